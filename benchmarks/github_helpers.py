@@ -0,0 +1,285 @@
+"""
+Measures the wall time, the requests and the bytes transferred by the GitHub helpers against the fake GitHub
+server of tests/fake_github, on a synthetic repository of 10k pull requests and 500 branches by default.
+Each helper runs cold (empty response cache and metadata store) and then warm (the same call again, the
+responses revalidated with their ETag). The latency of each response can be injected to simulate the network.
+
+The results are written as JSON. With --baseline they are compared with the results of a previous run with the
+same configuration: more requests or more bytes than the baseline, or a wall time over the time tolerance,
+are regressions and the exit code is 1.
+
+Usage:
+    python -m benchmarks.github_helpers [--pull-requests 10000] [--branches 500] [--latency-ms 0]
+        [--output results.json] [--baseline previous.json] [--time-tolerance 0.5]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from chat_with_repo.branch_tools import find_branches_by_commit
+from chat_with_repo.commit_tools import is_commit_in_base
+from chat_with_repo.github_client import get_response_cache
+from chat_with_repo.metadata_store import get_metadata_store
+from chat_with_repo.model import PullRequestFilter
+from chat_with_repo.pull_request_tools import (
+    create_prompt_property,
+    get_pull_requests,
+    get_pull_requests_by_path,
+)
+from chat_with_repo.settings import settings
+from chat_with_repo.tag_tools import find_tags_by_commit
+from tests.fake_github import FakeGitHubServer, FakeRepository, synthetic_repository
+
+OWNER = "smeup"
+REPO = "jariko"
+
+
+class BenchmarkConfig(BaseModel):
+    pull_requests: int = 10000
+    branches: int = 500
+    tags: int = 50
+    commits: int = 2000
+    latency_ms: float = 0.0
+    repeat: int = 3
+
+
+class Measure(BaseModel):
+    """
+    Attributes:
+        seconds (float): The wall time, the fastest of the repetitions.
+        requests (int): The requests received by the server, the 304 Not Modified included.
+        not_modified (int): The 304 Not Modified responses.
+        bytes (int): The bytes of the bodies of the responses.
+    """
+
+    seconds: float
+    requests: int
+    not_modified: int
+    bytes: int
+
+
+class HelperResult(BaseModel):
+    cold: Measure
+    warm: Measure
+
+
+class BenchmarkReport(BaseModel):
+    config: BenchmarkConfig
+    results: Dict[str, HelperResult]
+
+
+def create_cases(repository: FakeRepository) -> List[Tuple[str, Callable[[], object]]]:
+    """
+    Returns:
+        List[Tuple[str, Callable[[], object]]]: The name and the call of each benchmarked helper,
+            on a commit in the middle of the history of develop and on the newest pull request.
+    """
+    commit = repository.commits[len(repository.commits) // 2]
+    path = commit["files"][0]["filename"]
+    number = repository.pulls[0]["number"]
+    return [
+        (
+            "get_pull_requests",
+            lambda: get_pull_requests(
+                PullRequestFilter(target_branch="develop"), owner=OWNER, repo=REPO
+            ),
+        ),
+        (
+            "get_pull_requests_by_path",
+            lambda: get_pull_requests_by_path(path, owner=OWNER, repo=REPO),
+        ),
+        (
+            "find_branches_by_commit",
+            lambda: find_branches_by_commit(commit["sha"], owner=OWNER, repo=REPO),
+        ),
+        (
+            "find_tags_by_commit",
+            lambda: find_tags_by_commit(commit["sha"], owner=OWNER, repo=REPO),
+        ),
+        (
+            "is_commit_in_base",
+            lambda: is_commit_in_base(commit["sha"], "master", owner=OWNER, repo=REPO),
+        ),
+        (
+            "create_prompt_property",
+            lambda: create_prompt_property(number, owner=OWNER, repo=REPO),
+        ),
+    ]
+
+
+def measure(server: FakeGitHubServer, call: Callable[[], object]) -> Measure:
+    """
+    Runs the call against the server, the output printed by the helpers is discarded.
+    """
+    github = server.github
+    requests, not_modified, sent = (
+        len(github.requests),
+        github.not_modified,
+        github.bytes_sent,
+    )
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        call()
+    seconds = time.perf_counter() - start
+    return Measure(
+        seconds=seconds,
+        requests=len(github.requests) - requests,
+        not_modified=github.not_modified - not_modified,
+        bytes=github.bytes_sent - sent,
+    )
+
+
+def run_benchmark(config: BenchmarkConfig) -> BenchmarkReport:
+    """
+    Serves the synthetic repository of the configuration and measures each helper cold and warm.
+
+    Args:
+        config (BenchmarkConfig): The size of the repository, the latency and the repetitions.
+
+    Returns:
+        BenchmarkReport: The configuration and the measures of each helper.
+    """
+    repository = synthetic_repository(
+        owner=OWNER,
+        name=REPO,
+        pull_requests=config.pull_requests,
+        branches=config.branches,
+        tags=config.tags,
+        commits=config.commits,
+        diff_lines=5,
+    )
+    results: Dict[str, HelperResult] = {}
+    with FakeGitHubServer(
+        [repository], latency_seconds=config.latency_ms / 1000, rate_limit=10**9
+    ) as server:
+        previous_url = settings.github_api_url
+        previous_token = vars(settings).get("github_token")
+        # The token is set in the settings cache, so it is not read from the environment
+        settings.github_api_url = server.url
+        vars(settings)["github_token"] = "benchmark-token"
+        try:
+            for name, call in create_cases(repository):
+                colds, warms = [], []
+                for _ in range(config.repeat):
+                    get_response_cache().clear()
+                    get_metadata_store().clear()
+                    colds.append(measure(server, call))
+                    warms.append(measure(server, call))
+                results[name] = HelperResult(
+                    cold=__fastest(colds), warm=__fastest(warms)
+                )
+        finally:
+            settings.github_api_url = previous_url
+            if previous_token is None:
+                vars(settings).pop("github_token", None)
+            else:
+                vars(settings)["github_token"] = previous_token
+            get_response_cache().clear()
+            get_metadata_store().clear()
+    return BenchmarkReport(config=config, results=results)
+
+
+def __fastest(measures: List[Measure]) -> Measure:
+    return min(measures, key=lambda measure: measure.seconds)
+
+
+def check_regressions(
+    report: BenchmarkReport, baseline: BenchmarkReport, time_tolerance: float = 0.5
+) -> List[str]:
+    """
+    Compares the report with the baseline: the requests and the bytes are deterministic for a configuration,
+    so any increase is a regression, the wall time is compared with a tolerance.
+
+    Args:
+        report (BenchmarkReport): The current results.
+        baseline (BenchmarkReport): The results of a previous run.
+        time_tolerance (float, optional): The allowed increase of the wall time, 0.5 is 50%. Defaults to 0.5.
+
+    Returns:
+        List[str]: The regressions, empty if there are none.
+    """
+    if report.config.model_dump(exclude={"repeat"}) != baseline.config.model_dump(
+        exclude={"repeat"}
+    ):
+        return ["The baseline has been measured with a different configuration"]
+    regressions = []
+    for name, result in report.results.items():
+        expected = baseline.results.get(name)
+        if expected is None:
+            continue
+        for run in ["cold", "warm"]:
+            current, previous = getattr(result, run), getattr(expected, run)
+            if current.requests > previous.requests:
+                regressions.append(
+                    f"{name} ({run}): {current.requests} requests, baseline {previous.requests}"
+                )
+            if current.bytes > previous.bytes:
+                regressions.append(
+                    f"{name} ({run}): {current.bytes} bytes, baseline {previous.bytes}"
+                )
+            if current.seconds > previous.seconds * (1 + time_tolerance):
+                regressions.append(
+                    f"{name} ({run}): {current.seconds:.3f} s, baseline {previous.seconds:.3f} s"
+                )
+    return regressions
+
+
+def print_report(report: BenchmarkReport):
+    print(
+        f"{'helper':28} {'run':5} {'seconds':>9} {'requests':>9} {'304':>6} {'bytes':>12}"
+    )
+    for name, result in report.results.items():
+        for run in ["cold", "warm"]:
+            measure = getattr(result, run)
+            print(
+                f"{name:28} {run:5} {measure.seconds:9.3f} {measure.requests:9} "
+                f"{measure.not_modified:6} {measure.bytes:12}"
+            )
+
+
+def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--pull-requests", type=int, default=10000)
+    parser.add_argument("--branches", type=int, default=500)
+    parser.add_argument("--tags", type=int, default=50)
+    parser.add_argument("--commits", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="The JSON file of the results")
+    parser.add_argument("--baseline", help="The JSON file of a previous run")
+    parser.add_argument("--time-tolerance", type=float, default=0.5)
+    options = parser.parse_args(args)
+    report = run_benchmark(
+        BenchmarkConfig(
+            pull_requests=options.pull_requests,
+            branches=options.branches,
+            tags=options.tags,
+            commits=options.commits,
+            latency_ms=options.latency_ms,
+            repeat=options.repeat,
+        )
+    )
+    print_report(report)
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as f:
+            f.write(report.model_dump_json(indent=2))
+    if options.baseline:
+        with open(options.baseline, encoding="utf-8") as f:
+            baseline = BenchmarkReport.model_validate(json.load(f))
+        regressions = check_regressions(report, baseline, options.time_tolerance)
+        for regression in regressions:
+            print(regression)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""
+Micro-benchmarks of the pure functions run on every review and on every pull request query, on generated
+inputs as large as the biggest ones seen in production: a 50MB diff of 5k files, 20k pull requests with their
+title and body and 5k file paths.
+
+For each function it reports the operations per second (an operation is a diff line, a pull request or a path)
+and, measured in a separate run under tracemalloc, the peak and the retained memory.
+With --baseline the results are compared with a previous run: fewer operations per second or more peak memory
+than the tolerance allows are regressions and the exit code is 1.
+
+Usage:
+    python -m benchmarks.hot_functions [--scale 1.0] [--repeat 3] [--output results.json]
+        [--baseline previous.json] [--tolerance 0.3]
+"""
+
+import argparse
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from chat_with_repo import pull_request_tools
+from chat_with_repo.model import PullRequest, PullRequestFilter
+from chat_with_repo.pull_request_tools import (
+    exclude_files_from_diff,
+    generate_diff_hash,
+)
+
+WORDS = (
+    "fix add update remove refactor parser cache branch api test docs symbol table loop "
+    "interpreter compiler runtime data structure field record file program call procedure"
+).split()
+
+DIFF_MB = 50
+PULL_REQUESTS = 20000
+PATHS = 5000
+
+
+class HotFunctionCase(BaseModel):
+    """
+    Attributes:
+        name (str): The benchmarked function.
+        operations (int): The operations of a call, i.e. the lines of the diff or the pull requests.
+        unit (str): What an operation is.
+    """
+
+    name: str
+    operations: int
+    unit: str
+
+
+class HotFunctionResult(BaseModel):
+    """
+    Attributes:
+        operations_per_second (float): The operations per second of the fastest call.
+        seconds (float): The time of the fastest call.
+        peak_bytes (int): The peak of the memory allocated during a call.
+        retained_bytes (int): The memory still allocated after a call, i.e. the result.
+    """
+
+    unit: str
+    operations: int
+    operations_per_second: float
+    seconds: float
+    peak_bytes: int
+    retained_bytes: int
+
+
+class HotFunctionReport(BaseModel):
+    scale: float
+    results: Dict[str, HotFunctionResult]
+
+
+def generate_paths(count: int, seed: int = 0) -> List[str]:
+    rnd = random.Random(seed)
+    return [
+        f"src/main/kotlin/com/smeup/{rnd.choice(WORDS)}/{rnd.choice(WORDS)}/File{i}.kt"
+        for i in range(count)
+    ]
+
+
+def generate_diff(paths: List[str], size_bytes: int, seed: int = 0) -> str:
+    """
+    Returns:
+        str: A git diff changing each path, of about size_bytes.
+    """
+    rnd = random.Random(seed)
+    lines_per_file = max(1, size_bytes // len(paths) // 60)
+    chunks = []
+    for path in paths:
+        chunks.append(
+            f"diff --git a/{path} b/{path}\nindex 1234567..89abcde 100644\n"
+            f"--- a/{path}\n+++ b/{path}\n@@ -1,{lines_per_file} +1,{lines_per_file} @@\n"
+        )
+        chunks.extend(
+            f"{rnd.choice('+- ')}    val {rnd.choice(WORDS)}{line} = {rnd.choice(WORDS)}({line})\n"
+            for line in range(lines_per_file)
+        )
+    return "".join(chunks)
+
+
+def generate_pull_requests(count: int, seed: int = 0) -> List[PullRequest]:
+    rnd = random.Random(seed)
+    created = datetime(2024, 1, 1)
+    return [
+        PullRequest(
+            number=number,
+            html_url=f"https://github.com/smeup/jariko/pull/{number}",
+            diff_url=f"https://github.com/smeup/jariko/pull/{number}.diff",
+            title=" ".join(rnd.sample(WORDS, 6)).capitalize() + f" (#{number})",
+            user={"login": "lanarimarco"},
+            body="## Description\n\n"
+            + ". ".join(" ".join(rnd.choices(WORDS, k=12)) for _ in range(10)),
+            created_at=created,
+            head={
+                "label": f"smeup:feature/{number}",
+                "ref": f"feature/{number}",
+                "sha": "0" * 40,
+            },
+            base={"label": "smeup:develop", "ref": "develop", "sha": "0" * 40},
+        )
+        for number in range(1, count + 1)
+    ]
+
+
+def create_cases(
+    scale: float = 1.0,
+) -> List[Tuple[HotFunctionCase, Callable[[], object]]]:
+    """
+    Generates the inputs and returns the cases.
+
+    Args:
+        scale (float, optional): Multiplies the size of the inputs. Defaults to 1.0.
+
+    Returns:
+        List[Tuple[HotFunctionCase, Callable[[], object]]]: The HotFunctionCase and the call of each function.
+    """
+    paths = generate_paths(max(1, int(PATHS * scale)))
+    diff = generate_diff(paths, int(DIFF_MB * 1024 * 1024 * scale))
+    # The huge files excluded from a review are a few
+    excluded = paths[:: max(1, len(paths) // 50)]
+    pull_requests = generate_pull_requests(max(1, int(PULL_REQUESTS * scale)))
+    pull_request_filter = PullRequestFilter(title="parser cache", body="symbol table")
+    match_filter = pull_request_tools.__is_pull_request_match_filter
+    extract = pull_request_tools.__extract_only_useful_information
+    diff_lines = diff.count("\n")
+    return [
+        (
+            HotFunctionCase(
+                name="exclude_files_from_diff", operations=diff_lines, unit="line"
+            ),
+            lambda: exclude_files_from_diff(diff, excluded),
+        ),
+        (
+            HotFunctionCase(
+                name="__is_pull_request_match_filter",
+                operations=len(pull_requests),
+                unit="pull request",
+            ),
+            lambda: [match_filter(pr, pull_request_filter) for pr in pull_requests],
+        ),
+        (
+            HotFunctionCase(
+                name="__extract_only_useful_information",
+                operations=len(pull_requests),
+                unit="pull request body",
+            ),
+            lambda: [extract(pr.body) for pr in pull_requests],
+        ),
+        (
+            HotFunctionCase(
+                name="generate_diff_hash", operations=len(paths), unit="path"
+            ),
+            lambda: [generate_diff_hash(path) for path in paths],
+        ),
+    ]
+
+
+def measure(
+    case: HotFunctionCase, call: Callable[[], object], repeat: int = 3
+) -> HotFunctionResult:
+    """
+    Times the call repeat times without tracing, then traces its allocations in one more call.
+    """
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+    seconds = min(timings)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = call()
+        retained_bytes, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return HotFunctionResult(
+        unit=case.unit,
+        operations=case.operations,
+        operations_per_second=case.operations / seconds if seconds else float("inf"),
+        seconds=seconds,
+        peak_bytes=peak_bytes,
+        retained_bytes=retained_bytes,
+    )
+
+
+def run_benchmark(scale: float = 1.0, repeat: int = 3) -> HotFunctionReport:
+    return HotFunctionReport(
+        scale=scale,
+        results={
+            case.name: measure(case, call, repeat) for case, call in create_cases(scale)
+        },
+    )
+
+
+def check_regressions(
+    report: HotFunctionReport, baseline: HotFunctionReport, tolerance: float = 0.3
+) -> List[str]:
+    """
+    Compares the report with a baseline measured at the same scale.
+
+    Args:
+        report (HotFunctionReport): The current results.
+        baseline (HotFunctionReport): The results of a previous run.
+        tolerance (float, optional): The allowed loss of operations per second and increase of the peak memory,
+            0.3 is 30%. Defaults to 0.3.
+
+    Returns:
+        List[str]: The regressions, empty if there are none.
+    """
+    if report.scale != baseline.scale:
+        return ["The baseline has been measured at a different scale"]
+    regressions = []
+    for name, result in report.results.items():
+        expected = baseline.results.get(name)
+        if expected is None:
+            continue
+        if result.operations_per_second < expected.operations_per_second * (
+            1 - tolerance
+        ):
+            regressions.append(
+                f"{name}: {result.operations_per_second:,.0f} {result.unit}/s, "
+                f"baseline {expected.operations_per_second:,.0f}"
+            )
+        if result.peak_bytes > expected.peak_bytes * (1 + tolerance):
+            regressions.append(
+                f"{name}: peak {result.peak_bytes:,} bytes, baseline {expected.peak_bytes:,}"
+            )
+    return regressions
+
+
+def print_report(report: HotFunctionReport):
+    print(
+        f"{'function':36} {'operations':>10} {'ops/s':>14} {'seconds':>9} {'peak MB':>9} {'retained MB':>12}"
+    )
+    for name, result in report.results.items():
+        print(
+            f"{name:36} {result.operations:10} {result.operations_per_second:14,.0f} "
+            f"{result.seconds:9.3f} {result.peak_bytes / 2**20:9.1f} {result.retained_bytes / 2**20:12.1f}"
+        )
+
+
+def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="The JSON file of the results")
+    parser.add_argument("--baseline", help="The JSON file of a previous run")
+    parser.add_argument("--tolerance", type=float, default=0.3)
+    options = parser.parse_args(args)
+    report = run_benchmark(scale=options.scale, repeat=options.repeat)
+    print_report(report)
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as f:
+            f.write(report.model_dump_json(indent=2))
+    if options.baseline:
+        with open(options.baseline, encoding="utf-8") as f:
+            baseline = HotFunctionReport.model_validate(json.load(f))
+        regressions = check_regressions(report, baseline, options.tolerance)
+        for regression in regressions:
+            print(regression)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
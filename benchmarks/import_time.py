@@ -0,0 +1,122 @@
+"""
+Measures the import time of the app and of the tool modules with python -X importtime and checks them
+against a budget. Each module is imported in a fresh interpreter, so the time includes all its dependencies.
+Some modules must also not load the heavy dependencies used only on first use (i.e. langchain_openai).
+
+Usage:
+    python -m benchmarks.import_time [--repeat 3] [--budget-factor 1.0]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# The maximum import time in milliseconds of each module, in a fresh interpreter
+BUDGETS_MS: Dict[str, int] = {
+    "chat_with_repo.settings": 50,
+    "chat_with_repo.github_client": 300,
+    "chat_with_repo.commit_tools": 1000,
+    "chat_with_repo.branch_tools": 1000,
+    "chat_with_repo.tag_tools": 1000,
+    "chat_with_repo.pull_request_tools": 1100,
+    "chat_with_repo.assistant": 1200,
+    "chat_with_repo.app": 800,
+}
+
+# The modules that each module must not import, they are loaded on first use
+FORBIDDEN_IMPORTS: Dict[str, List[str]] = {
+    "chat_with_repo.settings": ["streamlit", "dotenv", "langchain_core"],
+    "chat_with_repo.commit_tools": ["streamlit", "langchain_openai", "httpx"],
+    "chat_with_repo.branch_tools": ["streamlit", "langchain_openai", "httpx"],
+    "chat_with_repo.tag_tools": ["streamlit", "langchain_openai", "httpx"],
+    "chat_with_repo.pull_request_tools": [
+        "streamlit",
+        "langchain_openai",
+        "langchain.agents",
+    ],
+    "chat_with_repo.assistant": ["streamlit", "langchain_openai", "langchain.agents"],
+    "chat_with_repo.app": ["langchain_openai", "langchain.agents", "langchain_core"],
+}
+
+
+def measure_import(module: str) -> Tuple[float, List[str]]:
+    """
+    Imports the module in a fresh interpreter with python -X importtime.
+
+    Args:
+        module (str): The module name.
+
+    Returns:
+        Tuple[float, List[str]]: The cumulative import time in milliseconds and the modules imported.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    if result.returncode != 0:
+        raise Exception(f"Error: unable to import {module} - {result.stderr[-2000:]}")
+    cumulative_us = 0
+    imported = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        name = name.strip()
+        imported.append(name)
+        if name == module:
+            cumulative_us = int(cumulative)
+    return cumulative_us / 1000, imported
+
+
+def check_imports(
+    modules: List[str], repeat: int = 3, budget_factor: float = 1.0
+) -> List[str]:
+    """
+    Measures the modules and checks the budgets and the forbidden imports.
+
+    Args:
+        modules (List[str]): The modules, they must be in BUDGETS_MS.
+        repeat (int, optional): The imports of each module, the fastest one is compared with the budget. Defaults to 3.
+        budget_factor (float, optional): Multiplies the budgets, i.e. on slow machines. Defaults to 1.0.
+
+    Returns:
+        List[str]: The violations, empty if all the modules are within the budget.
+    """
+    violations = []
+    for module in modules:
+        measures = [measure_import(module) for _ in range(repeat)]
+        milliseconds = min(ms for ms, _ in measures)
+        imported = measures[0][1]
+        budget = BUDGETS_MS[module] * budget_factor
+        print(f"{module:40} {milliseconds:8.1f} ms (budget {budget:.0f} ms)")
+        if milliseconds > budget:
+            violations.append(
+                f"{module} imports in {milliseconds:.0f} ms, budget {budget:.0f} ms"
+            )
+        for forbidden in FORBIDDEN_IMPORTS.get(module, []):
+            if forbidden in imported:
+                violations.append(f"{module} imports {forbidden}")
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--budget-factor", type=float, default=1.0)
+    args = parser.parse_args()
+    violations = check_imports(
+        list(BUDGETS_MS), repeat=args.repeat, budget_factor=args.budget_factor
+    )
+    for violation in violations:
+        print(violation)
+    sys.exit(1 if violations else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Measures the tokens of the tool outputs sent to the model before and after the compact serialization.
+
+Before the compact serialization the tools returned pydantic models, which LangChain turns into the
+observation through str(). The benchmark compares that representation with the output of the
+encoders in chat_with_repo.tool_output for the same results.
+
+By default it runs on synthetic GitHub-shaped payloads, with --fixtures it runs on recorded GitHub
+responses: a directory containing pulls.json (the response of GET /repos/{owner}/{repo}/pulls)
+and/or commits.json (the response of GET /repos/{owner}/{repo}/commits).
+
+Usage:
+    python -m benchmarks.tool_output_tokens [--fixtures DIR] [--top-k 10]
+"""
+
+import argparse
+import json
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+from chat_with_repo import MODEL_NAME
+from chat_with_repo.model import Commit, PullRequest
+from chat_with_repo.tokens import count_tokens
+from chat_with_repo.tool_output import (
+    encode_commit,
+    encode_commits,
+    encode_names,
+    encode_pull_request,
+    encode_pull_requests,
+)
+
+WORDS = "fix add update remove refactor parser cache branch api test docs symbol table loop".split()
+
+
+def synthetic_pull_requests(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    rnd = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    pull_requests = []
+    for number in range(count, 0, -1):
+        branch = f"feature/{'-'.join(rnd.sample(WORDS, 3))}"
+        created = start + timedelta(hours=number * 7)
+        merged = created + timedelta(days=1) if number % 3 else None
+        sha = "%040x" % rnd.getrandbits(160)
+        pull_requests.append(
+            {
+                "number": number,
+                "html_url": f"https://github.com/smeup/jariko/pull/{number}",
+                "diff_url": f"https://github.com/smeup/jariko/pull/{number}.diff",
+                "title": " ".join(rnd.sample(WORDS, 5)).capitalize(),
+                "user": {
+                    "login": rnd.choice(["lanarimarco", "foresti", "davidepalladino"])
+                },
+                "body": "## Description\n\n" + " ".join(rnd.choices(WORDS, k=120)),
+                "created_at": created.isoformat() + "Z",
+                "updated_at": created.isoformat() + "Z",
+                "merged_at": merged.isoformat() + "Z" if merged else None,
+                "closed_at": merged.isoformat() + "Z" if merged else None,
+                "head": {"label": f"smeup:{branch}", "ref": branch, "sha": sha},
+                "base": {
+                    "label": "smeup:develop",
+                    "ref": "develop",
+                    "sha": "%040x" % rnd.getrandbits(160),
+                },
+            }
+        )
+    return pull_requests
+
+
+def synthetic_commits(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    rnd = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    commits = []
+    for i in range(count):
+        sha = "%040x" % rnd.getrandbits(160)
+        name = rnd.choice(["Marco Lanari", "Mattia Bonardi", "Davide Palladino"])
+        commits.append(
+            {
+                "sha": sha,
+                "html_url": f"https://github.com/smeup/jariko/commit/{sha}",
+                "commit": {
+                    "author": {
+                        "name": name,
+                        "email": name.lower().replace(" ", ".") + "@smeup.com",
+                        "date": (start + timedelta(hours=i * 5)).isoformat() + "Z",
+                    },
+                    "message": " ".join(rnd.sample(WORDS, 6)).capitalize()
+                    + "\n\n"
+                    + " ".join(rnd.choices(WORDS, k=30)),
+                },
+            }
+        )
+    return commits
+
+
+def load(fixtures: str, name: str, default: Callable[[], List[Dict[str, Any]]]):
+    path = os.path.join(fixtures, name) if fixtures else None
+    if path and os.path.exists(path):
+        with open(path) as file:
+            return json.load(file), path
+    return default(), "synthetic"
+
+
+def report(name: str, before: str, after: str):
+    before_tokens = count_tokens(before, MODEL_NAME)
+    after_tokens = count_tokens(after, MODEL_NAME)
+    saving = 100 * (1 - after_tokens / before_tokens) if before_tokens else 0
+    print(f"{name:<36} {before_tokens:>8} {after_tokens:>8} {saving:>8.1f}%")
+
+
+def run(fixtures: str, top_k: int):
+    pulls, pulls_source = load(
+        fixtures, "pulls.json", lambda: synthetic_pull_requests(100)
+    )
+    commits, commits_source = load(
+        fixtures, "commits.json", lambda: synthetic_commits(100)
+    )
+    pull_requests = [PullRequest(**pr) for pr in pulls]
+    commit_list = [Commit(**commit) for commit in commits]
+    print(f"pull requests: {pulls_source}, commits: {commits_source}")
+    print(f"{'tool':<36} {'before':>8} {'after':>8} {'saving':>9}")
+
+    report(
+        "get_pull_request_by_number",
+        str(pull_requests[0]),
+        encode_pull_request(pull_requests[0]),
+    )
+    report(
+        "get_pull_requests",
+        str(pull_requests[:top_k]),
+        encode_pull_requests(
+            pull_requests[:top_k],
+            ["number", "title", "author", "head", "base", "state"],
+            total=len(pull_requests),
+        ),
+    )
+    report(
+        "get_pull_requests_by_commit",
+        str(pull_requests[:2]),
+        encode_pull_requests(
+            pull_requests[:2], ["number", "title", "state", "head", "base"]
+        ),
+    )
+    report(
+        "get_commit_by_sha",
+        str(commit_list[0]),
+        encode_commit(commit_list[0]),
+    )
+    report(
+        "get_commits_by_path",
+        str(commit_list[:top_k]),
+        encode_commits(
+            commit_list[:top_k],
+            ["sha", "date", "author", "message"],
+            total=len(commit_list),
+        ),
+    )
+    branches = [pr.head.ref for pr in pull_requests]
+    report(
+        "find_branches_by_commit",
+        str(branches[:top_k]),
+        encode_names(branches[:top_k], "branches", total=len(branches)),
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--fixtures", help="The directory with the recorded GitHub responses"
+    )
+    parser.add_argument(
+        "--top-k", type=int, default=10, help="The number of results of the tools"
+    )
+    args = parser.parse_args()
+    run(args.fixtures, args.top_k)
@@ -0,0 +1,123 @@
+"""
+Measures the effect of the tool selection on the prompt sent to the model.
+
+Offline it reports, for each question, the tokens of the tool schemas with all the tools and with the
+selected ones and the time spent by the selection.
+With --live it also asks the questions to the assistant, with and without the selection, and reports the
+input tokens and the latency of the model calls (it needs GITHUB_TOKEN and OPENAI_API_KEY).
+
+Usage:
+    python -m benchmarks.tool_selection [--live] [--top-k 5]
+"""
+
+import argparse
+import time
+
+from chat_with_repo import MODEL_NAME
+from chat_with_repo.assistant import GitHubAssistant
+from chat_with_repo.branch_tools import FindBranchesByCommitTool
+from chat_with_repo.commit_tools import (
+    GetCommitByShaTool,
+    GetCommitsByPathTool,
+    GetCommitsByPullRequestTool,
+    IsCommitInBaseTool,
+)
+from chat_with_repo.misc_tools import SelectGitHubRepoTool
+from chat_with_repo.model import State
+from chat_with_repo.pull_request_tools import (
+    CodeReviewTool,
+    GetPullRequestByNumberTool,
+    GetPullRequestByPathTool,
+    GetPullRequestsByCommitTool,
+    GetPullRequestsTool,
+    IsCommitInBranchTool,
+)
+from chat_with_repo.tag_tools import FindTagsByCommitTool
+from chat_with_repo.tokens import count_tokens, count_tool_tokens
+from chat_with_repo.constants import SYSTEM_MESSAGE
+from chat_with_repo.tool_selector import ToolSelector
+from chat_with_repo.tracing import LLM_SPAN
+from chat_with_repo.usage import total_usage
+
+QUESTIONS = [
+    "Hello, tell me the title of pull request containing this commit 5bc1da09bab1d53b28fbcfdcf9f01fd766bb3b05",
+    "Hello, tell me if the branch perf/avoid-logging-reconfiguration is merged to develop, response Yes if the branch was merged else No",
+    "Hello, tell me the pull request where in the description we have these words: '%alloc', '%realloc' and '%addr'",
+    "Hello, tell me if the commit 67477d15d599cad9d7bca0df49cc383984d85125 is in the develop or master. Answer YES or NO followed by the explanation",
+    "Hello, tell me the email of the author of the commit 5615e2956bd986d71225498ed1a571ef861f734f",
+    "Hello, tell me if the pull request 487 has been merged in the v1.5.1. Answer YES or NO",
+    "Hello, describe the changes of the pull request 562",
+]
+
+
+def all_tools(state: State):
+    return [
+        SelectGitHubRepoTool(state=state),
+        GetPullRequestByNumberTool(state=state),
+        GetPullRequestsTool(state=state),
+        GetPullRequestsByCommitTool(state=state),
+        GetPullRequestByPathTool(state=state),
+        CodeReviewTool(state=state),
+        GetCommitByShaTool(state=state),
+        IsCommitInBranchTool(state=state),
+        IsCommitInBaseTool(state=state),
+        GetCommitsByPathTool(state=state),
+        GetCommitsByPullRequestTool(state=state),
+        FindBranchesByCommitTool(state=state),
+        FindTagsByCommitTool(state=state),
+    ]
+
+
+def offline(top_k: int):
+    tools = all_tools(State())
+    selector = ToolSelector(top_k=top_k)
+    system_tokens = count_tokens(SYSTEM_MESSAGE, MODEL_NAME)
+    all_tokens = count_tool_tokens(tools, MODEL_NAME)
+    print(f"System message tokens: {system_tokens}")
+    print(f"{'tools':>7} {'tokens':>13} {'select ms':>10}  question")
+    for question in QUESTIONS:
+        start = time.perf_counter()
+        selected = selector.select(question, tools)
+        elapsed = (time.perf_counter() - start) * 1000
+        selected_tokens = count_tool_tokens(selected, MODEL_NAME)
+        print(
+            f"{len(selected):>3}/{len(tools):<3} {all_tokens:>5} -> {selected_tokens:<5} {elapsed:>10.2f}  {question[:60]}"
+        )
+
+
+def live(top_k: int):
+    print(
+        f"{'top_k':>6} {'llm calls':>9} {'input':>7} {'output':>7} {'llm s':>7} {'total s':>8}  question"
+    )
+    for question in QUESTIONS:
+        for selection_top_k in (None, top_k):
+            assistant = GitHubAssistant(
+                fast_path=False, tool_selection_top_k=selection_top_k
+            )
+            start = time.perf_counter()
+            assistant.chat(question)
+            elapsed = time.perf_counter() - start
+            usage = total_usage(assistant.last_turn_usage)
+            llm_seconds = sum(
+                descendant.duration_seconds or 0
+                for _, descendant in assistant.last_turn.walk()
+                if descendant.name == LLM_SPAN
+            )
+            print(
+                f"{str(selection_top_k):>6} {usage.llm_calls:>9} {usage.input_tokens:>7} {usage.output_tokens:>7} "
+                f"{llm_seconds:>7.2f} {elapsed:>8.2f}  {question[:60]}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--live", action="store_true", help="Ask the questions to the assistant"
+    )
+    parser.add_argument(
+        "--top-k", type=int, default=5, help="The number of selected tools"
+    )
+    args = parser.parse_args()
+    offline(args.top_k)
+    if args.live:
+        live(args.top_k)
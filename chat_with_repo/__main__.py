@@ -0,0 +1,4 @@
+from chat_with_repo.cli import main
+
+if __name__ == "__main__":
+    main()
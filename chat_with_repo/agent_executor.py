@@ -0,0 +1,133 @@
+import asyncio
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from langchain.agents import AgentExecutor
+from langchain_core.agents import AgentAction, AgentFinish, AgentStep
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForChainRun,
+    CallbackManagerForChainRun,
+)
+from langchain_core.pydantic_v1 import PrivateAttr
+from langchain_core.tools import BaseTool
+
+from chat_with_repo.tracing import TOOL_SPAN, span
+
+
+class ConcurrentAgentExecutor(AgentExecutor):
+    """
+    AgentExecutor running concurrently the tool calls that the model emits in the same step.
+    The results are returned to the agent in the same order of the tool calls.
+
+    Attributes:
+        max_concurrency (int): The maximum number of tool calls running at the same time. Defaults to 4.
+        sequential_tools (List[str]): The tools changing the state used by the other tools (i.e. select_github_repo),
+            they wait for the previous tool calls of the step and block the following ones.
+    """
+
+    max_concurrency: int = 4
+    sequential_tools: List[str] = ["select_github_repo"]
+
+    _pool: Optional[ThreadPoolExecutor] = PrivateAttr(default=None)
+    _pending: List[Future] = PrivateAttr(default_factory=list)
+    _semaphore: Optional[asyncio.Semaphore] = PrivateAttr(default=None)
+
+    def _iter_next_step(
+        self,
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+        inputs: Dict[str, str],
+        intermediate_steps: List[Tuple[AgentAction, str]],
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+    ) -> Iterator[Union[AgentFinish, AgentAction, AgentStep]]:
+        # The parent yields all the actions and only then it performs them one by one through
+        # _perform_agent_action, which here submits the action to the pool and returns a Future.
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            self._pool = pool
+            self._pending = []
+            try:
+                for step in super()._iter_next_step(
+                    name_to_tool_map,
+                    color_mapping,
+                    inputs,
+                    intermediate_steps,
+                    run_manager,
+                ):
+                    if not isinstance(step, Future):
+                        yield step
+                for future in self._pending:
+                    yield future.result()
+            finally:
+                self._pool = None
+                self._pending = []
+
+    def _perform_agent_action(
+        self,
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+        agent_action: AgentAction,
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+    ) -> Union[AgentStep, Future]:
+        perform = self.__traced(super()._perform_agent_action, agent_action)
+        if self._pool is None:
+            return perform(name_to_tool_map, color_mapping, agent_action, run_manager)
+        if agent_action.tool in self.sequential_tools:
+            wait(self._pending)
+            future = Future()
+            future.set_result(
+                perform(name_to_tool_map, color_mapping, agent_action, run_manager)
+            )
+        else:
+            future = self._pool.submit(
+                contextvars.copy_context().run,
+                perform,
+                name_to_tool_map,
+                color_mapping,
+                agent_action,
+                run_manager,
+            )
+        self._pending.append(future)
+        return future
+
+    async def _aperform_agent_action(
+        self,
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+        agent_action: AgentAction,
+        run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
+    ) -> AgentStep:
+        # The parent already runs the actions of a step through asyncio.gather,
+        # here we only cap the concurrency
+        permits = (
+            self.max_concurrency if agent_action.tool in self.sequential_tools else 1
+        )
+        async with self.__acquire(permits):
+            with span(TOOL_SPAN, agent_action.tool):
+                return await super()._aperform_agent_action(
+                    name_to_tool_map, color_mapping, agent_action, run_manager
+                )
+
+    @staticmethod
+    def __traced(perform: Callable[..., AgentStep], agent_action: AgentAction):
+        # The span is opened by the thread running the tool, so the GitHub requests of the tool are its children
+        def traced(*args) -> AgentStep:
+            with span(TOOL_SPAN, agent_action.tool):
+                return perform(*args)
+
+        return traced
+
+    @asynccontextmanager
+    async def __acquire(self, permits: int):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        acquired = 0
+        try:
+            for _ in range(permits):
+                await self._semaphore.acquire()
+                acquired += 1
+            yield
+        finally:
+            for _ in range(acquired):
+                self._semaphore.release()
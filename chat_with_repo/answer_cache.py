@@ -0,0 +1,337 @@
+import re
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple
+
+import numpy as np
+from pydantic import BaseModel
+
+from chat_with_repo.settings import settings
+from chat_with_repo.github_client import get
+from chat_with_repo.model import Repo
+from chat_with_repo.tool_selector import tokenize
+
+# The words that do not change the meaning of a question
+STOP_WORDS = (
+    "a an and answer any are can could do does give hello hi i in into is me of on or "
+    "please show tell the there to us we what which you"
+)
+STOP_TERMS = set(tokenize(STOP_WORDS))
+
+# The abbreviations replaced by the terms they stand for
+SYNONYMS = {
+    "pr": ["pull", "request"],
+    "prs": ["pull", "request"],
+    "pullrequest": ["pull", "request"],
+    "sha": ["commit"],
+    "hash": ["commit"],
+}
+
+# The words that must be identical in two questions to share the answer
+ENTITY_WORDS = {
+    "develop",
+    "master",
+    "main",
+    "open",
+    "opened",
+    "closed",
+    "merged",
+    "not",
+} | {name.lower() for repo in Repo for name in (repo.name, repo.value)}
+
+# The words referring to the previous messages, a question using them is a follow up
+CONTEXT_WORDS = {
+    "it",
+    "its",
+    "that",
+    "this",
+    "these",
+    "those",
+    "they",
+    "them",
+    "their",
+    "he",
+    "she",
+    "his",
+    "her",
+    "him",
+    "same",
+    "above",
+    "previous",
+    "again",
+}
+
+QUOTED_PATTERN = re.compile(r"'([^']+)'|\"([^\"]+)\"")
+IDENTIFIER_PATTERN = re.compile(r"[\w./-]*[\d./_-][\w./-]*")
+
+
+class AnswerKey(BaseModel):
+    """
+    Identifies the answer to a question.
+
+    Attributes:
+        repo (Repo): The repository selected when the question was asked.
+        freshness (str): The token changing when the data of the repository change.
+        question (str): The normalized question.
+        entities (FrozenSet[str]): The numbers, SHAs, branches, quoted strings... of the question.
+        terms (List[str]): The terms of the question indexed for the similarity.
+    """
+
+    repo: Repo
+    freshness: str
+    question: str
+    entities: FrozenSet[str]
+    terms: List[str]
+
+
+class CachedAnswer(BaseModel):
+    key: AnswerKey
+    answer: str
+    created: float
+
+
+class AnswerCache:
+    """
+    Cache of the assistant answers shared by all the users.
+    A question hits the cache if it has been asked with the same repository and the same freshness token
+    and either its normalized text is the same or it is a near-duplicate: same entities and TF-IDF cosine
+    similarity over similarity_threshold.
+
+    Attributes:
+        similarity_threshold (float): The minimum similarity of a near-duplicate question. Defaults to 0.85.
+        max_entries (int): The maximum number of answers, the least recently used are evicted. Defaults to 500.
+        ttl_seconds (int): The maximum age of an answer. Defaults to 3600.
+        freshness_ttl_seconds (int): How long the freshness token of a repository is reused before asking it
+            again to GitHub. Defaults to 30.
+    """
+
+    def __init__(
+        self,
+        similarity_threshold: float = 0.85,
+        max_entries: int = 500,
+        ttl_seconds: int = 3600,
+        freshness_ttl_seconds: int = 30,
+        freshness: Callable[[Repo], str] = None,
+    ):
+        """
+        Initializes a new instance of the AnswerCache class.
+
+        Args:
+            freshness (Callable[[Repo], str], optional): Returns the freshness token of a repository.
+                Defaults to get_freshness_token.
+        """
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.freshness_ttl_seconds = freshness_ttl_seconds
+        self.freshness = freshness or (
+            lambda repo: get_freshness_token(owner=repo.owner, repo=repo.value)
+        )
+        self.hits = 0
+        self.misses = 0
+        self.__answers: "OrderedDict[Tuple[Repo, str, str], CachedAnswer]" = (
+            OrderedDict()
+        )
+        self.__freshness: Dict[Repo, Tuple[str, float]] = {}
+        self.__lock = Lock()
+
+    def key(self, question: str, repo: Repo) -> Optional[AnswerKey]:
+        """
+        Computes the key of the question.
+
+        Args:
+            question (str): The user's question.
+            repo (Repo): The selected repository.
+
+        Returns:
+            Optional[AnswerKey]: The key, None if the freshness token is not available.
+        """
+        freshness = self.__get_freshness(repo)
+        if freshness is None:
+            return None
+        normalized = normalize_question(question)
+        return AnswerKey(
+            repo=repo,
+            freshness=freshness,
+            question=normalized,
+            entities=extract_entities(question),
+            terms=question_terms(normalized),
+        )
+
+    def get(self, key: AnswerKey) -> Optional[str]:
+        """
+        Returns:
+            Optional[str]: The answer of the same or of a near-duplicate question, None if not found.
+        """
+        with self.__lock:
+            self.__evict_expired()
+            cached = self.__answers.get((key.repo, key.freshness, key.question))
+            if cached is None:
+                cached = self.__find_similar(key)
+            if cached is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.__answers.move_to_end(
+                (cached.key.repo, cached.key.freshness, cached.key.question)
+            )
+            return cached.answer
+
+    def put(self, key: AnswerKey, answer: str):
+        with self.__lock:
+            self.__answers[(key.repo, key.freshness, key.question)] = CachedAnswer(
+                key=key, answer=answer, created=time.time()
+            )
+            self.__answers.move_to_end((key.repo, key.freshness, key.question))
+            while len(self.__answers) > self.max_entries:
+                self.__answers.popitem(last=False)
+
+    def clear(self):
+        with self.__lock:
+            self.__answers.clear()
+            self.__freshness.clear()
+
+    def refresh(self, repo: Repo):
+        """Forgets the freshness token of the repository, i.e. when a webhook tells that it has changed"""
+        with self.__lock:
+            self.__freshness.pop(repo, None)
+
+    def __get_freshness(self, repo: Repo) -> Optional[str]:
+        now = time.time()
+        cached = self.__freshness.get(repo)
+        if cached is not None and now - cached[1] < self.freshness_ttl_seconds:
+            return cached[0]
+        try:
+            freshness = self.freshness(repo)
+        except Exception as e:
+            print(f"Unable to get the freshness token of {repo.value}: {e}")
+            return None
+        self.__freshness[repo] = (freshness, now)
+        return freshness
+
+    def __evict_expired(self):
+        expiration = time.time() - self.ttl_seconds
+        for answer_key in [
+            k for k, cached in self.__answers.items() if cached.created < expiration
+        ]:
+            del self.__answers[answer_key]
+
+    def __find_similar(self, key: AnswerKey) -> Optional[CachedAnswer]:
+        candidates = [
+            cached
+            for cached in self.__answers.values()
+            if cached.key.repo == key.repo
+            and cached.key.freshness == key.freshness
+            and cached.key.entities == key.entities
+        ]
+        if not candidates or not key.terms:
+            return None
+        scores = similarity(key.terms, [cached.key.terms for cached in candidates])
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+        return candidates[best]
+
+
+def normalize_question(question: str) -> str:
+    """Lowercases the question and removes the punctuation not belonging to identifiers"""
+    text = question.lower().strip()
+    text = re.sub(r"[^\w\s./#'\"-]|(?<!\w)[.-]|[.-](?!\w)", " ", text)
+    return " ".join(text.split())
+
+
+def question_terms(question: str) -> List[str]:
+    """Returns the terms of the question indexed for the similarity, without stop words and abbreviations"""
+    terms = []
+    for term in tokenize(question):
+        if term not in STOP_TERMS:
+            terms.extend(SYNONYMS.get(term, [term]))
+    return terms
+
+
+def extract_entities(question: str) -> FrozenSet[str]:
+    """
+    Extracts from the question the values that must be identical in two questions to share the answer:
+    numbers, SHAs, branch and file names, quoted strings, repositories, target branches and states.
+    """
+    text = question.lower()
+    entities = {
+        (single or double).strip() for single, double in QUOTED_PATTERN.findall(text)
+    }
+    text = QUOTED_PATTERN.sub(" ", text)
+    for word in text.split():
+        word = word.strip("?!,;:()[]{}").rstrip(".")
+        if IDENTIFIER_PATTERN.fullmatch(word) or word.lstrip("#").isdigit():
+            entities.add(word.lstrip("#"))
+        elif re.fullmatch(r"[0-9a-f]{7,40}", word):
+            entities.add(word)
+        elif word in ENTITY_WORDS:
+            entities.add(word)
+    return frozenset(entities)
+
+
+def is_self_contained(question: str) -> bool:
+    """Returns False if the question refers to the previous messages without naming what it is about"""
+    words = set(re.findall(r"[a-z]+", question.lower()))
+    if not words & CONTEXT_WORDS:
+        return True
+    return any(entity not in ENTITY_WORDS for entity in extract_entities(question))
+
+
+def similarity(terms: List[str], documents: List[List[str]]) -> np.ndarray:
+    """
+    Computes the TF-IDF cosine similarity between the terms of a question and the ones of other questions.
+
+    Args:
+        terms (List[str]): The terms of the question.
+        documents (List[List[str]]): The terms of the other questions.
+
+    Returns:
+        np.ndarray: The similarity with each question.
+    """
+    vocabulary: Dict[str, int] = {}
+    for document in [terms] + documents:
+        for term in document:
+            vocabulary.setdefault(term, len(vocabulary))
+    counts = np.zeros((len(documents) + 1, len(vocabulary)))
+    for row, document in enumerate([terms] + documents):
+        for term in document:
+            counts[row, vocabulary[term]] += 1.0
+    document_frequency = np.count_nonzero(counts, axis=0)
+    idf = np.log((1 + len(counts)) / (1 + document_frequency)) + 1.0
+    matrix = counts * idf
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix[1:] @ matrix[0]
+
+
+def get_freshness_token(owner: str = "smeup", repo: str = "jariko") -> str:
+    """
+    Retrieves a token changing whenever a pull request is created or updated or something is pushed to the repository.
+    It combines the ETag of the list of the pull requests sorted by update and the push time of the repository.
+
+    Args:
+        owner (str, optional): The owner of the repository. Defaults to "smeup".
+        repo (str, optional): The name of the repository. Defaults to "jariko".
+
+    Returns:
+        str: The freshness token.
+    """
+    headers = {
+        "Accept": "application/vnd.github.v3+json",
+        "Authorization": f"token {settings.github_token}",
+    }
+    response = get(
+        f"{settings.github_api_url}/repos/{owner}/{repo}/pulls",
+        headers=headers,
+        params={"state": "all", "sort": "updated", "direction": "desc", "per_page": 1},
+    )
+    if response.status_code != 200:
+        raise Exception(f"Error: {response.status_code} - {response.text}")
+    pull_requests_etag = response.headers.get("ETag", "")
+    response = get(f"{settings.github_api_url}/repos/{owner}/{repo}", headers=headers)
+    if response.status_code != 200:
+        raise Exception(f"Error: {response.status_code} - {response.text}")
+    return f"{pull_requests_etag}|{response.json().get('pushed_at')}"
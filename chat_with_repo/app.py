@@ -1,15 +1,25 @@
 import os
 import sys
+import uuid
 
 pythonpath = os.path.dirname(os.path.dirname(__file__))
 sys.path.append(pythonpath)
 
 import streamlit as st
-from chat_with_repo.assistant import GitHubAssistant
 from enum import Enum
+from typing import TYPE_CHECKING, Dict, Iterator, Union
 
 from chat_with_repo.auth2 import get_user
-from chat_with_repo.users import AuthorizationManager
+from chat_with_repo.model import ToolEvent
+from chat_with_repo.settings import settings
+
+# The assistant, the caches and the jobs (langchain, openai...) are imported when the first
+# authorized session needs them, so the login page is served without loading them
+if TYPE_CHECKING:
+    from chat_with_repo.assistant import GitHubAssistant
+    from chat_with_repo.resources import Resources
+    from chat_with_repo.tracing import Span
+    from chat_with_repo.usage import Usage
 
 
 class Role(Enum):
@@ -24,7 +34,16 @@ class Role(Enum):
             return "https://raw.githubusercontent.com/smeup/jariko/develop/images/jariko_small.png"
 
 
-authorization_manager = AuthorizationManager()
+@st.cache_resource
+def get_resources() -> "Resources":
+    """The caches, the connection pool and the review workers are shared by all the sessions"""
+    from chat_with_repo.resources import get_resources
+
+    resources = get_resources()
+    resources.start_cache_warmer()
+    resources.start_webhook_receiver()
+    resources.start_metrics_server()
+    return resources
 
 
 def main():
@@ -33,16 +52,44 @@ def main():
 
     user = get_user()
 
-    authorized = False if not user else authorization_manager.is_authorized(user.email)
+    authorized = (
+        False
+        if not user
+        else get_resources().authorization_manager.is_authorized(user.email)
+    )
 
     if user is not None and authorized:
         # Initialize chat history
         if "messages" not in st.session_state:
             st.session_state.messages = []
+        from chat_with_repo.metrics import get_metrics
+
+        if "session_id" not in st.session_state:
+            st.session_state.session_id = uuid.uuid4().hex
+        get_metrics().touch_session(st.session_state.session_id)
         if "assistant" not in st.session_state:
-            st.session_state.assistant = GitHubAssistant()
+            from chat_with_repo.assistant import GitHubAssistant
+
+            st.session_state.assistant = GitHubAssistant(
+                answer_cache=get_resources().answer_cache,
+                review_job_queue=get_resources().review_job_queue,
+                usage_ledger=get_resources().usage_ledger,
+                user=user.email,
+                session_id=st.session_state.session_id,
+            )
+
+        with st.sidebar:
+            show_review_jobs()
+            if settings.debug:
+                from chat_with_repo.tracing import latency_histograms
+
+                with st.expander("Shared caches"):
+                    st.json(get_resources().stats())
+                with st.expander("Latency"):
+                    st.json(latency_histograms.summary())
+                show_usage(st.session_state.assistant, user.email)
 
-        assistant: GitHubAssistant = st.session_state.assistant
+        assistant: "GitHubAssistant" = st.session_state.assistant
 
         # Display chat messages from history on app rerun
         for message in st.session_state.messages:
@@ -52,6 +99,8 @@ def main():
             else:
                 with st.chat_message(message["role"]):
                     st.markdown(message["content"])
+                    if message.get("timing"):
+                        show_turn_timing(message["timing"])
 
         # React to user input
         if prompt := st.chat_input(f"Hello {user.email} how can I help you?"):
@@ -61,18 +110,120 @@ def main():
             # Add user message to chat history
             st.session_state.messages.append({"role": user.name, "content": prompt})
 
-            response = st.session_state.assistant.chat(prompt)
-            # Display assistant response in chat message container
+            # Display assistant response in chat message container while it is streamed
             with st.chat_message(name=assistant.state.repo.value):
-                st.markdown(response)
-            # Add assistant response to chat history
+                status = st.status("Thinking...")
+                response = st.write_stream(
+                    render_stream(assistant.stream(prompt), status)
+                )
+                timing = (
+                    turn_timing(assistant.last_turn, assistant.last_turn_usage)
+                    if settings.debug and assistant.last_turn is not None
+                    else None
+                )
+                if timing:
+                    show_turn_timing(timing)
+            # Add assistant response to chat history, the answer replaces the text streamed before it
             st.session_state.messages.append(
-                {"role": assistant.state.repo.value, "content": response}
+                {
+                    "role": assistant.state.repo.value,
+                    "content": assistant.last_answer or response,
+                    "timing": timing,
+                }
             )
     elif user is not None and not authorized:
         st.error(body=f"User {user.email} is not authorized to use this app.")
 
 
+def render_stream(events: Iterator[Union[str, ToolEvent]], status) -> Iterator[str]:
+    """Shows the tools invoked by the agent in the status container and yields only the tokens"""
+    for event in events:
+        if isinstance(event, ToolEvent):
+            status.update(label=f"Running {event.name}...")
+            status.write(f"`{event.name}` {event.input}")
+        else:
+            yield event
+    status.update(label="Done", state="complete")
+
+
+def turn_timing(turn: "Span", usage: Dict[str, "Usage"]) -> dict:
+    """The summary, the operations and the usage of a turn, kept with the message to show them again on rerun"""
+    from chat_with_repo.tracing import timing_breakdown, turn_summary
+    from chat_with_repo.usage import total_usage
+
+    return {
+        "summary": {**turn_summary(turn), "cost": total_usage(usage).cost},
+        "operations": timing_breakdown(turn),
+        "usage": [
+            {"model": model, **model_usage.model_dump()}
+            for model, model_usage in usage.items()
+        ],
+    }
+
+
+def show_turn_timing(timing: dict):
+    """Shows where the time of a turn went: the model calls, the tools and the GitHub requests"""
+    summary = timing["summary"]
+    label = (
+        f"Timing: {summary['seconds']:.1f} s, {summary['llm_calls']} model calls "
+        f"({summary['llm_seconds']:.1f} s, ${summary.get('cost', 0.0):.4f}), "
+        f"{summary['github_requests']} GitHub requests ({summary['github_seconds']:.1f} s)"
+    )
+    with st.expander(label):
+        st.json(summary)
+        st.dataframe(timing["operations"], use_container_width=True)
+        if timing.get("usage"):
+            st.dataframe(timing["usage"], use_container_width=True)
+
+
+def show_usage(assistant: "GitHubAssistant", email: str):
+    """Shows the tokens and the cost of the session, of the user and of the most expensive repositories and questions"""
+    from chat_with_repo.usage import total_usage
+
+    ledger = get_resources().usage_ledger
+    session_cost = total_usage(assistant.session_usage).cost
+    with st.expander(f"Usage: ${session_cost:.4f} this session"):
+        for title, usage in [
+            ("This session by model", assistant.session_usage),
+            (f"{email} by model", ledger.totals("model", user=email)),
+            ("All users by repository", ledger.totals("repo")),
+            ("All users by kind of question", ledger.totals("kind")),
+            ("All users by user", ledger.totals("user")),
+        ]:
+            st.caption(title)
+            st.dataframe(
+                [
+                    {"name": name or "-", **model_usage.model_dump()}
+                    for name, model_usage in usage.items()
+                ],
+                use_container_width=True,
+            )
+
+
+@st.experimental_fragment(run_every=2)
+def show_review_jobs():
+    """Shows the code reviews, the running ones are refreshed while they are written"""
+    from chat_with_repo.review_jobs import JobState
+
+    st.subheader("Reviews")
+    jobs = get_resources().review_job_queue.list_jobs()
+    if not jobs:
+        st.caption("No code reviews yet.")
+    for job in jobs:
+        label = f"#{job.number} {job.repo} - {job.state.value}"
+        with st.expander(label, expanded=job.state == JobState.RUNNING):
+            if job.state == JobState.DONE:
+                st.markdown(job.result)
+            elif job.state == JobState.FAILED:
+                st.error(job.error)
+            elif job.state == JobState.CANCELLED:
+                st.caption("Cancelled.")
+            elif job.progress:
+                st.markdown(job.progress)
+            else:
+                st.caption("Waiting for a free worker...")
+
+
 def process_message(message):
     # Add your logic here to process the user's message and generate a response
     # For example, you could use a chatbot library or an API to generate the response
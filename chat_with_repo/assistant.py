@@ -1,5 +1,27 @@
-from typing import Callable, List
-from chat_with_repo import MODEL_NAME, OPENAI_API_KEY
+import asyncio
+import requests
+import uuid
+from queue import Queue
+from threading import Thread
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+)
+from chat_with_repo.answer_cache import AnswerCache, AnswerKey, is_self_contained
+from chat_with_repo.callbacks import (
+    QueueCallbackHandler,
+    ToolResultsCallbackHandler,
+    TracingCallbackHandler,
+)
+from chat_with_repo.chat_history import ChatHistory
 from chat_with_repo.branch_tools import FindBranchesByCommitTool
 from chat_with_repo.commit_tools import (
     GetCommitByShaTool,
@@ -8,8 +30,16 @@ from chat_with_repo.commit_tools import (
     IsCommitInBaseTool,
 )
 from chat_with_repo.constants import SYSTEM_MESSAGE
-from chat_with_repo.misc_tools import SelectGitHubRepoTool
-from chat_with_repo.model import State
+from chat_with_repo.github_client import DeadlineExceededError, deadline
+from chat_with_repo.misc_tools import GetReferenceTool, SelectGitHubRepoTool
+from chat_with_repo.model_routing import (
+    AGENT_ESCALATION_STAGE,
+    AGENT_STAGE,
+    create_chat_model,
+    create_routed_agent,
+    stage_stats,
+)
+from chat_with_repo.model import State, ToolEvent
 from chat_with_repo.pull_request_tools import (
     CodeReviewTool,
     GetPullRequestByNumberTool,
@@ -20,51 +50,135 @@ from chat_with_repo.pull_request_tools import (
 from chat_with_repo.pull_request_tools import (
     GetPullRequestsTool,
 )
+from chat_with_repo.review_jobs import ReviewJobQueue
+from chat_with_repo.settings import settings
+from chat_with_repo.router import Route, arun_route, route_message, run_route
+from chat_with_repo.tokens import count_tool_tokens
+from chat_with_repo.tool_selector import ToolSelector
+from chat_with_repo.tracing import TURN_SPAN, Span, span
+from chat_with_repo.usage import (
+    Usage,
+    UsageLedger,
+    question_kind,
+    span_usage,
+)
 
 
-from langchain.agents import AgentExecutor, create_openai_tools_agent
-from langchain_core.messages import AIMessage, HumanMessage, BaseMessage
+from langchain_core.callbacks import BaseCallbackManager, Callbacks
+from langchain_core.messages import HumanMessage
 from langchain_core.prompts.chat import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.tools import tool
-from langchain_openai import ChatOpenAI
+from langchain_core.tools import BaseTool, tool
 
 
-from collections import deque
-
 from chat_with_repo.tag_tools import FindTagsByCommitTool
 
+if TYPE_CHECKING:
+    from chat_with_repo.agent_executor import ConcurrentAgentExecutor
+
+# The output of the AgentExecutor when it stops for the iteration or time limit
+STOPPED_OUTPUT_PREFIX = "Agent stopped due to"
+
+
+# The maximum number of chars of each tool result shown in a partial answer
+MAX_PARTIAL_RESULT_CHARS = 1000
+
+# Streamed before the answer when it does not continue the text already streamed (i.e. a partial answer)
+STREAMED_ANSWER_SEPARATOR = "\n\n---\n\n"
+
+# The default of escalation_model, ESCALATION_MODEL_NAME is read when the assistant is created
+# because None disables the escalation
+ESCALATION_MODEL_FROM_SETTINGS: Any = object()
+
+
 class GitHubAssistant:
 
     def __init__(
         self,
         owner: str = "smeup",
         repo: str = "jariko",
-        model: str = MODEL_NAME,
+        model: Optional[str] = None,
+        escalation_model: Optional[str] = ESCALATION_MODEL_FROM_SETTINGS,
         chat_history_length: int = 10,
+        chat_history_max_tokens: int = 2000,
         topK: int = 10,
         on_change_repo: Callable[[str], None] = None,
+        max_concurrent_tools: int = 4,
+        fast_path: bool = True,
+        tool_selection_top_k: Optional[int] = 5,
+        answer_cache: Optional[AnswerCache] = None,
+        max_iterations: int = 8,
+        max_execution_time: Optional[float] = 60.0,
+        review_job_queue: Optional[ReviewJobQueue] = None,
+        usage_ledger: Optional[UsageLedger] = None,
+        user: str = "",
+        session_id: Optional[str] = None,
     ):
         """
         Initializes a new instance of the GitHubAssistant class.
         args:
             owner: The owner of the GitHub repository. Defaults to "smeup".
             repo: The name of the GitHub repository. Defaults to "jariko".
-            model: The OpenAI model to use for the assistant. Defaults to "gpt-3.5-turbo".
-            chat_history_length: The maximum number of chat messages to keep in the chat history. Defaults to 10.
+            model: The OpenAI model planning the tool calls. Defaults to AGENT_MODEL_NAME.
+            escalation_model: The OpenAI model planning the step when model does not produce a valid tool call. Defaults to ESCALATION_MODEL_NAME, None disables the escalation.
+            chat_history_length: The maximum number of chat messages to keep verbatim in the chat history, the older ones are summarized. Defaults to 10.
+            chat_history_max_tokens: The token budget of the chat history sent to the model. Defaults to 2000.
             topK: The maximum number of results to return from the GitHub API.
             on_change_repo: A callback function that is called when the repository is changed.
+            max_concurrent_tools: The maximum number of tool calls of the same agent step executed concurrently. Defaults to 4.
+            fast_path: If True the simple lookups (i.e. "show PR 549") are answered calling directly the tool, without the agent. Defaults to True.
+            tool_selection_top_k: The maximum number of tools, in addition to select_github_repo, sent to the model for each question. Defaults to 5, None sends all the tools.
+            answer_cache: The cache of the answers, usually shared by all the assistants. Defaults to None, no cache.
+            max_iterations: The maximum number of agent steps of a turn. Defaults to 8.
+            max_execution_time: The seconds available to a turn, they bound the timeout of the GitHub requests and of the model calls.
+                When the steps or the time run out the answer is made of the tool results collected so far. Defaults to 60, None for no limit.
+            review_job_queue: The queue running the code reviews in background, usually shared by all the assistants. Defaults to None, the reviews run in the turn.
+            usage_ledger: Stores the tokens and the cost of each turn, usually shared by all the assistants. Defaults to None, the usage is only kept in session_usage.
+            user: The email of the user the usage is accounted to. Defaults to "".
+            session_id: The id of the session the usage is accounted to. Defaults to a new id.
         """
         if not owner:
             raise ValueError("owner must be specified")
         if not repo:
             raise ValueError("repo must be specified")
+        model = model or settings.agent_model_name
         if not model:
             raise ValueError("model must be specified")
         self.model = model
-        self.chat_history: List[BaseMessage] = deque(maxlen=chat_history_length)
+        self.escalation_model = (
+            settings.escalation_model_name
+            if escalation_model is ESCALATION_MODEL_FROM_SETTINGS
+            else escalation_model
+        )
+        self.chat_history = ChatHistory(
+            max_tokens=chat_history_max_tokens,
+            max_messages=chat_history_length,
+            model=model,
+        )
         self.topK = topK
         self.state = State()
+        self.state.on_change_repo = lambda repo: self.__on_change_repo(repo)
         self.on_change_repo = on_change_repo
+        self.max_concurrent_tools = max_concurrent_tools
+        self.fast_path = fast_path
+        self.tool_selector = (
+            ToolSelector(top_k=tool_selection_top_k)
+            if tool_selection_top_k is not None
+            else None
+        )
+        self.answer_cache = answer_cache
+        self.max_iterations = max_iterations
+        self.max_execution_time = max_execution_time
+        self.review_job_queue = review_job_queue
+        # The spans of the last turn, i.e. to show where its time went
+        self.last_turn: Optional[Span] = None
+        # The answer of the last turn, as stored in the chat history
+        self.last_answer: Optional[str] = None
+        self.usage_ledger = usage_ledger
+        self.user = user
+        self.session_id = session_id or uuid.uuid4().hex
+        # The tokens and the cost by model of the last turn and of all the turns of the session
+        self.last_turn_usage: Dict[str, Usage] = {}
+        self.session_usage: Dict[str, Usage] = {}
 
     prompt = ChatPromptTemplate.from_messages(
         [
@@ -78,9 +192,218 @@ class GitHubAssistant:
     def new_thread(self):
         self.chat_history.clear()
 
-    def chat(self, message: str) -> str:
-        self.state.on_change_repo = lambda repo: self.__on_change_repo(repo)
-        llm = ChatOpenAI(model=self.model, temperature=0, api_key=OPENAI_API_KEY)
+    def chat(self, message: str, callbacks: Callbacks = None) -> str:
+        # The repository named in the message is selected first, the turn and the cached answer refer to it
+        route = self.__route(message)
+        try:
+            with span(TURN_SPAN, self.state.repo.value) as turn:
+                self.last_turn = turn
+                self.last_answer = None
+                key = self.__answer_key(message)
+                answer = self.__get_cached_answer(key)
+                if answer is not None:
+                    turn.set(answer_cache="hit")
+                    return self.__on_agent_response(
+                        {"input": message.strip(), "output": answer}
+                    )
+                return self.__put_cached_answer(
+                    key, self.__chat(message, callbacks, route), turn
+                )
+        finally:
+            self.__account_usage(turn)
+
+    def __chat(self, message: str, callbacks: Callbacks, route: Optional[Route]) -> str:
+        tool_results = ToolResultsCallbackHandler()
+        try:
+            with deadline(self.max_execution_time):
+                if route is not None:
+                    return self.__on_agent_response(
+                        {
+                            "input": message.strip(),
+                            "output": run_route(route, self.state.repo, self.topK),
+                        }
+                    )
+                agent_executor = self.__create_agent_executor(message)
+                agent_response = agent_executor.invoke(
+                    input=self.__create_input(message),
+                    config={
+                        "callbacks": self.__add_turn_callbacks(callbacks, tool_results)
+                    },
+                )
+        except timeout_errors() as e:
+            agent_response = self.__on_timeout(message, tool_results, e)
+        return self.__on_agent_response(
+            self.__check_stopped(agent_response, tool_results)
+        )
+
+    async def achat(self, message: str, callbacks: Callbacks = None) -> str:
+        """
+        Async version of chat, the tools are executed through their async implementation
+        so that the GitHub calls do not block the caller.
+        """
+        route = self.__route(message)
+        try:
+            with span(TURN_SPAN, self.state.repo.value) as turn:
+                self.last_turn = turn
+                self.last_answer = None
+                key = await asyncio.to_thread(self.__answer_key, message)
+                answer = self.__get_cached_answer(key)
+                if answer is not None:
+                    turn.set(answer_cache="hit")
+                    return await self.__aon_agent_response(
+                        {"input": message.strip(), "output": answer}
+                    )
+                return self.__put_cached_answer(
+                    key, await self.__achat(message, callbacks, route), turn
+                )
+        finally:
+            self.__account_usage(turn)
+
+    async def __achat(
+        self, message: str, callbacks: Callbacks, route: Optional[Route]
+    ) -> str:
+        tool_results = ToolResultsCallbackHandler()
+        try:
+            with deadline(self.max_execution_time):
+                if route is not None:
+                    return await self.__aon_agent_response(
+                        {
+                            "input": message.strip(),
+                            "output": await arun_route(
+                                route, self.state.repo, self.topK
+                            ),
+                        }
+                    )
+                agent_executor = self.__create_agent_executor(message)
+                agent_response = await agent_executor.ainvoke(
+                    input=self.__create_input(message),
+                    config={
+                        "callbacks": self.__add_turn_callbacks(callbacks, tool_results)
+                    },
+                )
+        except timeout_errors() as e:
+            agent_response = self.__on_timeout(message, tool_results, e)
+        return await self.__aon_agent_response(
+            self.__check_stopped(agent_response, tool_results)
+        )
+
+    def stream(self, message: str) -> Iterator[Union[str, ToolEvent]]:
+        """
+        Streams the answer to the message, the agent runs through achat in a background thread.
+        args:
+            message: The user's message.
+        returns:
+            An iterator of the tokens generated by the models (agent and code review) interleaved
+            with a ToolEvent for each tool invoked by the agent. When the answer does not continue the streamed
+            text (i.e. a partial answer after a timeout) it follows STREAMED_ANSWER_SEPARATOR in full,
+            the answer alone is in last_answer.
+        """
+        events: Queue = Queue()
+        result = {}
+
+        def run():
+            try:
+                result["output"] = asyncio.run(
+                    self.achat(message, callbacks=[QueueCallbackHandler(events)])
+                )
+            except Exception as e:
+                result["error"] = e
+            finally:
+                events.put(None)
+
+        Thread(target=run, daemon=True).start()
+        streamed = ""
+        while (event := events.get()) is not None:
+            if isinstance(event, str):
+                streamed += event
+            yield event
+        if "error" in result:
+            raise result["error"]
+        # The output could not be streamed, i.e. when a tool has returned it directly without using a model
+        if result["output"].startswith(streamed):
+            remainder = result["output"][len(streamed) :]
+            if remainder:
+                yield remainder
+        else:
+            yield STREAMED_ANSWER_SEPARATOR + result["output"]
+
+    def __account_usage(self, turn: Span):
+        """
+        Adds the model calls of the finished turn to the session, to the stage statistics and to the usage ledger,
+        all read from the llm spans of the turn
+        """
+        self.last_turn_usage = span_usage(turn)
+        stage_stats.record_spans(turn)
+        for model, usage in self.last_turn_usage.items():
+            self.session_usage.setdefault(model, Usage()).add(usage)
+        if self.usage_ledger is None:
+            return
+        try:
+            self.usage_ledger.record(
+                self.last_turn_usage,
+                kind=question_kind(turn),
+                repo=turn.label,
+                user=self.user,
+                session=self.session_id,
+            )
+        except Exception as e:
+            print(f"The usage of the turn was not recorded: {e}")
+
+    def __answer_key(self, message: str) -> Optional[AnswerKey]:
+        # A follow up question (i.e. "Who is its author?") depends on the previous messages
+        if self.answer_cache is None or (
+            self.chat_history.messages and not is_self_contained(message)
+        ):
+            return None
+        return self.answer_cache.key(message, self.state.repo)
+
+    def __get_cached_answer(self, key: Optional[AnswerKey]) -> Optional[str]:
+        if key is None:
+            return None
+        answer = self.answer_cache.get(key)
+        if settings.debug and answer is not None:
+            print(f"Answer cache hit: {key.question}")
+        return answer
+
+    def __put_cached_answer(
+        self, key: Optional[AnswerKey], answer: str, turn: Span
+    ) -> str:
+        # A partial answer depends on how slow GitHub and the models were, it is not shared with the other users
+        if key is not None and not turn.attributes.get("partial"):
+            self.answer_cache.put(key, answer)
+        return answer
+
+    def __route(self, message: str) -> Optional[Route]:
+        """Returns the route of the message if it is a simple lookup, the repository named in the message is selected"""
+        if not self.fast_path:
+            return None
+        route = route_message(message)
+        if route is not None and route.repo is not None:
+            self.state.repo = route.repo
+        return route
+
+    def __create_agent_executor(self, message: str) -> "ConcurrentAgentExecutor":
+        # langchain.agents is imported by the first turn reaching the agent
+        from chat_with_repo.agent_executor import ConcurrentAgentExecutor
+
+        llm = create_chat_model(
+            AGENT_STAGE,
+            self.model,
+            temperature=0,
+            streaming=True,
+            timeout=self.max_execution_time,
+        )
+        escalation_llm = (
+            create_chat_model(
+                AGENT_ESCALATION_STAGE,
+                self.escalation_model,
+                temperature=0,
+                streaming=True,
+                timeout=self.max_execution_time,
+            )
+            if self.escalation_model and self.escalation_model != self.model
+            else None
+        )
         if not self.state.is_repo_selected():
             tools = [SelectGitHubRepoTool(state=self.state)]
         else:
@@ -90,7 +413,12 @@ class GitHubAssistant:
                 GetPullRequestsTool(state=self.state, topK=self.topK),
                 GetPullRequestsByCommitTool(state=self.state, topK=self.topK),
                 GetPullRequestByPathTool(state=self.state, topK=self.topK),
-                CodeReviewTool(state=self.state),
+                CodeReviewTool(
+                    state=self.state,
+                    job_queue=self.review_job_queue,
+                    user=self.user,
+                    session_id=self.session_id,
+                ),
                 GetCommitByShaTool(state=self.state),
                 IsCommitInBranchTool(state=self.state),
                 IsCommitInBaseTool(state=self.state),
@@ -103,20 +431,139 @@ class GitHubAssistant:
                 FindBranchesByCommitTool(state=self.state, topK=self.topK),
                 FindTagsByCommitTool(state=self.state, topK=self.topK),
             ]
-        agent = create_openai_tools_agent(llm, tools, self.prompt)
-        agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
-        self.state.messages = self.chat_history + deque([HumanMessage(content=message.strip())])
-        agent_response = agent_executor.invoke(
-            input={
-                "input": message.strip(),
-                "chat_history": [msg.content.strip() for msg in self.chat_history],
-            }
+            if self.tool_selector is not None:
+                tools = self.__select_tools(message, tools)
+        if self.chat_history.references:
+            tools.append(GetReferenceTool(chat_history=self.chat_history))
+        agent = create_routed_agent(llm, tools, self.prompt, escalation_llm)
+        self.state.messages = self.chat_history.messages + [
+            HumanMessage(content=message.strip())
+        ]
+        return ConcurrentAgentExecutor(
+            agent=agent,
+            tools=tools,
+            verbose=True,
+            max_concurrency=self.max_concurrent_tools,
+            max_iterations=self.max_iterations,
+            max_execution_time=self.max_execution_time,
+            # The model is invoked instead of streamed because only the invocation goes through
+            # the cache, the tokens are streamed anyway because the model has streaming=True
+            stream_runnable=False,
         )
-        self.chat_history.append(HumanMessage(content=agent_response["input"]))
-        self.chat_history.append(AIMessage(content=agent_response["output"]))
+
+    def __add_turn_callbacks(
+        self, callbacks: Callbacks, tool_results: ToolResultsCallbackHandler
+    ) -> Callbacks:
+        handlers = [
+            TracingCallbackHandler(),
+            tool_results,
+        ]
+        if callbacks is None:
+            return handlers
+        if isinstance(callbacks, BaseCallbackManager):
+            callbacks = callbacks.copy()
+            for handler in handlers:
+                callbacks.add_handler(handler)
+            return callbacks
+        return list(callbacks) + handlers
+
+    def __on_timeout(
+        self,
+        message: str,
+        tool_results: ToolResultsCallbackHandler,
+        error: Exception,
+    ) -> dict:
+        print(f"The turn ran out of time: {error!r}")
+        self.last_turn.set(partial=True)
+        return {
+            "input": message.strip(),
+            "output": self.__partial_answer(tool_results, "time"),
+        }
+
+    def __check_stopped(
+        self, agent_response: dict, tool_results: ToolResultsCallbackHandler
+    ) -> dict:
+        if not agent_response["output"].startswith(STOPPED_OUTPUT_PREFIX):
+            return agent_response
+        self.last_turn.set(partial=True)
+        return {
+            **agent_response,
+            "output": self.__partial_answer(tool_results, "time or steps"),
+        }
+
+    def __partial_answer(
+        self, tool_results: ToolResultsCallbackHandler, limit: str
+    ) -> str:
+        if not tool_results.results:
+            return (
+                f"I ran out of {limit} before finding the answer, "
+                "please ask a more specific question."
+            )
+        lines = [
+            f"I ran out of {limit} before completing the answer, "
+            "these are the results found so far:"
+        ]
+        for name, tool_input, output in tool_results.results:
+            if len(output) > MAX_PARTIAL_RESULT_CHARS:
+                output = output[:MAX_PARTIAL_RESULT_CHARS] + "... (truncated)"
+            lines.append(f"\n**{name}** `{tool_input}`\n```\n{output}\n```")
+        return "\n".join(lines)
+
+    def __select_tools(self, message: str, tools: List[BaseTool]) -> List[BaseTool]:
+        # The previous question gives the context to the follow up questions (i.e. "From who?")
+        previous_questions = self.chat_history.questions()[-1:]
+        selected_tools = self.tool_selector.select(
+            " ".join(previous_questions + [message]), tools
+        )
+        if settings.debug:
+            print(
+                f"Selected tools: {[tool.name for tool in selected_tools]}, "
+                f"tool tokens: {count_tool_tokens(tools, self.model)} -> {count_tool_tokens(selected_tools, self.model)}"
+            )
+        return selected_tools
+
+    def __create_input(self, message: str) -> dict:
+        return {
+            "input": message.strip(),
+            "chat_history": self.chat_history.to_messages(),
+        }
+
+    def __on_agent_response(self, agent_response: dict) -> str:
+        if settings.debug:
+            print(f"Model stages: {stage_stats.summary()}")
+        # The summary of the chat history is a model call of the turn
+        self.chat_history.append(
+            agent_response["input"],
+            agent_response["output"],
+            callbacks=[TracingCallbackHandler()],
+        )
+        self.last_answer = agent_response["output"]
+        return agent_response["output"]
+
+    async def __aon_agent_response(self, agent_response: dict) -> str:
+        if settings.debug:
+            print(f"Model stages: {stage_stats.summary()}")
+        await self.chat_history.aappend(
+            agent_response["input"],
+            agent_response["output"],
+            callbacks=[TracingCallbackHandler()],
+        )
+        self.last_answer = agent_response["output"]
         return agent_response["output"]
 
     def __on_change_repo(self, new_repo: str):
         if self.on_change_repo is not None:
             self.on_change_repo(new_repo)
         self.new_thread()
+
+
+def timeout_errors() -> Tuple[Type[BaseException], ...]:
+    """Returns the errors of a turn running out of time, httpx is imported only when an error is raised"""
+    import httpx
+
+    return (
+        DeadlineExceededError,
+        asyncio.TimeoutError,
+        requests.exceptions.Timeout,
+        httpx.TimeoutException,
+    )
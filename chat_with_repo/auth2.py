@@ -3,14 +3,14 @@ from google_auth_oauthlib.flow import InstalledAppFlow
 from oauthlib.oauth2 import InvalidGrantError
 import requests
 
-from chat_with_repo import CLIENT_SECRET, DEBUG, REDIRECT_URI, SCOPES
+from chat_with_repo.settings import SCOPES, settings
 from chat_with_repo.users import User
 
 __debug_user = User(email="debuguser@debug.it", name="Debug User", avatar="😎")
 
 
 def get_user() -> User:
-    if DEBUG:
+    if settings.debug:
         return __debug_user
     if st.session_state.get("user", ""):
         return st.session_state["user"]
@@ -26,8 +26,8 @@ def get_user() -> User:
 
 
 def __create_flow() -> InstalledAppFlow:
-    flow = InstalledAppFlow.from_client_config(CLIENT_SECRET, SCOPES)
-    flow.redirect_uri = REDIRECT_URI
+    flow = InstalledAppFlow.from_client_config(settings.client_secret, SCOPES)
+    flow.redirect_uri = settings.redirect_uri
     return flow
 
 
@@ -0,0 +1,189 @@
+"""
+Reviews in advance the open pull requests of the repositories, i.e. every night before people start work.
+
+Usage:
+    python -m chat_with_repo.batch_review [--repos jariko kokos] [--workers 2] [--llm-rps 1] [--github-rps 5]
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from chat_with_repo.constants import BATCH_REVIEW_QUESTION
+from chat_with_repo.github_client import set_rate_limit
+from chat_with_repo.model import PullRequest, Repo
+from chat_with_repo.model_routing import set_llm_rate_limit
+from chat_with_repo.pull_request_tools import get_open_pull_requests
+from chat_with_repo.review_jobs import JobState, ReviewJobQueue
+from chat_with_repo.settings import settings
+
+
+class BatchReviewReport(BaseModel):
+    """
+    The outcome of a batch review.
+
+    Attributes:
+        repos (int): The repositories whose pull requests have been listed.
+        pull_requests (int): The open pull requests found.
+        skipped (int): The pull requests whose head commit was already reviewed.
+        reviewed (int): The reviews completed.
+        failed (int): The reviews failed or cancelled because not finished before the timeout and the
+            repositories whose pull requests could not be listed.
+        seconds (float): The elapsed time.
+        review_seconds (float): The time spent by the workers on the reviews.
+    """
+
+    repos: int = 0
+    pull_requests: int = 0
+    skipped: int = 0
+    reviewed: int = 0
+    failed: int = 0
+    seconds: float = 0.0
+    review_seconds: float = 0.0
+
+    @property
+    def reviews_per_minute(self) -> float:
+        return self.reviewed * 60 / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        average = self.review_seconds / self.reviewed if self.reviewed else 0.0
+        return (
+            f"Repositories: {self.repos}, open pull requests: {self.pull_requests}, "
+            f"already reviewed: {self.skipped}, reviewed: {self.reviewed}, failed: {self.failed}\n"
+            f"Elapsed: {self.seconds:.1f}s, throughput: {self.reviews_per_minute:.2f} reviews/min, "
+            f"average review: {average:.1f}s"
+        )
+
+
+def review_open_pull_requests(
+    repos: List[Repo] = list(Repo),
+    queue: Optional[ReviewJobQueue] = None,
+    list_pull_requests: Callable[[str, str], List[PullRequest]] = None,
+    timeout: Optional[float] = None,
+) -> BatchReviewReport:
+    """
+    Reviews the open pull requests of the repositories whose head commit has not been reviewed yet.
+    The reviews run in the workers of the queue and are stored in its database, so the users find them ready.
+
+    Args:
+        repos (List[Repo], optional): The repositories. Defaults to all the repositories.
+        queue (Optional[ReviewJobQueue], optional): The queue running the reviews. Defaults to a new ReviewJobQueue.
+        list_pull_requests (Callable[[str, str], List[PullRequest]], optional): Lists the open pull requests of
+            owner and repo. Defaults to get_open_pull_requests.
+        timeout (Optional[float], optional): The seconds to wait for the reviews, the reviews not finished by then
+            are cancelled. Defaults to None, no limit.
+
+    Returns:
+        BatchReviewReport: The counts and the throughput of the batch.
+    """
+    queue = queue or ReviewJobQueue()
+    list_pull_requests = list_pull_requests or (
+        lambda owner, repo: get_open_pull_requests(owner=owner, repo=repo)
+    )
+    report = BatchReviewReport(repos=len(repos))
+    start = time.monotonic()
+
+    def list_repo(repo: Repo) -> Tuple[Repo, Optional[List[PullRequest]]]:
+        try:
+            return repo, list_pull_requests(repo.owner, repo.value)
+        except Exception as e:
+            print(f"Unable to list the open pull requests of {repo.value}: {e}")
+            return repo, None
+
+    job_ids = []
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        listed = list(executor.map(list_repo, repos))
+    for repo, pull_requests in listed:
+        if pull_requests is None:
+            report.failed += 1
+            continue
+        report.pull_requests += len(pull_requests)
+        for pull_request in pull_requests:
+            if queue.is_reviewed(
+                number=pull_request.number,
+                head_sha=pull_request.head.sha,
+                owner=repo.owner,
+                repo=repo.value,
+            ):
+                report.skipped += 1
+                continue
+            job = queue.submit(
+                number=pull_request.number,
+                question=BATCH_REVIEW_QUESTION.format(number=pull_request.number),
+                owner=repo.owner,
+                repo=repo.value,
+                head_sha=pull_request.head.sha,
+            )
+            job_ids.append(job.id)
+
+    expiration = None if timeout is None else time.monotonic() + timeout
+    for job_id in job_ids:
+        remaining = (
+            None if expiration is None else max(0, expiration - time.monotonic())
+        )
+        job = queue.wait(job_id, timeout=remaining)
+        if job.state == JobState.DONE:
+            report.reviewed += 1
+            report.review_seconds += job.finished - job.started
+        else:
+            if job.in_flight:
+                queue.cancel(job_id)
+            report.failed += 1
+    report.seconds = time.monotonic() - start
+    return report
+
+
+def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Reviews the open pull requests not reviewed yet"
+    )
+    parser.add_argument(
+        "--repos",
+        nargs="*",
+        choices=[repo.value for repo in Repo],
+        help="The repositories, all if not set",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=settings.review_max_concurrent_jobs,
+        help="The reviews running at the same time",
+    )
+    parser.add_argument(
+        "--llm-rps",
+        type=float,
+        default=None,
+        help="The maximum model calls per second of all the workers",
+    )
+    parser.add_argument(
+        "--github-rps",
+        type=float,
+        default=None,
+        help="The maximum GitHub requests per second of all the workers",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="The seconds to wait for the reviews",
+    )
+    options = parser.parse_args(args)
+    set_llm_rate_limit(options.llm_rps)
+    set_rate_limit(options.github_rps)
+    repos = [Repo(value) for value in options.repos] if options.repos else list(Repo)
+    queue = ReviewJobQueue(max_concurrent_jobs=options.workers)
+    try:
+        report = review_open_pull_requests(
+            repos=repos, queue=queue, timeout=options.timeout
+        )
+    finally:
+        # The reviews cancelled after the timeout stop at their next token
+        queue.shutdown(wait=False, cancel_futures=True)
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,13 @@
+import asyncio
 from typing import List, Type
-import requests
 from langchain_core.pydantic_v1 import BaseModel, Field
 from langchain_core.tools import BaseTool
 
-from chat_with_repo import GITHUB_TOKEN
-from chat_with_repo.commit_tools import is_commit_in_base
+from chat_with_repo.settings import settings
+from chat_with_repo.commit_tools import ais_commit_in_base, is_commit_in_base
+from chat_with_repo.github_client import aget, get
 from chat_with_repo.model import State
+from chat_with_repo.tool_output import MAX_OUTPUT_TOKENS, encode_names
 
 
 class FindBranchesByCommitSchema(BaseModel):
@@ -15,16 +17,36 @@ class FindBranchesByCommitSchema(BaseModel):
 class FindBranchesByCommitTool(BaseTool):
     state: State
     topK: int = 10
+    max_output_tokens: int = MAX_OUTPUT_TOKENS
     args_schema: Type[BaseModel] = FindBranchesByCommitSchema
     name: str = "find_branches_by_commit"
     description = "Retrieves the branches that contain a specific commit."
 
-    def _run(self, commit_sha: str) -> List[str]:
-        return find_branches_by_commit(
-            commit_sha=commit_sha,
-            owner=self.state.repo.owner,
-            repo=self.state.repo.name,
-        )[: self.topK]
+    def _run(self, commit_sha: str) -> str:
+        return self.__encode(
+            find_branches_by_commit(
+                commit_sha=commit_sha,
+                owner=self.state.repo.owner,
+                repo=self.state.repo.name,
+            )
+        )
+
+    async def _arun(self, commit_sha: str) -> str:
+        return self.__encode(
+            await afind_branches_by_commit(
+                commit_sha=commit_sha,
+                owner=self.state.repo.owner,
+                repo=self.state.repo.name,
+            )
+        )
+
+    def __encode(self, names: List[str]) -> str:
+        return encode_names(
+            names[: self.topK],
+            "branches",
+            max_tokens=self.max_output_tokens,
+            total=len(names),
+        )
 
 
 def find_branches_by_commit(
@@ -42,10 +64,10 @@ def find_branches_by_commit(
     """
 
     # List all branches
-    url = f"https://api.github.com/repos/{owner}/{repo}/branches"
+    url = f"{settings.github_api_url}/repos/{owner}/{repo}/branches"
     headers = {
         "Accept": "application/vnd.github.v3+json",
-        "Authorization": f"token {GITHUB_TOKEN}",
+        "Authorization": f"token {settings.github_token}",
     }
     params = {
         "per_page": 100,
@@ -54,7 +76,7 @@ def find_branches_by_commit(
     nextUrl = url
     branches_by_commit = []
     while nextUrl:
-        response = requests.get(url=nextUrl, headers=headers, params=params)
+        response = get(nextUrl, headers=headers, params=params)
         if response.status_code == 200:
             nextUrl = response.links.get("next", {}).get("url")
             branches = response.json()
@@ -70,3 +92,48 @@ def find_branches_by_commit(
                 f"Check if your profile has the rights for {url}",
             )
     return branches_by_commit
+
+
+async def afind_branches_by_commit(
+    commit_sha: str, owner: str = "smeup", repo: str = "jariko"
+) -> List[str]:
+    """
+    Async version of find_branches_by_commit.
+    The branches of each page are verified concurrently.
+    """
+
+    url = f"{settings.github_api_url}/repos/{owner}/{repo}/branches"
+    headers = {
+        "Accept": "application/vnd.github.v3+json",
+        "Authorization": f"token {settings.github_token}",
+    }
+    params = {
+        "per_page": 100,
+    }
+
+    nextUrl = url
+    branches_by_commit = []
+    while nextUrl:
+        response = await aget(nextUrl, headers=headers, params=params)
+        if response.status_code == 200:
+            nextUrl = response.links.get("next", {}).get("url")
+            branch_names = [branch["name"] for branch in response.json()]
+            contains_commit = await asyncio.gather(
+                *[
+                    ais_commit_in_base(
+                        commit_sha=commit_sha, base=branch_name, owner=owner, repo=repo
+                    )
+                    for branch_name in branch_names
+                ]
+            )
+            branches_by_commit += [
+                branch_name
+                for branch_name, contains in zip(branch_names, contains_commit)
+                if contains
+            ]
+        else:
+            raise Exception(
+                f"Error: {response.status_code} - {response.text}",
+                f"Check if your profile has the rights for {url}",
+            )
+    return branches_by_commit
@@ -0,0 +1,284 @@
+"""
+Refreshes in background the open pull requests, the branches, the tags and the recent commits of the
+repositories, so that the first questions of the day find the GitHub pages in the caches instead of paginating
+them from scratch. Each refresh spends at most a share of the GitHub rate limit.
+
+Usage:
+    python -m chat_with_repo.cache_warmer [--repos jariko webup-project] [--interval 300] [--once]
+"""
+
+import argparse
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from chat_with_repo.github_client import (
+    RequestBudgetExceededError,
+    get,
+    get_rate_limit,
+    request_budget,
+)
+from chat_with_repo.metadata_store import PULL_REQUESTS, get_metadata_store
+from chat_with_repo.model import PullRequestFilter, Repo
+from chat_with_repo.pull_request_tools import get_open_pull_requests, get_pull_requests
+from chat_with_repo.settings import settings
+
+# The rate limit of an authenticated GitHub user, until a response tells the actual one
+DEFAULT_RATE_LIMIT_PER_HOUR = 5000
+
+
+class WarmReport(BaseModel):
+    """
+    The outcome of a refresh of the caches.
+
+    Attributes:
+        warmed (List[str]): The refreshed tasks, as "repo: task".
+        failed (List[str]): The failed tasks with their error.
+        requests (int): The GitHub requests spent, the ones answered with 304 Not Modified excluded.
+        budget (int): The GitHub requests allowed.
+        exhausted (bool): True if the budget ran out before all the tasks were refreshed.
+        seconds (float): The elapsed time.
+    """
+
+    warmed: List[str] = []
+    failed: List[str] = []
+    requests: int = 0
+    budget: int = 0
+    exhausted: bool = False
+    seconds: float = 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"Warmed: {len(self.warmed)}, failed: {len(self.failed)}, "
+            f"requests: {self.requests}/{self.budget}{' (budget exhausted)' if self.exhausted else ''}, "
+            f"elapsed: {self.seconds:.1f}s"
+        )
+
+
+def warm_open_pull_requests(owner: str, repo: str, ttl_seconds: float):
+    """Lists the open pull requests and keeps each one in the metadata store, as found by number"""
+    store = get_metadata_store()
+    for pull_request in get_open_pull_requests(owner=owner, repo=repo):
+        store.put(
+            PULL_REQUESTS, (owner, repo, pull_request.number), pull_request, ttl_seconds
+        )
+
+
+def warm_pull_requests(owner: str, repo: str, ttl_seconds: float):
+    """Paginates the pull requests searched by title, body, path and commit (all the states, target develop)"""
+    get_pull_requests(PullRequestFilter(), owner=owner, repo=repo)
+
+
+def warm_branches(owner: str, repo: str, ttl_seconds: float):
+    """Paginates the branches as find_branches_by_commit does"""
+    __warm_pages(f"{settings.github_api_url}/repos/{owner}/{repo}/branches")
+
+
+def warm_tags(owner: str, repo: str, ttl_seconds: float):
+    """Paginates the tags as find_tags_by_commit does"""
+    __warm_pages(f"{settings.github_api_url}/repos/{owner}/{repo}/tags")
+
+
+def warm_recent_commits(owner: str, repo: str, ttl_seconds: float):
+    """Reads the first page of the commits of the default branch"""
+    __warm_pages(f"{settings.github_api_url}/repos/{owner}/{repo}/commits", max_pages=1)
+
+
+# The tasks of a refresh, the most useful first: when the budget runs out the last ones wait for the next refresh
+WARM_TASKS: List[Tuple[str, Callable[[str, str, float], None]]] = [
+    ("open pull requests", warm_open_pull_requests),
+    ("branches", warm_branches),
+    ("tags", warm_tags),
+    ("recent commits", warm_recent_commits),
+    ("pull requests", warm_pull_requests),
+]
+
+
+class CacheWarmer:
+    """
+    Refreshes the caches of the repositories every interval_seconds in a background thread.
+    The pages already cached are revalidated with their ETag, so once warm a refresh costs few requests.
+
+    Attributes:
+        repos (List[Repo]): The repositories to keep warm.
+        interval_seconds (float): The seconds between the start of two refreshes.
+        rate_limit_share (float): The share of the GitHub rate limit available to the refreshes.
+    """
+
+    def __init__(
+        self,
+        repos: Optional[List[Repo]] = None,
+        interval_seconds: Optional[float] = None,
+        rate_limit_share: Optional[float] = None,
+        tasks: List[Tuple[str, Callable[[str, str, float], None]]] = WARM_TASKS,
+    ):
+        """
+        Initializes a new instance of the CacheWarmer class.
+
+        Args:
+            repos (Optional[List[Repo]], optional): The repositories. Defaults to CACHE_WARMER_REPOS.
+            interval_seconds (Optional[float], optional): The seconds between two refreshes. Defaults to CACHE_WARMER_INTERVAL_SECONDS.
+            rate_limit_share (Optional[float], optional): The share of the rate limit. Defaults to CACHE_WARMER_RATE_LIMIT_SHARE.
+            tasks (List[Tuple[str, Callable[[str, str, float], None]]], optional): The name and the function
+                refreshing owner and repo, the function receives also the TTL of the stored metadata. Defaults to WARM_TASKS.
+        """
+        self.repos = (
+            repos
+            if repos is not None
+            else [Repo(value) for value in settings.cache_warmer_repos]
+        )
+        self.interval_seconds = (
+            interval_seconds
+            if interval_seconds is not None
+            else settings.cache_warmer_interval_seconds
+        )
+        self.rate_limit_share = (
+            rate_limit_share
+            if rate_limit_share is not None
+            else settings.cache_warmer_rate_limit_share
+        )
+        self.tasks = tasks
+        self.last_report: Optional[WarmReport] = None
+        self.__stop = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+
+    def budget(self) -> int:
+        """
+        Returns:
+            int: The GitHub requests of a refresh: the share of the requests allowed in an interval,
+                bounded by the share of the requests remaining in the current window.
+        """
+        rate_limit = get_rate_limit()
+        limit = rate_limit.limit if rate_limit else DEFAULT_RATE_LIMIT_PER_HOUR
+        interval = self.interval_seconds or 3600
+        budget = self.rate_limit_share * limit * min(interval, 3600) / 3600
+        if rate_limit is not None:
+            budget = min(budget, self.rate_limit_share * rate_limit.remaining)
+        return int(budget)
+
+    def warm(self) -> WarmReport:
+        """
+        Refreshes the caches once, task by task for all the repositories, until the budget runs out.
+
+        Returns:
+            WarmReport: The refreshed tasks and the requests spent.
+        """
+        start = time.perf_counter()
+        report = WarmReport(budget=self.budget())
+        # The stored metadata lives until the next refresh
+        ttl_seconds = max(self.interval_seconds, 60)
+        with request_budget(report.budget) as budget:
+            for name, task in self.tasks:
+                for repo in self.repos:
+                    label = f"{repo.value}: {name}"
+                    try:
+                        task(repo.owner, repo.value, ttl_seconds)
+                        report.warmed.append(label)
+                    except RequestBudgetExceededError:
+                        report.exhausted = True
+                        break
+                    except Exception as e:
+                        print(f"Cache warmer: {label} failed - {e}")
+                        report.failed.append(f"{label} - {e}")
+                if report.exhausted or self.__stop.is_set():
+                    break
+            report.requests = budget.used
+        report.seconds = time.perf_counter() - start
+        self.last_report = report
+        print(f"Cache warmer: {report}")
+        return report
+
+    def start(self):
+        """Starts the refreshes in a daemon thread, the first one immediately"""
+        if self.__thread is not None and self.__thread.is_alive():
+            return
+        if self.interval_seconds <= 0:
+            raise ValueError("interval_seconds must be greater than 0")
+        self.__stop.clear()
+        self.__thread = threading.Thread(
+            target=self.__run, name="cache-warmer", daemon=True
+        )
+        self.__thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stops the refreshes, the running one ends after its current task"""
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join(timeout)
+            self.__thread = None
+
+    def __run(self):
+        while not self.__stop.is_set():
+            started = time.monotonic()
+            try:
+                self.warm()
+            except Exception as e:
+                print(f"Cache warmer: refresh failed - {e}")
+            self.__stop.wait(
+                max(0.0, self.interval_seconds - (time.monotonic() - started))
+            )
+
+
+def __warm_pages(url: str, max_pages: Optional[int] = None):
+    # The same headers and parameters of the tools, so that their requests find the cached pages
+    headers = {
+        "Accept": "application/vnd.github.v3+json",
+        "Authorization": f"token {settings.github_token}",
+    }
+    params: Dict[str, int] = {
+        "per_page": 100,
+    }
+    nextUrl = url
+    pages = 0
+    while nextUrl and (max_pages is None or pages < max_pages):
+        response = get(nextUrl, headers=headers, params=params)
+        if response.status_code != 200:
+            raise Exception(f"Error: {response.status_code} - {response.text}")
+        nextUrl = response.links.get("next", {}).get("url")
+        pages += 1
+
+
+def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Refreshes the GitHub caches of the repositories"
+    )
+    parser.add_argument(
+        "--repos",
+        nargs="*",
+        choices=[repo.value for repo in Repo],
+        help="The repositories, CACHE_WARMER_REPOS if not set",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=settings.cache_warmer_interval_seconds or 300,
+        help="The seconds between two refreshes",
+    )
+    parser.add_argument(
+        "--rate-limit-share",
+        type=float,
+        default=settings.cache_warmer_rate_limit_share,
+        help="The share of the GitHub rate limit used by each refresh",
+    )
+    parser.add_argument("--once", action="store_true", help="Refreshes once and exits")
+    options = parser.parse_args(args)
+    warmer = CacheWarmer(
+        repos=[Repo(value) for value in options.repos] if options.repos else None,
+        interval_seconds=options.interval,
+        rate_limit_share=options.rate_limit_share,
+    )
+    if options.once:
+        warmer.warm()
+        return
+    warmer.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        warmer.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+from queue import Queue
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+
+from chat_with_repo.llm_cache import CACHE_HIT_INFO
+from chat_with_repo.model import ToolEvent
+from chat_with_repo.tracing import LLM_SPAN, Span, start_span
+
+
+class QueueCallbackHandler(BaseCallbackHandler):
+    """
+    Puts into a queue the tokens generated by the models and a ToolEvent for each tool started by the agent.
+    """
+
+    run_inline = True
+
+    def __init__(self, queue: Queue):
+        self.queue = queue
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        if token:
+            self.queue.put(token)
+
+    def on_tool_start(
+        self, serialized: Dict[str, Any], input_str: str, **kwargs: Any
+    ) -> None:
+        self.queue.put(ToolEvent(name=serialized.get("name", ""), input=input_str))
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    Traces each model call as an llm span, child of the span current when the call starts (i.e. the turn).
+    A response returned by the LLM cache is marked with cache=hit and has no tokens, so it costs nothing.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self.__spans: Dict[UUID, Span] = {}
+
+    def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: List[List[BaseMessage]],
+        *,
+        run_id: UUID,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        metadata = metadata or {}
+        self.__spans[run_id] = start_span(
+            LLM_SPAN,
+            metadata.get("ls_model_name", "unknown"),
+            stage=metadata.get("stage", "unknown"),
+        )
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self.__spans.pop(run_id, None)
+        if span is None:
+            return
+        if is_cache_hit(response):
+            span.set(cache="hit").finish()
+            return
+        input_tokens, output_tokens = get_token_usage(response)
+        span.set(input_tokens=input_tokens, output_tokens=output_tokens).finish()
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        span = self.__spans.pop(run_id, None)
+        if span is not None:
+            span.set(error=type(error).__name__).finish()
+
+
+class ToolResultsCallbackHandler(BaseCallbackHandler):
+    """
+    Collects the results of the tools completed during a turn, they are the partial answer
+    when the turn runs out of time or steps.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self.results: List[Tuple[str, str, str]] = []
+        self.__started: Dict[UUID, Tuple[str, str]] = {}
+
+    def on_tool_start(
+        self,
+        serialized: Dict[str, Any],
+        input_str: str,
+        *,
+        run_id: UUID,
+        **kwargs: Any,
+    ) -> None:
+        self.__started[run_id] = (serialized.get("name", ""), input_str)
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self.__started.pop(run_id, None)
+        if started is not None:
+            self.results.append((started[0], started[1], str(output)))
+
+    def on_tool_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self.__started.pop(run_id, None)
+
+
+def is_cache_hit(response: LLMResult) -> bool:
+    """
+    Returns:
+        bool: True if the response has been returned by the LLM cache (see llm_cache.SQLiteLLMCache).
+    """
+    return any(
+        (generation.generation_info or {}).get(CACHE_HIT_INFO)
+        for generations in response.generations
+        for generation in generations
+    )
+
+
+def get_token_usage(response: LLMResult) -> tuple[int, int]:
+    """
+    Extracts the tokens consumed by a model call.
+
+    Args:
+        response (LLMResult): The result of the model call.
+
+    Returns:
+        tuple[int, int]: The input and the output tokens.
+    """
+    input_tokens = output_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(
+                getattr(generation, "message", None), "usage_metadata", None
+            )
+            if usage:
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+    if input_tokens == 0 and output_tokens == 0 and response.llm_output:
+        token_usage = response.llm_output.get("token_usage") or {}
+        input_tokens = token_usage.get("prompt_tokens", 0)
+        output_tokens = token_usage.get("completion_tokens", 0)
+    return input_tokens, output_tokens
@@ -0,0 +1,190 @@
+import asyncio
+from typing import Callable, Dict, List, Optional
+
+from langchain_core.callbacks import Callbacks
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.prompts.chat import ChatPromptTemplate
+
+from chat_with_repo.constants import (
+    CHAT_HISTORY_SUMMARY_SYSTEM_MESSAGE,
+    CHAT_HISTORY_SUMMARY_TEMPLATE,
+)
+from chat_with_repo.model_routing import SUMMARY_STAGE, create_chat_model
+from chat_with_repo.settings import settings
+from chat_with_repo.tokens import count_tokens
+
+# The tokens added by the chat format to each message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# A function receiving the current summary, the messages to add to it and the callbacks of the model call
+# and returning the new summary
+Summarizer = Callable[[str, List[BaseMessage], Callbacks], str]
+
+
+class ChatHistory:
+    """
+    The chat history sent to the agent, bounded by a token budget.
+    The most recent messages are kept verbatim, the older ones are compressed into a running summary
+    produced by a cheap model. The large assistant outputs (i.e. code reviews) are stored by reference
+    and only an excerpt is replayed to the model, the model reads them with the get_reference tool.
+
+    Attributes:
+        summary (str): The summary of the messages no longer kept verbatim.
+        messages (List[BaseMessage]): The most recent messages.
+        references (Dict[str, str]): The large outputs by reference.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 2000,
+        max_messages: int = 10,
+        max_message_tokens: int = 500,
+        max_summary_tokens: int = 300,
+        model: Optional[str] = None,
+        summarizer: Optional[Summarizer] = None,
+    ):
+        """
+        Initializes a new instance of the ChatHistory class.
+
+        Args:
+            max_tokens (int, optional): The token budget of summary and messages. Defaults to 2000.
+            max_messages (int, optional): The maximum number of messages kept verbatim. Defaults to 10.
+            max_message_tokens (int, optional): The assistant outputs longer than this are stored by reference. Defaults to 500.
+            max_summary_tokens (int, optional): The part of max_tokens reserved to the summary. Defaults to 300.
+            model (Optional[str], optional): The model used to count the tokens. Defaults to MODEL_NAME.
+            summarizer (Optional[Summarizer], optional): The function producing the summary. Defaults to summarize with SUMMARY_MODEL_NAME.
+        """
+        self.max_tokens = max_tokens
+        self.max_messages = max_messages
+        self.max_message_tokens = max_message_tokens
+        self.max_summary_tokens = max_summary_tokens
+        self.model = model or settings.model_name
+        self.summarizer = summarizer or summarize
+        self.summary = ""
+        self.messages: List[BaseMessage] = []
+        self.references: Dict[str, str] = {}
+
+    def append(self, question: str, answer: str, callbacks: Callbacks = None):
+        """
+        Appends a turn of the conversation, the older messages exceeding the budget are summarized.
+
+        Args:
+            question (str): The user's message.
+            answer (str): The assistant's answer.
+            callbacks (Callbacks, optional): The callbacks of the summary model call, i.e. to trace it in the turn.
+                Defaults to None.
+        """
+        evicted = self.__add(question, answer)
+        if evicted:
+            self.__summarize(evicted, callbacks)
+
+    async def aappend(self, question: str, answer: str, callbacks: Callbacks = None):
+        """
+        Async version of append, the summary model is called in a thread so that it does not block the event loop.
+        """
+        evicted = self.__add(question, answer)
+        if evicted:
+            # The thread runs in a copy of the context, the model call is traced in the current turn
+            await asyncio.to_thread(self.__summarize, evicted, callbacks)
+
+    def to_messages(self) -> List[BaseMessage]:
+        """
+        Returns:
+            List[BaseMessage]: The messages to send to the model, the summary first.
+        """
+        if not self.summary:
+            return list(self.messages)
+        return [
+            SystemMessage(
+                content=f"Summary of the previous conversation: {self.summary}"
+            )
+        ] + self.messages
+
+    def get_reference(self, reference: str) -> Optional[str]:
+        return self.references.get(reference)
+
+    def questions(self) -> List[str]:
+        return [msg.content for msg in self.messages if isinstance(msg, HumanMessage)]
+
+    def count_tokens(self) -> int:
+        return sum(self.__count_tokens(msg.content) for msg in self.to_messages())
+
+    def clear(self):
+        self.summary = ""
+        self.messages.clear()
+        self.references.clear()
+
+    def __add(self, question: str, answer: str) -> List[BaseMessage]:
+        """Adds the messages of the turn and returns the older ones to summarize"""
+        self.messages.append(HumanMessage(content=question))
+        self.messages.append(AIMessage(content=self.__store(answer)))
+        return self.__evict()
+
+    def __summarize(self, evicted: List[BaseMessage], callbacks: Callbacks):
+        try:
+            self.summary = self.summarizer(self.summary, evicted, callbacks)
+        except Exception as e:
+            # The turn has already been answered, losing the older context is better than failing
+            print(f"Unable to summarize the chat history: {e}")
+
+    def __store(self, answer: str) -> str:
+        if count_tokens(answer, self.model) <= self.max_message_tokens:
+            return answer
+        reference = f"output-{len(self.references) + 1}"
+        self.references[reference] = answer
+        lines = answer.strip().splitlines()
+        excerpt = lines[0][:200] if lines else ""
+        return f"{excerpt}... (long output stored as {reference}, not repeated here, use get_reference to read it)"
+
+    def __evict(self) -> List[BaseMessage]:
+        evicted = []
+        # The last turn is always kept
+        while len(self.messages) > 2 and (
+            len(self.messages) > self.max_messages
+            or self.__count_messages_tokens()
+            > self.max_tokens - self.max_summary_tokens
+        ):
+            evicted.extend(self.messages[:2])
+            del self.messages[:2]
+        return evicted
+
+    def __count_messages_tokens(self) -> int:
+        return sum(self.__count_tokens(msg.content) for msg in self.messages)
+
+    def __count_tokens(self, text: str) -> int:
+        return count_tokens(text, self.model) + MESSAGE_OVERHEAD_TOKENS
+
+
+def summarize(
+    summary: str, messages: List[BaseMessage], callbacks: Callbacks = None
+) -> str:
+    """
+    Updates the summary of the conversation with the messages using SUMMARY_MODEL_NAME.
+
+    Args:
+        summary (str): The current summary.
+        messages (List[BaseMessage]): The messages to add to the summary.
+        callbacks (Callbacks, optional): The callbacks of the model call. Defaults to None.
+
+    Returns:
+        str: The updated summary.
+    """
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            ("system", CHAT_HISTORY_SUMMARY_SYSTEM_MESSAGE),
+            ("human", CHAT_HISTORY_SUMMARY_TEMPLATE),
+        ]
+    )
+    llm = create_chat_model(SUMMARY_STAGE, settings.summary_model_name, temperature=0)
+    chain = prompt | llm
+    response = chain.invoke(
+        {
+            "summary": summary or "(empty)",
+            "messages": "\n".join(
+                f"{'User' if isinstance(msg, HumanMessage) else 'Assistant'}: {msg.content}"
+                for msg in messages
+            ),
+        },
+        config={"callbacks": callbacks},
+    )
+    return response.content.strip()
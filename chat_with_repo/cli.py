@@ -0,0 +1,235 @@
+"""
+Asks questions to the assistant without the Streamlit app, i.e. from scripts or CI.
+
+The questions are read one per line from a file or from stdin, a line can also be a JSON object with
+"question" and optionally "id" and "repo". Each question is answered by its own assistant, concurrently,
+and for each one a JSON line with the answer, the error and the timing is written. A line that cannot be
+parsed gets a JSON line with its error, the other questions are answered anyway.
+
+Usage:
+    python -m chat_with_repo [--file questions.txt] [--workers 4] [--repo jariko] [--output answers.jsonl]
+"""
+
+import argparse
+import json
+import sys
+import time
+from contextlib import redirect_stdout
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import Lock
+from typing import Callable, Iterable, Iterator, List, Optional, TextIO
+
+from pydantic import BaseModel
+
+from chat_with_repo.assistant import GitHubAssistant
+from chat_with_repo.model import Repo
+from chat_with_repo.resources import get_resources
+from chat_with_repo.usage import total_usage
+
+
+class Question(BaseModel):
+    """
+    Attributes:
+        id (str): The id of the question, by default its line number.
+        question (str): The question.
+        repo (Repo): The repository the question is about.
+        error (Optional[str]): Why the line of the question cannot be parsed, the question is not answered.
+    """
+
+    id: str
+    question: str
+    repo: Repo
+    error: Optional[str] = None
+
+
+class Answer(BaseModel):
+    """
+    Attributes:
+        id (str): The id of the question.
+        question (str): The question.
+        repo (str): The repository the question is about.
+        answer (Optional[str]): The answer, None if the assistant failed.
+        error (Optional[str]): The error, None if the question has been answered.
+        seconds (float): The time spent answering.
+        llm_calls (int): The model calls.
+        input_tokens (int): The input tokens of the model calls.
+        output_tokens (int): The output tokens of the model calls.
+        cost (float): The cost in USD of the model calls estimated with the prices of pricing.
+    """
+
+    id: str
+    question: str
+    repo: str
+    answer: Optional[str] = None
+    error: Optional[str] = None
+    seconds: float
+    llm_calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cost: float = 0.0
+
+
+def read_questions(
+    lines: Iterable[str], repo: Repo = Repo.jariko
+) -> Iterator[Question]:
+    """
+    Parses the questions, one per line, blank lines and lines starting with # are ignored.
+
+    Args:
+        lines (Iterable[str]): The lines, a line is either the text of the question or a JSON object
+            with "question" and optionally "id" and "repo".
+        repo (Repo, optional): The repository of the questions not specifying it. Defaults to Repo.jariko.
+
+    Yields:
+        Iterator[Question]: The questions, with the error of the lines that cannot be parsed,
+            i.e. a malformed JSON or an unknown repository.
+    """
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("{"):
+            try:
+                value = json.loads(line)
+                yield Question(
+                    id=str(value.get("id", number)),
+                    question=value["question"],
+                    repo=Repo(value.get("repo", repo.value)),
+                )
+            except Exception as e:
+                yield Question(
+                    id=str(number),
+                    question=line,
+                    repo=repo,
+                    error=f"{type(e).__name__}: {e}",
+                )
+        else:
+            yield Question(id=str(number), question=line, repo=repo)
+
+
+def answer_question(
+    question: Question,
+    create_assistant: Callable[[], GitHubAssistant] = GitHubAssistant,
+) -> Answer:
+    """
+    Answers a question with a new assistant, the errors are reported in the answer.
+
+    Args:
+        question (Question): The question.
+        create_assistant (Callable[[], GitHubAssistant], optional): Creates the assistant. Defaults to GitHubAssistant.
+
+    Returns:
+        Answer: The answer, its timing and the usage of the models traced in the turn.
+    """
+    start = time.perf_counter()
+    answer = assistant = None
+    error = question.error
+    if error is None:
+        try:
+            assistant = create_assistant()
+            assistant.state.repo = question.repo
+            answer = assistant.chat(question.question)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+    usage = total_usage(assistant.last_turn_usage if assistant is not None else {})
+    return Answer(
+        id=question.id,
+        question=question.question,
+        repo=question.repo.value,
+        answer=answer,
+        error=error,
+        seconds=round(time.perf_counter() - start, 3),
+        llm_calls=usage.llm_calls,
+        input_tokens=usage.input_tokens,
+        output_tokens=usage.output_tokens,
+        cost=usage.cost,
+    )
+
+
+def answer_questions(
+    questions: Iterable[Question],
+    output: TextIO,
+    workers: int = 4,
+    create_assistant: Callable[[], GitHubAssistant] = GitHubAssistant,
+) -> List[Answer]:
+    """
+    Answers the questions concurrently and writes a JSON line for each answer as soon as it is ready.
+
+    Args:
+        questions (Iterable[Question]): The questions.
+        output (TextIO): Where the answers are written.
+        workers (int, optional): The questions answered at the same time. Defaults to 4.
+        create_assistant (Callable[[], GitHubAssistant], optional): Creates the assistants. Defaults to GitHubAssistant.
+
+    Returns:
+        List[Answer]: The answers in completion order.
+    """
+    answers = []
+    lock = Lock()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(answer_question, question, create_assistant)
+            for question in questions
+        ]
+        for future in as_completed(futures):
+            answer = future.result()
+            with lock:
+                answers.append(answer)
+                output.write(answer.model_dump_json() + "\n")
+                output.flush()
+    return answers
+
+
+def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m chat_with_repo",
+        description="Answers the questions read from a file or stdin, writing JSON lines",
+    )
+    parser.add_argument(
+        "--file", help="The file of the questions, stdin if not set", default=None
+    )
+    parser.add_argument(
+        "--output", help="The file of the answers, stdout if not set", default=None
+    )
+    parser.add_argument(
+        "--workers", type=int, default=4, help="The questions answered concurrently"
+    )
+    parser.add_argument(
+        "--repo",
+        choices=[repo.value for repo in Repo],
+        default=Repo.jariko.value,
+        help="The repository of the questions not specifying it",
+    )
+    parser.add_argument(
+        "--answer-cache",
+        action="store_true",
+        help="Shares the answers between identical questions",
+    )
+    options = parser.parse_args(args)
+
+    answer_cache = get_resources().answer_cache if options.answer_cache else None
+    input_file = open(options.file) if options.file else sys.stdin
+    output_file = open(options.output, "w") if options.output else sys.stdout
+    start = time.perf_counter()
+    # The logs of the assistant and of the tools go to stderr, stdout is kept for the answers
+    try:
+        with redirect_stdout(sys.stderr):
+            answers = answer_questions(
+                read_questions(input_file, repo=Repo(options.repo)),
+                output=output_file,
+                workers=options.workers,
+                create_assistant=lambda: GitHubAssistant(answer_cache=answer_cache),
+            )
+    finally:
+        if options.file:
+            input_file.close()
+        if options.output:
+            output_file.close()
+    seconds = time.perf_counter() - start
+    failed = sum(1 for answer in answers if answer.error is not None)
+    print(
+        f"Answered {len(answers) - failed} questions, {failed} failed, in {seconds:.1f}s",
+        file=sys.stderr,
+    )
+    if failed:
+        sys.exit(1)
@@ -1,12 +1,18 @@
 from langchain_core.pydantic_v1 import BaseModel, Field
 from langchain_core.tools import BaseTool
-from chat_with_repo import GITHUB_TOKEN
+from chat_with_repo.settings import settings
+from chat_with_repo.github_client import aget, get
+from chat_with_repo.metadata_store import (
+    ANCESTOR_TTL_SECONDS,
+    ANCESTRY,
+    MISSING,
+    NOT_ANCESTOR_TTL_SECONDS,
+    get_metadata_store,
+)
+from chat_with_repo.tool_output import MAX_OUTPUT_TOKENS, encode_commit, encode_commits
 from chat_with_repo.model import Commit, CommitFilter, Repo, State
 
 
-import requests
-
-
 from typing import Callable, List, Optional, Type
 
 
@@ -20,9 +26,18 @@ class GetCommitByShaTool(BaseTool):
     name: str = "get_commit_by_sha"
     description = "Retrieves a commit by its SHA and allows to answer to all questions related a commit identified  by a SHA."
 
-    def _run(self, sha: str) -> Commit:
-        return get_commit_by_sha(
-            commit_sha=sha, owner=self.state.repo.owner, repo=self.state.repo.value
+    def _run(self, sha: str) -> str:
+        return encode_commit(
+            get_commit_by_sha(
+                commit_sha=sha, owner=self.state.repo.owner, repo=self.state.repo.value
+            )
+        )
+
+    async def _arun(self, sha: str) -> str:
+        return encode_commit(
+            await aget_commit_by_sha(
+                commit_sha=sha, owner=self.state.repo.owner, repo=self.state.repo.value
+            )
         )
 
 
@@ -33,14 +48,33 @@ class GetCommitsByPathSchema(BaseModel):
 class GetCommitsByPathTool(BaseTool):
     state: State
     topK: int = 10
+    max_output_tokens: int = MAX_OUTPUT_TOKENS
+    output_fields: List[str] = ["sha", "date", "author", "message"]
     args_schema: Type[BaseModel] = GetCommitsByPathSchema
     name: str = "get_commits_by_path"
     description = "Retrieves a list of commits associated with a specific file."
 
-    def _run(self, path: str) -> List[Commit]:
-        return get_commits_by_path(
-            path=path, owner=self.state.repo.owner, repo=self.state.repo.value
-        )[: self.topK]
+    def _run(self, path: str) -> str:
+        return self.__encode(
+            get_commits_by_path(
+                path=path, owner=self.state.repo.owner, repo=self.state.repo.value
+            )
+        )
+
+    async def _arun(self, path: str) -> str:
+        return self.__encode(
+            await aget_commits_by_path(
+                path=path, owner=self.state.repo.owner, repo=self.state.repo.value
+            )
+        )
+
+    def __encode(self, commits: List[Commit]) -> str:
+        return encode_commits(
+            commits[: self.topK],
+            fields=self.output_fields,
+            max_tokens=self.max_output_tokens,
+            total=len(commits),
+        )
 
 
 class GetCommitsByPullRequestSchema(BaseModel):
@@ -50,14 +84,33 @@ class GetCommitsByPullRequestSchema(BaseModel):
 class GetCommitsByPullRequestTool(BaseTool):
     state: State
     topK: int = 10
+    max_output_tokens: int = MAX_OUTPUT_TOKENS
+    output_fields: List[str] = ["sha", "date", "author", "message"]
     args_schema: Type[BaseModel] = GetCommitsByPullRequestSchema
     name: str = "get_commits_by_pull_request"
     description = "Retrieves a list of commits associated with a specific pull request."
 
-    def _run(self, number: int) -> List[Commit]:
-        return get_commits_by_pull_request(
-            number=number, owner=self.state.repo.owner, repo=self.state.repo.value
-        )[: self.topK]
+    def _run(self, number: int) -> str:
+        return self.__encode(
+            get_commits_by_pull_request(
+                number=number, owner=self.state.repo.owner, repo=self.state.repo.value
+            )
+        )
+
+    async def _arun(self, number: int) -> str:
+        return self.__encode(
+            await aget_commits_by_pull_request(
+                number=number, owner=self.state.repo.owner, repo=self.state.repo.value
+            )
+        )
+
+    def __encode(self, commits: List[Commit]) -> str:
+        return encode_commits(
+            commits[: self.topK],
+            fields=self.output_fields,
+            max_tokens=self.max_output_tokens,
+            total=len(commits),
+        )
 
 
 class IsCommitInBaseSchema(BaseModel):
@@ -79,6 +132,14 @@ class IsCommitInBaseTool(BaseTool):
             repo=self.state.repo.value,
         )
 
+    async def _arun(self, commit_sha: str, branch: str) -> bool:
+        return await ais_commit_in_base(
+            commit_sha=commit_sha,
+            base=branch,
+            owner=self.state.repo.owner,
+            repo=self.state.repo.value,
+        )
+
 
 class GetMergingCommitSchema(BaseModel):
     commit_sha: str = Field(..., description="The commit SHA.")
@@ -91,12 +152,24 @@ class GetMergingCommitTool(BaseTool):
     name: str = "get_merging_commit"
     description = "Retrieves the commit that merged a given commit into a branch."
 
-    def _run(self, commit_sha: str, branch: str) -> Optional[str]:
-        return get_merging_commit(
-            commit_sha=commit_sha,
-            branch=branch,
-            owner=self.state.repo.owner,
-            repo=self.state.repo.value,
+    def _run(self, commit_sha: str, branch: str) -> str:
+        return encode_commit(
+            get_merging_commit(
+                commit_sha=commit_sha,
+                branch=branch,
+                owner=self.state.repo.owner,
+                repo=self.state.repo.value,
+            )
+        )
+
+    async def _arun(self, commit_sha: str, branch: str) -> str:
+        return encode_commit(
+            await aget_merging_commit(
+                commit_sha=commit_sha,
+                branch=branch,
+                owner=self.state.repo.owner,
+                repo=self.state.repo.value,
+            )
         )
 
 
@@ -114,13 +187,34 @@ def get_commit_by_sha(
     Returns:
         Commit: A Commit representing the retrieved commit.
     """
-    url = f"https://api.github.com/repos/{owner}/{repo}/commits/{commit_sha}"
+    url = f"{settings.github_api_url}/repos/{owner}/{repo}/commits/{commit_sha}"
+    headers = {
+        "Accept": "application/vnd.github.v3+json",
+        "Authorization": f"token {settings.github_token}",
+    }
+
+    response = get(url, headers=headers)
+    if response.status_code == 200:
+        return Commit.model_validate(response.json())
+    elif response.status_code == 422:
+        return None
+    else:
+        raise Exception(f"Error: {response.status_code} - {response.text}")
+
+
+async def aget_commit_by_sha(
+    commit_sha: str, owner: str = "smeup", repo: str = "jariko"
+) -> Optional[Commit]:
+    """
+    Async version of get_commit_by_sha.
+    """
+    url = f"{settings.github_api_url}/repos/{owner}/{repo}/commits/{commit_sha}"
     headers = {
         "Accept": "application/vnd.github.v3+json",
-        "Authorization": f"token {GITHUB_TOKEN}",
+        "Authorization": f"token {settings.github_token}",
     }
 
-    response = requests.get(url, headers=headers)
+    response = await aget(url, headers=headers)
     if response.status_code == 200:
         return Commit.model_validate(response.json())
     elif response.status_code == 422:
@@ -143,16 +237,38 @@ def get_commits_by_path(
     Returns:
         List[Commit]: A list of Commit representing the retrieved commits.
     """
-    url = f"https://api.github.com/repos/{owner}/{repo}/commits"
+    url = f"{settings.github_api_url}/repos/{owner}/{repo}/commits"
     headers = {
         "Accept": "application/vnd.github.v3+json",
-        "Authorization": f"token {GITHUB_TOKEN}",
+        "Authorization": f"token {settings.github_token}",
     }
     params = {
         "path": path,
     }
 
-    response = requests.get(url, headers=headers, params=params)
+    response = get(url, headers=headers, params=params)
+    if response.status_code == 200:
+        return [Commit.model_validate(commit) for commit in response.json()]
+    else:
+        raise Exception(f"Error: {response.status_code} - {response.text}")
+
+
+async def aget_commits_by_path(
+    path: str, owner: str = "smeup", repo: str = "jariko"
+) -> List[Commit]:
+    """
+    Async version of get_commits_by_path.
+    """
+    url = f"{settings.github_api_url}/repos/{owner}/{repo}/commits"
+    headers = {
+        "Accept": "application/vnd.github.v3+json",
+        "Authorization": f"token {settings.github_token}",
+    }
+    params = {
+        "path": path,
+    }
+
+    response = await aget(url, headers=headers, params=params)
     if response.status_code == 200:
         return [Commit.model_validate(commit) for commit in response.json()]
     else:
@@ -177,10 +293,10 @@ def get_commits_by_pull_request(
     Returns:
         List[Commit]: A list of Commit representing the retrieved commits.
     """
-    url = f"https://api.github.com/repos/{owner}/{repo}/pulls/{number}/commits"
+    url = f"{settings.github_api_url}/repos/{owner}/{repo}/pulls/{number}/commits"
     headers = {
         "Accept": "application/vnd.github.v3+json",
-        "Authorization": f"token {GITHUB_TOKEN}",
+        "Authorization": f"token {settings.github_token}",
     }
     params = {
         "per_page": 100,
@@ -188,7 +304,7 @@ def get_commits_by_pull_request(
     nextUrl = url
     commits = []
     while nextUrl:
-        response = requests.get(nextUrl, headers=headers, params=params)
+        response = get(nextUrl, headers=headers, params=params)
         if response.status_code == 200:
             nextUrl = response.links.get("next", {}).get("url")
             # Process the commits as needed
@@ -201,6 +317,38 @@ def get_commits_by_pull_request(
     return commits
 
 
+async def aget_commits_by_pull_request(
+    number: int,
+    owner: str = "smeup",
+    repo: str = "jariko",
+    filter: Callable[[Commit], bool] = lambda commit: True,
+) -> List[Commit]:
+    """
+    Async version of get_commits_by_pull_request.
+    """
+    url = f"{settings.github_api_url}/repos/{owner}/{repo}/pulls/{number}/commits"
+    headers = {
+        "Accept": "application/vnd.github.v3+json",
+        "Authorization": f"token {settings.github_token}",
+    }
+    params = {
+        "per_page": 100,
+    }
+    nextUrl = url
+    commits = []
+    while nextUrl:
+        response = await aget(nextUrl, headers=headers, params=params)
+        if response.status_code == 200:
+            nextUrl = response.links.get("next", {}).get("url")
+            for commit in response.json():
+                my_commit = Commit.model_validate(commit)
+                if filter(my_commit):
+                    commits.append(my_commit)
+        else:
+            raise Exception(f"Error: {response.status_code} - {response.text}")
+    return commits
+
+
 # https://docs.github.com/rest/commits/commits#compare-two-commits
 def compare_commits(
     base: str, head: str, owner: str = "smeup", repo: str = "jariko"
@@ -218,10 +366,10 @@ def compare_commits(
         List[Commit]: A list of Commit representing the retrieved commits. If the base commit or the head commit does not exist,
         it returns None.
     """
-    url = f"https://api.github.com/repos/{owner}/{repo}/compare/{base}...{head}"
+    url = f"{settings.github_api_url}/repos/{owner}/{repo}/compare/{base}...{head}"
     headers = {
         "Accept": "application/vnd.github.v3+json",
-        "Authorization": f"token {GITHUB_TOKEN}",
+        "Authorization": f"token {settings.github_token}",
     }
     params = {
         "per_page": 100,
@@ -230,7 +378,7 @@ def compare_commits(
     nextUrl = url
     commits = []
     while nextUrl:
-        response = requests.get(nextUrl, headers=headers, params=params)
+        response = get(nextUrl, headers=headers, params=params)
         if response.status_code == 200:
             nextUrl = response.links.get("next", {}).get("url")
             # Process the commits as needed
@@ -243,6 +391,36 @@ def compare_commits(
     return commits
 
 
+async def acompare_commits(
+    base: str, head: str, owner: str = "smeup", repo: str = "jariko"
+) -> Optional[List[Commit]]:
+    """
+    Async version of compare_commits.
+    """
+    url = f"{settings.github_api_url}/repos/{owner}/{repo}/compare/{base}...{head}"
+    headers = {
+        "Accept": "application/vnd.github.v3+json",
+        "Authorization": f"token {settings.github_token}",
+    }
+    params = {
+        "per_page": 100,
+    }
+
+    nextUrl = url
+    commits = []
+    while nextUrl:
+        response = await aget(nextUrl, headers=headers, params=params)
+        if response.status_code == 200:
+            nextUrl = response.links.get("next", {}).get("url")
+            for commit in response.json()["commits"]:
+                commits.append(Commit.model_validate(commit))
+        elif response.status_code == 404:
+            return None
+        else:
+            raise Exception(f"Error: {response.status_code} - {response.text}")
+    return commits
+
+
 def is_commit_in_base(
     commit_sha: str, base: str, owner: str = "smeup", repo: str = "jariko"
 ) -> bool:
@@ -258,10 +436,45 @@ def is_commit_in_base(
     Returns:
         bool: True if the commit is in the base, False otherwise.
     """
-    commits = compare_commits(base=base, head=commit_sha, owner=owner, repo=repo)
-    if commits is None:
-        return False
-    return not any(commit.sha == commit_sha for commit in commits)
+    store = get_metadata_store()
+    key = (owner, repo, commit_sha, base)
+    contained = store.get(ANCESTRY, key)
+    if contained is MISSING:
+        commits = compare_commits(base=base, head=commit_sha, owner=owner, repo=repo)
+        contained = commits is not None and not any(
+            commit.sha == commit_sha for commit in commits
+        )
+        __store_ancestry(key, contained)
+    return contained
+
+
+async def ais_commit_in_base(
+    commit_sha: str, base: str, owner: str = "smeup", repo: str = "jariko"
+) -> bool:
+    """
+    Async version of is_commit_in_base.
+    """
+    store = get_metadata_store()
+    key = (owner, repo, commit_sha, base)
+    contained = store.get(ANCESTRY, key)
+    if contained is MISSING:
+        commits = await acompare_commits(
+            base=base, head=commit_sha, owner=owner, repo=repo
+        )
+        contained = commits is not None and not any(
+            commit.sha == commit_sha for commit in commits
+        )
+        __store_ancestry(key, contained)
+    return contained
+
+
+def __store_ancestry(key: tuple, contained: bool):
+    get_metadata_store().put(
+        ANCESTRY,
+        key,
+        contained,
+        ANCESTOR_TTL_SECONDS if contained else NOT_ANCESTOR_TTL_SECONDS,
+    )
 
 
 def get_merging_commit(
@@ -282,10 +495,10 @@ def get_merging_commit(
         Optional[Commit]: A Commit representing the retrieved commit. If the commit is not merged into the branch, it returns None.
     """
     # URL to check if the commit is in the branch
-    url = f"https://api.github.com/repos/{owner}/{repo}/commits/{commit_sha}"
+    url = f"{settings.github_api_url}/repos/{owner}/{repo}/commits/{commit_sha}"
 
     # Make the request
-    response = requests.get(url)
+    response = get(url)
 
     if response.status_code == 200:
         commit_data = response.json()
@@ -293,8 +506,8 @@ def get_merging_commit(
         for parent in commit_data["parents"]:
             parent_sha = parent["sha"]
             # Compare the parent commit with the branch
-            compare_url = f"https://api.github.com/repos/{owner}/{repo}/compare/{branch}...{parent_sha}"
-            compare_response = requests.get(compare_url)
+            compare_url = f"{settings.github_api_url}/repos/{owner}/{repo}/compare/{branch}...{parent_sha}"
+            compare_response = get(compare_url)
             if compare_response.status_code == 200:
                 compare_data = compare_response.json()
                 # If the commit is part of the branch, return the commit's date
@@ -313,6 +526,39 @@ def get_merging_commit(
     return None
 
 
+async def aget_merging_commit(
+    commit_sha: str, branch: str, owner: str = "smeup", repo: str = "jariko"
+) -> Optional[Commit]:
+    """
+    Async version of get_merging_commit, it suffers from the same issue.
+    """
+    url = f"{settings.github_api_url}/repos/{owner}/{repo}/commits/{commit_sha}"
+
+    response = await aget(url)
+
+    if response.status_code == 200:
+        commit_data = response.json()
+        for parent in commit_data["parents"]:
+            parent_sha = parent["sha"]
+            compare_url = f"{settings.github_api_url}/repos/{owner}/{repo}/compare/{branch}...{parent_sha}"
+            compare_response = await aget(compare_url)
+            if compare_response.status_code == 200:
+                compare_data = compare_response.json()
+                if (
+                    compare_data["status"] == "behind"
+                    or compare_data["status"] == "identical"
+                ):
+                    return await aget_commit_by_sha(
+                        commit_sha=parent_sha, owner=owner, repo=repo
+                    )
+    elif response.status_code == 404:
+        return None
+    else:
+        raise Exception(f"Error: {response.status_code} - {response.text}")
+
+    return None
+
+
 def __get_commits(
     commit_filter: CommitFilter = CommitFilter(),
     owner: str = "smeup",
@@ -336,10 +582,10 @@ def __get_commits(
         None
     """
 
-    url = f"https://api.github.com/repos/{owner}/{repo}/commits"
+    url = f"{settings.github_api_url}/repos/{owner}/{repo}/commits"
     headers = {
         "Accept": "application/vnd.github.v3+json",
-        "Authorization": f"token {GITHUB_TOKEN}",
+        "Authorization": f"token {settings.github_token}",
     }
     params = {"per_page": 100}
     if commit_filter.sha:
@@ -350,13 +596,13 @@ def __get_commits(
         params["author"] = commit_filter.author
     if commit_filter.committer:
         params["committer"] = commit_filter.committer
-    response = requests.get(url, headers=headers, params=params)
+    response = get(url, headers=headers, params=params)
 
     nextUrl = url
 
     while nextUrl:
         print(f"Processing {nextUrl}")
-        response = requests.get(nextUrl, headers=headers, params=params)
+        response = get(nextUrl, headers=headers, params=params)
         # Check if the request was successful
         if response.status_code == 200:
             nextUrl = response.links.get("next", {}).get("url")
@@ -97,3 +97,23 @@ Instructions
         You have to provide all kinds of suggestions in order to improve the code quality, readability, and maintainability.
 
 """
+
+CHAT_HISTORY_SUMMARY_SYSTEM_MESSAGE = """
+You summarize a conversation between a user and a virtual assistant that helps with GitHub-related tasks.
+
+Update the CURRENT_SUMMARY with the NEW_MESSAGES and answer only with the updated summary.
+Keep the repository, the numbers of the pull requests, the SHAs of the commits, the names of the branches and tags
+and the answers given by the assistant, leave out greetings and explanations.
+Answer in at most 150 words.
+"""
+
+CHAT_HISTORY_SUMMARY_TEMPLATE = """
+CURRENT_SUMMARY
+{summary}
+
+NEW_MESSAGES
+{messages}
+"""
+
+# The request of the reviews made by the batch review of the open pull requests
+BATCH_REVIEW_QUESTION = "Make a code review of the pull request {number}"
@@ -0,0 +1,568 @@
+import asyncio
+import hashlib
+import json
+import time
+import warnings
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Dict, Iterator, Optional
+from urllib.parse import urlsplit
+
+import requests
+from langchain_core._api import LangChainBetaWarning
+from langchain_core.rate_limiters import BaseRateLimiter, InMemoryRateLimiter
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from chat_with_repo.settings import settings
+from chat_with_repo.tracing import (
+    GITHUB_SPAN,
+    Span,
+    endpoint_template,
+    page_number,
+    span,
+)
+
+if TYPE_CHECKING:
+    import httpx
+
+# Maximum number of GitHub requests in flight at the same time for each event loop
+MAX_CONCURRENT_REQUESTS = 10
+
+# Timeout of a GitHub request when no deadline is set or the deadline is farther
+DEFAULT_TIMEOUT_SECONDS = 30.0
+
+
+# The connections kept by the session of the synchronous requests, shared by all the threads
+MAX_POOLED_CONNECTIONS = 20
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when a GitHub request is made after the deadline of the current turn"""
+
+
+class RequestBudgetExceededError(Exception):
+    """Raised when a GitHub request is made after the requests allowed by request_budget are used"""
+
+
+# The time.monotonic() by which the GitHub requests of the current context must complete.
+# Being a ContextVar it follows the tool calls into the worker threads and the asyncio tasks.
+__deadline: ContextVar[Optional[float]] = ContextVar("github_deadline", default=None)
+
+
+@contextmanager
+def deadline(seconds: Optional[float]) -> Iterator[None]:
+    """
+    Limits the time of the GitHub requests made in the block: each request times out when the deadline
+    is reached and no request is started after it. A nested deadline cannot extend the outer one.
+
+    Args:
+        seconds (Optional[float]): The seconds from now, None for no deadline.
+    """
+    current = __deadline.get()
+    value = current
+    if seconds is not None:
+        value = time.monotonic() + seconds
+        if current is not None:
+            value = min(value, current)
+    token = __deadline.set(value)
+    try:
+        yield
+    finally:
+        __deadline.reset(token)
+
+
+class _RequestBudget:
+    def __init__(self, max_requests: int):
+        self.max_requests = max_requests
+        self.used = 0
+
+
+# The requests which the current context can still make, i.e. the share of the rate limit of the cache warmer
+__request_budget: ContextVar[Optional[_RequestBudget]] = ContextVar(
+    "github_request_budget", default=None
+)
+
+
+@contextmanager
+def request_budget(max_requests: int) -> Iterator[_RequestBudget]:
+    """
+    Limits the GitHub requests made in the block: once max_requests have been made the next one raises
+    RequestBudgetExceededError. The revalidations answered with 304 Not Modified do not count, as for GitHub.
+
+    Args:
+        max_requests (int): The requests allowed.
+
+    Returns:
+        Iterator[_RequestBudget]: The budget, its used attribute counts the requests made.
+    """
+    budget = _RequestBudget(max_requests)
+    token = __request_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        __request_budget.reset(token)
+
+
+def __check_request_budget():
+    budget = __request_budget.get()
+    if budget is not None and budget.used >= budget.max_requests:
+        raise RequestBudgetExceededError(
+            f"Error: the budget of {budget.max_requests} GitHub requests is exhausted"
+        )
+
+
+class RateLimit:
+    """
+    The GitHub rate limit, as seen in the headers of the last response.
+
+    Attributes:
+        limit (int): The requests allowed each hour.
+        remaining (int): The requests left in the current window.
+        reset (float): When the window resets, in seconds since the epoch.
+    """
+
+    def __init__(self, limit: int, remaining: int, reset: float):
+        self.limit = limit
+        self.remaining = remaining
+        self.reset = reset
+
+
+__rate_limit: Optional[RateLimit] = None
+__rate_limits: Dict[str, RateLimit] = {}
+
+
+def get_rate_limit() -> Optional[RateLimit]:
+    """
+    Returns:
+        Optional[RateLimit]: The rate limit of the last GitHub response, None if no response had the headers.
+    """
+    return __rate_limit
+
+
+def get_rate_limits() -> Dict[str, RateLimit]:
+    """
+    Returns:
+        Dict[str, RateLimit]: The rate limit of the last GitHub response of each token, by token_fingerprint.
+    """
+    return dict(__rate_limits)
+
+
+def token_fingerprint(authorization: Optional[str]) -> str:
+    """
+    Returns:
+        str: A short hash identifying the token of an Authorization header without disclosing it,
+            "anonymous" for the requests without token.
+    """
+    if not authorization:
+        return "anonymous"
+    return hashlib.sha256(authorization.split()[-1].encode()).hexdigest()[:8]
+
+
+def __update_rate_limit(headers: Any, authorization: Optional[str] = None):
+    global __rate_limit
+    remaining = headers.get("X-RateLimit-Remaining")
+    if remaining is None:
+        return
+    __rate_limit = __rate_limits[token_fingerprint(authorization)] = RateLimit(
+        limit=int(headers.get("X-RateLimit-Limit", 0)),
+        remaining=int(remaining),
+        reset=float(headers.get("X-RateLimit-Reset", 0)),
+    )
+
+
+# The limiter shared by all the GitHub requests of the process, None for no limit
+__rate_limiter: Optional[BaseRateLimiter] = None
+
+
+def set_rate_limit(requests_per_second: Optional[float]):
+    """
+    Limits the GitHub requests of the whole process, i.e. when many reviews run in parallel.
+
+    Args:
+        requests_per_second (Optional[float]): The maximum average rate, None removes the limit.
+    """
+    global __rate_limiter
+    __rate_limiter = create_rate_limiter(requests_per_second)
+
+
+def create_rate_limiter(
+    requests_per_second: Optional[float],
+) -> Optional[BaseRateLimiter]:
+    """
+    Returns:
+        Optional[BaseRateLimiter]: A token bucket allowing requests_per_second, None if requests_per_second is None.
+    """
+    if requests_per_second is None:
+        return None
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", LangChainBetaWarning)
+        return InMemoryRateLimiter(
+            requests_per_second=requests_per_second,
+            check_every_n_seconds=min(0.1, 1 / requests_per_second),
+        )
+
+
+def remaining_time() -> Optional[float]:
+    """
+    Returns:
+        Optional[float]: The seconds left before the deadline, None if no deadline is set.
+    """
+    value = __deadline.get()
+    return None if value is None else value - time.monotonic()
+
+
+def get_timeout() -> float:
+    """
+    Returns:
+        float: The timeout of a request: DEFAULT_TIMEOUT_SECONDS or the time left before the deadline if shorter.
+
+    Raises:
+        DeadlineExceededError: If the deadline has been reached.
+    """
+    remaining = remaining_time()
+    if remaining is None:
+        return DEFAULT_TIMEOUT_SECONDS
+    if remaining <= 0:
+        raise DeadlineExceededError(
+            "The time available for the GitHub requests is over"
+        )
+    return min(DEFAULT_TIMEOUT_SECONDS, remaining)
+
+
+class CachedResponse:
+    """
+    A GitHub response kept by the ResponseCache. It exposes status_code, headers, content, text, json() and links
+    as requests.Response and httpx.Response do, so the sync and the async requests share the cached responses.
+
+    Attributes:
+        url (str): The url of the response, with the query.
+        etag (str): The ETag of the response.
+        validated (float): The time.monotonic() of the last time GitHub confirmed the response.
+    """
+
+    def __init__(self, response: Any):
+        self.url = str(response.url)
+        self.status_code = response.status_code
+        self.headers = CaseInsensitiveDict(response.headers)
+        self.content: bytes = response.content
+        self.links: Dict[str, Dict[str, str]] = response.links
+        self.etag: str = response.headers.get("ETag")
+        self.validated = time.monotonic()
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+
+class ResponseCache:
+    """
+    The GitHub responses having an ETag, shared by all the sessions of the process.
+    A cached response is revalidated with If-None-Match: when GitHub answers 304 Not Modified the cached
+    response is returned and the request does not count against the rate limit.
+    A response validated less than max_age_seconds ago is returned without asking GitHub,
+    i.e. the pages kept fresh by the cache warmer.
+    When the responses exceed max_size_bytes the least recently used are evicted.
+
+    Attributes:
+        max_size_bytes (int): The maximum size of the cached response bodies.
+        max_age_seconds (float): How long a response is returned without revalidating it, 0 to always revalidate.
+        hits (int): The requests answered with 304 Not Modified or with a fresh response.
+        misses (int): The requests returning a new body.
+    """
+
+    def __init__(
+        self, max_size_bytes: int = 50 * 1024 * 1024, max_age_seconds: float = 0
+    ):
+        self.max_size_bytes = max_size_bytes
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self.__responses: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self.__lock = Lock()
+
+    def lookup(self, key: str) -> Optional[CachedResponse]:
+        """
+        Returns:
+            Optional[CachedResponse]: The response, None if not cached.
+        """
+        with self.__lock:
+            cached = self.__responses.get(key)
+            if cached is None:
+                return None
+            self.__responses.move_to_end(key)
+            return cached
+
+    def is_fresh(self, cached: CachedResponse) -> bool:
+        """
+        Returns:
+            bool: True if the response can be returned without revalidating it.
+        """
+        return time.monotonic() - cached.validated < self.max_age_seconds
+
+    def put(self, key: str, response: CachedResponse):
+        size = len(response.content)
+        # A response larger than a tenth of the cache (i.e. a huge diff) would evict everything else
+        if size > self.max_size_bytes // 10:
+            return
+        with self.__lock:
+            previous = self.__responses.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous.content)
+            self.__responses[key] = response
+            self.size += size
+            while self.size > self.max_size_bytes and self.__responses:
+                _, evicted = self.__responses.popitem(last=False)
+                self.size -= len(evicted.content)
+
+    def expire(self, path: str, subpaths: bool = True) -> int:
+        """
+        Forces the revalidation of the responses of a resource, i.e. the pages of "/repos/smeup/jariko/branches"
+        after a new branch. The responses keep their ETag, so the pages not changed are still answered with 304.
+
+        Args:
+            path (str): The path of the resource, without the base url.
+            subpaths (bool, optional): If True expires also the resources below path. Defaults to True.
+
+        Returns:
+            int: The responses expired.
+        """
+
+        def matches(url: str) -> bool:
+            url_path = urlsplit(url).path.rstrip("/")
+            return url_path.endswith(path) or (subpaths and f"{path}/" in url_path)
+
+        with self.__lock:
+            expired = 0
+            for response in self.__responses.values():
+                if matches(response.url):
+                    response.validated = float("-inf")
+                    expired += 1
+            return expired
+
+    def record(self, hit: bool):
+        with self.__lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def clear(self):
+        with self.__lock:
+            self.__responses.clear()
+            self.size = 0
+
+    def __len__(self) -> int:
+        return len(self.__responses)
+
+
+def response_cache_key(
+    url: str,
+    headers: Optional[Dict[str, str]],
+    params: Optional[Dict[str, Any]],
+) -> str:
+    """The key of a response: the url, the query, the media type and the credentials (hashed)"""
+    value = repr(
+        (
+            url,
+            sorted((params or {}).items()),
+            sorted((headers or {}).items()),
+        )
+    )
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+__response_cache: Optional[ResponseCache] = None
+__http_session: Optional[requests.Session] = None
+__shared_lock = Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """
+    Returns:
+        ResponseCache: The response cache of the process, sized by GITHUB_RESPONSE_CACHE_MB.
+    """
+    global __response_cache
+    with __shared_lock:
+        if __response_cache is None:
+            __response_cache = ResponseCache(
+                max_size_bytes=settings.github_response_cache_mb * 1024 * 1024,
+                max_age_seconds=settings.github_response_max_age_seconds,
+            )
+        return __response_cache
+
+
+def __get_http_session() -> requests.Session:
+    global __http_session
+    with __shared_lock:
+        if __http_session is None:
+            __http_session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=MAX_POOLED_CONNECTIONS,
+                pool_maxsize=MAX_POOLED_CONNECTIONS,
+            )
+            __http_session.mount("https://", adapter)
+            __http_session.mount("http://", adapter)
+        return __http_session
+
+
+def get(
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    params: Optional[Dict[str, Any]] = None,
+) -> requests.Response:
+    """
+    Performs a GET request against the GitHub API with a timeout bounded by the current deadline.
+    The connections are pooled and the responses with an ETag are revalidated through the response cache.
+    The request is traced as a github span with its endpoint template, page, status, bytes and cache outcome.
+
+    Args:
+        url (str): The url to call.
+        headers (Dict[str, str], optional): The request headers. Defaults to None.
+        params (Dict[str, Any], optional): The query parameters. Defaults to None.
+
+    Returns:
+        requests.Response: The response, a CachedResponse when it comes from the response cache.
+
+    Raises:
+        DeadlineExceededError: If the deadline has been reached.
+        RequestBudgetExceededError: If the request budget of the context is exhausted.
+    """
+    with span(
+        GITHUB_SPAN, endpoint_template(url), page=page_number(url, params)
+    ) as request:
+        cache = get_response_cache()
+        key = response_cache_key(url, headers, params)
+        cached = cache.lookup(key)
+        if cached is not None and cache.is_fresh(cached):
+            cache.record(hit=True)
+            request.set(status=cached.status_code, bytes=0, cache="fresh")
+            return cached
+        __check_request_budget()
+        if __rate_limiter is not None:
+            __rate_limiter.acquire()
+        request_headers = dict(headers or {})
+        if cached is not None:
+            request_headers["If-None-Match"] = cached.etag
+        response = __get_http_session().get(
+            url, headers=request_headers, params=params, timeout=get_timeout()
+        )
+        __trace_response(request, cached, response)
+        return __on_response(cache, key, cached, response)
+
+
+def __trace_response(request: Span, cached: Optional[CachedResponse], response: Any):
+    request.set(
+        status=response.status_code,
+        bytes=len(response.content),
+        cache=(
+            "revalidated"
+            if cached is not None and response.status_code == 304
+            else "miss"
+        ),
+    )
+
+
+def __on_response(
+    cache: ResponseCache,
+    key: str,
+    cached: Optional[CachedResponse],
+    response: Any,
+) -> Any:
+    request = getattr(response, "request", None)
+    __update_rate_limit(
+        response.headers,
+        request.headers.get("Authorization") if request is not None else None,
+    )
+    if cached is not None and response.status_code == 304:
+        cache.record(hit=True)
+        cached.validated = time.monotonic()
+        return cached
+    budget = __request_budget.get()
+    if budget is not None:
+        budget.used += 1
+    cache.record(hit=False)
+    if response.status_code == 200 and response.headers.get("ETag"):
+        cache.put(key, CachedResponse(response))
+    return response
+
+
+class _AsyncSession:
+    def __init__(self):
+        # httpx is imported by the first async request
+        import httpx
+
+        self.client = httpx.AsyncClient(follow_redirects=True, timeout=None)
+        self.semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+
+# An httpx client is bound to the event loop which created it, so we keep one for each loop.
+# The entries disappear together with their loop (i.e. at the end of asyncio.run)
+__sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _AsyncSession]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def __get_session() -> _AsyncSession:
+    loop = asyncio.get_running_loop()
+    session = __sessions.get(loop)
+    if session is None:
+        session = _AsyncSession()
+        __sessions[loop] = session
+    return session
+
+
+async def aget(
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    params: Optional[Dict[str, Any]] = None,
+) -> "httpx.Response":
+    """
+    Performs an asynchronous GET request against the GitHub API with a timeout bounded by the current deadline.
+    The connections are pooled, the number of concurrent requests is limited to MAX_CONCURRENT_REQUESTS
+    and the responses with an ETag are revalidated through the response cache.
+    The request is traced as get does.
+
+    Args:
+        url (str): The url to call.
+        headers (Dict[str, str], optional): The request headers. Defaults to None.
+        params (Dict[str, Any], optional): The query parameters. Defaults to None.
+
+    Returns:
+        httpx.Response: The response, it exposes status_code, text, json() and links like requests.Response.
+            A CachedResponse when it comes from the response cache.
+
+    Raises:
+        DeadlineExceededError: If the deadline has been reached.
+        RequestBudgetExceededError: If the request budget of the context is exhausted.
+    """
+    with span(
+        GITHUB_SPAN, endpoint_template(url), page=page_number(url, params)
+    ) as request:
+        cache = get_response_cache()
+        key = response_cache_key(url, headers, params)
+        cached = cache.lookup(key)
+        if cached is not None and cache.is_fresh(cached):
+            cache.record(hit=True)
+            request.set(status=cached.status_code, bytes=0, cache="fresh")
+            return cached
+        __check_request_budget()
+        session = __get_session()
+        if __rate_limiter is not None:
+            await __rate_limiter.aacquire()
+        request_headers = dict(headers or {})
+        if cached is not None:
+            request_headers["If-None-Match"] = cached.etag
+        async with session.semaphore:
+            response = await session.client.get(
+                url, headers=request_headers, params=params, timeout=get_timeout()
+            )
+        __trace_response(request, cached, response)
+        return __on_response(cache, key, cached, response)
@@ -0,0 +1,196 @@
+import hashlib
+import os
+import sqlite3
+import time
+import warnings
+from enum import Enum
+from threading import Lock
+from typing import Any, Optional
+
+from langchain_core._api import LangChainBetaWarning
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+
+from chat_with_repo.settings import settings
+
+# The key of the generation info marking the responses returned by the cache, they cost nothing
+CACHE_HIT_INFO = "llm_cache_hit"
+
+
+class LLMCacheMode(Enum):
+    OFF = "off"
+    # Returns the cached responses and stores the new ones
+    READ_WRITE = "read_write"
+    # Always calls the model and stores the responses, i.e. to refresh the recordings
+    RECORD = "record"
+    # Only returns the cached responses, a missing one is an error, i.e. to run tests and benchmarks offline
+    REPLAY = "replay"
+
+
+class LLMCacheMissError(Exception):
+    def __init__(self, llm_string: str):
+        super().__init__(
+            "No recorded response for the prompt in replay mode, "
+            f"record it with LLM_CACHE_MODE=record. Model: {llm_string[:200]}"
+        )
+
+
+class SQLiteLLMCache(BaseCache):
+    """
+    LLM cache stored in a SQLite database.
+    The responses are keyed by the hash of the prompt (the serialized messages) and of the llm string
+    (model, parameters and tools), when the database exceeds max_size_bytes the least recently used
+    responses are evicted.
+
+    Attributes:
+        path (str): The path of the database.
+        max_size_bytes (int): The maximum size of the stored responses.
+        mode (LLMCacheMode): The cache mode.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_size_bytes: int = 100 * 1024 * 1024,
+        mode: LLMCacheMode = LLMCacheMode.READ_WRITE,
+    ):
+        self.path = path
+        self.max_size_bytes = max_size_bytes
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self.__lock = Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.__connection = sqlite3.connect(path, check_same_thread=False)
+        with self.__lock, self.__connection:
+            self.__connection.execute("PRAGMA journal_mode=WAL")
+            self.__connection.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    llm_string TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                )
+                """)
+            self.__connection.execute(
+                "CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed)"
+            )
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        if self.mode == LLMCacheMode.RECORD:
+            return None
+        key = cache_key(prompt, llm_string)
+        with self.__lock, self.__connection:
+            row = self.__connection.execute(
+                "SELECT value FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                self.__connection.execute(
+                    "UPDATE llm_cache SET accessed = ? WHERE key = ?",
+                    (time.time(), key),
+                )
+        if row is None:
+            self.misses += 1
+            if self.mode == LLMCacheMode.REPLAY:
+                raise LLMCacheMissError(llm_string)
+            return None
+        self.hits += 1
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", LangChainBetaWarning)
+            generations = loads(row[0])
+        # The stored usage is kept in the message, the mark tells the callbacks not to account it again
+        for generation in generations:
+            generation.generation_info = {
+                **(generation.generation_info or {}),
+                CACHE_HIT_INFO: True,
+            }
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE):
+        if self.mode == LLMCacheMode.REPLAY:
+            return
+        value = dumps(list(return_val))
+        now = time.time()
+        with self.__lock, self.__connection:
+            self.__connection.execute(
+                "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    cache_key(prompt, llm_string),
+                    llm_string,
+                    value,
+                    len(value),
+                    now,
+                    now,
+                ),
+            )
+            self.__evict()
+
+    def clear(self, **kwargs: Any):
+        with self.__lock, self.__connection:
+            self.__connection.execute("DELETE FROM llm_cache")
+
+    def size(self) -> int:
+        with self.__lock:
+            return self.__size()
+
+    def __size(self) -> int:
+        return self.__connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM llm_cache"
+        ).fetchone()[0]
+
+    def __evict(self):
+        excess = self.__size() - self.max_size_bytes
+        if excess <= 0:
+            return
+        evicted = 0
+        keys = []
+        for key, size in self.__connection.execute(
+            "SELECT key, size FROM llm_cache ORDER BY accessed"
+        ):
+            keys.append((key,))
+            evicted += size
+            if evicted >= excess:
+                break
+        self.__connection.executemany("DELETE FROM llm_cache WHERE key = ?", keys)
+
+
+def cache_key(prompt: str, llm_string: str) -> str:
+    return hashlib.sha256(f"{llm_string}\n{prompt}".encode()).hexdigest()
+
+
+__llm_cache: Optional[SQLiteLLMCache] = None
+__llm_cache_lock = Lock()
+
+
+def get_default_llm_cache() -> Optional[BaseCache]:
+    """
+    Returns the LLM cache configured through LLM_CACHE_MODE, LLM_CACHE_PATH and LLM_CACHE_MAX_SIZE_MB,
+    shared by all the models of the process.
+
+    Returns:
+        Optional[BaseCache]: The cache, None if LLM_CACHE_MODE is off.
+    """
+    global __llm_cache
+    mode = LLMCacheMode(settings.llm_cache_mode)
+    if mode == LLMCacheMode.OFF:
+        return None
+    with __llm_cache_lock:
+        if __llm_cache is None:
+            __llm_cache = SQLiteLLMCache(
+                path=settings.llm_cache_path,
+                max_size_bytes=settings.llm_cache_max_size_mb * 1024 * 1024,
+                mode=mode,
+            )
+        return __llm_cache
+
+
+def get_created_llm_cache() -> Optional[SQLiteLLMCache]:
+    """
+    Returns:
+        Optional[SQLiteLLMCache]: The LLM cache of the process if a model already created it, None otherwise.
+    """
+    return __llm_cache
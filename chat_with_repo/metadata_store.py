@@ -0,0 +1,123 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from chat_with_repo.settings import settings
+
+# How long a pull request is reused before asking it again to GitHub
+PULL_REQUEST_TTL_SECONDS = 60
+# A commit contained in a branch or tag stays contained, unless the branch is force pushed
+ANCESTOR_TTL_SECONDS = 24 * 3600
+# A commit not yet contained in a branch can be merged at any time
+NOT_ANCESTOR_TTL_SECONDS = 60
+# The entries written by the webhooks, the next events keep them up to date
+WEBHOOK_TTL_SECONDS = 3600
+
+PULL_REQUESTS = "pull_requests"
+ANCESTRY = "ancestry"
+
+# The marker of a missing entry, None is a valid value (i.e. a pull request not found)
+MISSING = object()
+
+
+class MetadataStore:
+    """
+    The repository metadata shared by all the sessions of the process: the pull requests by number and the
+    ancestry of the commits (is the commit contained in the branch, tag or commit). Each entry expires after
+    its own TTL and each table keeps at most max_entries, evicting the least recently used.
+
+    Attributes:
+        max_entries (int): The maximum number of entries of each table.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.__tables: Dict[str, "OrderedDict[Hashable, Tuple[Any, float]]"] = {}
+        self.__lock = Lock()
+
+    def get(self, table: str, key: Hashable) -> Any:
+        """
+        Returns:
+            Any: The value, MISSING if not stored or expired.
+        """
+        with self.__lock:
+            entries = self.__tables.get(table)
+            entry = entries.get(key) if entries is not None else None
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del entries[key]
+                self.misses += 1
+                return MISSING
+            entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, table: str, key: Hashable, value: Any, ttl_seconds: float):
+        with self.__lock:
+            entries = self.__tables.setdefault(table, OrderedDict())
+            entries[key] = (value, time.monotonic() + ttl_seconds)
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def invalidate(self, table: str, key: Optional[Hashable] = None):
+        """Removes an entry or, if key is None, the whole table"""
+        with self.__lock:
+            entries = self.__tables.get(table)
+            if entries is None:
+                return
+            if key is None:
+                entries.clear()
+            else:
+                entries.pop(key, None)
+
+    def invalidate_where(
+        self, table: str, predicate: Callable[[Hashable, Any], bool]
+    ) -> int:
+        """
+        Removes the entries of the table matching the predicate, i.e. the ancestry of a force pushed branch.
+
+        Args:
+            table (str): The table.
+            predicate (Callable[[Hashable, Any], bool]): Receives the key and the value of each entry.
+
+        Returns:
+            int: The entries removed.
+        """
+        with self.__lock:
+            entries = self.__tables.get(table)
+            if entries is None:
+                return 0
+            keys = [key for key, entry in entries.items() if predicate(key, entry[0])]
+            for key in keys:
+                del entries[key]
+            return len(keys)
+
+    def clear(self):
+        with self.__lock:
+            self.__tables.clear()
+
+    def sizes(self) -> Dict[str, int]:
+        with self.__lock:
+            return {table: len(entries) for table, entries in self.__tables.items()}
+
+
+__metadata_store: Optional[MetadataStore] = None
+__metadata_store_lock = Lock()
+
+
+def get_metadata_store() -> MetadataStore:
+    """
+    Returns:
+        MetadataStore: The metadata store of the process, sized by METADATA_STORE_MAX_ENTRIES.
+    """
+    global __metadata_store
+    with __metadata_store_lock:
+        if __metadata_store is None:
+            __metadata_store = MetadataStore(
+                max_entries=settings.metadata_store_max_entries
+            )
+        return __metadata_store
@@ -0,0 +1,381 @@
+"""
+Prometheus metrics of the process: the tool invocations, the GitHub requests by endpoint and status, the rate limit
+remaining for each token, the hit ratio of each cache, the tokens of the models and the active sessions.
+The counters are fed by the spans of tracing, the gauges are read from the caches and the GitHub client when
+the metrics are scraped.
+
+The metrics are served in the Prometheus text format on http://<METRICS_ADDRESS>:<METRICS_PORT>/metrics
+by a tornado server running in the process of the app, because the caches and the spans live in the process.
+"""
+
+import asyncio
+import threading
+import time
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Tuple
+
+import tornado.httpserver
+import tornado.netutil
+import tornado.web
+
+from chat_with_repo.github_client import get_rate_limits
+from chat_with_repo.tracing import (
+    GITHUB_SPAN,
+    LLM_SPAN,
+    TOOL_SPAN,
+    TURN_SPAN,
+    Span,
+    add_span_listener,
+    latency_histograms,
+)
+
+METRICS_PATH = "/metrics"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# A session without turns nor page runs for this long is no longer active
+SESSION_IDLE_SECONDS = 30 * 60
+
+# The type and the help of each metric
+METRICS = {
+    "chat_turns_total": ("counter", "The turns answered by repository."),
+    "chat_tool_invocations_total": ("counter", "The tool calls by tool and outcome."),
+    "chat_github_requests_total": (
+        "counter",
+        "The GitHub requests by endpoint, status and use of the response cache.",
+    ),
+    "chat_github_response_bytes_total": (
+        "counter",
+        "The bytes of the GitHub responses received by endpoint.",
+    ),
+    "chat_llm_calls_total": ("counter", "The model calls by model and stage."),
+    "chat_llm_tokens_total": (
+        "counter",
+        "The tokens of the model calls by model and direction (input or output).",
+    ),
+    "chat_span_duration_seconds": (
+        "histogram",
+        "The duration of the turns, model calls, tool calls and GitHub requests.",
+    ),
+    "chat_github_rate_limit_remaining": (
+        "gauge",
+        "The requests left to each token in the rate limit window of the last response.",
+    ),
+    "chat_github_rate_limit_limit": (
+        "gauge",
+        "The requests allowed to each token in a rate limit window.",
+    ),
+    "chat_github_rate_limit_reset_timestamp_seconds": (
+        "gauge",
+        "The epoch seconds when the rate limit window of each token resets.",
+    ),
+    "chat_cache_hits_total": ("counter", "The hits of each cache layer."),
+    "chat_cache_misses_total": ("counter", "The misses of each cache layer."),
+    "chat_cache_hit_ratio": (
+        "gauge",
+        "The hits over the lookups of each cache layer since the start.",
+    ),
+    "chat_active_sessions": (
+        "gauge",
+        f"The sessions active in the last {SESSION_IDLE_SECONDS} seconds.",
+    ),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Metrics:
+    """
+    The counters of the process by name and labels and the last activity of each session.
+    """
+
+    def __init__(self, session_idle_seconds: float = SESSION_IDLE_SECONDS):
+        self.session_idle_seconds = session_idle_seconds
+        self.__counters: Dict[str, Dict[Labels, float]] = {}
+        self.__sessions: Dict[str, float] = {}
+        self.__lock = Lock()
+
+    def increment(self, name: str, value: float = 1, **labels):
+        key = tuple(sorted((label, str(text)) for label, text in labels.items()))
+        with self.__lock:
+            counter = self.__counters.setdefault(name, {})
+            counter[key] = counter.get(key, 0) + value
+
+    def counter(self, name: str, **labels) -> float:
+        """
+        Returns:
+            float: The value of the counter with exactly these labels, 0 if never incremented.
+        """
+        key = tuple(sorted((label, str(text)) for label, text in labels.items()))
+        with self.__lock:
+            return self.__counters.get(name, {}).get(key, 0)
+
+    def observe_span(self, span: Span):
+        """Updates the counters with a finished span, it is registered as span listener"""
+        attributes = span.attributes
+        if span.name == TURN_SPAN:
+            self.increment("chat_turns_total", repo=span.label)
+        elif span.name == TOOL_SPAN:
+            self.increment(
+                "chat_tool_invocations_total",
+                tool=span.label,
+                status="error" if attributes.get("error") else "ok",
+            )
+        elif span.name == GITHUB_SPAN:
+            self.increment(
+                "chat_github_requests_total",
+                endpoint=span.label,
+                status=attributes.get("status", "error"),
+                cache=attributes.get("cache", "miss"),
+            )
+            if attributes.get("bytes"):
+                self.increment(
+                    "chat_github_response_bytes_total",
+                    attributes["bytes"],
+                    endpoint=span.label,
+                )
+        elif span.name == LLM_SPAN:
+            self.increment(
+                "chat_llm_calls_total",
+                model=span.label,
+                stage=attributes.get("stage", "unknown"),
+            )
+            for direction in ["input", "output"]:
+                tokens = attributes.get(f"{direction}_tokens", 0)
+                if tokens:
+                    self.increment(
+                        "chat_llm_tokens_total",
+                        tokens,
+                        model=span.label,
+                        direction=direction,
+                    )
+
+    def touch_session(self, session_id: str):
+        """Records an activity of the session, i.e. a run of the page"""
+        with self.__lock:
+            self.__sessions[session_id] = time.monotonic()
+
+    def active_sessions(self) -> int:
+        """
+        Returns:
+            int: The sessions with an activity in the last session_idle_seconds, the others are forgotten.
+        """
+        oldest = time.monotonic() - self.session_idle_seconds
+        with self.__lock:
+            for session_id in [
+                session_id
+                for session_id, last_seen in self.__sessions.items()
+                if last_seen < oldest
+            ]:
+                del self.__sessions[session_id]
+            return len(self.__sessions)
+
+    def render(self, caches: Optional[Dict[str, Tuple[int, int]]] = None) -> str:
+        """
+        Renders the metrics in the Prometheus text format.
+
+        Args:
+            caches (Optional[Dict[str, Tuple[int, int]]], optional): The hits and the misses of each cache layer,
+                see Resources.cache_counters. Defaults to None.
+
+        Returns:
+            str: The exposition of all the metrics.
+        """
+        samples: Dict[str, List[Tuple[str, Labels, float]]] = {}
+        with self.__lock:
+            for name, counter in self.__counters.items():
+                samples[name] = [
+                    (name, labels, value) for labels, value in sorted(counter.items())
+                ]
+        durations = samples.setdefault("chat_span_duration_seconds", [])
+        for (name, label), histogram in sorted(latency_histograms.histograms().items()):
+            labels = (("label", label), ("span", name))
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                durations.append(
+                    (
+                        "chat_span_duration_seconds_bucket",
+                        labels + (("le", _format_value(bound)),),
+                        cumulative,
+                    )
+                )
+            durations.append(
+                (
+                    "chat_span_duration_seconds_bucket",
+                    labels + (("le", "+Inf"),),
+                    histogram.count,
+                )
+            )
+            durations.append(("chat_span_duration_seconds_sum", labels, histogram.sum))
+            durations.append(
+                ("chat_span_duration_seconds_count", labels, histogram.count)
+            )
+        for token, rate_limit in sorted(get_rate_limits().items()):
+            labels = (("token", token),)
+            for name, value in [
+                ("chat_github_rate_limit_remaining", rate_limit.remaining),
+                ("chat_github_rate_limit_limit", rate_limit.limit),
+                ("chat_github_rate_limit_reset_timestamp_seconds", rate_limit.reset),
+            ]:
+                samples.setdefault(name, []).append((name, labels, value))
+        for layer, (hits, misses) in sorted((caches or {}).items()):
+            labels = (("layer", layer),)
+            for name, value in [
+                ("chat_cache_hits_total", hits),
+                ("chat_cache_misses_total", misses),
+                (
+                    "chat_cache_hit_ratio",
+                    hits / (hits + misses) if hits + misses else 0,
+                ),
+            ]:
+                samples.setdefault(name, []).append((name, labels, value))
+        samples["chat_active_sessions"] = [
+            ("chat_active_sessions", (), self.active_sessions())
+        ]
+        lines = []
+        for name, (kind, description) in METRICS.items():
+            if not samples.get(name):
+                continue
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample_name, labels, value in samples[name]:
+                lines.append(
+                    f"{sample_name}{_format_labels(labels)} {_format_value(value)}"
+                )
+        return "\n".join(lines) + "\n"
+
+
+# Single underscore: the helpers are called from the methods of Metrics, where __names are mangled
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return (
+        "{" + ",".join(f'{label}="{_escape(value)}"' for label, value in labels) + "}"
+    )
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+__metrics: Optional[Metrics] = None
+__metrics_lock = Lock()
+
+
+def get_metrics() -> Metrics:
+    """
+    Returns:
+        Metrics: The metrics of the process, created on first access and fed by the spans from then on.
+    """
+    global __metrics
+    with __metrics_lock:
+        if __metrics is None:
+            __metrics = Metrics()
+            add_span_listener(__metrics.observe_span)
+        return __metrics
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    def initialize(
+        self,
+        metrics: Metrics,
+        caches: Optional[Callable[[], Dict[str, Tuple[int, int]]]],
+    ):
+        self.metrics = metrics
+        self.caches = caches
+
+    def get(self):
+        self.set_header("Content-Type", CONTENT_TYPE)
+        self.write(self.metrics.render(self.caches() if self.caches else None))
+
+
+class MetricsServer:
+    """
+    Serves the metrics in a daemon thread with its own event loop, alongside Streamlit.
+
+    Attributes:
+        port (int): The port, 0 to pick a free one.
+        address (str): The address to bind. Defaults to the loopback interface.
+    """
+
+    def __init__(
+        self,
+        port: int,
+        address: str = "127.0.0.1",
+        metrics: Optional[Metrics] = None,
+        caches: Optional[Callable[[], Dict[str, Tuple[int, int]]]] = None,
+    ):
+        self.port = port
+        self.address = address
+        self.__application = tornado.web.Application(
+            [
+                (
+                    METRICS_PATH,
+                    MetricsHandler,
+                    {"metrics": metrics or get_metrics(), "caches": caches},
+                )
+            ]
+        )
+        self.__loop = asyncio.new_event_loop()
+        self.__server: Optional[tornado.httpserver.HTTPServer] = None
+        self.__started = threading.Event()
+        self.__error: Optional[Exception] = None
+        self.__thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """
+        Starts the server and waits until it listens.
+
+        Raises:
+            Exception: The error of the server that cannot listen, i.e. the port is in use.
+        """
+        self.__thread = threading.Thread(
+            target=self.__run, name="metrics-server", daemon=True
+        )
+        self.__thread.start()
+        if not self.__started.wait(10):
+            raise TimeoutError("The metrics server did not start in 10 seconds")
+        if self.__error is not None:
+            self.__thread = None
+            raise self.__error
+
+    def stop(self):
+        if self.__thread is None:
+            return
+
+        def shutdown():
+            if self.__server is not None:
+                self.__server.stop()
+            self.__loop.stop()
+
+        self.__loop.call_soon_threadsafe(shutdown)
+        self.__thread.join(10)
+        self.__thread = None
+
+    def __run(self):
+        asyncio.set_event_loop(self.__loop)
+        try:
+            self.__loop.run_until_complete(self.__listen())
+        except Exception as e:
+            # Raised by start in the thread of the caller
+            self.__error = e
+            self.__loop.close()
+            self.__started.set()
+            return
+        self.__started.set()
+        self.__loop.run_forever()
+        self.__loop.close()
+
+    async def __listen(self):
+        self.__server = tornado.httpserver.HTTPServer(self.__application)
+        sockets = tornado.netutil.bind_sockets(self.port, address=self.address or None)
+        self.__server.add_sockets(sockets)
+        # With port 0 the system picks a free port
+        self.port = sockets[0].getsockname()[1]
+        print(f"Metrics served on http://{self.address}:{self.port}{METRICS_PATH}")
@@ -1,14 +1,14 @@
-from typing import Type
+from typing import Any, Type
 from langchain_core.pydantic_v1 import BaseModel, Field
 from langchain_core.tools import BaseTool
 
 from chat_with_repo.model import Repo, State
 
 
-
 class SelectGitHubRepoSchema(BaseModel):
     repo: Repo = Field(..., description="The name of the GitHub repository.")
 
+
 class SelectGitHubRepoTool(BaseTool):
     state: State
     args_schema: Type[BaseModel] = SelectGitHubRepoSchema
@@ -18,5 +18,33 @@ class SelectGitHubRepoTool(BaseTool):
     def _run(self, repo: Repo):
         self.state.repo = repo
         return "Ok!"
-    
-    
\ No newline at end of file
+
+    async def _arun(self, repo: Repo):
+        return self._run(repo)
+
+
+class GetReferenceSchema(BaseModel):
+    reference: str = Field(
+        ..., description="The reference of the stored output, i.e. output-1."
+    )
+
+
+class GetReferenceTool(BaseTool):
+    """
+    Returns a large output of a previous answer (i.e. a code review) that the chat history (a chat_history.ChatHistory)
+    has stored by reference and replays only as an excerpt.
+    """
+
+    chat_history: Any
+    args_schema: Type[BaseModel] = GetReferenceSchema
+    name: str = "get_reference"
+    description = "A tool that returns the full text of a long output of a previous answer stored by reference."
+
+    def _run(self, reference: str):
+        output = self.chat_history.get_reference(reference)
+        if output is None:
+            return f"No output is stored as {reference}."
+        return output
+
+    async def _arun(self, reference: str):
+        return self._run(reference)
@@ -1,8 +1,10 @@
 from datetime import datetime
-from typing import Callable, List, Optional
+from typing import TYPE_CHECKING, Callable, List, Optional
 from pydantic import BaseModel
 from enum import Enum
-from langchain_core.messages import BaseMessage
+
+if TYPE_CHECKING:
+    from langchain_core.messages import BaseMessage
 
 
 class Repo(Enum):
@@ -32,7 +34,7 @@ class Repo(Enum):
 
 
 class State:
-    def __init__(self, repo: Repo = Repo.jariko, messages: List[BaseMessage] = []):
+    def __init__(self, repo: Repo = Repo.jariko, messages: List["BaseMessage"] = []):
         """Initializes a new instance of the State
 
         Args:
@@ -41,7 +43,7 @@ class State:
         """
         self._repo: Repo = repo
         self.on_change_repo: Callable[[Repo], None] = None
-        self.messages: List[BaseMessage] = messages
+        self.messages: List["BaseMessage"] = messages
 
     def is_repo_selected(self):
         return self.repo is not None
@@ -126,7 +128,7 @@ class CommitFilter(BaseModel):
 
 
 class PullRequestState(Enum):
-    OPENED = "opened"
+    OPENED = "open"
     CLOSED = "closed"
     ALL = "all"
 
@@ -148,3 +150,16 @@ class PullRequestFilter(BaseModel):
     opened_from_branch: Optional[str] = None
     target_branch: str = "develop"
     state: PullRequestState = PullRequestState.ALL
+
+
+class ToolEvent(BaseModel):
+    """
+    Represents a tool invoked by the agent while the answer is streamed.
+
+    Attributes:
+        name (str): The name of the tool.
+        input (str): The input of the tool.
+    """
+
+    name: str
+    input: str
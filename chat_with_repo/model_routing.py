@@ -0,0 +1,270 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from langchain_core.messages import AIMessage
+from langchain_core.prompts.chat import ChatPromptTemplate
+from langchain_core.rate_limiters import BaseRateLimiter
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from langchain_core.runnables import RunnablePassthrough
+from langchain_core.tools import BaseTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from chat_with_repo.github_client import create_rate_limiter
+from chat_with_repo.llm_cache import get_default_llm_cache
+from chat_with_repo.pricing import estimate_cost
+from chat_with_repo.settings import settings
+from chat_with_repo.tracing import LLM_SPAN, Span
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
+
+# The stages of a turn using a model
+AGENT_STAGE = "agent"
+AGENT_ESCALATION_STAGE = "agent_escalation"
+CODE_REVIEW_STAGE = "code_review"
+SUMMARY_STAGE = "summary"
+
+
+class StageStats:
+    """
+    Latency, tokens and cost of the model calls of each stage, accumulated by the whole process
+    in order to tune the routing. The model calls are read from the llm spans of the turns, like the usage.
+    """
+
+    def __init__(self):
+        self.__stats: Dict[str, Dict[str, Any]] = {}
+        self.__lock = Lock()
+
+    def record(
+        self,
+        stage: str,
+        model: str,
+        seconds: float,
+        input_tokens: int,
+        output_tokens: int,
+    ):
+        with self.__lock:
+            stats = self.__get(stage)
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+            stats["input_tokens"] += input_tokens
+            stats["output_tokens"] += output_tokens
+            stats["cost"] += estimate_cost(model, input_tokens, output_tokens)
+            stats["models"][model] = stats["models"].get(model, 0) + 1
+
+    def record_spans(self, root: Span):
+        """Records the finished model calls traced under a span, i.e. a turn or a review job"""
+        for _, descendant in root.walk():
+            if descendant.name != LLM_SPAN or descendant.duration_seconds is None:
+                continue
+            self.record(
+                descendant.attributes.get("stage", "unknown"),
+                descendant.label,
+                descendant.duration_seconds,
+                descendant.attributes.get("input_tokens", 0),
+                descendant.attributes.get("output_tokens", 0),
+            )
+
+    def record_escalation(self, stage: str):
+        with self.__lock:
+            self.__get(stage)["escalations"] += 1
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns:
+            Dict[str, Dict[str, Any]]: For each stage calls, escalations, seconds, average seconds,
+                input and output tokens, cost in USD and calls by model.
+        """
+        with self.__lock:
+            return {
+                stage: {
+                    **stats,
+                    "models": dict(stats["models"]),
+                    "avg_seconds": (
+                        stats["seconds"] / stats["calls"] if stats["calls"] else 0.0
+                    ),
+                }
+                for stage, stats in self.__stats.items()
+            }
+
+    def reset(self):
+        with self.__lock:
+            self.__stats.clear()
+
+    def __get(self, stage: str) -> Dict[str, Any]:
+        return self.__stats.setdefault(
+            stage,
+            {
+                "calls": 0,
+                "escalations": 0,
+                "seconds": 0.0,
+                "input_tokens": 0,
+                "output_tokens": 0,
+                "cost": 0.0,
+                "models": {},
+            },
+        )
+
+
+# The statistics of the process
+stage_stats = StageStats()
+
+
+# The maximum number of models (and of their HTTP connection pools) shared by the sessions
+MAX_CHAT_MODELS = 32
+
+# The limiter shared by all the model calls of the process, None for no limit
+__llm_rate_limiter: Optional[BaseRateLimiter] = None
+
+# The models already created, by stage, model name and parameters
+__chat_models: "OrderedDict[tuple, ChatOpenAI]" = OrderedDict()
+__chat_models_lock = Lock()
+
+
+def set_llm_rate_limit(requests_per_second: Optional[float]):
+    """
+    Limits the model calls of the whole process.
+
+    Args:
+        requests_per_second (Optional[float]): The maximum average rate, None removes the limit.
+    """
+    global __llm_rate_limiter
+    with __chat_models_lock:
+        __llm_rate_limiter = create_rate_limiter(requests_per_second)
+        # The models hold the previous limiter
+        __chat_models.clear()
+
+
+def create_chat_model(stage: str, model: str, **kwargs: Any) -> "ChatOpenAI":
+    """
+    Returns the model of a stage, the stage is stored in the metadata of the calls.
+    The models are shared by all the sessions of the process, so they reuse the same HTTP connections.
+
+    Args:
+        stage (str): The stage, i.e. AGENT_STAGE.
+        model (str): The model name.
+        **kwargs: The other ChatOpenAI parameters.
+
+    Returns:
+        ChatOpenAI: The model.
+    """
+    # langchain_openai is imported by the first model, the modules using this one import faster
+    from langchain_openai import ChatOpenAI
+
+    key = (stage, model, tuple(sorted(kwargs.items())))
+    with __chat_models_lock:
+        chat_model = __chat_models.get(key)
+        if chat_model is None:
+            chat_model = ChatOpenAI(
+                model=model,
+                api_key=settings.openai_api_key,
+                stream_usage=True,
+                cache=get_default_llm_cache(),
+                metadata={"stage": stage},
+                rate_limiter=__llm_rate_limiter,
+                **kwargs,
+            )
+            __chat_models[key] = chat_model
+            while len(__chat_models) > MAX_CHAT_MODELS:
+                __chat_models.popitem(last=False)
+        __chat_models.move_to_end(key)
+        return chat_model
+
+
+def clear_chat_models():
+    with __chat_models_lock:
+        __chat_models.clear()
+
+
+def create_routed_agent(
+    llm: Runnable,
+    tools: List[BaseTool],
+    prompt: ChatPromptTemplate,
+    escalation_llm: Optional[Runnable] = None,
+) -> Runnable:
+    """
+    Creates an agent like create_openai_tools_agent where each step is planned by llm and, when llm does not
+    produce a valid tool call (unknown tool, malformed or invalid arguments), by escalation_llm.
+
+    Args:
+        llm (Runnable): The small fast model.
+        tools (List[BaseTool]): The tools.
+        prompt (ChatPromptTemplate): The prompt, it must have the agent_scratchpad placeholder.
+        escalation_llm (Optional[Runnable], optional): The stronger model. Defaults to None, no escalation.
+
+    Returns:
+        Runnable: The agent.
+    """
+    from langchain.agents.format_scratchpad.openai_tools import (
+        format_to_openai_tool_messages,
+    )
+    from langchain.agents.output_parsers.openai_tools import (
+        OpenAIToolsAgentOutputParser,
+    )
+
+    openai_tools = [convert_to_openai_tool(tool) for tool in tools]
+    llm_with_tools = llm.bind(tools=openai_tools)
+    if escalation_llm is None:
+        planner = llm_with_tools
+    else:
+        escalation_llm_with_tools = escalation_llm.bind(tools=openai_tools)
+
+        def plan(messages: Any, config: RunnableConfig) -> AIMessage:
+            response = llm_with_tools.invoke(messages, config)
+            reason = describe_invalid_tool_call(response, tools)
+            if reason is None:
+                return response
+            stage_stats.record_escalation(AGENT_STAGE)
+            print(f"Escalating the agent step: {reason}")
+            return escalation_llm_with_tools.invoke(messages, config)
+
+        async def aplan(messages: Any, config: RunnableConfig) -> AIMessage:
+            response = await llm_with_tools.ainvoke(messages, config)
+            reason = describe_invalid_tool_call(response, tools)
+            if reason is None:
+                return response
+            stage_stats.record_escalation(AGENT_STAGE)
+            print(f"Escalating the agent step: {reason}")
+            return await escalation_llm_with_tools.ainvoke(messages, config)
+
+        planner = RunnableLambda(plan, afunc=aplan, name="routed_agent_model")
+
+    return (
+        RunnablePassthrough.assign(
+            agent_scratchpad=lambda x: format_to_openai_tool_messages(
+                x["intermediate_steps"]
+            )
+        )
+        | prompt
+        | planner
+        | OpenAIToolsAgentOutputParser()
+    )
+
+
+def is_valid_tool_call(response: AIMessage, tools: List[BaseTool]) -> bool:
+    """
+    Returns True if the response is a final answer or all its tool calls name a tool and have valid arguments.
+    """
+    return describe_invalid_tool_call(response, tools) is None
+
+
+def describe_invalid_tool_call(
+    response: AIMessage, tools: List[BaseTool]
+) -> Optional[str]:
+    """Returns why the tool calls of the response are not valid, None if they are valid"""
+    if response.invalid_tool_calls:
+        return f"malformed tool call {response.invalid_tool_calls[0].get('name')}"
+    if not response.tool_calls and not response.content:
+        return "empty response"
+    tools_by_name = {tool.name: tool for tool in tools}
+    for tool_call in response.tool_calls:
+        tool = tools_by_name.get(tool_call["name"])
+        if tool is None:
+            return f"unknown tool {tool_call['name']}"
+        if tool.args_schema is not None:
+            try:
+                tool.args_schema.parse_obj(tool_call["args"])
+            except Exception as e:
+                return f"invalid arguments for {tool.name}: {e}"
+    return None
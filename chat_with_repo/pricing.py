@@ -0,0 +1,58 @@
+from typing import Dict, Optional, Tuple
+
+from chat_with_repo.settings import settings
+
+# USD for 1M input and output tokens, the versioned names (i.e. gpt-4o-mini-2024-07-18) match the longest prefix
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4": (30.00, 60.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+
+
+def get_model_prices() -> Dict[str, Tuple[float, float]]:
+    """
+    Returns:
+        Dict[str, Tuple[float, float]]: The MODEL_PRICES updated with the prices of the MODEL_PRICES setting,
+            USD for 1M input and output tokens by model.
+    """
+    return {**MODEL_PRICES, **settings.model_prices}
+
+
+def get_model_price(model: str) -> Optional[Tuple[float, float]]:
+    """
+    Returns the price of a model.
+
+    Args:
+        model (str): The model name.
+
+    Returns:
+        Optional[Tuple[float, float]]: USD for 1M input and output tokens, None if the model is unknown.
+    """
+    prices = get_model_prices()
+    if model in prices:
+        return prices[model]
+    prefixes = [name for name in prices if model.startswith(name)]
+    if not prefixes:
+        return None
+    return prices[max(prefixes, key=len)]
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int) -> float:
+    """
+    Estimates the cost of a model call.
+
+    Args:
+        model (str): The model name.
+        input_tokens (int): The input tokens.
+        output_tokens (int): The output tokens.
+
+    Returns:
+        float: The cost in USD, 0 if the model is unknown.
+    """
+    price = get_model_price(model)
+    if price is None:
+        return 0.0
+    return (input_tokens * price[0] + output_tokens * price[1]) / 1_000_000
@@ -1,21 +1,40 @@
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForToolRun,
+    CallbackManagerForToolRun,
+    Callbacks,
+)
 from langchain_core.pydantic_v1 import BaseModel, Field
 from langchain_core.tools import BaseTool
-from langchain_core.prompts import ChatPromptTemplate
 
 
-from typing import Callable, List, Optional, Tuple, Type
+from typing import Any, Callable, List, Optional, Tuple, Type
 
-from langchain_openai import ChatOpenAI
-import requests
+import asyncio
 import hashlib
 
-from chat_with_repo import GITHUB_TOKEN, MODEL_NAME, OPENAI_API_KEY
+from chat_with_repo.settings import settings
 from chat_with_repo.commit_tools import (
+    aget_commits_by_path,
+    aget_commits_by_pull_request,
+    ais_commit_in_base,
     get_commits_by_path,
     get_commits_by_pull_request,
     is_commit_in_base,
 )
 from chat_with_repo.constants import CODE_REVIEW_SYSTEM_MESSAGE, CODE_REVIEW_TEMPLATE
+from chat_with_repo.github_client import aget, get
+from chat_with_repo.metadata_store import (
+    MISSING,
+    PULL_REQUEST_TTL_SECONDS,
+    PULL_REQUESTS,
+    get_metadata_store,
+)
+from chat_with_repo.model_routing import CODE_REVIEW_STAGE, create_chat_model
+from chat_with_repo.tool_output import (
+    MAX_OUTPUT_TOKENS,
+    encode_pull_request,
+    encode_pull_requests,
+)
 from chat_with_repo.model import (
     Commit,
     FileChange,
@@ -36,9 +55,18 @@ class GetPullRequestByNumberTool(BaseTool):
     name: str = "get_pull_request_by_number"
     description = "Retrieves a pull request by its number."
 
-    def _run(self, number: int) -> Optional[PullRequest]:
-        return get_pull_request_by_number(
-            number=number, owner=self.state.repo.owner, repo=self.state.repo.value
+    def _run(self, number: int) -> str:
+        return encode_pull_request(
+            get_pull_request_by_number(
+                number=number, owner=self.state.repo.owner, repo=self.state.repo.value
+            )
+        )
+
+    async def _arun(self, number: int) -> str:
+        return encode_pull_request(
+            await aget_pull_request_by_number(
+                number=number, owner=self.state.repo.owner, repo=self.state.repo.value
+            )
         )
 
 
@@ -49,16 +77,37 @@ class GetPullRequestsByCommitShema(BaseModel):
 class GetPullRequestsByCommitTool(BaseTool):
     state: State
     topK: int = 10
+    max_output_tokens: int = MAX_OUTPUT_TOKENS
+    output_fields: List[str] = ["number", "title", "state", "head", "base"]
     args_schema: Type[BaseModel] = GetPullRequestsByCommitShema
     name: str = "get_pull_requests_by_commit"
     description = "Retrieves a list of pull requests associated with a specific commit."
 
-    def _run(self, commit_sha: str) -> List[PullRequest]:
-        return get_pull_requests_by_commit(
-            commit_sha=commit_sha,
-            owner=self.state.repo.owner,
-            repo=self.state.repo.value,
-        )[: self.topK]
+    def _run(self, commit_sha: str) -> str:
+        return self.__encode(
+            get_pull_requests_by_commit(
+                commit_sha=commit_sha,
+                owner=self.state.repo.owner,
+                repo=self.state.repo.value,
+            )
+        )
+
+    async def _arun(self, commit_sha: str) -> str:
+        return self.__encode(
+            await aget_pull_requests_by_commit(
+                commit_sha=commit_sha,
+                owner=self.state.repo.owner,
+                repo=self.state.repo.value,
+            )
+        )
+
+    def __encode(self, pull_requests: List[PullRequest]) -> str:
+        return encode_pull_requests(
+            pull_requests[: self.topK],
+            fields=self.output_fields,
+            max_tokens=self.max_output_tokens,
+            total=len(pull_requests),
+        )
 
 
 class GetPullRequestByPathSchema(BaseModel):
@@ -68,14 +117,33 @@ class GetPullRequestByPathSchema(BaseModel):
 class GetPullRequestByPathTool(BaseTool):
     state: State
     topK: int = 10
+    max_output_tokens: int = MAX_OUTPUT_TOKENS
+    output_fields: List[str] = ["number", "title", "author", "state"]
     args_schema: Type[BaseModel] = GetPullRequestByPathSchema
     name: str = "get_pull_requests_by_path"
     description = "Retrieves a list of pull requests associated with a specific file."
 
-    def _run(self, path: str) -> List[PullRequest]:
-        return get_pull_requests_by_path(
-            path=path, owner=self.state.repo.owner, repo=self.state.repo.value
-        )[: self.topK]
+    def _run(self, path: str) -> str:
+        return self.__encode(
+            get_pull_requests_by_path(
+                path=path, owner=self.state.repo.owner, repo=self.state.repo.value
+            )
+        )
+
+    async def _arun(self, path: str) -> str:
+        return self.__encode(
+            await aget_pull_requests_by_path(
+                path=path, owner=self.state.repo.owner, repo=self.state.repo.value
+            )
+        )
+
+    def __encode(self, pull_requests: List[PullRequest]) -> str:
+        return encode_pull_requests(
+            pull_requests[: self.topK],
+            fields=self.output_fields,
+            max_tokens=self.max_output_tokens,
+            total=len(pull_requests),
+        )
 
 
 class GetPullRequestsByCommitShema(BaseModel):
@@ -85,16 +153,37 @@ class GetPullRequestsByCommitShema(BaseModel):
 class GetPullRequestsByCommitTool(BaseTool):
     state: State
     topK: int = 10
+    max_output_tokens: int = MAX_OUTPUT_TOKENS
+    output_fields: List[str] = ["number", "title", "state", "head", "base"]
     args_schema: Type[BaseModel] = GetPullRequestsByCommitShema
     name: str = "get_pull_requests_by_commit"
     description = "Retrieves a list of pull requests associated with a specific commit."
 
-    def _run(self, commit_sha: str) -> List[PullRequest]:
-        return get_pull_requests_by_commit(
-            commit_sha=commit_sha,
-            owner=self.state.repo.owner,
-            repo=self.state.repo.value,
-        )[: self.topK]
+    def _run(self, commit_sha: str) -> str:
+        return self.__encode(
+            get_pull_requests_by_commit(
+                commit_sha=commit_sha,
+                owner=self.state.repo.owner,
+                repo=self.state.repo.value,
+            )
+        )
+
+    async def _arun(self, commit_sha: str) -> str:
+        return self.__encode(
+            await aget_pull_requests_by_commit(
+                commit_sha=commit_sha,
+                owner=self.state.repo.owner,
+                repo=self.state.repo.value,
+            )
+        )
+
+    def __encode(self, pull_requests: List[PullRequest]) -> str:
+        return encode_pull_requests(
+            pull_requests[: self.topK],
+            fields=self.output_fields,
+            max_tokens=self.max_output_tokens,
+            total=len(pull_requests),
+        )
 
 
 class GetPullRequestsSchema(BaseModel):
@@ -116,6 +205,8 @@ class GetPullRequestsSchema(BaseModel):
 class GetPullRequestsTool(BaseTool):
     state: State
     topK: int = 10
+    max_output_tokens: int = MAX_OUTPUT_TOKENS
+    output_fields: List[str] = ["number", "title", "author", "head", "base", "state"]
     args_schema: Type[BaseModel] = GetPullRequestsSchema
     name: str = "get_pull_requests"
     description = "Retrieves a list of pull requests based on the provided filters."
@@ -127,18 +218,50 @@ class GetPullRequestsTool(BaseTool):
         opened_from_branch: str = None,
         target_branch: str = "develop",
         state: PullRequestState = PullRequestState.ALL,
-    ) -> List[PullRequest]:
-        return get_pull_requests(
-            PullRequestFilter(
-                title=title,
-                body=body,
-                opened_from_branch=opened_from_branch,
-                target_branch=target_branch,
-                state=state,
-            ),
-            owner=self.state.repo.owner,
-            repo=self.state.repo.value,
-        )[: self.topK]
+    ) -> str:
+        return self.__encode(
+            get_pull_requests(
+                PullRequestFilter(
+                    title=title,
+                    body=body,
+                    opened_from_branch=opened_from_branch,
+                    target_branch=target_branch,
+                    state=state,
+                ),
+                owner=self.state.repo.owner,
+                repo=self.state.repo.value,
+            )
+        )
+
+    async def _arun(
+        self,
+        title: str = None,
+        body: str = None,
+        opened_from_branch: str = None,
+        target_branch: str = "develop",
+        state: PullRequestState = PullRequestState.ALL,
+    ) -> str:
+        return self.__encode(
+            await aget_pull_requests(
+                PullRequestFilter(
+                    title=title,
+                    body=body,
+                    opened_from_branch=opened_from_branch,
+                    target_branch=target_branch,
+                    state=state,
+                ),
+                owner=self.state.repo.owner,
+                repo=self.state.repo.value,
+            )
+        )
+
+    def __encode(self, pull_requests: List[PullRequest]) -> str:
+        return encode_pull_requests(
+            pull_requests[: self.topK],
+            fields=self.output_fields,
+            max_tokens=self.max_output_tokens,
+            total=len(pull_requests),
+        )
 
 
 class CodeReviewSchema(BaseModel):
@@ -163,32 +286,67 @@ class PromptProperty:
 
 
 class CodeReviewTool(BaseTool):
+    """
+    Makes the code review of a pull request.
+    When job_queue (a review_jobs.ReviewJobQueue) is set the review runs as a background job
+    and the tool returns immediately the reference to the job, its usage is accounted to user and session_id.
+    """
+
     args_schema: Type[BaseModel] = CodeReviewSchema
     state: State
+    model: Optional[str] = None
+    job_queue: Optional[Any] = None
+    user: str = ""
+    session_id: str = ""
     name: str = "code_review"
     description = "Makes a code review of the pull request"
     return_direct = True
 
-    def _run(self, number: int) -> str:
+    def _run(
+        self, number: int, run_manager: Optional[CallbackManagerForToolRun] = None
+    ) -> str:
+        if self.job_queue is not None:
+            return self.__submit(number)
+        # the callbacks are propagated in order to stream the review tokens
+        return review_pull_request(
+            number=number,
+            question=self.state.messages[-1].content,
+            owner=self.state.repo.owner,
+            repo=self.state.repo.value,
+            model=self.model,
+            callbacks=run_manager.get_child() if run_manager else None,
+        )
 
-        llm = ChatOpenAI(model=MODEL_NAME, api_key=OPENAI_API_KEY)
-        prompt = ChatPromptTemplate.from_messages(
-            [("system", CODE_REVIEW_SYSTEM_MESSAGE), ("user", CODE_REVIEW_TEMPLATE)]
+    async def _arun(
+        self,
+        number: int,
+        run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
+    ) -> str:
+        if self.job_queue is not None:
+            return self.__submit(number)
+        return await areview_pull_request(
+            number=number,
+            question=self.state.messages[-1].content,
+            owner=self.state.repo.owner,
+            repo=self.state.repo.value,
+            model=self.model,
+            callbacks=run_manager.get_child() if run_manager else None,
         )
-        chain = prompt | llm
-        prompt_property = create_prompt_property(
-            number=number, owner=self.state.repo.owner, repo=self.state.repo.value
+
+    def __submit(self, number: int) -> str:
+        job = self.job_queue.submit(
+            number=number,
+            question=self.state.messages[-1].content,
+            owner=self.state.repo.owner,
+            repo=self.state.repo.value,
+            model=self.model,
+            user=self.user,
+            session=self.session_id,
+        )
+        return (
+            f"The code review of the pull request #{number} is running in background (job `{job.id}`), "
+            "you can follow it in the reviews panel."
         )
-        return chain.invoke(
-            {
-                "input": self.state.messages[-1].content,
-                "description": prompt_property.description,
-                "diff": prompt_property.diff,
-                "commits": prompt_property.commits,
-                "links_diff": prompt_property.links_diff,
-                "excluded_links_diff": prompt_property.excluded_links_diff,
-            }
-        ).content
 
 
 # This tool is into this module to avoid circular imports
@@ -218,6 +376,21 @@ class IsCommitInBranchTool(BaseTool):
             repo=self.state.repo.value,
         )
 
+    async def _arun(self, commit_sha: str, branch: str) -> bool:
+        pull_requests_by_commit = await aget_pull_requests_by_commit(
+            commit_sha=commit_sha,
+            owner=self.state.repo.owner,
+            repo=self.state.repo.value,
+        )
+        if len(pull_requests_by_commit) > 0:
+            return True
+        return await ais_commit_in_base(
+            commit_sha=commit_sha,
+            base=branch,
+            owner=self.state.repo.owner,
+            repo=self.state.repo.value,
+        )
+
 
 ##########################################################################
 
@@ -233,46 +406,58 @@ def get_pull_request_by_number(
     Returns:
         Optional[PullRequest]: The pull request with the given number, or None if it does not exist.
     """
+    store = get_metadata_store()
+    pull_request = store.get(PULL_REQUESTS, (owner, repo, number))
+    if pull_request is not MISSING:
+        return pull_request
 
-    url = f"https://api.github.com/repos/{owner}/{repo}/pulls/{number}"
+    url = f"{settings.github_api_url}/repos/{owner}/{repo}/pulls/{number}"
     headers = {
         "Accept": "application/vnd.github.v3+json",
-        "Authorization": f"token {GITHUB_TOKEN}",
+        "Authorization": f"token {settings.github_token}",
     }
 
-    response = requests.get(url, headers=headers)
+    response = get(url, headers=headers)
     if response.status_code == 200:
-        return PullRequest.model_validate(response.json())
+        pull_request = PullRequest.model_validate(response.json())
     elif response.status_code == 404:
-        return None
+        pull_request = None
     else:
         raise Exception(f"Error: {response.status_code} - {response.text}")
+    store.put(
+        PULL_REQUESTS, (owner, repo, number), pull_request, PULL_REQUEST_TTL_SECONDS
+    )
+    return pull_request
 
 
-def get_pull_requests_by_commit(
-    commit_sha: str, owner: str = "smeup", repo: str = "jariko"
-) -> List[PullRequest]:
+async def aget_pull_request_by_number(
+    number: int, owner: str = "smeup", repo: str = "jariko"
+) -> Optional[PullRequest]:
     """
-    Retrieves the pull requests associated with a given commit SHA.
-
-    Args:
-        commit_sha (str): The SHA of the commit.
-        owner (str, optional): The owner of the repository. Defaults to "smeup".
-        repo (str, optional): The name of the repository. Defaults to "jariko".
-
-    Returns:
-        List[PullRequest]: A list of PullRequest objects representing the retrieved pull requests.
+    Async version of get_pull_request_by_number.
     """
-    url = f"https://api.github.com/repos/{owner}/{repo}/commits/{commit_sha}/pulls"
+    store = get_metadata_store()
+    pull_request = store.get(PULL_REQUESTS, (owner, repo, number))
+    if pull_request is not MISSING:
+        return pull_request
+
+    url = f"{settings.github_api_url}/repos/{owner}/{repo}/pulls/{number}"
     headers = {
-        "Accept": "application/vnd.github.groot-preview+json",  # Required for this API
-        "Authorization": f"token {GITHUB_TOKEN}",
+        "Accept": "application/vnd.github.v3+json",
+        "Authorization": f"token {settings.github_token}",
     }
-    response = requests.get(url, headers=headers)
+
+    response = await aget(url, headers=headers)
     if response.status_code == 200:
-        return [PullRequest.model_validate(pr) for pr in response.json()]
+        pull_request = PullRequest.model_validate(response.json())
+    elif response.status_code == 404:
+        pull_request = None
     else:
         raise Exception(f"Error: {response.status_code} - {response.text}")
+    store.put(
+        PULL_REQUESTS, (owner, repo, number), pull_request, PULL_REQUEST_TTL_SECONDS
+    )
+    return pull_request
 
 
 def get_pull_requests(
@@ -306,6 +491,49 @@ def get_pull_requests(
     )
 
 
+async def aget_pull_requests(
+    pull_request_filter: PullRequestFilter = PullRequestFilter(),
+    owner: str = "smeup",
+    repo: str = "jariko",
+    direction: str = "desc",
+) -> List[PullRequest]:
+    """
+    Async version of get_pull_requests.
+    """
+    return await __aget_pull_requests(
+        opened_from_branch=pull_request_filter.opened_from_branch,
+        owner=owner,
+        repo=repo,
+        target_branch=pull_request_filter.target_branch,
+        state=pull_request_filter.state,
+        direction=direction,
+        pull_request_matches_filter=lambda pr: __is_pull_request_match_filter(
+            pr, pull_request_filter
+        ),
+    )
+
+
+def get_open_pull_requests(
+    owner: str = "smeup", repo: str = "jariko"
+) -> List[PullRequest]:
+    """
+    Retrieves the open pull requests of a repository, whatever their target branch.
+
+    Args:
+        owner (str, optional): The owner of the repository. Defaults to "smeup".
+        repo (str, optional): The name of the repository. Defaults to "jariko".
+
+    Returns:
+        List[PullRequest]: The open pull requests, the newest first.
+    """
+    return __get_pull_requests(
+        owner=owner,
+        repo=repo,
+        target_branch=None,
+        state=PullRequestState.OPENED,
+    )
+
+
 def get_pull_requests_by_path(
     path: str, owner: str = "smeup", repo: str = "jariko"
 ) -> List[PullRequest]:
@@ -331,6 +559,25 @@ def get_pull_requests_by_path(
     return pull_requests
 
 
+async def aget_pull_requests_by_path(
+    path: str, owner: str = "smeup", repo: str = "jariko"
+) -> List[PullRequest]:
+    """
+    Async version of get_pull_requests_by_path.
+    The pull requests of each commit are retrieved concurrently.
+    """
+    commits = await aget_commits_by_path(path=path, owner=owner, repo=repo)
+    pull_requests_by_commit = await asyncio.gather(
+        *[aget_pull_requests_by_commit(commit.sha, owner, repo) for commit in commits]
+    )
+    pull_requests = []
+    for pull_requests_of_commit in pull_requests_by_commit:
+        pull_requests += [
+            pr for pr in pull_requests_of_commit if pr not in pull_requests
+        ]
+    return pull_requests
+
+
 class PullRequestMatched(BaseModel):
     matched: bool = True
     matched_words_count: int = 0
@@ -386,7 +633,7 @@ def __get_pull_requests(
     direction: str = "desc",
     pull_request_matches_filter: Callable[
         [PullRequest], PullRequestMatched
-    ] = lambda pr: True,
+    ] = lambda pr: PullRequestMatched(),
 ) -> List[PullRequest]:
     """
     Retrieves a list of pull requests from a GitHub repository.
@@ -394,7 +641,7 @@ def __get_pull_requests(
     Args:
         owner (str): The owner of the repository. Defaults to "smeup".
         repo (str): The name of the repository. Defaults to "jariko".
-        target_branch (str): The target branch of the pull requests. Defaults to "develop".
+        target_branch (str): The target branch of the pull requests, None for any branch. Defaults to "develop".
         state (PullRequestState): The state of the pull requests. Defaults to PullRequestState.ALL.
         direction (str): The direction of the pull requests. Defaults to "desc".
 
@@ -406,16 +653,17 @@ def __get_pull_requests(
 
     """
     # Make the API request
-    url = f"https://api.github.com/repos/{owner}/{repo}/pulls"
+    url = f"{settings.github_api_url}/repos/{owner}/{repo}/pulls"
     headers = {
         "Accept": "application/vnd.github.v3+json",
-        "Authorization": f"token {GITHUB_TOKEN}",
+        "Authorization": f"token {settings.github_token}",
     }
     params = {
-        "base": f"{target_branch}",
         "direction": f"{direction}",
         "per_page": 100,
     }
+    if target_branch:
+        params["base"] = target_branch
     if state:
         params["state"] = state.value
     if opened_from_branch:
@@ -426,7 +674,7 @@ def __get_pull_requests(
 
     while nextUrl:
         print(f"Processing {nextUrl}")
-        response = requests.get(nextUrl, headers=headers, params=params)
+        response = get(nextUrl, headers=headers, params=params)
         # Check if the request was successful
         if response.status_code == 200:
             nextUrl = response.links.get("next", {}).get("url")
@@ -446,6 +694,57 @@ def __get_pull_requests(
     return [pr[0] for pr in pull_requests_with_matched_chars]
 
 
+async def __aget_pull_requests(
+    opened_from_branch: str = None,
+    owner: str = "smeup",
+    repo: str = "jariko",
+    target_branch: str = "develop",
+    state: PullRequestState = PullRequestState.ALL,
+    direction: str = "desc",
+    pull_request_matches_filter: Callable[
+        [PullRequest], PullRequestMatched
+    ] = lambda pr: PullRequestMatched(),
+) -> List[PullRequest]:
+    """
+    Async version of __get_pull_requests.
+    """
+    url = f"{settings.github_api_url}/repos/{owner}/{repo}/pulls"
+    headers = {
+        "Accept": "application/vnd.github.v3+json",
+        "Authorization": f"token {settings.github_token}",
+    }
+    params = {
+        "direction": f"{direction}",
+        "per_page": 100,
+    }
+    if target_branch:
+        params["base"] = target_branch
+    if state:
+        params["state"] = state.value
+    if opened_from_branch:
+        params["head"] = f"{owner}:{opened_from_branch}"
+
+    nextUrl = url
+    pull_requests_with_matched_chars: List[Tuple[PullRequest, int]] = []
+
+    while nextUrl:
+        print(f"Processing {nextUrl}")
+        response = await aget(nextUrl, headers=headers, params=params)
+        if response.status_code == 200:
+            nextUrl = response.links.get("next", {}).get("url")
+            for pr in response.json():
+                pull_request = PullRequest.model_validate(pr)
+                pull_request_matched = pull_request_matches_filter(pull_request)
+                if pull_request_matched.matched:
+                    pull_requests_with_matched_chars.append(
+                        (pull_request, pull_request_matched.matched_words_count)
+                    )
+        else:
+            raise Exception(f"Error: {response.status_code} - {response.text}")
+    pull_requests_with_matched_chars.sort(key=lambda x: x[1], reverse=True)
+    return [pr[0] for pr in pull_requests_with_matched_chars]
+
+
 def get_pull_requests_by_commit(
     commit_sha: str, owner: str = "smeup", repo: str = "jariko"
 ) -> List[PullRequest]:
@@ -460,10 +759,39 @@ def get_pull_requests_by_commit(
     Returns:
         List[PullRequest]: A list of PullRequest objects representing the retrieved pull requests.
     """
-    url = f"https://api.github.com/repos/{owner}/{repo}/commits/{commit_sha}/pulls"
+    url = f"{settings.github_api_url}/repos/{owner}/{repo}/commits/{commit_sha}/pulls"
+    headers = {
+        "Accept": "application/vnd.github.groot-preview+json",  # Required for this API
+        "Authorization": f"token {settings.github_token}",
+    }
+    params = {
+        "per_page": 100,
+    }
+
+    nextUrl = url
+    pull_requests = []
+    while nextUrl:
+        response = get(nextUrl, headers=headers, params=params)
+        if response.status_code == 200:
+            nextUrl = response.links.get("next", {}).get("url")
+            pull_requests += [PullRequest.model_validate(pr) for pr in response.json()]
+        elif response.status_code == 422 or response.status_code == 404:
+            return []
+        else:
+            raise Exception(f"Error: {response.status_code} - {response.text}")
+    return pull_requests
+
+
+async def aget_pull_requests_by_commit(
+    commit_sha: str, owner: str = "smeup", repo: str = "jariko"
+) -> List[PullRequest]:
+    """
+    Async version of get_pull_requests_by_commit.
+    """
+    url = f"{settings.github_api_url}/repos/{owner}/{repo}/commits/{commit_sha}/pulls"
     headers = {
         "Accept": "application/vnd.github.groot-preview+json",  # Required for this API
-        "Authorization": f"token {GITHUB_TOKEN}",
+        "Authorization": f"token {settings.github_token}",
     }
     params = {
         "per_page": 100,
@@ -472,7 +800,7 @@ def get_pull_requests_by_commit(
     nextUrl = url
     pull_requests = []
     while nextUrl:
-        response = requests.get(url, headers=headers, params=params)
+        response = await aget(nextUrl, headers=headers, params=params)
         if response.status_code == 200:
             nextUrl = response.links.get("next", {}).get("url")
             pull_requests += [PullRequest.model_validate(pr) for pr in response.json()]
@@ -494,12 +822,26 @@ def get_diff(number: int, owner: str = "smeup", repo: str = "jariko") -> str:
     Returns:
         str: The diff content of the pull request.
     """
-    api_url = f"https://api.github.com/repos/{owner}/{repo}/pulls/{number}"
+    api_url = f"{settings.github_api_url}/repos/{owner}/{repo}/pulls/{number}"
     headers = {
-        "Authorization": f"Bearer {GITHUB_TOKEN}",
+        "Authorization": f"Bearer {settings.github_token}",
         "Accept": "application/vnd.github.v3.diff",
     }
-    response = requests.get(url=api_url, headers=headers)
+    response = get(api_url, headers=headers)
+    if response.status_code == 200:
+        return response.text
+    else:
+        raise Exception(f"Error: {response.status_code} - {response.text}")
+
+
+async def aget_diff(number: int, owner: str = "smeup", repo: str = "jariko") -> str:
+    """Async version of get_diff."""
+    api_url = f"{settings.github_api_url}/repos/{owner}/{repo}/pulls/{number}"
+    headers = {
+        "Authorization": f"Bearer {settings.github_token}",
+        "Accept": "application/vnd.github.v3.diff",
+    }
+    response = await aget(api_url, headers=headers)
     if response.status_code == 200:
         return response.text
     else:
@@ -581,10 +923,10 @@ def get_files_changed_in_pull_request(
     Returns:
         List[FileChange]: A list of FileChange objects representing the files changed in the pull request.
     """
-    url = f"https://api.github.com/repos/{owner}/{repo}/pulls/{number}/files"
+    url = f"{settings.github_api_url}/repos/{owner}/{repo}/pulls/{number}/files"
     headers = {
         "Accept": "application/vnd.github.v3+json",
-        "Authorization": f"token {GITHUB_TOKEN}",
+        "Authorization": f"token {settings.github_token}",
     }
     params = {
         "per_page": 100,
@@ -592,8 +934,41 @@ def get_files_changed_in_pull_request(
 
     nextUrl = url
     files_changed = []
-    response = requests.get(url, headers=headers, params=params)
     while nextUrl:
+        response = get(nextUrl, headers=headers, params=params)
+        if response.status_code == 200:
+            nextUrl = response.links.get("next", {}).get("url")
+            for file in response.json():
+                current_file = FileChange.model_validate(file)
+                if filter(current_file):
+                    files_changed.append(current_file)
+        else:
+            raise Exception(f"Error: {response.status_code} - {response.text}")
+    return files_changed
+
+
+async def aget_files_changed_in_pull_request(
+    number: int,
+    owner: str = "smeup",
+    repo: str = "jariko",
+    filter: Callable[[FileChange], bool] = lambda file_change: True,
+) -> List[FileChange]:
+    """
+    Async version of get_files_changed_in_pull_request.
+    """
+    url = f"{settings.github_api_url}/repos/{owner}/{repo}/pulls/{number}/files"
+    headers = {
+        "Accept": "application/vnd.github.v3+json",
+        "Authorization": f"token {settings.github_token}",
+    }
+    params = {
+        "per_page": 100,
+    }
+
+    nextUrl = url
+    files_changed = []
+    while nextUrl:
+        response = await aget(nextUrl, headers=headers, params=params)
         if response.status_code == 200:
             nextUrl = response.links.get("next", {}).get("url")
             for file in response.json():
@@ -615,16 +990,154 @@ def create_prompt_property(number: int, owner="smeup", repo="jariko") -> PromptP
     """
     pull_request = get_pull_request_by_number(number=number, owner=owner, repo=repo)
 
-    title: str = pull_request.title
-    body: str = "" if pull_request.body is None else pull_request.body
+    excluded_file_names: List[str] = []
 
-    description: str = f"""
-    Title: {title} 
-    Body: {body}
-"""
+    files_changed_in_pull_request: List[FileChange] = get_files_changed_in_pull_request(
+        number=number,
+        owner=owner,
+        repo=repo,
+        filter=__create_file_change_filter(excluded_file_names),
+    )
+
+    commits: List[Commit] = get_commits_by_pull_request(
+        number=number, owner=owner, repo=repo
+    )
 
+    diff: str = get_diff(number=number, owner=owner, repo=repo)
+
+    return __to_prompt_property(
+        number=number,
+        owner=owner,
+        repo=repo,
+        pull_request=pull_request,
+        files_changed_in_pull_request=files_changed_in_pull_request,
+        excluded_file_names=excluded_file_names,
+        commits=commits,
+        diff=diff,
+    )
+
+
+async def acreate_prompt_property(
+    number: int, owner="smeup", repo="jariko"
+) -> PromptProperty:
+    """
+    Async version of create_prompt_property.
+    The pull request, its files, its commits and its diff are retrieved concurrently.
+    """
     excluded_file_names: List[str] = []
 
+    pull_request, files_changed_in_pull_request, commits, diff = await asyncio.gather(
+        aget_pull_request_by_number(number=number, owner=owner, repo=repo),
+        aget_files_changed_in_pull_request(
+            number=number,
+            owner=owner,
+            repo=repo,
+            filter=__create_file_change_filter(excluded_file_names),
+        ),
+        aget_commits_by_pull_request(number=number, owner=owner, repo=repo),
+        aget_diff(number=number, owner=owner, repo=repo),
+    )
+
+    return __to_prompt_property(
+        number=number,
+        owner=owner,
+        repo=repo,
+        pull_request=pull_request,
+        files_changed_in_pull_request=files_changed_in_pull_request,
+        excluded_file_names=excluded_file_names,
+        commits=commits,
+        diff=diff,
+    )
+
+
+def review_pull_request(
+    number: int,
+    question: str,
+    owner: str = "smeup",
+    repo: str = "jariko",
+    model: Optional[str] = None,
+    callbacks: Callbacks = None,
+) -> str:
+    """
+    Makes the code review of a pull request.
+
+    Args:
+        number (int): The number of the pull request.
+        question (str): The user's request, i.e. "make a code review of the pull request 549".
+        owner (str, optional): The owner of the repository. Defaults to "smeup".
+        repo (str, optional): The name of the repository. Defaults to "jariko".
+        model (Optional[str], optional): The model writing the review. Defaults to CODE_REVIEW_MODEL_NAME.
+        callbacks (Callbacks, optional): The callbacks of the model call, i.e. to stream the tokens. Defaults to None.
+
+    Returns:
+        str: The review in markdown format.
+    """
+    prompt_property = create_prompt_property(number=number, owner=owner, repo=repo)
+    return (
+        __create_review_chain(model)
+        .invoke(
+            __review_chain_input(question, prompt_property),
+            config={"callbacks": callbacks},
+        )
+        .content
+    )
+
+
+async def areview_pull_request(
+    number: int,
+    question: str,
+    owner: str = "smeup",
+    repo: str = "jariko",
+    model: Optional[str] = None,
+    callbacks: Callbacks = None,
+) -> str:
+    """
+    Async version of review_pull_request.
+    """
+    prompt_property = await acreate_prompt_property(
+        number=number, owner=owner, repo=repo
+    )
+    return (
+        await __create_review_chain(model).ainvoke(
+            __review_chain_input(question, prompt_property),
+            config={"callbacks": callbacks},
+        )
+    ).content
+
+
+def __create_review_chain(model: Optional[str]):
+    from langchain_core.prompts import ChatPromptTemplate
+
+    llm = create_chat_model(
+        CODE_REVIEW_STAGE,
+        model or settings.code_review_model_name,
+        streaming=True,
+        temperature=0,
+    )
+    prompt = ChatPromptTemplate.from_messages(
+        [("system", CODE_REVIEW_SYSTEM_MESSAGE), ("user", CODE_REVIEW_TEMPLATE)]
+    )
+    return prompt | llm
+
+
+def __review_chain_input(question: str, prompt_property: PromptProperty) -> dict:
+    return {
+        "input": question,
+        "description": prompt_property.description,
+        "diff": prompt_property.diff,
+        "commits": prompt_property.commits,
+        "links_diff": prompt_property.links_diff,
+        "excluded_links_diff": prompt_property.excluded_links_diff,
+    }
+
+
+def __create_file_change_filter(
+    excluded_file_names: List[str],
+) -> Callable[[FileChange], bool]:
+    """
+    Creates a filter excluding the huge files, the names of the excluded files are appended to excluded_file_names.
+    """
+
     def filter_file_change(file_change: FileChange) -> bool:
         if file_change.changes <= 500:
             return True
@@ -632,15 +1145,26 @@ def create_prompt_property(number: int, owner="smeup", repo="jariko") -> PromptP
             excluded_file_names.append(file_change.filename)
             return False
 
-    files_changed_in_pull_request: List[FileChange] = get_files_changed_in_pull_request(
-        number=number, owner=owner, repo=repo, filter=filter_file_change
-    )
+    return filter_file_change
 
-    commits: List[Commit] = get_commits_by_pull_request(
-        number=number, owner=owner, repo=repo
-    )
 
-    diff: str = get_diff(number=number, owner=owner, repo=repo)
+def __to_prompt_property(
+    number: int,
+    owner: str,
+    repo: str,
+    pull_request: PullRequest,
+    files_changed_in_pull_request: List[FileChange],
+    excluded_file_names: List[str],
+    commits: List[Commit],
+    diff: str,
+) -> PromptProperty:
+    title: str = pull_request.title
+    body: str = "" if pull_request.body is None else pull_request.body
+
+    description: str = f"""
+    Title: {title} 
+    Body: {body}
+"""
 
     diff = exclude_files_from_diff(diff, excluded_file_names)
 
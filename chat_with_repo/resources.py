@@ -0,0 +1,219 @@
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Tuple
+
+from chat_with_repo.github_client import ResponseCache, get_response_cache
+from chat_with_repo.metadata_store import MetadataStore, get_metadata_store
+from chat_with_repo.settings import settings
+from chat_with_repo.users import AuthorizationManager
+
+if TYPE_CHECKING:
+    from chat_with_repo.answer_cache import AnswerCache
+    from chat_with_repo.cache_warmer import CacheWarmer
+    from chat_with_repo.metrics import MetricsServer
+    from chat_with_repo.review_jobs import ReviewJobQueue
+    from chat_with_repo.usage import UsageLedger
+    from chat_with_repo.webhooks import WebhookReceiver
+
+
+class Resources:
+    """
+    The resources shared by all the sessions of the process: the GitHub response cache and connection pool,
+    the metadata store, the answer cache, the code review workers, the usage ledger, the cache warmer,
+    the webhook receiver, the metrics server and the authorizations.
+    The LLM clients are shared through model_routing.create_chat_model, the LLM cache through
+    llm_cache.get_default_llm_cache and the index of the tools through tool_selector.
+    Each resource is created on first access and bounded by its memory cap, a session only keeps its State
+    and its chat history.
+    """
+
+    def __init__(self):
+        self.__resources: Dict[str, Any] = {}
+        self.__lock = Lock()
+
+    @property
+    def response_cache(self) -> ResponseCache:
+        return get_response_cache()
+
+    @property
+    def metadata_store(self) -> MetadataStore:
+        return get_metadata_store()
+
+    @property
+    def authorization_manager(self) -> AuthorizationManager:
+        return self.__get("authorization_manager", AuthorizationManager)
+
+    @property
+    def answer_cache(self) -> "AnswerCache":
+        from chat_with_repo.answer_cache import AnswerCache
+
+        return self.__get("answer_cache", AnswerCache)
+
+    @property
+    def review_job_queue(self) -> "ReviewJobQueue":
+        from chat_with_repo.review_jobs import ReviewJobQueue
+
+        # The ledger is created before taking the lock of the resources, which is not reentrant
+        usage_ledger = self.usage_ledger
+        return self.__get(
+            "review_job_queue", lambda: ReviewJobQueue(usage_ledger=usage_ledger)
+        )
+
+    @property
+    def usage_ledger(self) -> "UsageLedger":
+        from chat_with_repo.usage import UsageLedger
+
+        return self.__get("usage_ledger", UsageLedger)
+
+    def start_cache_warmer(self) -> Optional["CacheWarmer"]:
+        """
+        Starts the cache warmer, once for the process, if CACHE_WARMER_INTERVAL_SECONDS is set.
+
+        Returns:
+            Optional[CacheWarmer]: The cache warmer, None if disabled.
+        """
+        if settings.cache_warmer_interval_seconds <= 0:
+            return None
+        from chat_with_repo.cache_warmer import CacheWarmer
+
+        def create_cache_warmer() -> CacheWarmer:
+            cache_warmer = CacheWarmer()
+            cache_warmer.start()
+            return cache_warmer
+
+        return self.__get("cache_warmer", create_cache_warmer)
+
+    def start_webhook_receiver(self) -> Optional["WebhookReceiver"]:
+        """
+        Starts the webhook receiver, once for the process, if GITHUB_WEBHOOK_SECRET is set.
+        A receiver that cannot listen (i.e. the port is in use) is logged and not retried, the app runs without it.
+
+        Returns:
+            Optional[WebhookReceiver]: The webhook receiver, None if disabled or if it cannot listen.
+        """
+        if not settings.github_webhook_secret:
+            return None
+        from chat_with_repo.webhooks import WebhookReceiver
+
+        # The answer cache is created before taking the lock of the resources, which is not reentrant
+        answer_cache = self.answer_cache
+
+        def create_webhook_receiver() -> Optional[WebhookReceiver]:
+            webhook_receiver = WebhookReceiver(
+                secret=settings.github_webhook_secret,
+                port=settings.github_webhook_port,
+                answer_cache=answer_cache,
+            )
+            try:
+                webhook_receiver.start()
+            except Exception as e:
+                print(f"Unable to start the webhook receiver: {e}")
+                return None
+            return webhook_receiver
+
+        return self.__get("webhook_receiver", create_webhook_receiver)
+
+    def start_metrics_server(self) -> Optional["MetricsServer"]:
+        """
+        Starts the metrics server, once for the process, if METRICS_PORT is set.
+        A server that cannot listen (i.e. the port is in use) is logged and not retried, the app runs without it.
+
+        Returns:
+            Optional[MetricsServer]: The metrics server, None if disabled or if it cannot listen.
+        """
+        if settings.metrics_port is None:
+            return None
+        from chat_with_repo.metrics import MetricsServer
+
+        def create_metrics_server() -> Optional[MetricsServer]:
+            metrics_server = MetricsServer(
+                port=settings.metrics_port,
+                address=settings.metrics_address,
+                caches=self.cache_counters,
+            )
+            try:
+                metrics_server.start()
+            except Exception as e:
+                print(f"Unable to start the metrics server: {e}")
+                return None
+            return metrics_server
+
+        return self.__get("metrics_server", create_metrics_server)
+
+    def cache_counters(self) -> Dict[str, Tuple[int, int]]:
+        """
+        Returns:
+            Dict[str, Tuple[int, int]]: The hits and the misses of each cache layer already created.
+        """
+        from chat_with_repo.llm_cache import get_created_llm_cache
+
+        counters = {
+            "github_response": (self.response_cache.hits, self.response_cache.misses),
+            "metadata": (self.metadata_store.hits, self.metadata_store.misses),
+        }
+        if "answer_cache" in self.__resources:
+            counters["answer"] = (self.answer_cache.hits, self.answer_cache.misses)
+        llm_cache = get_created_llm_cache()
+        if llm_cache is not None:
+            counters["llm"] = (llm_cache.hits, llm_cache.misses)
+        return counters
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns:
+            Dict[str, Any]: The size and the hits of the caches, i.e. to show them in debug mode.
+        """
+        response_cache = self.response_cache
+        metadata_store = self.metadata_store
+        stats: Dict[str, Any] = {
+            "github_responses": {
+                "entries": len(response_cache),
+                "bytes": response_cache.size,
+                "hits": response_cache.hits,
+                "misses": response_cache.misses,
+            },
+            "metadata": {
+                "entries": metadata_store.sizes(),
+                "hits": metadata_store.hits,
+                "misses": metadata_store.misses,
+            },
+        }
+        if "cache_warmer" in self.__resources:
+            last_report = self.__resources["cache_warmer"].last_report
+            stats["cache_warmer"] = str(last_report) if last_report else "running"
+        if "answer_cache" in self.__resources:
+            stats["answers"] = {
+                "hits": self.answer_cache.hits,
+                "misses": self.answer_cache.misses,
+            }
+        return stats
+
+    def clear_caches(self):
+        """Empties the caches, i.e. after a change of the GitHub token"""
+        self.response_cache.clear()
+        self.metadata_store.clear()
+        if "answer_cache" in self.__resources:
+            self.answer_cache.clear()
+
+    def __get(self, name: str, factory: Callable[[], Any]) -> Any:
+        # Only one instance of each resource, i.e. only one pool of review workers
+        with self.__lock:
+            if name not in self.__resources:
+                self.__resources[name] = factory()
+            return self.__resources[name]
+
+
+__resources: Optional[Resources] = None
+__resources_lock = Lock()
+
+
+def get_resources() -> Resources:
+    """
+    Returns:
+        Resources: The resources of the process. The app exposes them through st.cache_resource,
+            the headless entry points (CLI, batch review) use them directly.
+    """
+    global __resources
+    with __resources_lock:
+        if __resources is None:
+            __resources = Resources()
+        return __resources
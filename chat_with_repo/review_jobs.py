@@ -0,0 +1,541 @@
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from threading import Lock
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+
+from pydantic import BaseModel
+
+from chat_with_repo.callbacks import TracingCallbackHandler
+from chat_with_repo.model_routing import stage_stats
+from chat_with_repo.pull_request_tools import review_pull_request
+from chat_with_repo.settings import settings
+from chat_with_repo.tracing import TOOL_SPAN, Span, span
+from chat_with_repo.usage import UsageLedger, span_usage
+
+# A function making the review, with the signature of review_pull_request
+ReviewFunction = Callable[..., str]
+
+
+class JobState(Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class ReviewJob(BaseModel):
+    """
+    A code review running in background.
+
+    Attributes:
+        id (str): The id of the job.
+        owner (str): The owner of the repository.
+        repo (str): The name of the repository.
+        number (int): The number of the pull request.
+        question (str): The user's request.
+        model (str): The model writing the review.
+        head_sha (Optional[str]): The head commit of the pull request reviewed, when known.
+        worker (Optional[str]): The process running the job, as hostname:pid.
+        user (str): The email of the user who submitted the job, its usage is accounted to the user.
+        session (str): The id of the session that submitted the job.
+        state (JobState): The state of the job.
+        progress (str): The review written so far.
+        result (Optional[str]): The review, when the job is done.
+        error (Optional[str]): The error, when the job is failed.
+        created (float): When the job has been submitted.
+        started (Optional[float]): When the review has started.
+        finished (Optional[float]): When the review has finished.
+    """
+
+    id: str
+    owner: str
+    repo: str
+    number: int
+    question: str
+    model: str
+    head_sha: Optional[str] = None
+    worker: Optional[str] = None
+    user: str = ""
+    session: str = ""
+    state: JobState = JobState.QUEUED
+    progress: str = ""
+    result: Optional[str] = None
+    error: Optional[str] = None
+    created: float
+    started: Optional[float] = None
+    finished: Optional[float] = None
+
+    @property
+    def in_flight(self) -> bool:
+        return self.state in (JobState.QUEUED, JobState.RUNNING)
+
+
+# Single underscore: the helpers are called from the methods of ReviewJobQueue, where __names are mangled
+def _current_worker() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _is_worker_alive(worker: Optional[str]) -> bool:
+    """
+    Returns:
+        bool: False if the process running a job is dead, or if the job has no process. The processes of the
+            other hosts cannot be checked and are considered alive.
+    """
+    if not worker:
+        return False
+    hostname, _, pid = worker.rpartition(":")
+    if hostname != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # The process exists but belongs to another user
+        return True
+    return True
+
+
+class ProgressCallbackHandler(TracingCallbackHandler):
+    """
+    Passes the tokens of the review to on_token and traces its model calls, so that the usage of the job
+    is accounted even if it runs outside of the turn. The errors are raised, so that on_token can stop
+    a cancelled review.
+    """
+
+    raise_error = True
+
+    def __init__(self, on_token: Callable[[str], None]):
+        super().__init__()
+        self.on_token = on_token
+
+    def on_llm_new_token(self, token: str, **kwargs: Any):
+        if token:
+            self.on_token(token)
+
+
+class ReviewCancelled(Exception):
+    pass
+
+
+class ReviewJobQueue:
+    """
+    Runs the code reviews in a pool of workers, outside the Streamlit script runs.
+    The jobs are stored in a SQLite database, so the finished reviews can be reopened later and the jobs
+    interrupted by a restart are run again. Each job records the process running it, so that the processes
+    sharing the database only resume the jobs of the processes that are dead. A review of the same head
+    commit of a pull request already queued or running is not submitted twice, the running job is returned
+    instead.
+
+    Attributes:
+        path (str): The path of the database.
+        max_concurrent_jobs (int): How many reviews run at the same time.
+        progress_interval_seconds (float): How often the progress of a running review is stored.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_concurrent_jobs: Optional[int] = None,
+        review: Optional[ReviewFunction] = None,
+        progress_interval_seconds: float = 1.0,
+        usage_ledger: Optional[UsageLedger] = None,
+    ):
+        """
+        Initializes a new instance of the ReviewJobQueue class.
+
+        Args:
+            path (Optional[str], optional): The path of the database. Defaults to REVIEW_JOBS_PATH.
+            max_concurrent_jobs (Optional[int], optional): How many reviews run at the same time.
+                Defaults to REVIEW_MAX_CONCURRENT_JOBS.
+            review (Optional[ReviewFunction], optional): The function making the review. Defaults to review_pull_request.
+            usage_ledger (Optional[UsageLedger], optional): Records the tokens of each review. Defaults to None.
+        """
+        self.path = path or settings.review_jobs_path
+        self.max_concurrent_jobs = (
+            max_concurrent_jobs or settings.review_max_concurrent_jobs
+        )
+        self.progress_interval_seconds = progress_interval_seconds
+        self.review = review or review_pull_request
+        self.usage_ledger = usage_ledger
+        self.__lock = Lock()
+        # The progress of the running jobs, more recent than the stored one
+        self.__progress: Dict[str, List[str]] = {}
+        # The jobs cancelled while queued or running in this process
+        self.__cancelled: Set[str] = set()
+        self.__executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrent_jobs, thread_name_prefix="review-job"
+        )
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.__connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.__connection.row_factory = sqlite3.Row
+        with self.__lock, self.__connection:
+            self.__connection.execute("PRAGMA journal_mode=WAL")
+            self.__connection.execute("""
+                CREATE TABLE IF NOT EXISTS review_jobs (
+                    id TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    repo TEXT NOT NULL,
+                    number INTEGER NOT NULL,
+                    question TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    progress TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created REAL NOT NULL,
+                    started REAL,
+                    finished REAL
+                )
+                """)
+            columns = [
+                row["name"]
+                for row in self.__connection.execute("PRAGMA table_info(review_jobs)")
+            ]
+            # The columns added after the first version of the table
+            for column, definition in [
+                ("head_sha", "TEXT"),
+                ("worker", "TEXT"),
+                ("user", "TEXT NOT NULL DEFAULT ''"),
+                ("session", "TEXT NOT NULL DEFAULT ''"),
+            ]:
+                if column not in columns:
+                    self.__connection.execute(
+                        f"ALTER TABLE review_jobs ADD COLUMN {column} {definition}"
+                    )
+            self.__connection.execute(
+                "CREATE INDEX IF NOT EXISTS review_jobs_pull_request ON review_jobs (owner, repo, number)"
+            )
+        self.__resume()
+
+    def submit(
+        self,
+        number: int,
+        question: str,
+        owner: str = "smeup",
+        repo: str = "jariko",
+        model: Optional[str] = None,
+        head_sha: Optional[str] = None,
+        user: str = "",
+        session: str = "",
+    ) -> ReviewJob:
+        """
+        Submits the review of a pull request.
+
+        Args:
+            number (int): The number of the pull request.
+            question (str): The user's request.
+            owner (str, optional): The owner of the repository. Defaults to "smeup".
+            repo (str, optional): The name of the repository. Defaults to "jariko".
+            model (Optional[str], optional): The model writing the review. Defaults to CODE_REVIEW_MODEL_NAME.
+            head_sha (Optional[str], optional): The head commit of the pull request. Defaults to None.
+            user (str, optional): The email of the user submitting the review. Defaults to "".
+            session (str, optional): The id of the session submitting the review. Defaults to "".
+
+        Returns:
+            ReviewJob: The new job or the one already reviewing the same head commit of the pull request
+                with the same model.
+        """
+        model = model or settings.code_review_model_name
+        with self.__lock:
+            row = self.__connection.execute(
+                "SELECT * FROM review_jobs WHERE owner = ? AND repo = ? AND number = ? AND model = ? "
+                "AND head_sha IS ? AND state IN (?, ?) ORDER BY created DESC LIMIT 1",
+                (
+                    owner,
+                    repo,
+                    number,
+                    model,
+                    head_sha,
+                    JobState.QUEUED.value,
+                    JobState.RUNNING.value,
+                ),
+            ).fetchone()
+            if row is not None:
+                return self.__to_job(row)
+            job = ReviewJob(
+                id=uuid.uuid4().hex[:12],
+                owner=owner,
+                repo=repo,
+                number=number,
+                question=question,
+                model=model,
+                head_sha=head_sha,
+                worker=_current_worker(),
+                user=user,
+                session=session,
+                created=time.time(),
+            )
+            with self.__connection:
+                values = job.model_dump()
+                values["state"] = job.state.value
+                self.__connection.execute(
+                    f"INSERT INTO review_jobs ({', '.join(values)}) "
+                    f"VALUES ({', '.join('?' for _ in values)})",
+                    list(values.values()),
+                )
+        self.__executor.submit(self.__run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[ReviewJob]:
+        with self.__lock:
+            row = self.__connection.execute(
+                "SELECT * FROM review_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            return self.__to_job(row) if row is not None else None
+
+    def list_jobs(self, limit: int = 20) -> List[ReviewJob]:
+        """
+        Returns:
+            List[ReviewJob]: The most recent jobs, the newest first.
+        """
+        with self.__lock:
+            rows = self.__connection.execute(
+                "SELECT * FROM review_jobs ORDER BY created DESC LIMIT ?", (limit,)
+            ).fetchall()
+            return [self.__to_job(row) for row in rows]
+
+    def latest_review(
+        self, number: int, owner: str = "smeup", repo: str = "jariko"
+    ) -> Optional[ReviewJob]:
+        """
+        Returns:
+            Optional[ReviewJob]: The most recent finished review of the pull request, None if never reviewed.
+        """
+        with self.__lock:
+            row = self.__connection.execute(
+                "SELECT * FROM review_jobs WHERE owner = ? AND repo = ? AND number = ? AND state = ? "
+                "ORDER BY finished DESC LIMIT 1",
+                (owner, repo, number, JobState.DONE.value),
+            ).fetchone()
+            return self.__to_job(row) if row is not None else None
+
+    def is_reviewed(
+        self,
+        number: int,
+        head_sha: str,
+        owner: str = "smeup",
+        repo: str = "jariko",
+    ) -> bool:
+        """
+        Returns:
+            bool: True if the head commit of the pull request has been reviewed or is being reviewed.
+        """
+        with self.__lock:
+            row = self.__connection.execute(
+                "SELECT 1 FROM review_jobs WHERE owner = ? AND repo = ? AND number = ? AND head_sha = ? "
+                "AND state IN (?, ?, ?) LIMIT 1",
+                (
+                    owner,
+                    repo,
+                    number,
+                    head_sha,
+                    JobState.QUEUED.value,
+                    JobState.RUNNING.value,
+                    JobState.DONE.value,
+                ),
+            ).fetchone()
+            return row is not None
+
+    def stream(self, job_id: str, poll_interval: float = 0.2) -> Iterator[str]:
+        """
+        Yields the review of a job while it is written, until the job is finished.
+
+        Args:
+            job_id (str): The id of the job.
+            poll_interval (float, optional): How often the progress is checked. Defaults to 0.2.
+
+        Yields:
+            Iterator[str]: The new text of the review.
+        """
+        sent = 0
+        while True:
+            job = self.get(job_id)
+            if job is None:
+                return
+            text = job.result if job.state == JobState.DONE else job.progress
+            if len(text) > sent:
+                yield text[sent:]
+                sent = len(text)
+            if not job.in_flight:
+                if job.state == JobState.FAILED:
+                    yield f"\n\nThe review failed: {job.error}"
+                elif job.state == JobState.CANCELLED:
+                    yield "\n\nThe review was cancelled."
+                return
+            time.sleep(poll_interval)
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[ReviewJob]:
+        """
+        Waits until the job is finished.
+
+        Returns:
+            Optional[ReviewJob]: The job, still in flight if the timeout is expired.
+        """
+        expiration = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or not job.in_flight:
+                return job
+            if expiration is not None and time.monotonic() >= expiration:
+                return job
+            time.sleep(0.05)
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancels a job in flight: a queued job does not start, a running one stops at the next token of the review.
+
+        Returns:
+            bool: True if the job was in flight.
+        """
+        with self.__lock, self.__connection:
+            cancelled = self.__connection.execute(
+                "UPDATE review_jobs SET state = ?, finished = ? WHERE id = ? AND state IN (?, ?)",
+                (
+                    JobState.CANCELLED.value,
+                    time.time(),
+                    job_id,
+                    JobState.QUEUED.value,
+                    JobState.RUNNING.value,
+                ),
+            ).rowcount
+            if cancelled:
+                self.__cancelled.add(job_id)
+        return bool(cancelled)
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False):
+        """
+        Stops the workers.
+
+        Args:
+            wait (bool, optional): Waits for the running reviews. Defaults to True.
+            cancel_futures (bool, optional): The queued jobs do not start, they are resumed by the next queue
+                on the database once this process ends. Defaults to False.
+        """
+        self.__executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+    def __resume(self):
+        # The jobs interrupted by the end of their process are run again from the beginning, the jobs of the
+        # processes still alive are left to them
+        worker = _current_worker()
+        with self.__lock:
+            rows = self.__connection.execute(
+                "SELECT * FROM review_jobs WHERE state IN (?, ?) ORDER BY created",
+                (JobState.QUEUED.value, JobState.RUNNING.value),
+            ).fetchall()
+        for row in rows:
+            if _is_worker_alive(row["worker"]):
+                continue
+            # The job is claimed only if no other process has claimed it in the meantime
+            with self.__lock, self.__connection:
+                claimed = self.__connection.execute(
+                    "UPDATE review_jobs SET worker = ? WHERE id = ? AND worker IS ?",
+                    (worker, row["id"], row["worker"]),
+                ).rowcount
+            if not claimed:
+                continue
+            job = self.__to_job(row)
+            job.worker = worker
+            print(f"Resuming the review job {job.id} of the pull request #{job.number}")
+            self.__executor.submit(self.__run, job)
+
+    def __run(self, job: ReviewJob):
+        with self.__lock:
+            if job.id in self.__cancelled:
+                self.__cancelled.discard(job.id)
+                return
+            self.__progress[job.id] = []
+        self.__update(job.id, state=JobState.RUNNING, progress="", started=time.time())
+        last_stored = time.monotonic()
+
+        def on_token(token: str):
+            nonlocal last_stored
+            with self.__lock:
+                if job.id in self.__cancelled:
+                    raise ReviewCancelled(f"The review job {job.id} was cancelled")
+                self.__progress[job.id].append(token)
+            if time.monotonic() - last_stored >= self.progress_interval_seconds:
+                last_stored = time.monotonic()
+                self.__update(job.id, progress=self.__get_progress(job.id))
+
+        try:
+            # The review runs outside of the turn, its model calls are traced and accounted as a job
+            with span(TOOL_SPAN, "code_review", job=job.id) as job_span:
+                result = self.review(
+                    number=job.number,
+                    question=job.question,
+                    owner=job.owner,
+                    repo=job.repo,
+                    model=job.model,
+                    callbacks=[ProgressCallbackHandler(on_token)],
+                )
+            self.__update(
+                job.id,
+                state=JobState.DONE,
+                progress=result,
+                result=result,
+                finished=time.time(),
+            )
+        except ReviewCancelled as e:
+            print(e)
+        except Exception as e:
+            print(f"The review job {job.id} failed: {e}")
+            self.__update(
+                job.id,
+                state=JobState.FAILED,
+                progress=self.__get_progress(job.id),
+                error=str(e),
+                finished=time.time(),
+            )
+        finally:
+            with self.__lock:
+                self.__progress.pop(job.id, None)
+                self.__cancelled.discard(job.id)
+            stage_stats.record_spans(job_span)
+            if self.usage_ledger is not None:
+                self.__record_usage(job, job_span)
+
+    def __record_usage(self, job: ReviewJob, job_span: Span):
+        try:
+            self.usage_ledger.record(
+                span_usage(job_span),
+                kind="code_review_job",
+                repo=job.repo,
+                user=job.user,
+                session=job.session,
+            )
+        except Exception as e:
+            print(f"The usage of the review job {job.id} was not recorded: {e}")
+
+    def __get_progress(self, job_id: str) -> str:
+        with self.__lock:
+            return "".join(self.__progress.get(job_id, []))
+
+    def __update(self, job_id: str, **values: Any):
+        # A cancelled job is not updated by the review still running
+        columns = ", ".join(f"{column} = ?" for column in values)
+        parameters = [
+            value.value if isinstance(value, JobState) else value
+            for value in values.values()
+        ]
+        with self.__lock, self.__connection:
+            self.__connection.execute(
+                f"UPDATE review_jobs SET {columns} WHERE id = ? AND state != ?",
+                parameters + [job_id, JobState.CANCELLED.value],
+            )
+
+    def __to_job(self, row: sqlite3.Row) -> ReviewJob:
+        job = ReviewJob(**dict(row))
+        # The running jobs show also the progress not yet stored
+        progress = self.__progress.get(job.id)
+        if progress is not None and job.state == JobState.RUNNING:
+            job.progress = "".join(progress)
+        return job
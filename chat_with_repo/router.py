@@ -0,0 +1,345 @@
+import re
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from chat_with_repo.branch_tools import (
+    afind_branches_by_commit,
+    find_branches_by_commit,
+)
+from chat_with_repo.commit_tools import (
+    aget_commit_by_sha,
+    aget_commits_by_pull_request,
+    get_commit_by_sha,
+    get_commits_by_pull_request,
+)
+from chat_with_repo.model import Commit, PullRequest, Repo
+from chat_with_repo.pull_request_tools import (
+    aget_pull_request_by_number,
+    aget_pull_requests_by_commit,
+    get_pull_request_by_number,
+    get_pull_requests_by_commit,
+)
+from chat_with_repo.tag_tools import afind_tags_by_commit, find_tags_by_commit
+from chat_with_repo.tracing import TOOL_SPAN, span
+
+# A SHA must contain at least a letter otherwise it could be a number
+SHA_PATTERN = re.compile(r"\b(?=[0-9a-f]*[a-f])[0-9a-f]{7,40}\b", re.IGNORECASE)
+PULL_REQUEST_NUMBER_PATTERN = re.compile(
+    r"(?:\b(?:pr|pull[\s-]?request)\s*(?:number\s*)?#?|#)(\d+)\b", re.IGNORECASE
+)
+
+FILLER_WORDS = {
+    "a",
+    "about",
+    "all",
+    "an",
+    "any",
+    "are",
+    "associated",
+    "by",
+    "can",
+    "could",
+    "details",
+    "display",
+    "find",
+    "for",
+    "from",
+    "get",
+    "give",
+    "hello",
+    "hi",
+    "in",
+    "info",
+    "information",
+    "is",
+    "list",
+    "me",
+    "number",
+    "of",
+    "on",
+    "please",
+    "project",
+    "related",
+    "repo",
+    "repository",
+    "show",
+    "tell",
+    "that",
+    "the",
+    "this",
+    "to",
+    "what",
+    "which",
+    "you",
+}
+PULL_REQUEST_WORDS = {"pr", "prs", "pull", "request", "requests", "pullrequest"}
+COMMIT_WORDS = {"commit", "commits", "sha", "hash"}
+TAG_WORDS = {"tag", "tags", "release", "releases", "version", "versions"}
+BRANCH_WORDS = {"branch", "branches"}
+CONTAIN_WORDS = {
+    "contain",
+    "contains",
+    "containing",
+    "include",
+    "includes",
+    "including",
+    "has",
+    "have",
+    "having",
+    "with",
+}
+
+KNOWN_WORDS = (
+    FILLER_WORDS
+    | PULL_REQUEST_WORDS
+    | COMMIT_WORDS
+    | TAG_WORDS
+    | BRANCH_WORDS
+    | CONTAIN_WORDS
+)
+
+
+class Route(BaseModel):
+    """
+    Represents a question that can be answered by calling directly a tool, without the agent.
+
+    Attributes:
+        tool (str): The name of the tool to call.
+        args (Dict[str, Any]): The arguments of the tool.
+        repo (Optional[Repo]): The repository named in the question, None if no repository is named.
+    """
+
+    tool: str
+    args: Dict[str, Any]
+    repo: Optional[Repo] = None
+
+
+def route_message(message: str) -> Optional[Route]:
+    """
+    Recognizes the simple lookups: pull request by number, commit by SHA, pull requests, tags or branches
+    containing a commit and commits of a pull request.
+
+    Args:
+        message (str): The user's message.
+
+    Returns:
+        Optional[Route]: The route to follow, None if the message is ambiguous and must be handled by the agent.
+    """
+    text = message.strip()
+    repo = None
+    for candidate in sorted(Repo, key=lambda r: len(r.value), reverse=True):
+        for name in __repo_names(candidate):
+            pattern = re.compile(
+                rf"(?<![\w.-]){re.escape(name)}(?![\w-])", re.IGNORECASE
+            )
+            if pattern.search(text):
+                if repo is not None and repo != candidate:
+                    return None
+                repo = candidate
+                text = pattern.sub(" ", text)
+
+    pull_request_numbers = set(PULL_REQUEST_NUMBER_PATTERN.findall(text))
+    text = PULL_REQUEST_NUMBER_PATTERN.sub(" pr ", text)
+    shas = {sha.lower() for sha in SHA_PATTERN.findall(text)}
+    text = SHA_PATTERN.sub(" ", text)
+    if len(pull_request_numbers) > 1 or len(shas) > 1:
+        return None
+
+    words = set(re.findall(r"[a-z0-9]+", text.lower()))
+    # Any word we do not know could change the meaning of the question
+    if not words <= KNOWN_WORDS:
+        return None
+
+    number = int(pull_request_numbers.pop()) if pull_request_numbers else None
+    sha = shas.pop() if shas else None
+    mentions_pull_request = bool(words & PULL_REQUEST_WORDS)
+    mentions_commit = bool(words & COMMIT_WORDS)
+    mentions_tag = bool(words & TAG_WORDS)
+    mentions_branch = bool(words & BRANCH_WORDS)
+
+    if sha and number is None:
+        if mentions_tag and not mentions_branch and not mentions_pull_request:
+            return Route(
+                tool="find_tags_by_commit", args={"commit_sha": sha}, repo=repo
+            )
+        if mentions_branch and not mentions_tag and not mentions_pull_request:
+            return Route(
+                tool="find_branches_by_commit", args={"commit_sha": sha}, repo=repo
+            )
+        if mentions_pull_request and not mentions_tag and not mentions_branch:
+            return Route(
+                tool="get_pull_requests_by_commit", args={"commit_sha": sha}, repo=repo
+            )
+        if not (mentions_tag or mentions_branch or mentions_pull_request):
+            return Route(tool="get_commit_by_sha", args={"sha": sha}, repo=repo)
+    if number is not None and sha is None and not (mentions_tag or mentions_branch):
+        if mentions_commit:
+            return Route(
+                tool="get_commits_by_pull_request", args={"number": number}, repo=repo
+            )
+        return Route(
+            tool="get_pull_request_by_number", args={"number": number}, repo=repo
+        )
+    return None
+
+
+def run_route(route: Route, repo: Repo, topK: int = 10) -> str:
+    """
+    Calls the tool of the route and formats its result.
+
+    Args:
+        route (Route): The route.
+        repo (Repo): The repository to query.
+        topK (int, optional): The maximum number of results. Defaults to 10.
+
+    Returns:
+        str: The answer in markdown format.
+    """
+    owner, name = repo.owner, repo.value
+    with span(TOOL_SPAN, route.tool, fast_path=True):
+        if route.tool == "get_pull_request_by_number":
+            result = get_pull_request_by_number(owner=owner, repo=name, **route.args)
+        elif route.tool == "get_pull_requests_by_commit":
+            result = get_pull_requests_by_commit(owner=owner, repo=name, **route.args)
+        elif route.tool == "get_commit_by_sha":
+            result = get_commit_by_sha(
+                commit_sha=route.args["sha"], owner=owner, repo=name
+            )
+        elif route.tool == "get_commits_by_pull_request":
+            result = get_commits_by_pull_request(owner=owner, repo=name, **route.args)
+        elif route.tool == "find_branches_by_commit":
+            result = find_branches_by_commit(owner=owner, repo=name, **route.args)
+        elif route.tool == "find_tags_by_commit":
+            result = find_tags_by_commit(owner=owner, repo=name, **route.args)
+        else:
+            raise ValueError(f"Unknown route tool: {route.tool}")
+    return format_route_result(route, repo, result, topK)
+
+
+async def arun_route(route: Route, repo: Repo, topK: int = 10) -> str:
+    """
+    Async version of run_route.
+    """
+    owner, name = repo.owner, repo.value
+    with span(TOOL_SPAN, route.tool, fast_path=True):
+        if route.tool == "get_pull_request_by_number":
+            result = await aget_pull_request_by_number(
+                owner=owner, repo=name, **route.args
+            )
+        elif route.tool == "get_pull_requests_by_commit":
+            result = await aget_pull_requests_by_commit(
+                owner=owner, repo=name, **route.args
+            )
+        elif route.tool == "get_commit_by_sha":
+            result = await aget_commit_by_sha(
+                commit_sha=route.args["sha"], owner=owner, repo=name
+            )
+        elif route.tool == "get_commits_by_pull_request":
+            result = await aget_commits_by_pull_request(
+                owner=owner, repo=name, **route.args
+            )
+        elif route.tool == "find_branches_by_commit":
+            result = await afind_branches_by_commit(
+                owner=owner, repo=name, **route.args
+            )
+        elif route.tool == "find_tags_by_commit":
+            result = await afind_tags_by_commit(owner=owner, repo=name, **route.args)
+        else:
+            raise ValueError(f"Unknown route tool: {route.tool}")
+    return format_route_result(route, repo, result, topK)
+
+
+def format_route_result(route: Route, repo: Repo, result: Any, topK: int = 10) -> str:
+    """
+    Formats in markdown the result of the tool of the route.
+
+    Args:
+        route (Route): The route.
+        repo (Repo): The repository queried.
+        result (Any): The result of the tool.
+        topK (int, optional): The maximum number of results shown. Defaults to 10.
+
+    Returns:
+        str: The answer in markdown format.
+    """
+    if route.tool == "get_pull_request_by_number":
+        if result is None:
+            return f"Pull request #{route.args['number']} not found in {repo.value}."
+        return __format_pull_request(result)
+    if route.tool == "get_pull_requests_by_commit":
+        if not result:
+            return f"No pull request contains the commit {route.args['commit_sha']} in {repo.value}."
+        return "\n".join(f"- {__format_pull_request_line(pr)}" for pr in result[:topK])
+    if route.tool == "get_commit_by_sha":
+        if result is None:
+            return f"Commit {route.args['sha']} not found in {repo.value}."
+        return __format_commit(result)
+    if route.tool == "get_commits_by_pull_request":
+        if not result:
+            return f"No commits found for the pull request #{route.args['number']} in {repo.value}."
+        return "\n".join(
+            f"- {__format_commit_line(commit)}" for commit in result[:topK]
+        )
+    if route.tool in ("find_branches_by_commit", "find_tags_by_commit"):
+        kind = "branches" if route.tool == "find_branches_by_commit" else "tags"
+        if not result:
+            return f"No {kind} contain the commit {route.args['commit_sha']} in {repo.value}."
+        return (
+            f"The {kind} containing the commit {route.args['commit_sha']} are: "
+            + ", ".join(result[:topK])
+        )
+    raise ValueError(f"Unknown route tool: {route.tool}")
+
+
+def __repo_names(repo: Repo) -> List[str]:
+    names = {
+        repo.value,
+        repo.name,
+        repo.value.replace("-", " "),
+        repo.name.replace("_", " "),
+    }
+    return sorted(names, key=len, reverse=True)
+
+
+def __format_pull_request(pull_request: PullRequest) -> str:
+    if pull_request.merged_at:
+        status = f"merged on {pull_request.merged_at:%B %d, %Y}"
+    elif pull_request.closed_at:
+        status = f"closed on {pull_request.closed_at:%B %d, %Y}"
+    else:
+        status = "open"
+    return "\n".join(
+        [
+            f"**#{pull_request.number}** [{pull_request.title}]({pull_request.html_url})",
+            f"- author: {pull_request.user.login}",
+            f"- from `{pull_request.head.ref}` into `{pull_request.base.ref}`",
+            f"- created on {pull_request.created_at:%B %d, %Y}, {status}",
+            f"- head commit: {pull_request.head.sha}",
+        ]
+    )
+
+
+def __format_pull_request_line(pull_request: PullRequest) -> str:
+    return (
+        f"[#{pull_request.number}]({pull_request.html_url}) {pull_request.title} "
+        f"({pull_request.head.ref} → {pull_request.base.ref})"
+    )
+
+
+def __format_commit(commit: Commit) -> str:
+    author = commit.commit.author
+    return "\n".join(
+        [
+            f"**[{commit.sha}]({commit.html_url})**",
+            f"- author: {author.name} <{author.email}>",
+            f"- date: {author.date:%B %d, %Y %H:%M}",
+            f"- message: {commit.commit.message}",
+        ]
+    )
+
+
+def __format_commit_line(commit: Commit) -> str:
+    author = commit.commit.author
+    message = commit.commit.message.splitlines()[0] if commit.commit.message else ""
+    return f"[{commit.sha}]({commit.html_url}) {message} ({author.name}, {author.date:%Y-%m-%d})"
@@ -0,0 +1,300 @@
+import json
+import os
+from functools import cached_property
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+SCOPES = [
+    "https://www.googleapis.com/auth/userinfo.profile",
+    "https://www.googleapis.com/auth/userinfo.email",
+    "openid",
+]
+
+
+class Settings:
+    """
+    The settings of the application, read from the environment variables (and the .env file) and,
+    only for the Google authentication, from the Streamlit secrets.
+    Each setting is read and validated on first access, so a module only pays for the settings it uses:
+    i.e. the GitHub tools do not need Streamlit nor the OpenAI key.
+    """
+
+    def __init__(self, environ: Optional[Dict[str, str]] = None):
+        """
+        Initializes a new instance of the Settings class.
+
+        Args:
+            environ (Optional[Dict[str, str]], optional): The variables to read instead of os.environ and .env,
+                i.e. in the tests. Defaults to None.
+        """
+        self.__environ = environ
+        self.__dotenv_loaded = environ is not None
+        self.__lock = Lock()
+
+    @cached_property
+    def github_token(self) -> str:
+        return self.__required(
+            "GITHUB_TOKEN",
+            "Wrong github settings. GITHUB_TOKEN environment variable is not set.",
+        )
+
+    # The base url of the GitHub REST API, i.e. a GitHub Enterprise server or the fake server of the tests
+    @cached_property
+    def github_api_url(self) -> str:
+        return self.__getenv("GITHUB_API_URL", "https://api.github.com").rstrip("/")
+
+    @cached_property
+    def openai_api_key(self) -> str:
+        return self.__required(
+            "OPENAI_API_KEY",
+            "Wrong openai settings. OPENAI_API_KEY environment variable is not set.",
+        )
+
+    # Google settings
+    # Client ID and secret are stored in the client_secret.json
+    # Google project: https://console.cloud.google.com/apis/credentials?project=chatwithrepo-429720
+    # Account: lanarimarco@gmail.com
+    # Credenziali -> ID client OAuth 2.0 - development
+    @cached_property
+    def client_secret(self) -> Dict[str, Any]:
+        client_secret = self.__get_secret("client_secret")
+        if not client_secret:
+            raise Exception(
+                "Wrong google auth settings. CLIENT_SECRET is not set. "
+                "In local development you can set it in the .streamlit/secrets.toml section: [google.client_secret.web], view .secrets.toml for further information. "
+                "In production you can set it in the environment variables."
+            )
+        return client_secret
+
+    @cached_property
+    def redirect_uri(self) -> str:
+        flow = self.__get_secret("flow")
+        redirect_uri = flow.get("redirect_uri") if flow else None
+        if not redirect_uri:
+            raise Exception(
+                "Wrong google auth settings. REDIRECT_URI is not set. "
+                "In local development you can set it in the .streamlit/secrets.toml section: [google.flow.redirect_uri], view .secrets.toml for further information. "
+                "In production you can set it in the environment variables."
+            )
+        return redirect_uri
+
+    @cached_property
+    def authorized_users(self) -> str:
+        return self.__required(
+            "AUTHORIZED_USERS",
+            "Wrong authorized users settings. AUTHORIZED_USERS environment variable is not set.",
+        )
+
+    @cached_property
+    def debug(self) -> bool:
+        return self.__getenv("DEBUG", "False").lower() == "true"
+
+    @cached_property
+    def model_name(self) -> str:
+        model_name = self.__getenv("MODEL_NAME", "gpt-4o-mini")
+        if not model_name:
+            raise Exception(
+                "Wrong model settings. MODEL_NAME environment variable is not set."
+            )
+        return model_name
+
+    # Models of each stage: the agent plans the tool calls with the small fast model and escalates to
+    # the stronger one when the tool call is not valid, the code review uses the stronger model
+    @cached_property
+    def agent_model_name(self) -> str:
+        return self.__getenv("AGENT_MODEL_NAME") or self.model_name
+
+    @cached_property
+    def escalation_model_name(self) -> str:
+        return self.__getenv("ESCALATION_MODEL_NAME", "gpt-4o")
+
+    @cached_property
+    def code_review_model_name(self) -> str:
+        return self.__getenv("CODE_REVIEW_MODEL_NAME", "gpt-4o")
+
+    # The cheap model used to summarize the older messages of the chat history
+    @cached_property
+    def summary_model_name(self) -> str:
+        return self.__getenv("SUMMARY_MODEL_NAME", "gpt-4o-mini")
+
+    # The prices of the models, in addition to or instead of the ones of pricing.MODEL_PRICES,
+    # as a JSON object of USD for 1M input and output tokens, i.e. {"gpt-4o": [2.5, 10]}
+    @cached_property
+    def model_prices(self) -> Dict[str, Tuple[float, float]]:
+        try:
+            return {
+                model: (float(price[0]), float(price[1]))
+                for model, price in json.loads(
+                    self.__getenv("MODEL_PRICES") or "{}"
+                ).items()
+            }
+        except (ValueError, TypeError, IndexError, AttributeError):
+            raise Exception(
+                'Wrong model prices settings. MODEL_PRICES must be a JSON object like {"gpt-4o": [2.5, 10]}.'
+            )
+
+    # The tokens and the cost of the turns by user, session, repository and kind of question
+    @cached_property
+    def usage_path(self) -> str:
+        return self.__getenv("USAGE_PATH", ".cache/usage.sqlite")
+
+    # LLM response cache: off, read_write, record (refresh the responses) or replay (offline, a miss is an error)
+    @cached_property
+    def llm_cache_mode(self) -> str:
+        llm_cache_mode = self.__getenv("LLM_CACHE_MODE", "read_write").lower()
+        if llm_cache_mode not in ("off", "read_write", "record", "replay"):
+            raise Exception(
+                "Wrong llm cache settings. LLM_CACHE_MODE must be one of: off, read_write, record, replay."
+            )
+        return llm_cache_mode
+
+    @cached_property
+    def llm_cache_path(self) -> str:
+        return self.__getenv("LLM_CACHE_PATH", ".cache/llm_cache.sqlite")
+
+    @cached_property
+    def llm_cache_max_size_mb(self) -> int:
+        return int(self.__getenv("LLM_CACHE_MAX_SIZE_MB", "100"))
+
+    # Background code reviews: the database of the jobs and how many reviews run at the same time
+    @cached_property
+    def review_jobs_path(self) -> str:
+        return self.__getenv("REVIEW_JOBS_PATH", ".cache/review_jobs.sqlite")
+
+    @cached_property
+    def review_max_concurrent_jobs(self) -> int:
+        review_max_concurrent_jobs = int(
+            self.__getenv("REVIEW_MAX_CONCURRENT_JOBS", "2")
+        )
+        if review_max_concurrent_jobs < 1:
+            raise Exception(
+                "Wrong review jobs settings. REVIEW_MAX_CONCURRENT_JOBS must be at least 1."
+            )
+        return review_max_concurrent_jobs
+
+    # The GitHub responses revalidated with their ETag and the metadata (pull requests, ancestry of the commits)
+    # shared by all the sessions
+    @cached_property
+    def github_response_cache_mb(self) -> int:
+        return int(self.__getenv("GITHUB_RESPONSE_CACHE_MB", "50"))
+
+    @cached_property
+    def metadata_store_max_entries(self) -> int:
+        return int(self.__getenv("METADATA_STORE_MAX_ENTRIES", "10000"))
+
+    # How long a GitHub response is reused without revalidating it, 0 always revalidates
+    @cached_property
+    def github_response_max_age_seconds(self) -> float:
+        return float(self.__getenv("GITHUB_RESPONSE_MAX_AGE_SECONDS", "0"))
+
+    # The cache warmer refreshes the pull requests, branches, tags and commits of the repositories in background
+    @cached_property
+    def cache_warmer_interval_seconds(self) -> float:
+        return float(self.__getenv("CACHE_WARMER_INTERVAL_SECONDS", "0"))
+
+    @cached_property
+    def cache_warmer_repos(self) -> List[str]:
+        return [
+            repo.strip()
+            for repo in self.__getenv(
+                "CACHE_WARMER_REPOS", "jariko,webup-project"
+            ).split(",")
+            if repo.strip()
+        ]
+
+    @cached_property
+    def cache_warmer_rate_limit_share(self) -> float:
+        cache_warmer_rate_limit_share = float(
+            self.__getenv("CACHE_WARMER_RATE_LIMIT_SHARE", "0.1")
+        )
+        if not 0 < cache_warmer_rate_limit_share <= 1:
+            raise Exception(
+                "Wrong cache warmer settings. CACHE_WARMER_RATE_LIMIT_SHARE must be greater than 0 and at most 1."
+            )
+        return cache_warmer_rate_limit_share
+
+    # The webhook receiver applies the GitHub events to the caches, it runs only if the secret is set
+    @cached_property
+    def github_webhook_secret(self) -> Optional[str]:
+        return self.__getenv("GITHUB_WEBHOOK_SECRET") or None
+
+    @cached_property
+    def github_webhook_port(self) -> int:
+        return int(self.__getenv("GITHUB_WEBHOOK_PORT", "8502"))
+
+    # The spans of the turns are exported through the OpenTelemetry API, it needs opentelemetry-api and an exporter
+    @cached_property
+    def tracing_otel(self) -> bool:
+        return self.__getenv("TRACING_OTEL", "False").lower() == "true"
+
+    # The Prometheus metrics are served on http://<address>:<port>/metrics, only if the port is set
+    @cached_property
+    def metrics_port(self) -> Optional[int]:
+        metrics_port = self.__getenv("METRICS_PORT")
+        return int(metrics_port) if metrics_port else None
+
+    @cached_property
+    def metrics_address(self) -> str:
+        return self.__getenv("METRICS_ADDRESS", "127.0.0.1")
+
+    def __getenv(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        if self.__environ is not None:
+            return self.__environ.get(name, default)
+        if not self.__dotenv_loaded:
+            with self.__lock:
+                if not self.__dotenv_loaded:
+                    from dotenv import load_dotenv
+
+                    load_dotenv()
+                    self.__dotenv_loaded = True
+        return os.getenv(name, default)
+
+    def __required(self, name: str, message: str) -> str:
+        value = self.__getenv(name)
+        if not value:
+            raise Exception(message)
+        return value
+
+    def __get_secret(self, name: str) -> Optional[Any]:
+        # Streamlit is imported only by the settings of the web app
+        import streamlit as st
+
+        return st.secrets["google"].get(name)
+
+
+# The settings of the process
+settings = Settings()
+
+# The names of the settings exported by the chat_with_repo package
+EXPORTED_SETTINGS = {
+    "GITHUB_TOKEN": "github_token",
+    "GITHUB_API_URL": "github_api_url",
+    "OPENAI_API_KEY": "openai_api_key",
+    "CLIENT_SECRET": "client_secret",
+    "REDIRECT_URI": "redirect_uri",
+    "AUTHORAZED_USERS": "authorized_users",
+    "DEBUG": "debug",
+    "MODEL_NAME": "model_name",
+    "AGENT_MODEL_NAME": "agent_model_name",
+    "ESCALATION_MODEL_NAME": "escalation_model_name",
+    "CODE_REVIEW_MODEL_NAME": "code_review_model_name",
+    "SUMMARY_MODEL_NAME": "summary_model_name",
+    "MODEL_PRICES": "model_prices",
+    "USAGE_PATH": "usage_path",
+    "LLM_CACHE_MODE": "llm_cache_mode",
+    "LLM_CACHE_PATH": "llm_cache_path",
+    "LLM_CACHE_MAX_SIZE_MB": "llm_cache_max_size_mb",
+    "REVIEW_JOBS_PATH": "review_jobs_path",
+    "REVIEW_MAX_CONCURRENT_JOBS": "review_max_concurrent_jobs",
+    "GITHUB_RESPONSE_CACHE_MB": "github_response_cache_mb",
+    "METADATA_STORE_MAX_ENTRIES": "metadata_store_max_entries",
+    "GITHUB_RESPONSE_MAX_AGE_SECONDS": "github_response_max_age_seconds",
+    "CACHE_WARMER_INTERVAL_SECONDS": "cache_warmer_interval_seconds",
+    "CACHE_WARMER_REPOS": "cache_warmer_repos",
+    "CACHE_WARMER_RATE_LIMIT_SHARE": "cache_warmer_rate_limit_share",
+    "GITHUB_WEBHOOK_SECRET": "github_webhook_secret",
+    "GITHUB_WEBHOOK_PORT": "github_webhook_port",
+    "TRACING_OTEL": "tracing_otel",
+    "METRICS_PORT": "metrics_port",
+    "METRICS_ADDRESS": "metrics_address",
+}
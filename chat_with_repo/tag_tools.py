@@ -1,11 +1,13 @@
+import asyncio
 from typing import List, Type
-import requests
 from langchain_core.pydantic_v1 import BaseModel, Field
 from langchain_core.tools import BaseTool
 
-from chat_with_repo import GITHUB_TOKEN
-from chat_with_repo.commit_tools import is_commit_in_base
+from chat_with_repo.settings import settings
+from chat_with_repo.commit_tools import ais_commit_in_base, is_commit_in_base
+from chat_with_repo.github_client import aget, get
 from chat_with_repo.model import State
+from chat_with_repo.tool_output import MAX_OUTPUT_TOKENS, encode_names
 import re
 
 
@@ -16,16 +18,36 @@ class FindTagsByCommitSchema(BaseModel):
 class FindTagsByCommitTool(BaseTool):
     state: State
     topK: int = 10
+    max_output_tokens: int = MAX_OUTPUT_TOKENS
     args_schema: Type[BaseModel] = FindTagsByCommitSchema
     name: str = "find_tags_by_commit"
     description = "Retrieves the tags that contain a specific commit."
 
-    def _run(self, commit_sha: str) -> List[str]:
-        return find_tags_by_commit(
-            commit_sha=commit_sha,
-            owner=self.state.repo.owner,
-            repo=self.state.repo.name,
-        )[: self.topK]
+    def _run(self, commit_sha: str) -> str:
+        return self.__encode(
+            find_tags_by_commit(
+                commit_sha=commit_sha,
+                owner=self.state.repo.owner,
+                repo=self.state.repo.name,
+            )
+        )
+
+    async def _arun(self, commit_sha: str) -> str:
+        return self.__encode(
+            await afind_tags_by_commit(
+                commit_sha=commit_sha,
+                owner=self.state.repo.owner,
+                repo=self.state.repo.name,
+            )
+        )
+
+    def __encode(self, names: List[str]) -> str:
+        return encode_names(
+            names[: self.topK],
+            "tags",
+            max_tokens=self.max_output_tokens,
+            total=len(names),
+        )
 
 
 def find_tags_by_commit(
@@ -36,11 +58,11 @@ def find_tags_by_commit(
 ) -> List[str]:
 
     # List all tags
-    url = f"https://api.github.com/repos/{owner}/{repo}/tags"
+    url = f"{settings.github_api_url}/repos/{owner}/{repo}/tags"
 
     headers = {
         "Accept": "application/vnd.github.v3+json",
-        "Authorization": f"token {GITHUB_TOKEN}",
+        "Authorization": f"token {settings.github_token}",
     }
     params = {
         "per_page": 100,
@@ -50,7 +72,7 @@ def find_tags_by_commit(
     tags_by_commit = []
     force_break = False
     while nextUrl and not force_break:
-        response = requests.get(url=nextUrl, headers=headers, params=params)
+        response = get(nextUrl, headers=headers, params=params)
         if response.status_code == 200:
             tags = response.json()
             for tag in tags:
@@ -75,3 +97,62 @@ def find_tags_by_commit(
                 f"Check if your profile has the rights for {url}",
             )
     return tags_by_commit
+
+
+async def afind_tags_by_commit(
+    commit_sha: str,
+    tag_match_regexp: str = "v[0-9]+.[0-9]+.[0-9]+",
+    owner: str = "smeup",
+    repo: str = "jariko",
+) -> List[str]:
+    """
+    Async version of find_tags_by_commit.
+    The tags of each page are verified concurrently, then they are scanned in the same order of the sync version.
+    """
+
+    url = f"{settings.github_api_url}/repos/{owner}/{repo}/tags"
+
+    headers = {
+        "Accept": "application/vnd.github.v3+json",
+        "Authorization": f"token {settings.github_token}",
+    }
+    params = {
+        "per_page": 100,
+    }
+
+    nextUrl = url
+    tags_by_commit = []
+    force_break = False
+    while nextUrl and not force_break:
+        response = await aget(nextUrl, headers=headers, params=params)
+        if response.status_code == 200:
+            tags = [
+                tag
+                for tag in response.json()
+                if re.match(tag_match_regexp, tag["name"])
+            ]
+            contains_commit = await asyncio.gather(
+                *[
+                    ais_commit_in_base(
+                        commit_sha=commit_sha,
+                        base=tag["commit"]["sha"],
+                        owner=owner,
+                        repo=repo,
+                    )
+                    for tag in tags
+                ]
+            )
+            for tag, contains in zip(tags, contains_commit):
+                if contains:
+                    tags_by_commit.append(tag["name"])
+                elif len(tags_by_commit) > 0:
+                    # see find_tags_by_commit
+                    force_break = True
+                    break
+            nextUrl = response.links.get("next", {}).get("url")
+        else:
+            raise Exception(
+                f"Error: {response.status_code} - {response.text}",
+                f"Check if your profile has the rights for {url}",
+            )
+    return tags_by_commit
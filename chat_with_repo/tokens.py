@@ -0,0 +1,55 @@
+import json
+from functools import lru_cache
+from typing import List, Optional
+
+import tiktoken
+from langchain_core.tools import BaseTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+
+@lru_cache(maxsize=None)
+def __get_encoding(model: str) -> Optional[tiktoken.Encoding]:
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # tiktoken downloads the encodings the first time, without network we can only estimate
+        print(
+            f"Unable to load the tiktoken encoding for {model}, tokens are estimated: {e}"
+        )
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """
+    Counts the tokens of a text.
+
+    Args:
+        text (str): The text.
+        model (str, optional): The model whose tokenizer is used. Defaults to "gpt-4o-mini".
+
+    Returns:
+        int: The number of tokens, estimated as one token every 4 chars if the encoding is not available.
+    """
+    encoding = __get_encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_tool_tokens(tools: List[BaseTool], model: str = "gpt-4o-mini") -> int:
+    """
+    Counts the tokens of the tool schemas sent to the model.
+
+    Args:
+        tools (List[BaseTool]): The tools.
+        model (str, optional): The model whose tokenizer is used. Defaults to "gpt-4o-mini".
+
+    Returns:
+        int: The number of tokens of the JSON schemas of the tools.
+    """
+    return sum(
+        count_tokens(json.dumps(convert_to_openai_tool(tool)), model) for tool in tools
+    )
@@ -0,0 +1,231 @@
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from chat_with_repo.model import Commit, PullRequest
+from chat_with_repo.tokens import count_tokens
+
+# The default maximum number of tokens of a tool output
+MAX_OUTPUT_TOKENS = 1500
+
+# The maximum number of chars of the body of a pull request
+MAX_BODY_CHARS = 1000
+
+PULL_REQUEST_FIELDS: Dict[str, Callable[[PullRequest], Any]] = {
+    "number": lambda pr: pr.number,
+    "title": lambda pr: pr.title,
+    "author": lambda pr: pr.user.login,
+    "head": lambda pr: pr.head.ref,
+    "base": lambda pr: pr.base.ref,
+    "state": lambda pr: pull_request_state(pr),
+    "created": lambda pr: format_date(pr.created_at),
+    "head_sha": lambda pr: pr.head.sha,
+}
+
+COMMIT_FIELDS: Dict[str, Callable[[Commit], Any]] = {
+    "sha": lambda commit: commit.sha,
+    "date": lambda commit: format_date(commit.commit.author.date),
+    "author": lambda commit: commit.commit.author.name,
+    "email": lambda commit: commit.commit.author.email,
+    "message": lambda commit: first_line(commit.commit.message),
+}
+
+
+def encode_pull_request(pull_request: Optional[PullRequest]) -> str:
+    """
+    Encodes a pull request with all the fields useful to answer the questions about it.
+
+    Args:
+        pull_request (Optional[PullRequest]): The pull request.
+
+    Returns:
+        str: One "field: value" line for each field.
+    """
+    if pull_request is None:
+        return "Pull request not found."
+    body = pull_request.body or ""
+    if len(body) > MAX_BODY_CHARS:
+        body = body[:MAX_BODY_CHARS] + "... (truncated)"
+    return "\n".join(
+        [
+            f"number: {pull_request.number}",
+            f"title: {pull_request.title}",
+            f"url: {pull_request.html_url}",
+            f"author: {pull_request.user.login}",
+            f"head: {pull_request.head.ref} ({pull_request.head.sha})",
+            f"base: {pull_request.base.ref}",
+            f"created: {format_date(pull_request.created_at)}",
+            f"merged: {format_date(pull_request.merged_at)}",
+            f"closed: {format_date(pull_request.closed_at)}",
+            f"body: {body}",
+        ]
+    )
+
+
+def encode_pull_requests(
+    pull_requests: List[PullRequest],
+    fields: List[str],
+    max_tokens: int = MAX_OUTPUT_TOKENS,
+    total: Optional[int] = None,
+) -> str:
+    """
+    Encodes a list of pull requests as a table with only the given fields.
+
+    Args:
+        pull_requests (List[PullRequest]): The pull requests.
+        fields (List[str]): The fields to show, keys of PULL_REQUEST_FIELDS.
+        max_tokens (int, optional): The maximum number of tokens. Defaults to MAX_OUTPUT_TOKENS.
+        total (Optional[int], optional): The number of pull requests found, if greater than the ones passed. Defaults to None.
+
+    Returns:
+        str: The table.
+    """
+    rows = [
+        {field: PULL_REQUEST_FIELDS[field](pr) for field in fields}
+        for pr in pull_requests
+    ]
+    return encode_table(rows, "pull requests", max_tokens, total)
+
+
+def encode_commit(commit: Optional[Commit]) -> str:
+    """
+    Encodes a commit with all the fields useful to answer the questions about it.
+
+    Args:
+        commit (Optional[Commit]): The commit.
+
+    Returns:
+        str: One "field: value" line for each field.
+    """
+    if commit is None:
+        return "Commit not found."
+    author = commit.commit.author
+    return "\n".join(
+        [
+            f"sha: {commit.sha}",
+            f"url: {commit.html_url}",
+            f"author: {author.name} <{author.email}>",
+            f"date: {format_date(author.date)}",
+            f"message: {commit.commit.message}",
+        ]
+    )
+
+
+def encode_commits(
+    commits: List[Commit],
+    fields: List[str],
+    max_tokens: int = MAX_OUTPUT_TOKENS,
+    total: Optional[int] = None,
+) -> str:
+    """
+    Encodes a list of commits as a table with only the given fields.
+
+    Args:
+        commits (List[Commit]): The commits.
+        fields (List[str]): The fields to show, keys of COMMIT_FIELDS.
+        max_tokens (int, optional): The maximum number of tokens. Defaults to MAX_OUTPUT_TOKENS.
+        total (Optional[int], optional): The number of commits found, if greater than the ones passed. Defaults to None.
+
+    Returns:
+        str: The table.
+    """
+    rows = [
+        {field: COMMIT_FIELDS[field](commit) for field in fields} for commit in commits
+    ]
+    return encode_table(rows, "commits", max_tokens, total)
+
+
+def encode_names(
+    names: List[str],
+    kind: str,
+    max_tokens: int = MAX_OUTPUT_TOKENS,
+    total: Optional[int] = None,
+) -> str:
+    """
+    Encodes a list of names (i.e. branches or tags).
+
+    Args:
+        names (List[str]): The names.
+        kind (str): What the names are, i.e. "branches".
+        max_tokens (int, optional): The maximum number of tokens. Defaults to MAX_OUTPUT_TOKENS.
+        total (Optional[int], optional): The number of names found, if greater than the ones passed. Defaults to None.
+
+    Returns:
+        str: One name for each line.
+    """
+    return encode_table([{"name": name} for name in names], kind, max_tokens, total)
+
+
+def encode_table(
+    rows: List[Dict[str, Any]],
+    kind: str,
+    max_tokens: int = MAX_OUTPUT_TOKENS,
+    total: Optional[int] = None,
+) -> str:
+    """
+    Encodes the rows as a table separated by "|".
+    The columns having the same value in all rows are shown once before the table and
+    the rows exceeding max_tokens are replaced by a "more available" marker.
+
+    Args:
+        rows (List[Dict[str, Any]]): The rows, all with the same keys.
+        kind (str): What the rows are, i.e. "pull requests".
+        max_tokens (int, optional): The maximum number of tokens. Defaults to MAX_OUTPUT_TOKENS.
+        total (Optional[int], optional): The number of rows found, if greater than the ones passed. Defaults to None.
+
+    Returns:
+        str: The table.
+    """
+    total = max(total or 0, len(rows))
+    if not rows:
+        return f"No {kind} found."
+    columns = list(rows[0].keys())
+    common = (
+        [c for c in columns if len({str(row[c]) for row in rows}) == 1]
+        if len(rows) > 1
+        else []
+    )
+    columns = [c for c in columns if c not in common]
+
+    lines = []
+    if common:
+        lines.append(
+            "all with " + ", ".join(f"{c}: {__to_cell(rows[0][c])}" for c in common)
+        )
+    if len(columns) > 1:
+        lines.append(" | ".join(columns))
+    tokens = count_tokens("\n".join(lines))
+    shown = 0
+    for row in rows:
+        line = " | ".join(__to_cell(row[c]) for c in columns) if columns else ""
+        line_tokens = count_tokens(line) + 1
+        if shown > 0 and tokens + line_tokens > max_tokens:
+            break
+        lines.append(line)
+        tokens += line_tokens
+        shown += 1
+    if shown < total:
+        lines.append(
+            f"... {total - shown} more {kind} available, shown {shown} of {total}"
+        )
+    return "\n".join(line for line in lines if line)
+
+
+def pull_request_state(pull_request: PullRequest) -> str:
+    if pull_request.merged_at:
+        return f"merged {format_date(pull_request.merged_at)}"
+    if pull_request.closed_at:
+        return f"closed {format_date(pull_request.closed_at)}"
+    return "open"
+
+
+def format_date(date: Optional[datetime]) -> str:
+    return "-" if date is None else date.strftime("%Y-%m-%d %H:%M")
+
+
+def first_line(text: Optional[str]) -> str:
+    lines = (text or "").strip().splitlines()
+    return lines[0] if lines else ""
+
+
+def __to_cell(value: Any) -> str:
+    return str(value).replace("|", "/").replace("\n", " ")
@@ -0,0 +1,130 @@
+import re
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+import numpy as np
+from langchain_core.tools import BaseTool
+
+# The tool that is always sent to the model, the other tools depend on the repository it selects
+ALWAYS_SELECTED_TOOLS = ["select_github_repo"]
+
+# Words the users employ for the questions answered by each tool, in addition to the tool name and description
+TOOL_KEYWORDS: Dict[str, str] = {
+    "get_pull_request_by_number": "pr pull request number merged who when author state closed open details",
+    "get_pull_requests": "pr pull requests title body description branch merged opened open approve closed target develop search",
+    "get_pull_requests_by_commit": "pr pull request commit sha hash title containing",
+    "get_pull_requests_by_path": "pr pull request file path",
+    "code_review": "review code describe description changes suggestions diff purpose",
+    "get_commit_by_sha": "commit sha hash author email message date who",
+    "is_commit_in_branch": "commit branch merged contains",
+    "is_commit_in_base": "commit branch tag version merged contains hash",
+    "get_commits_by_path": "commit commits file path",
+    "get_commits_by_pull_request": "commits pull request pr",
+    "find_branches_by_commit": "branches commit contain which",
+    "find_tags_by_commit": "tags versions releases commit contain which",
+    "get_merging_commit": "merged commit who merge",
+}
+
+
+class ToolSelector:
+    """
+    Selects the tools relevant for a question through a TF-IDF index of the tool names, descriptions and keywords,
+    so that the model receives only their schemas.
+
+    Attributes:
+        top_k (int): The maximum number of selected tools, select_github_repo excluded. Defaults to 5.
+    """
+
+    def __init__(self, top_k: int = 5):
+        self.top_k = top_k
+
+    def select(self, message: str, tools: List[BaseTool]) -> List[BaseTool]:
+        """
+        Selects the tools relevant for the message.
+
+        Args:
+            message (str): The user's message.
+            tools (List[BaseTool]): All the available tools.
+
+        Returns:
+            List[BaseTool]: select_github_repo and the top_k tools with a positive score in the order of tools.
+            All the tools when no tool matches the message (i.e. follow up questions as "From who?").
+        """
+        candidates = [tool for tool in tools if tool.name not in ALWAYS_SELECTED_TOOLS]
+        scores = score_tools(
+            message,
+            tuple(
+                (tool.name, tool.description, TOOL_KEYWORDS.get(tool.name, ""))
+                for tool in candidates
+            ),
+        )
+        ranked = [i for i in np.argsort(-scores, kind="stable") if scores[i] > 0]
+        if not ranked:
+            return tools
+        selected = {candidates[i].name for i in ranked[: self.top_k]}
+        return [
+            tool
+            for tool in tools
+            if tool.name in selected or tool.name in ALWAYS_SELECTED_TOOLS
+        ]
+
+
+def score_tools(message: str, documents: Tuple[Tuple[str, ...], ...]) -> np.ndarray:
+    """
+    Computes the cosine similarity between the message and the documents describing the tools.
+
+    Args:
+        message (str): The user's message.
+        documents (Tuple[Tuple[str, ...], ...]): For each tool the texts describing it.
+
+    Returns:
+        np.ndarray: The score of each tool.
+    """
+    vocabulary, idf, matrix = __create_index(documents)
+    query = np.zeros(len(vocabulary))
+    for term in tokenize(message):
+        if term in vocabulary:
+            query[vocabulary[term]] += 1.0
+    query *= idf
+    norm = np.linalg.norm(query)
+    if norm == 0:
+        return np.zeros(len(documents))
+    return matrix @ (query / norm)
+
+
+def tokenize(text: str) -> List[str]:
+    """Splits the text into lowercase words reduced by a naive stemming, the numbers become the word "number" """
+    return [
+        "number" if word.isdigit() else __stem(word)
+        for word in re.findall(r"[a-z]+|\b[0-9]+\b", text.lower())
+    ]
+
+
+@lru_cache(maxsize=8)
+def __create_index(
+    documents: Tuple[Tuple[str, ...], ...],
+) -> Tuple[Dict[str, int], np.ndarray, np.ndarray]:
+    tokenized = [
+        tokenize(" ".join(document).replace("_", " ")) for document in documents
+    ]
+    vocabulary: Dict[str, int] = {}
+    for terms in tokenized:
+        for term in terms:
+            vocabulary.setdefault(term, len(vocabulary))
+    counts = np.zeros((len(documents), len(vocabulary)))
+    for row, terms in enumerate(tokenized):
+        for term in terms:
+            counts[row, vocabulary[term]] += 1.0
+    document_frequency = np.count_nonzero(counts, axis=0)
+    idf = np.log((1 + len(documents)) / (1 + document_frequency)) + 1.0
+    matrix = counts * idf
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vocabulary, idf, matrix / norms
+
+
+def __stem(word: str) -> str:
+    for suffix in ("ing", "es", "ed", "s", "e"):
+        if len(word) - len(suffix) >= 3 and word.endswith(suffix):
+            return word[: -len(suffix)]
+    return word
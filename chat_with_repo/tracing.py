@@ -0,0 +1,397 @@
+import re
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from chat_with_repo.settings import settings
+
+# The kinds of span
+TURN_SPAN = "turn"
+LLM_SPAN = "llm"
+TOOL_SPAN = "tool"
+GITHUB_SPAN = "github"
+
+# The upper bounds in seconds of the buckets of the latency histograms
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# The path segments of the GitHub API replaced by a placeholder in the endpoint template of a request
+ENDPOINT_PATTERNS = [
+    (re.compile(r"^/repos/[^/]+/[^/]+"), "/repos/{owner}/{repo}"),
+    (re.compile(r"/compare/.+$"), "/compare/{basehead}"),
+    (re.compile(r"/(pulls|issues)/\d+"), r"/\1/{number}"),
+    (re.compile(r"/commits/[^/]+"), "/commits/{ref}"),
+    (re.compile(r"/(branches|tags)/.+$"), r"/\1/{name}"),
+]
+
+
+class Span:
+    """
+    A timed operation of a turn: the turn itself, a model call, a tool call or a GitHub request.
+    The spans started while a span is current are its children.
+
+    Attributes:
+        name (str): The kind of operation: turn, llm, tool or github.
+        label (str): What the operation is about: the repository, the model, the tool or the endpoint template.
+        attributes (Dict[str, Any]): The details, i.e. the status and the bytes of a GitHub request.
+        children (List[Span]): The operations run by this one.
+        start_time_ns (int): The start as nanoseconds since the epoch.
+        duration_seconds (Optional[float]): The duration, None while the operation is running.
+    """
+
+    def __init__(
+        self, name: str, label: str = "", parent: Optional["Span"] = None, **attributes
+    ):
+        self.name = name
+        self.label = label
+        self.parent = parent
+        self.attributes: Dict[str, Any] = attributes
+        self.children: List[Span] = []
+        self.start_time_ns = time.time_ns()
+        self.duration_seconds: Optional[float] = None
+        self.__start = time.perf_counter()
+        self.__lock = Lock()
+
+    @property
+    def start(self) -> float:
+        """The time.perf_counter() of the start"""
+        return self.__start
+
+    def set(self, **attributes) -> "Span":
+        self.attributes.update(attributes)
+        return self
+
+    def add_child(self, child: "Span"):
+        # The tools of an agent step run in parallel threads
+        with self.__lock:
+            self.children.append(child)
+
+    def finish(self):
+        """Ends the operation and records its duration, finishing a span twice has no effect"""
+        if self.duration_seconds is not None:
+            return
+        self.duration_seconds = time.perf_counter() - self.__start
+        latency_histograms.observe(self.name, self.label, self.duration_seconds)
+        for listener in list(_span_listeners):
+            try:
+                listener(self)
+            except Exception as e:
+                print(f"Error in span listener: {e}")
+        if self.parent is None and settings.tracing_otel:
+            export_to_opentelemetry(self)
+
+    def walk(self, depth: int = 0) -> Iterator[Tuple[int, "Span"]]:
+        """Yields the span and its descendants with their depth, the children in order of start"""
+        yield depth, self
+        with self.__lock:
+            children = sorted(self.children, key=lambda child: child.start)
+        for child in children:
+            yield from child.walk(depth + 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "label": self.label,
+            "attributes": dict(self.attributes),
+            "duration_seconds": self.duration_seconds,
+            "children": [
+                child.to_dict()
+                for child in sorted(self.children, key=lambda child: child.start)
+            ],
+        }
+
+
+# The callables notified of each finished span
+_span_listeners: List[Callable[[Span], None]] = []
+
+
+def add_span_listener(listener: Callable[[Span], None]):
+    """
+    Notifies the listener of each span when it finishes, i.e. to update the metrics.
+    The exceptions raised by the listener are printed and ignored.
+    """
+    if listener not in _span_listeners:
+        _span_listeners.append(listener)
+
+
+__current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    """
+    Returns:
+        Optional[Span]: The span of the operation running in this context, None outside of a span.
+    """
+    return __current_span.get()
+
+
+def start_span(name: str, label: str = "", **attributes) -> Span:
+    """
+    Starts a span child of the current one without making it current, i.e. when the operation starts and ends
+    in different callbacks. The caller must call finish().
+    """
+    parent = __current_span.get()
+    child = Span(name, label, parent, **attributes)
+    if parent is not None:
+        parent.add_child(child)
+    return child
+
+
+@contextmanager
+def span(name: str, label: str = "", **attributes) -> Iterator[Span]:
+    """
+    Times the block as a span child of the current one, the spans started inside the block are its children.
+    An exception raised by the block is recorded in the error attribute.
+
+    Args:
+        name (str): The kind of operation: turn, llm, tool or github.
+        label (str, optional): What the operation is about. Defaults to "".
+
+    Yields:
+        Span: The span, its attributes can be set by the block.
+    """
+    current = start_span(name, label, **attributes)
+    token = __current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set(error=type(e).__name__)
+        raise
+    finally:
+        __current_span.reset(token)
+        current.finish()
+
+
+class LatencyHistogram:
+    """
+    The distribution of the durations of an operation in the LATENCY_BUCKETS, the quantiles are estimated
+    with the upper bound of their bucket.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        # The last count is the one of the durations over the last bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return self.buckets[index] if index < len(self.buckets) else self.max
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "avg": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+        }
+
+
+class LatencyHistograms:
+    """
+    The latency histograms of the process by kind of span and label, i.e. "github /repos/{owner}/{repo}/pulls"
+    or "tool find_branches_by_commit".
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.__histograms: Dict[Tuple[str, str], LatencyHistogram] = {}
+        self.__lock = Lock()
+
+    def observe(self, name: str, label: str, seconds: float):
+        with self.__lock:
+            histogram = self.__histograms.get((name, label))
+            if histogram is None:
+                histogram = self.__histograms[(name, label)] = LatencyHistogram(
+                    self.buckets
+                )
+            histogram.observe(seconds)
+
+    def histograms(self) -> Dict[Tuple[str, str], LatencyHistogram]:
+        """
+        Returns:
+            Dict[Tuple[str, str], LatencyHistogram]: A copy of the histograms by kind of span and label.
+        """
+        with self.__lock:
+            copies = {}
+            for key, histogram in self.__histograms.items():
+                copy = LatencyHistogram(self.buckets)
+                copy.counts = list(histogram.counts)
+                copy.count, copy.sum, copy.max = (
+                    histogram.count,
+                    histogram.sum,
+                    histogram.max,
+                )
+                copies[key] = copy
+            return copies
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns:
+            Dict[str, Dict[str, float]]: For each kind of span and label count, sum, average, p50, p95, p99
+                and max in seconds.
+        """
+        return {
+            f"{name} {label}".strip(): histogram.summary()
+            for (name, label), histogram in sorted(self.histograms().items())
+        }
+
+    def reset(self):
+        with self.__lock:
+            self.__histograms.clear()
+
+
+# The latency histograms of the process
+latency_histograms = LatencyHistograms()
+
+
+def endpoint_template(url: str) -> str:
+    """
+    Returns:
+        str: The path of a GitHub API url with placeholders for the owner, the repository, the numbers,
+            the refs..., i.e. /repos/{owner}/{repo}/pulls/{number}/files.
+    """
+    path = urlsplit(url).path
+    api_path = urlsplit(settings.github_api_url).path
+    if api_path and path.startswith(api_path):
+        path = path[len(api_path) :]
+    for pattern, replacement in ENDPOINT_PATTERNS:
+        path = pattern.sub(replacement, path)
+    return path
+
+
+def page_number(url: str, params: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Returns:
+        int: The page requested by a GitHub API url, 1 if the url has no page parameter.
+    """
+    pages = parse_qs(urlsplit(url).query).get("page")
+    if pages:
+        return int(pages[-1])
+    return int((params or {}).get("page", 1))
+
+
+def turn_summary(turn: Span) -> Dict[str, Any]:
+    """
+    Sums the time spent by the operations of a turn. The tools of a step and their requests run concurrently,
+    so the sums can exceed the duration of the turn.
+
+    Returns:
+        Dict[str, Any]: The seconds of the turn, the calls and the seconds of the models and of the tools,
+            the requests, the pages after the first, the bytes, the cache hits and the seconds of the
+            GitHub requests.
+    """
+    summary = {
+        "seconds": turn.duration_seconds,
+        "llm_calls": 0,
+        "llm_seconds": 0.0,
+        "tool_calls": 0,
+        "tool_seconds": 0.0,
+        "github_requests": 0,
+        "github_next_pages": 0,
+        "github_bytes": 0,
+        "github_cache_hits": 0,
+        "github_seconds": 0.0,
+    }
+    for _, descendant in list(turn.walk())[1:]:
+        seconds = descendant.duration_seconds or 0.0
+        if descendant.name == LLM_SPAN:
+            summary["llm_calls"] += 1
+            summary["llm_seconds"] += seconds
+        elif descendant.name == TOOL_SPAN:
+            summary["tool_calls"] += 1
+            summary["tool_seconds"] += seconds
+        elif descendant.name == GITHUB_SPAN:
+            summary["github_requests"] += 1
+            summary["github_next_pages"] += descendant.attributes.get("page", 1) > 1
+            summary["github_bytes"] += descendant.attributes.get("bytes", 0)
+            summary["github_cache_hits"] += descendant.attributes.get("cache") in (
+                "fresh",
+                "revalidated",
+            )
+            summary["github_seconds"] += seconds
+    return summary
+
+
+def timing_breakdown(turn: Span) -> List[Dict[str, Any]]:
+    """
+    Returns:
+        List[Dict[str, Any]]: A row for each operation of the turn in order of start, indented by nesting,
+            with its start since the start of the turn, its duration and its attributes.
+    """
+    return [
+        {
+            "operation": f"{'  ' * depth}{descendant.name} {descendant.label}".rstrip(),
+            "start_ms": round((descendant.start - turn.start) * 1000, 1),
+            "duration_ms": (
+                None
+                if descendant.duration_seconds is None
+                else round(descendant.duration_seconds * 1000, 1)
+            ),
+            "details": " ".join(
+                f"{key}={value}" for key, value in descendant.attributes.items()
+            ),
+        }
+        for depth, descendant in turn.walk()
+    ]
+
+
+__opentelemetry_missing = False
+
+
+def export_to_opentelemetry(root: Span):
+    """
+    Replays a finished tree of spans through the OpenTelemetry API, the exporter (OTLP, console...)
+    is the one configured for the process, i.e. by opentelemetry-instrument. Nothing is exported
+    if the opentelemetry-api package is not installed.
+    """
+    global __opentelemetry_missing
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        if not __opentelemetry_missing:
+            print("TRACING_OTEL is set but opentelemetry-api is not installed")
+            __opentelemetry_missing = True
+        return
+    tracer = trace.get_tracer("chat_with_repo")
+
+    def replay(current: Span, context: Any):
+        otel_span = tracer.start_span(
+            f"{current.name} {current.label}".strip(),
+            context=context,
+            start_time=current.start_time_ns,
+            attributes={
+                key: value if isinstance(value, (bool, int, float, str)) else str(value)
+                for key, value in current.attributes.items()
+                if value is not None
+            },
+        )
+        for child in current.children:
+            replay(child, trace.set_span_in_context(otel_span))
+        otel_span.end(
+            end_time=current.start_time_ns
+            + int((current.duration_seconds or 0.0) * 1_000_000_000)
+        )
+
+    replay(root, None)
@@ -0,0 +1,231 @@
+import os
+import sqlite3
+import time
+import uuid
+from threading import Lock
+from typing import Dict, Optional
+
+from pydantic import BaseModel
+
+from chat_with_repo.pricing import estimate_cost
+from chat_with_repo.settings import settings
+from chat_with_repo.tracing import LLM_SPAN, TOOL_SPAN, Span
+
+# The columns the usage can be grouped by
+GROUPS = ("user", "session", "repo", "kind", "model")
+
+
+class Usage(BaseModel):
+    """
+    The tokens and the estimated cost of some model calls.
+
+    Attributes:
+        llm_calls (int): The model calls.
+        input_tokens (int): The input tokens.
+        output_tokens (int): The output tokens.
+        cost (float): The cost in USD estimated with the prices of pricing.
+        turns (int): The turns making the calls, only in the totals of the UsageLedger.
+    """
+
+    llm_calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cost: float = 0.0
+    turns: int = 0
+
+    def add(self, other: "Usage") -> "Usage":
+        self.llm_calls += other.llm_calls
+        self.input_tokens += other.input_tokens
+        self.output_tokens += other.output_tokens
+        self.cost += other.cost
+        self.turns += other.turns
+        return self
+
+
+def span_usage(root: Span) -> Dict[str, Usage]:
+    """
+    Sums the model calls traced under a span, i.e. a turn with the calls of the agent and of the code review.
+    The calls answered by the LLM cache are counted without tokens and cost.
+
+    Returns:
+        Dict[str, Usage]: The usage by model.
+    """
+    usage: Dict[str, Usage] = {}
+    for _, descendant in root.walk():
+        if descendant.name != LLM_SPAN:
+            continue
+        input_tokens = descendant.attributes.get("input_tokens", 0)
+        output_tokens = descendant.attributes.get("output_tokens", 0)
+        usage.setdefault(descendant.label, Usage()).add(
+            Usage(
+                llm_calls=1,
+                input_tokens=input_tokens,
+                output_tokens=output_tokens,
+                cost=estimate_cost(descendant.label, input_tokens, output_tokens),
+            )
+        )
+    return usage
+
+
+def total_usage(usage: Dict[str, Usage]) -> Usage:
+    total = Usage()
+    for model_usage in usage.values():
+        total.add(model_usage)
+    return total
+
+
+def question_kind(turn: Span) -> str:
+    """
+    Returns:
+        str: The kind of question answered by a turn: answer_cache for a cached answer, otherwise the tools called,
+            i.e. find_branches_by_commit+get_commit_by_sha, or no_tool.
+    """
+    if turn.attributes.get("answer_cache") == "hit":
+        return "answer_cache"
+    tools = sorted(
+        {
+            descendant.label
+            for _, descendant in turn.walk()
+            if descendant.name == TOOL_SPAN and descendant.label
+        }
+    )
+    return "+".join(tools) or "no_tool"
+
+
+class UsageLedger:
+    """
+    Stores the usage of each turn in a SQLite database, so the tokens and the cost can be summed by user, session,
+    repository, kind of question and model across the restarts. The cost is estimated when the turn is recorded,
+    a later change of the prices does not change it.
+
+    Attributes:
+        path (str): The path of the database.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Initializes a new instance of the UsageLedger class.
+
+        Args:
+            path (Optional[str], optional): The path of the database. Defaults to USAGE_PATH.
+        """
+        self.path = path or settings.usage_path
+        self.__lock = Lock()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.__connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.__connection.row_factory = sqlite3.Row
+        with self.__lock, self.__connection:
+            self.__connection.execute("PRAGMA journal_mode=WAL")
+            self.__connection.execute("""
+                CREATE TABLE IF NOT EXISTS usage (
+                    turn_id TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    user TEXT NOT NULL,
+                    session TEXT NOT NULL,
+                    repo TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    llm_calls INTEGER NOT NULL,
+                    input_tokens INTEGER NOT NULL,
+                    output_tokens INTEGER NOT NULL,
+                    cost REAL NOT NULL
+                )
+                """)
+            self.__connection.execute(
+                "CREATE INDEX IF NOT EXISTS usage_created ON usage (created)"
+            )
+
+    def record(
+        self,
+        usage: Dict[str, Usage],
+        kind: str,
+        repo: str,
+        user: str = "",
+        session: str = "",
+    ):
+        """
+        Records the usage of a turn, a row for each model. A turn without model calls, i.e. answered by the
+        answer cache, is recorded with an empty model so that it is counted.
+
+        Args:
+            usage (Dict[str, Usage]): The usage of the turn by model, see span_usage.
+            kind (str): The kind of question, see question_kind.
+            repo (str): The repository.
+            user (str, optional): The email of the user. Defaults to "".
+            session (str, optional): The id of the session. Defaults to "".
+        """
+        turn_id = uuid.uuid4().hex
+        created = time.time()
+        rows = [
+            (
+                turn_id,
+                created,
+                user,
+                session,
+                repo,
+                kind,
+                model,
+                model_usage.llm_calls,
+                model_usage.input_tokens,
+                model_usage.output_tokens,
+                model_usage.cost,
+            )
+            for model, model_usage in (usage or {"": Usage()}).items()
+        ]
+        with self.__lock, self.__connection:
+            self.__connection.executemany(
+                "INSERT INTO usage VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+
+    def totals(
+        self,
+        group_by: str,
+        since: Optional[float] = None,
+        user: Optional[str] = None,
+        session: Optional[str] = None,
+        limit: int = 20,
+    ) -> Dict[str, Usage]:
+        """
+        Sums the usage.
+
+        Args:
+            group_by (str): One of user, session, repo, kind or model.
+            since (Optional[float], optional): The epoch seconds of the oldest turn. Defaults to None, all the turns.
+            user (Optional[str], optional): Only the turns of the user. Defaults to None.
+            session (Optional[str], optional): Only the turns of the session. Defaults to None.
+            limit (int, optional): The maximum number of groups. Defaults to 20.
+
+        Returns:
+            Dict[str, Usage]: The usage of each group, the most expensive first.
+        """
+        if group_by not in GROUPS:
+            raise ValueError(f"group_by must be one of {', '.join(GROUPS)}")
+        conditions, parameters = [], []
+        for condition, value in [
+            ("created >= ?", since),
+            ("user = ?", user),
+            ("session = ?", session),
+        ]:
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self.__lock:
+            rows = self.__connection.execute(
+                f"SELECT {group_by} AS grouped, COUNT(DISTINCT turn_id) AS turns, SUM(llm_calls) AS llm_calls, "
+                "SUM(input_tokens) AS input_tokens, SUM(output_tokens) AS output_tokens, SUM(cost) AS cost "
+                f"FROM usage {where} GROUP BY {group_by} ORDER BY cost DESC, turns DESC LIMIT ?",
+                parameters + [limit],
+            ).fetchall()
+        return {
+            row["grouped"]: Usage(
+                turns=row["turns"],
+                llm_calls=row["llm_calls"],
+                input_tokens=row["input_tokens"],
+                output_tokens=row["output_tokens"],
+                cost=row["cost"],
+            )
+            for row in rows
+        }
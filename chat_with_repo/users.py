@@ -1,6 +1,6 @@
 from typing import List
 
-from chat_with_repo import AUTHORAZED_USERS, DEBUG
+from chat_with_repo.settings import settings
 
 from enum import Enum
 
@@ -24,7 +24,7 @@ class AuthorizationManager:
         pass
 
     def is_authorized(self, email: str) -> bool:
-        if DEBUG:
+        if settings.debug:
             return True
         for user in get_authorized_users():
             if user.email.upper() == email.upper():
@@ -33,4 +33,6 @@ class AuthorizationManager:
 
 
 def get_authorized_users() -> List[Authorization]:
-    return [Authorization(email.strip()) for email in AUTHORAZED_USERS.split(",")]
+    return [
+        Authorization(email.strip()) for email in settings.authorized_users.split(",")
+    ]
@@ -0,0 +1,292 @@
+"""
+Receives the GitHub webhooks and applies the push, create, delete and pull_request events to the shared caches,
+so that the cached pull requests, branches, tags and ancestry of the commits change exactly when the repository does.
+The receiver runs on tornado in the process of the app, on its own port, because the caches live in the process.
+
+Configure the webhook of the repositories with the payload url http://<host>:<GITHUB_WEBHOOK_PORT>/github/webhook,
+the content type application/json and the secret GITHUB_WEBHOOK_SECRET.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+import tornado.httpserver
+import tornado.netutil
+import tornado.web
+
+from chat_with_repo.github_client import get_response_cache
+from chat_with_repo.metadata_store import (
+    ANCESTOR_TTL_SECONDS,
+    ANCESTRY,
+    PULL_REQUESTS,
+    WEBHOOK_TTL_SECONDS,
+    get_metadata_store,
+)
+from chat_with_repo.model import PullRequest, Repo
+
+if TYPE_CHECKING:
+    from chat_with_repo.answer_cache import AnswerCache
+
+WEBHOOK_PATH = "/github/webhook"
+
+
+def verify_signature(secret: str, body: bytes, signature: Optional[str]) -> bool:
+    """
+    Verifies the X-Hub-Signature-256 header of a webhook.
+
+    Args:
+        secret (str): The secret of the webhook.
+        body (bytes): The payload as received.
+        signature (Optional[str]): The header, "sha256=" followed by the HMAC of the payload.
+
+    Returns:
+        bool: True if the payload has been signed with the secret.
+    """
+    if not signature or not signature.startswith("sha256="):
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(f"sha256={expected}", signature)
+
+
+def apply_event(
+    event: str, payload: Dict[str, Any], answer_cache: Optional["AnswerCache"] = None
+) -> List[str]:
+    """
+    Applies a GitHub event to the caches.
+
+    Args:
+        event (str): The X-GitHub-Event header, i.e. push.
+        payload (Dict[str, Any]): The payload of the event.
+        answer_cache (Optional[AnswerCache], optional): The answer cache, its answers about the repository
+            are checked again against GitHub. Defaults to None.
+
+    Returns:
+        List[str]: The changes applied, empty if the event does not concern the caches.
+    """
+    apply = EVENTS.get(event)
+    if apply is None or "repository" not in payload:
+        return []
+    owner, repo = payload["repository"]["full_name"].split("/", 1)
+    changes = apply(owner, repo, payload)
+    if changes and answer_cache is not None:
+        for member in Repo:
+            if member.owner == owner and member.value == repo:
+                answer_cache.refresh(member)
+    return changes
+
+
+def apply_push(owner: str, repo: str, payload: Dict[str, Any]) -> List[str]:
+    """Expires the refs and the commits, the pushed commits are stored as contained in the branch"""
+    cache = get_response_cache()
+    ref: str = payload["ref"]
+    if ref.startswith("refs/tags/"):
+        expired = cache.expire(f"/repos/{owner}/{repo}/tags")
+        return [f"expired {expired} tag responses"]
+    branch = ref[len("refs/heads/") :]
+    expired = sum(
+        cache.expire(f"/repos/{owner}/{repo}/{resource}")
+        for resource in ["branches", "commits", "compare"]
+    )
+    expired += cache.expire(f"/repos/{owner}/{repo}", subpaths=False)
+    store = get_metadata_store()
+    if payload.get("deleted") or payload.get("forced"):
+        # The commits of the branch may have been removed
+        removed = __remove_ancestry(owner, repo, branch, lambda contained: True)
+    else:
+        # A commit contained in the branch stays contained, the ones not contained may have been pushed now
+        removed = __remove_ancestry(
+            owner, repo, branch, lambda contained: not contained
+        )
+        for commit in payload.get("commits", []):
+            store.put(
+                ANCESTRY,
+                (owner, repo, commit["id"], branch),
+                True,
+                ANCESTOR_TTL_SECONDS,
+            )
+    return [
+        f"expired {expired} responses of {branch}",
+        f"removed {removed} ancestry entries of {branch}",
+    ]
+
+
+def apply_create(owner: str, repo: str, payload: Dict[str, Any]) -> List[str]:
+    """Expires the branches or the tags"""
+    return __expire_refs(owner, repo, payload["ref_type"])
+
+
+def apply_delete(owner: str, repo: str, payload: Dict[str, Any]) -> List[str]:
+    """Expires the branches or the tags, the ancestry of a deleted branch is removed"""
+    changes = __expire_refs(owner, repo, payload["ref_type"])
+    if payload["ref_type"] == "branch":
+        # A new branch with the same name would have other commits
+        removed = __remove_ancestry(owner, repo, payload["ref"], lambda contained: True)
+        changes.append(f"removed {removed} ancestry entries of {payload['ref']}")
+    return changes
+
+
+def apply_pull_request(owner: str, repo: str, payload: Dict[str, Any]) -> List[str]:
+    """Stores the pull request of the event and expires the lists of the pull requests"""
+    pull_request = PullRequest.model_validate(payload["pull_request"])
+    get_metadata_store().put(
+        PULL_REQUESTS,
+        (owner, repo, pull_request.number),
+        pull_request,
+        WEBHOOK_TTL_SECONDS,
+    )
+    expired = get_response_cache().expire(f"/repos/{owner}/{repo}/pulls")
+    return [
+        f"stored pull request {pull_request.number} ({payload.get('action')})",
+        f"expired {expired} pull request responses",
+    ]
+
+
+EVENTS: Dict[str, Callable[[str, str, Dict[str, Any]], List[str]]] = {
+    "push": apply_push,
+    "create": apply_create,
+    "delete": apply_delete,
+    "pull_request": apply_pull_request,
+}
+
+
+def __expire_refs(owner: str, repo: str, ref_type: str) -> List[str]:
+    if ref_type not in ("branch", "tag"):
+        return []
+    resource = "branches" if ref_type == "branch" else "tags"
+    expired = get_response_cache().expire(f"/repos/{owner}/{repo}/{resource}")
+    return [f"expired {expired} {ref_type} responses"]
+
+
+def __remove_ancestry(
+    owner: str, repo: str, base: str, predicate: Callable[[bool], bool]
+) -> int:
+    return get_metadata_store().invalidate_where(
+        ANCESTRY,
+        lambda key, contained: key[0] == owner
+        and key[1] == repo
+        and key[3] == base
+        and predicate(contained),
+    )
+
+
+class WebhookHandler(tornado.web.RequestHandler):
+    def initialize(self, secret: str, answer_cache: Optional["AnswerCache"]):
+        self.secret = secret
+        self.answer_cache = answer_cache
+
+    def post(self):
+        if not verify_signature(
+            self.secret,
+            self.request.body,
+            self.request.headers.get("X-Hub-Signature-256"),
+        ):
+            raise tornado.web.HTTPError(401, reason="Invalid signature")
+        event = self.request.headers.get("X-GitHub-Event", "")
+        try:
+            payload = json.loads(self.request.body)
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason="Invalid payload")
+        changes = apply_event(event, payload, answer_cache=self.answer_cache)
+        if changes:
+            print(f"Webhook {event}: {', '.join(changes)}")
+        self.write({"event": event, "changes": changes})
+
+
+def create_webhook_application(
+    secret: str, answer_cache: Optional["AnswerCache"] = None
+) -> tornado.web.Application:
+    """
+    Returns:
+        tornado.web.Application: The application receiving the webhooks signed with secret on WEBHOOK_PATH.
+    """
+    return tornado.web.Application(
+        [
+            (
+                WEBHOOK_PATH,
+                WebhookHandler,
+                {"secret": secret, "answer_cache": answer_cache},
+            )
+        ]
+    )
+
+
+class WebhookReceiver:
+    """
+    Serves the webhook application in a daemon thread with its own event loop, alongside Streamlit.
+
+    Attributes:
+        port (int): The port, 0 to pick a free one.
+        address (str): The address to bind. Defaults to all the interfaces.
+    """
+
+    def __init__(
+        self,
+        secret: str,
+        port: int,
+        address: str = "",
+        answer_cache: Optional["AnswerCache"] = None,
+    ):
+        self.port = port
+        self.address = address
+        self.__application = create_webhook_application(secret, answer_cache)
+        self.__loop = asyncio.new_event_loop()
+        self.__server: Optional[tornado.httpserver.HTTPServer] = None
+        self.__started = threading.Event()
+        self.__error: Optional[Exception] = None
+        self.__thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """
+        Starts the server and waits until it listens.
+
+        Raises:
+            Exception: The error of the server that cannot listen, i.e. the port is in use.
+        """
+        self.__thread = threading.Thread(
+            target=self.__run, name="webhook-receiver", daemon=True
+        )
+        self.__thread.start()
+        if not self.__started.wait(10):
+            raise TimeoutError("The webhook receiver did not start in 10 seconds")
+        if self.__error is not None:
+            self.__thread = None
+            raise self.__error
+
+    def stop(self):
+        if self.__thread is None:
+            return
+
+        def shutdown():
+            if self.__server is not None:
+                self.__server.stop()
+            self.__loop.stop()
+
+        self.__loop.call_soon_threadsafe(shutdown)
+        self.__thread.join(10)
+        self.__thread = None
+
+    def __run(self):
+        asyncio.set_event_loop(self.__loop)
+        try:
+            self.__loop.run_until_complete(self.__listen())
+        except Exception as e:
+            # Raised by start in the thread of the caller
+            self.__error = e
+            self.__loop.close()
+            self.__started.set()
+            return
+        self.__started.set()
+        self.__loop.run_forever()
+        self.__loop.close()
+
+    async def __listen(self):
+        self.__server = tornado.httpserver.HTTPServer(self.__application)
+        sockets = tornado.netutil.bind_sockets(self.port, address=self.address or None)
+        self.__server.add_sockets(sockets)
+        # With port 0 the system picks a free port
+        self.port = sockets[0].getsockname()[1]
+        print(f"Webhook receiver listening on port {self.port}{WEBHOOK_PATH}")
@@ -0,0 +1,67 @@
+import glob
+import os
+from typing import List
+
+import pytest
+
+from chat_with_repo.github_client import get_response_cache
+from chat_with_repo.metadata_store import get_metadata_store
+from chat_with_repo.settings import settings
+from tests.fake_github import (
+    FakeGitHubServer,
+    FakeRepository,
+    load_fixture,
+    synthetic_repository,
+)
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fake_github", "fixtures")
+
+
+def fixture_repositories() -> List[FakeRepository]:
+    """
+    Returns:
+        List[FakeRepository]: The repositories recorded in tests/fake_github/fixtures and a synthetic
+            smeup/kokos with more pull requests than a page.
+    """
+    return [
+        load_fixture(path)
+        for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.json")))
+    ] + [synthetic_repository(name="kokos", pull_requests=150, commits=400)]
+
+
+def __use_fake_github(monkeypatch: pytest.MonkeyPatch, server: FakeGitHubServer):
+    # The token is set in the settings cache, so it is not read from the environment
+    monkeypatch.setattr(settings, "github_api_url", server.url)
+    monkeypatch.setitem(vars(settings), "github_token", "fake-token")
+    get_response_cache().clear()
+    get_metadata_store().clear()
+
+
+@pytest.fixture(scope="session")
+def fake_github_server():
+    with FakeGitHubServer(fixture_repositories()) as server:
+        yield server
+
+
+@pytest.fixture
+def fake_github(fake_github_server, monkeypatch):
+    """Points the GitHub tools to the fake GitHub server, with empty caches"""
+    __use_fake_github(monkeypatch, fake_github_server)
+    yield fake_github_server
+    get_response_cache().clear()
+    get_metadata_store().clear()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def offline_github(request):
+    """
+    With FAKE_GITHUB=1 all the tests, i.e. tests/test_tools.py, call the fake GitHub server
+    instead of api.github.com.
+    """
+    if not os.environ.get("FAKE_GITHUB"):
+        yield None
+        return
+    server = request.getfixturevalue("fake_github_server")
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        __use_fake_github(monkeypatch, server)
+        yield server
@@ -0,0 +1,22 @@
+"""
+A fake GitHub REST server serving recorded or synthetic repositories, so that the tools and the benchmarks
+run offline, deterministic and without spending the rate limit. See tests.fake_github.recorder to record
+the fixtures of a real repository.
+"""
+
+from tests.fake_github.repository import (
+    FakeRepository,
+    load_fixture,
+    save_fixture,
+    synthetic_repository,
+)
+from tests.fake_github.server import FakeGitHub, FakeGitHubServer
+
+__all__ = [
+    "FakeGitHub",
+    "FakeGitHubServer",
+    "FakeRepository",
+    "load_fixture",
+    "save_fixture",
+    "synthetic_repository",
+]
@@ -0,0 +1,187 @@
+"""
+Records a GitHub repository into a fixture of the fake GitHub server: the pull requests, the branches, the tags,
+the latest commits with their parents and, for the given pull requests and commits, the diffs, the changed files
+and the files of the commits. It calls the real GitHub API, so it needs GITHUB_TOKEN and the network.
+The ancestry of the commits older than the recorded ones is not known by the fake server.
+
+Usage:
+    python -m tests.fake_github.recorder --owner smeup --repo jariko --pull-requests 549 535 \
+        --commit-pages 5 --output tests/fake_github/fixtures/smeup_jariko.json
+"""
+
+import argparse
+from typing import Any, Dict, List, Optional
+
+from chat_with_repo.github_client import get
+from chat_with_repo.settings import settings
+from tests.fake_github.repository import FakeRepository, save_fixture
+
+
+def record_repository(
+    owner: str,
+    repo: str,
+    pull_requests: List[int] = [],
+    commits: List[str] = [],
+    pull_request_pages: Optional[int] = None,
+    commit_pages: int = 5,
+) -> FakeRepository:
+    """
+    Records a repository from the GitHub API.
+
+    Args:
+        owner (str): The owner of the repository.
+        repo (str): The name of the repository.
+        pull_requests (List[int], optional): The pull requests whose diff and files are recorded. Defaults to [].
+        commits (List[str], optional): The commits whose files are recorded, for the search by path. Defaults to [].
+        pull_request_pages (Optional[int], optional): The pages of 100 pull requests, None for all. Defaults to None.
+        commit_pages (int, optional): The pages of 100 commits of the default branch. Defaults to 5.
+
+    Returns:
+        FakeRepository: The recorded repository.
+    """
+    base_url = f"{settings.github_api_url}/repos/{owner}/{repo}"
+    repository = __get_json(base_url)
+    recorded = __get_pages(f"{base_url}/commits", max_pages=commit_pages) + [
+        __get_json(f"{base_url}/commits/{sha}") for sha in commits
+    ]
+    commits_by_sha: Dict[str, Dict[str, Any]] = {}
+    for commit in recorded:
+        commits_by_sha.setdefault(commit["sha"], {}).update(__commit_fields(commit))
+    return FakeRepository(
+        owner=owner,
+        name=repo,
+        pulls=[
+            __pull_fields(pull)
+            for pull in __get_pages(
+                f"{base_url}/pulls", {"state": "all"}, max_pages=pull_request_pages
+            )
+        ],
+        commits=sorted(
+            commits_by_sha.values(),
+            key=lambda commit: commit["commit"]["author"]["date"],
+            reverse=True,
+        ),
+        branches={
+            branch["name"]: branch["commit"]["sha"]
+            for branch in __get_pages(f"{base_url}/branches")
+        },
+        tags={
+            tag["name"]: tag["commit"]["sha"] for tag in __get_pages(f"{base_url}/tags")
+        },
+        diffs={
+            number: __get_text(
+                f"{base_url}/pulls/{number}", "application/vnd.github.v3.diff"
+            )
+            for number in pull_requests
+        },
+        files={
+            number: __get_pages(f"{base_url}/pulls/{number}/files")
+            for number in pull_requests
+        },
+        pushed_at=repository["pushed_at"],
+    )
+
+
+def __pull_fields(pull: Dict[str, Any]) -> Dict[str, Any]:
+    # Only the fields used by the tools and by the fake server are recorded, so the fixtures stay small
+    fields = {
+        name: pull.get(name)
+        for name in [
+            "number",
+            "html_url",
+            "diff_url",
+            "state",
+            "title",
+            "body",
+            "created_at",
+            "updated_at",
+            "merged_at",
+            "closed_at",
+            "merge_commit_sha",
+        ]
+    }
+    fields["user"] = {"login": pull["user"]["login"]}
+    for ref in ["head", "base"]:
+        fields[ref] = {name: pull[ref][name] for name in ["label", "ref", "sha"]}
+    return fields
+
+
+def __commit_fields(commit: Dict[str, Any]) -> Dict[str, Any]:
+    fields = {
+        "sha": commit["sha"],
+        "html_url": commit["html_url"],
+        "commit": {
+            "author": commit["commit"]["author"],
+            "message": commit["commit"]["message"],
+        },
+        "parents": [{"sha": parent["sha"]} for parent in commit["parents"]],
+    }
+    if "files" in commit:
+        fields["files"] = [{"filename": file["filename"]} for file in commit["files"]]
+    return fields
+
+
+def __headers(accept: str = "application/vnd.github.v3+json") -> Dict[str, str]:
+    return {"Accept": accept, "Authorization": f"token {settings.github_token}"}
+
+
+def __get_json(url: str) -> Any:
+    response = get(url, headers=__headers())
+    if response.status_code != 200:
+        raise Exception(f"Error: {response.status_code} - {response.text}")
+    return response.json()
+
+
+def __get_text(url: str, accept: str) -> str:
+    response = get(url, headers=__headers(accept))
+    if response.status_code != 200:
+        raise Exception(f"Error: {response.status_code} - {response.text}")
+    return response.text
+
+
+def __get_pages(
+    url: str, params: Dict[str, Any] = {}, max_pages: Optional[int] = None
+) -> List[Any]:
+    items = []
+    nextUrl = url
+    pages = 0
+    while nextUrl and (max_pages is None or pages < max_pages):
+        print(f"Recording {nextUrl}")
+        response = get(nextUrl, headers=__headers(), params={**params, "per_page": 100})
+        if response.status_code != 200:
+            raise Exception(f"Error: {response.status_code} - {response.text}")
+        items += response.json()
+        nextUrl = response.links.get("next", {}).get("url")
+        pages += 1
+    return items
+
+
+def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Records a GitHub repository into a fixture of the fake GitHub server"
+    )
+    parser.add_argument("--owner", default="smeup")
+    parser.add_argument("--repo", default="jariko")
+    parser.add_argument("--pull-requests", nargs="*", type=int, default=[])
+    parser.add_argument("--commits", nargs="*", default=[])
+    parser.add_argument("--pull-request-pages", type=int, default=None)
+    parser.add_argument("--commit-pages", type=int, default=5)
+    parser.add_argument("--output", required=True)
+    options = parser.parse_args(args)
+    repository = record_repository(
+        owner=options.owner,
+        repo=options.repo,
+        pull_requests=options.pull_requests,
+        commits=options.commits,
+        pull_request_pages=options.pull_request_pages,
+        commit_pages=options.commit_pages,
+    )
+    save_fixture(repository, options.output)
+    print(
+        f"Recorded {len(repository.pulls)} pull requests, {len(repository.commits)} commits, "
+        f"{len(repository.branches)} branches and {len(repository.tags)} tags into {options.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,391 @@
+import hashlib
+import heapq
+import json
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+
+class FakeRepository:
+    """
+    The data of a repository served by the fake GitHub server, as returned by the GitHub REST API:
+    the responses of the endpoints (pagination, filters, compare...) are computed from it.
+
+    Attributes:
+        owner (str): The owner of the repository.
+        name (str): The name of the repository.
+        pulls (List[Dict[str, Any]]): The pull requests, the newest first.
+        commits (List[Dict[str, Any]]): The commits with their parents, the newest first.
+            A commit can have its "files", they are used to filter the commits by path.
+        branches (Dict[str, str]): The SHA of the head of each branch.
+        tags (Dict[str, str]): The SHA of each tag, the newest first.
+        diffs (Dict[int, str]): The diff of the pull requests.
+        files (Dict[int, List[Dict[str, Any]]]): The files changed by the pull requests.
+        pushed_at (str): The time of the last push.
+    """
+
+    def __init__(
+        self,
+        owner: str,
+        name: str,
+        pulls: List[Dict[str, Any]] = None,
+        commits: List[Dict[str, Any]] = None,
+        branches: Dict[str, str] = None,
+        tags: Dict[str, str] = None,
+        diffs: Dict[int, str] = None,
+        files: Dict[int, List[Dict[str, Any]]] = None,
+        pushed_at: str = "2024-07-01T00:00:00Z",
+    ):
+        self.owner = owner
+        self.name = name
+        self.pulls = pulls or []
+        self.commits = commits or []
+        self.branches = branches or {}
+        self.tags = tags or {}
+        self.diffs = diffs or {}
+        self.files = files or {}
+        self.pushed_at = pushed_at
+        self.__commits_by_sha = {commit["sha"]: commit for commit in self.commits}
+        self.__pulls_by_number = {pull["number"]: pull for pull in self.pulls}
+        self.__pull_commits: Dict[int, List[Dict[str, Any]]] = {}
+        self.__pulls_by_commit: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        # The generation of a commit is greater than the ones of its parents, the history is walked by generation
+        self.__generations: Dict[str, int] = {}
+        for commit in reversed(self.commits):
+            self.__generations[commit["sha"]] = 1 + max(
+                (self.__generations.get(p["sha"], 0) for p in commit["parents"]),
+                default=0,
+            )
+
+    @property
+    def full_name(self) -> str:
+        return f"{self.owner}/{self.name}"
+
+    def pull(self, number: int) -> Optional[Dict[str, Any]]:
+        return self.__pulls_by_number.get(number)
+
+    def commit(self, sha: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns:
+            Optional[Dict[str, Any]]: The commit with the SHA or with the abbreviated SHA, None if not found.
+        """
+        commit = self.__commits_by_sha.get(sha)
+        if commit is None and len(sha) >= 7:
+            commit = next(
+                (c for c in self.commits if c["sha"].startswith(sha)),
+                None,
+            )
+        return commit
+
+    def resolve(self, ref: str) -> Optional[str]:
+        """
+        Returns:
+            Optional[str]: The SHA of a branch, a tag or a commit, None if not found.
+        """
+        if ref in self.branches:
+            return self.branches[ref]
+        if ref in self.tags:
+            return self.tags[ref]
+        commit = self.commit(ref)
+        return commit["sha"] if commit else None
+
+    def ancestors(self, sha: str) -> Set[str]:
+        """
+        Returns:
+            Set[str]: The commit and all the commits reachable from its parents.
+        """
+        reachable: Set[str] = set()
+        pending = [sha]
+        while pending:
+            current = pending.pop()
+            if current in reachable:
+                continue
+            reachable.add(current)
+            pending.extend(self.__parents(current))
+        return reachable
+
+    def compare(self, base: str, head: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns:
+            Optional[Dict[str, Any]]: The comparison as /compare/{base}...{head}, the commits of head not in base
+                the oldest first. None if base or head are not found.
+        """
+        base_sha, head_sha = self.resolve(base), self.resolve(head)
+        if base_sha is None or head_sha is None:
+            return None
+        only_head, only_base = self.__exclusive_ancestors(head_sha, base_sha)
+        ahead = [
+            self.__commits_by_sha[sha]
+            for sha in sorted(only_head, key=self.__generations.get)
+            if sha in self.__commits_by_sha
+        ]
+        behind_by = len(only_base)
+        if not ahead and not behind_by:
+            status = "identical"
+        elif not ahead:
+            status = "behind"
+        elif not behind_by:
+            status = "ahead"
+        else:
+            status = "diverged"
+        return {
+            "status": status,
+            "ahead_by": len(ahead),
+            "behind_by": behind_by,
+            "total_commits": len(ahead),
+            "base_commit": self.commit(base_sha),
+            "commits": ahead,
+        }
+
+    def pull_commits(self, number: int) -> List[Dict[str, Any]]:
+        """
+        Returns:
+            List[Dict[str, Any]]: The commits of the pull request, the oldest first.
+        """
+        if number not in self.__pull_commits:
+            pull = self.pull(number)
+            comparison = self.compare(pull["base"]["sha"], pull["head"]["sha"])
+            self.__pull_commits[number] = comparison["commits"] if comparison else []
+        return self.__pull_commits[number]
+
+    def pulls_of_commit(self, sha: str) -> List[Dict[str, Any]]:
+        """
+        Returns:
+            List[Dict[str, Any]]: The pull requests containing the commit or merged by it.
+        """
+        if self.__pulls_by_commit is None:
+            pulls_by_commit: Dict[str, List[Dict[str, Any]]] = {}
+            for pull in self.pulls:
+                shas = {commit["sha"] for commit in self.pull_commits(pull["number"])}
+                if pull.get("merge_commit_sha"):
+                    shas.add(pull["merge_commit_sha"])
+                for commit_sha in shas:
+                    pulls_by_commit.setdefault(commit_sha, []).append(pull)
+            self.__pulls_by_commit = pulls_by_commit
+        return self.__pulls_by_commit.get(sha, [])
+
+    def __parents(self, sha: str) -> List[str]:
+        commit = self.__commits_by_sha.get(sha)
+        return [parent["sha"] for parent in commit["parents"]] if commit else []
+
+    def __exclusive_ancestors(self, head: str, base: str) -> Tuple[Set[str], Set[str]]:
+        """
+        Walks the history from head and from base, the newest generation first, until the two walks meet,
+        as git does to compare two commits: the cost depends on the distance between the commits,
+        not on the size of the history.
+
+        Returns:
+            Tuple[Set[str], Set[str]]: The commits reachable only from head and the ones reachable only from base.
+        """
+        HEAD, BASE = 1, 2
+        flags: Dict[str, int] = {}
+        walked: Dict[str, int] = {}
+        queue: List[Tuple[int, str]] = []
+
+        def mark(sha: str, flag: int):
+            if flags.get(sha, 0) | flag != flags.get(sha, 0):
+                flags[sha] = flags.get(sha, 0) | flag
+                heapq.heappush(queue, (-self.__generations.get(sha, 0), sha))
+
+        mark(head, HEAD)
+        mark(base, BASE)
+        while any(flags[sha] != HEAD | BASE for _, sha in queue):
+            _, sha = heapq.heappop(queue)
+            if walked.get(sha) == flags[sha]:
+                continue
+            walked[sha] = flags[sha]
+            for parent in self.__parents(sha):
+                mark(parent, flags[sha])
+        return (
+            {sha for sha, flag in flags.items() if flag == HEAD},
+            {sha for sha, flag in flags.items() if flag == BASE},
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "owner": self.owner,
+            "name": self.name,
+            "pushed_at": self.pushed_at,
+            "pulls": self.pulls,
+            "commits": self.commits,
+            "branches": self.branches,
+            "tags": self.tags,
+            "diffs": {str(number): diff for number, diff in self.diffs.items()},
+            "files": {str(number): files for number, files in self.files.items()},
+        }
+
+    @staticmethod
+    def from_dict(data: Dict[str, Any]) -> "FakeRepository":
+        return FakeRepository(
+            owner=data["owner"],
+            name=data["name"],
+            pulls=data.get("pulls", []),
+            commits=data.get("commits", []),
+            branches=data.get("branches", {}),
+            tags=data.get("tags", {}),
+            diffs={int(number): diff for number, diff in data.get("diffs", {}).items()},
+            files={
+                int(number): files for number, files in data.get("files", {}).items()
+            },
+            pushed_at=data.get("pushed_at", "2024-07-01T00:00:00Z"),
+        )
+
+
+def load_fixture(path: str) -> FakeRepository:
+    """
+    Returns:
+        FakeRepository: The repository saved in a JSON fixture, i.e. recorded by tests.fake_github.recorder.
+    """
+    with open(path, encoding="utf-8") as f:
+        return FakeRepository.from_dict(json.load(f))
+
+
+def save_fixture(repository: FakeRepository, path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(repository.to_dict(), f, indent=1)
+
+
+def synthetic_repository(
+    owner: str = "smeup",
+    name: str = "jariko",
+    pull_requests: int = 30,
+    branches: int = 10,
+    tags: int = 5,
+    commits: int = 200,
+    files_per_pull_request: int = 3,
+    diff_lines: int = 20,
+    seed: int = 0,
+) -> FakeRepository:
+    """
+    Generates a repository with a linear history on develop, the master branch behind develop and
+    the feature branches and the tags on the commits of develop. Same arguments, same repository.
+
+    Args:
+        owner (str, optional): The owner. Defaults to "smeup".
+        name (str, optional): The name. Defaults to "jariko".
+        pull_requests (int, optional): The pull requests, the 5 newest are open. Defaults to 30.
+        branches (int, optional): The branches, develop and master included. Defaults to 10.
+        tags (int, optional): The tags, named vX.Y.Z. Defaults to 5.
+        commits (int, optional): The commits of develop. Defaults to 200.
+        files_per_pull_request (int, optional): The files changed by each pull request. Defaults to 3.
+        diff_lines (int, optional): The changed lines of each file of a diff. Defaults to 20.
+        seed (int, optional): The seed of the random generator. Defaults to 0.
+
+    Returns:
+        FakeRepository: The repository.
+    """
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    authors = ["Jane Doe", "John Smith", "Mario Rossi", "Anna Bianchi"]
+    paths = [f"src/main/kotlin/com/smeup/module{i % 20}/File{i}.kt" for i in range(100)]
+
+    def sha(*values: Any) -> str:
+        return hashlib.sha1("-".join(str(v) for v in values).encode()).hexdigest()
+
+    def timestamp(minutes: int) -> str:
+        return (start + timedelta(minutes=minutes)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    history = []
+    parent = None
+    for i in range(commits):
+        author = authors[i % len(authors)]
+        commit_sha = sha(owner, name, "commit", i)
+        history.append(
+            {
+                "sha": commit_sha,
+                "html_url": f"https://github.com/{owner}/{name}/commit/{commit_sha}",
+                "commit": {
+                    "author": {
+                        "name": author,
+                        "email": f"{author.lower().replace(' ', '.')}@example.com",
+                        "date": timestamp(i * 60),
+                    },
+                    "message": f"Change {i} of {rng.choice(paths).rsplit('/', 1)[1]}",
+                },
+                "parents": [{"sha": parent}] if parent else [],
+                "files": [{"filename": path} for path in rng.sample(paths, 2)],
+            }
+        )
+        parent = commit_sha
+    history.reverse()
+
+    branch_heads = {
+        "develop": history[0]["sha"],
+        "master": history[commits // 2]["sha"],
+    }
+    for i in range(max(0, branches - 2)):
+        branch_heads[f"feature/branch-{i}"] = history[rng.randrange(commits)]["sha"]
+    tag_heads = {
+        f"v1.{tags - i}.0": history[min(commits - 1, (i + 1) * commits // (tags + 1))][
+            "sha"
+        ]
+        for i in range(tags)
+    }
+
+    pulls, diffs, files = [], {}, {}
+    for i in range(pull_requests):
+        number = pull_requests - i
+        head_index = min(commits - 2, i * max(1, commits // max(1, pull_requests)))
+        head, base = history[head_index], history[head_index + 1]
+        is_open = i < 5
+        created = timestamp((commits - head_index) * 60)
+        changed = rng.sample(paths, files_per_pull_request)
+        pulls.append(
+            {
+                "number": number,
+                "html_url": f"https://github.com/{owner}/{name}/pull/{number}",
+                "diff_url": f"https://github.com/{owner}/{name}/pull/{number}.diff",
+                "state": "open" if is_open else "closed",
+                "title": f"Fix {changed[0].rsplit('/', 1)[1]} (#{number})",
+                "user": {"login": authors[i % len(authors)].split()[0].lower()},
+                "body": f"This pull request changes {', '.join(changed)}",
+                "created_at": created,
+                "updated_at": created,
+                "merged_at": None if is_open else created,
+                "closed_at": None if is_open else created,
+                "merge_commit_sha": None if is_open else head["sha"],
+                "head": {
+                    "label": f"{owner}:feature/pr-{number}",
+                    "ref": f"feature/pr-{number}",
+                    "sha": head["sha"],
+                },
+                "base": {
+                    "label": f"{owner}:develop",
+                    "ref": "develop",
+                    "sha": base["sha"],
+                },
+            }
+        )
+        files[number] = [
+            {
+                "filename": path,
+                "status": "modified",
+                "additions": diff_lines,
+                "deletions": diff_lines,
+                "changes": 2 * diff_lines,
+            }
+            for path in changed
+        ]
+        diffs[number] = "".join(
+            f"diff --git a/{path} b/{path}\n"
+            f"index {sha(path, 'a')[:7]}..{sha(path, 'b')[:7]} 100644\n"
+            f"--- a/{path}\n+++ b/{path}\n"
+            f"@@ -1,{diff_lines} +1,{diff_lines} @@\n"
+            + "".join(
+                f"-    val value{line} = {line}\n+    val value{line} = {line + 1}\n"
+                for line in range(diff_lines)
+            )
+            for path in changed
+        )
+
+    return FakeRepository(
+        owner=owner,
+        name=name,
+        pulls=pulls,
+        commits=history,
+        branches=branch_heads,
+        tags=tag_heads,
+        diffs=diffs,
+        files=files,
+        pushed_at=history[0]["commit"]["author"]["date"],
+    )
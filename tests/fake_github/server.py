@@ -0,0 +1,372 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlencode
+
+import tornado.httpserver
+import tornado.netutil
+import tornado.web
+
+from tests.fake_github.repository import FakeRepository
+
+# The requests allowed each hour, as for an authenticated GitHub user
+RATE_LIMIT = 5000
+
+
+class FakeGitHub:
+    """
+    The state of the fake GitHub server: the repositories, the rate limit and the log of the requests.
+
+    Attributes:
+        repositories (Dict[str, FakeRepository]): The repositories by full name, i.e. smeup/jariko.
+        latency_seconds (float): The time taken by each response, i.e. to benchmark the network round trips.
+        rate_limit (int): The requests allowed in a window of one hour.
+        remaining (int): The requests left in the current window, the 304 Not Modified excluded.
+        requests (List[str]): The path and the query of the requests received.
+        not_modified (int): The 304 Not Modified responses.
+        bytes_sent (int): The bytes of the bodies of the responses.
+    """
+
+    def __init__(
+        self,
+        repositories: List[FakeRepository],
+        latency_seconds: float = 0.0,
+        rate_limit: int = RATE_LIMIT,
+    ):
+        self.repositories = {
+            repository.full_name: repository for repository in repositories
+        }
+        self.latency_seconds = latency_seconds
+        self.rate_limit = rate_limit
+        self.remaining = rate_limit
+        self.reset = int(time.time()) + 3600
+        self.requests: List[str] = []
+        self.not_modified = 0
+        self.bytes_sent = 0
+        self.lock = threading.Lock()
+
+    def repository(self, owner: str, name: str) -> Optional[FakeRepository]:
+        return self.repositories.get(f"{owner}/{name}")
+
+
+class FakeGitHubHandler(tornado.web.RequestHandler):
+    def initialize(self, github: FakeGitHub):
+        self.github = github
+
+    async def prepare(self):
+        with self.github.lock:
+            self.github.requests.append(self.request.uri)
+        if self.github.latency_seconds:
+            await asyncio.sleep(self.github.latency_seconds)
+
+    def repository(self, owner: str, name: str) -> FakeRepository:
+        repository = self.github.repository(owner, name)
+        if repository is None:
+            self.not_found()
+        return repository
+
+    def not_found(self):
+        self.respond({"message": "Not Found"}, status=404)
+        raise tornado.web.Finish()
+
+    def respond(
+        self,
+        body: Any,
+        status: int = 200,
+        paginate: Optional[str] = None,
+        content_type: str = "application/json; charset=utf-8",
+    ):
+        """
+        Writes the body with its ETag and the rate limit headers, a list or the paginate key of an object is
+        paginated with per_page and page and linked with the Link header.
+        """
+        if paginate is not None or isinstance(body, list):
+            items = body[paginate] if paginate else body
+            per_page = min(int(self.get_argument("per_page", "30")), 100)
+            page = max(int(self.get_argument("page", "1")), 1)
+            last = max(1, -(-len(items) // per_page))
+            page_items = items[(page - 1) * per_page : page * per_page]
+            if paginate:
+                body = {**body, paginate: page_items}
+            else:
+                body = page_items
+            self.__link(page, last)
+        content = body.encode() if isinstance(body, str) else json.dumps(body).encode()
+        etag = f'"{hashlib.sha1(content).hexdigest()}"'
+        with self.github.lock:
+            not_modified = (
+                status == 200 and self.request.headers.get("If-None-Match") == etag
+            )
+            if not_modified:
+                self.github.not_modified += 1
+            elif self.github.remaining <= 0:
+                status = 403
+                content = b'{"message": "API rate limit exceeded"}'
+            else:
+                self.github.remaining -= 1
+            if not not_modified:
+                self.github.bytes_sent += len(content)
+            self.set_header("X-RateLimit-Limit", str(self.github.rate_limit))
+            self.set_header("X-RateLimit-Remaining", str(self.github.remaining))
+            self.set_header("X-RateLimit-Reset", str(self.github.reset))
+            self.set_header("X-RateLimit-Resource", "core")
+        self.set_header("ETag", etag)
+        if not_modified:
+            self.set_status(304)
+            self.clear_header("Content-Type")
+            self.finish()
+            return
+        self.set_status(status)
+        self.set_header("Content-Type", content_type)
+        self.finish(content)
+
+    def __link(self, page: int, last: int):
+        def url(page: int) -> str:
+            arguments = {
+                name: self.get_argument(name) for name in self.request.arguments
+            }
+            arguments["page"] = str(page)
+            return f"{self.request.protocol}://{self.request.host}{self.request.path}?{urlencode(arguments)}"
+
+        links = []
+        if page < last:
+            links += [f'<{url(page + 1)}>; rel="next"', f'<{url(last)}>; rel="last"']
+        if page > 1:
+            links += [f'<{url(page - 1)}>; rel="prev"', f'<{url(1)}>; rel="first"']
+        if links:
+            self.set_header("Link", ", ".join(links))
+
+
+class RepositoryHandler(FakeGitHubHandler):
+    def get(self, owner: str, name: str):
+        repository = self.repository(owner, name)
+        self.respond(
+            {
+                "name": repository.name,
+                "full_name": repository.full_name,
+                "owner": {"login": repository.owner},
+                "pushed_at": repository.pushed_at,
+            }
+        )
+
+
+class PullsHandler(FakeGitHubHandler):
+    def get(self, owner: str, name: str):
+        repository = self.repository(owner, name)
+        state = self.get_argument("state", "open")
+        base = self.get_argument("base", None)
+        head = self.get_argument("head", None)
+        pulls = [
+            pull
+            for pull in repository.pulls
+            if (state == "all" or pull["state"] == state)
+            and (base is None or pull["base"]["ref"] == base)
+            and (head is None or pull["head"]["label"] == head)
+        ]
+        if self.get_argument("direction", "desc") == "asc":
+            pulls = list(reversed(pulls))
+        self.respond(pulls)
+
+
+class PullHandler(FakeGitHubHandler):
+    def get(self, owner: str, name: str, number: str):
+        repository = self.repository(owner, name)
+        pull = repository.pull(int(number))
+        if pull is None:
+            self.not_found()
+        if "diff" in self.request.headers.get("Accept", ""):
+            self.respond(
+                repository.diffs.get(int(number), ""),
+                content_type="text/plain; charset=utf-8",
+            )
+        else:
+            self.respond(pull)
+
+
+class PullFilesHandler(FakeGitHubHandler):
+    def get(self, owner: str, name: str, number: str):
+        repository = self.repository(owner, name)
+        if repository.pull(int(number)) is None:
+            self.not_found()
+        self.respond(repository.files.get(int(number), []))
+
+
+class PullCommitsHandler(FakeGitHubHandler):
+    def get(self, owner: str, name: str, number: str):
+        repository = self.repository(owner, name)
+        if repository.pull(int(number)) is None:
+            self.not_found()
+        self.respond(repository.pull_commits(int(number)))
+
+
+class CommitsHandler(FakeGitHubHandler):
+    def get(self, owner: str, name: str):
+        repository = self.repository(owner, name)
+        sha = self.get_argument("sha", None)
+        path = self.get_argument("path", None)
+        author = self.get_argument("author", None)
+        commits = repository.commits
+        if sha is not None:
+            head = repository.resolve(sha)
+            if head is None:
+                self.not_found()
+            ancestors = repository.ancestors(head)
+            commits = [commit for commit in commits if commit["sha"] in ancestors]
+        if path is not None:
+            commits = [
+                commit
+                for commit in commits
+                if any(file["filename"] == path for file in commit.get("files", []))
+            ]
+        if author is not None:
+            commits = [
+                commit
+                for commit in commits
+                if author
+                in (
+                    commit["commit"]["author"]["name"],
+                    commit["commit"]["author"]["email"],
+                )
+            ]
+        self.respond(commits)
+
+
+class CommitHandler(FakeGitHubHandler):
+    def get(self, owner: str, name: str, sha: str):
+        commit = self.repository(owner, name).commit(sha)
+        if commit is None:
+            self.respond({"message": f"No commit found for SHA: {sha}"}, status=422)
+            return
+        self.respond(commit)
+
+
+class CommitPullsHandler(FakeGitHubHandler):
+    def get(self, owner: str, name: str, sha: str):
+        repository = self.repository(owner, name)
+        commit = repository.commit(sha)
+        if commit is None:
+            self.respond({"message": f"No commit found for SHA: {sha}"}, status=422)
+            return
+        self.respond(repository.pulls_of_commit(commit["sha"]))
+
+
+class CompareHandler(FakeGitHubHandler):
+    def get(self, owner: str, name: str, base: str, head: str):
+        comparison = self.repository(owner, name).compare(base, head)
+        if comparison is None:
+            self.not_found()
+        self.respond(comparison, paginate="commits")
+
+
+class BranchesHandler(FakeGitHubHandler):
+    def get(self, owner: str, name: str):
+        repository = self.repository(owner, name)
+        self.respond(
+            [
+                {"name": branch, "commit": {"sha": sha}, "protected": False}
+                for branch, sha in repository.branches.items()
+            ]
+        )
+
+
+class TagsHandler(FakeGitHubHandler):
+    def get(self, owner: str, name: str):
+        repository = self.repository(owner, name)
+        self.respond(
+            [
+                {"name": tag, "commit": {"sha": sha}}
+                for tag, sha in repository.tags.items()
+            ]
+        )
+
+
+def create_application(github: FakeGitHub) -> tornado.web.Application:
+    repo = r"/repos/([^/]+)/([^/]+)"
+    handlers = [
+        (repo, RepositoryHandler),
+        (f"{repo}/pulls", PullsHandler),
+        (rf"{repo}/pulls/(\d+)", PullHandler),
+        (rf"{repo}/pulls/(\d+)/files", PullFilesHandler),
+        (rf"{repo}/pulls/(\d+)/commits", PullCommitsHandler),
+        (f"{repo}/commits", CommitsHandler),
+        (f"{repo}/commits/([^/]+)", CommitHandler),
+        (f"{repo}/commits/([^/]+)/pulls", CommitPullsHandler),
+        (rf"{repo}/compare/(.+)\.\.\.(.+)", CompareHandler),
+        (f"{repo}/branches", BranchesHandler),
+        (f"{repo}/tags", TagsHandler),
+    ]
+    return tornado.web.Application(
+        [(pattern, handler, {"github": github}) for pattern, handler in handlers]
+    )
+
+
+class FakeGitHubServer:
+    """
+    Serves a FakeGitHub on 127.0.0.1 in a daemon thread, the GitHub client reaches it through GITHUB_API_URL.
+
+    Usage:
+        with FakeGitHubServer([synthetic_repository()]) as server:
+            monkeypatch.setattr(settings, "github_api_url", server.url)
+    """
+
+    def __init__(
+        self,
+        repositories: List[FakeRepository],
+        latency_seconds: float = 0.0,
+        rate_limit: int = RATE_LIMIT,
+        port: int = 0,
+    ):
+        self.github = FakeGitHub(repositories, latency_seconds, rate_limit)
+        self.port = port
+        self.__application = create_application(self.github)
+        self.__loop = asyncio.new_event_loop()
+        self.__server: Optional[tornado.httpserver.HTTPServer] = None
+        self.__started = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> "FakeGitHubServer":
+        self.__thread = threading.Thread(
+            target=self.__run, name="fake-github", daemon=True
+        )
+        self.__thread.start()
+        self.__started.wait(10)
+        return self
+
+    def stop(self):
+        if self.__thread is None:
+            return
+
+        def shutdown():
+            if self.__server is not None:
+                self.__server.stop()
+            self.__loop.stop()
+
+        self.__loop.call_soon_threadsafe(shutdown)
+        self.__thread.join(10)
+        self.__thread = None
+
+    def __enter__(self) -> "FakeGitHubServer":
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def __run(self):
+        asyncio.set_event_loop(self.__loop)
+        self.__loop.run_until_complete(self.__listen())
+        self.__started.set()
+        self.__loop.run_forever()
+        self.__loop.close()
+
+    async def __listen(self):
+        self.__server = tornado.httpserver.HTTPServer(self.__application)
+        sockets = tornado.netutil.bind_sockets(self.port, address="127.0.0.1")
+        self.__server.add_sockets(sockets)
+        self.port = sockets[0].getsockname()[1]
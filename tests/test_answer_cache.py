@@ -0,0 +1,83 @@
+import chat_with_repo.assistant as assistant_module
+from chat_with_repo.answer_cache import (
+    AnswerCache,
+    extract_entities,
+    is_self_contained,
+)
+from chat_with_repo.assistant import GitHubAssistant
+from chat_with_repo.model import Repo
+
+
+def create_cache(freshness: str = "v1") -> AnswerCache:
+    tokens = {"value": freshness}
+    cache = AnswerCache(freshness=lambda repo: tokens["value"], freshness_ttl_seconds=0)
+    cache.tokens = tokens
+    return cache
+
+
+def test_answer_cache_near_duplicate_hit():
+    cache = create_cache()
+    cache.put(cache.key("Open PRs to approve on jariko", Repo.jariko), "#1, #2")
+    assert (
+        cache.get(cache.key("open pull requests to approve on jariko?", Repo.jariko))
+        == "#1, #2"
+    )
+    assert (
+        cache.get(cache.key("Hello, open PRs to approve on jariko please", Repo.jariko))
+        == "#1, #2"
+    )
+
+
+def test_answer_cache_requires_same_entities():
+    cache = create_cache()
+    cache.put(cache.key("is branch feature/abc merged to develop", Repo.jariko), "Yes")
+    assert (
+        cache.get(cache.key("is branch feature/abd merged to develop", Repo.jariko))
+        is None
+    )
+    assert (
+        cache.get(cache.key("is branch feature/abc merged to master", Repo.jariko))
+        is None
+    )
+    assert cache.get(cache.key("show pull request 549", Repo.jariko)) is None
+
+
+def test_answer_cache_depends_on_repo_and_freshness():
+    cache = create_cache()
+    cache.put(cache.key("open PRs to approve", Repo.jariko), "#1")
+    assert cache.get(cache.key("open PRs to approve", Repo.kokos)) is None
+    cache.tokens["value"] = "v2"
+    assert cache.get(cache.key("open PRs to approve", Repo.jariko)) is None
+
+
+def test_extract_entities():
+    assert extract_entities(
+        "Is commit 67477d15d599cad9d7bca0df49cc383984d85125 in develop? PR #487, 'hello world'"
+    ) == {"67477d15d599cad9d7bca0df49cc383984d85125", "develop", "487", "hello world"}
+
+
+def test_is_self_contained():
+    assert is_self_contained("show the open pull requests")
+    assert not is_self_contained("who is its author?")
+    assert is_self_contained("show this commit 5bc1da09")
+
+
+def test_answer_is_keyed_by_the_repo_named_in_the_message(monkeypatch):
+    freshness_repos = []
+
+    def freshness(repo):
+        freshness_repos.append(repo)
+        return "v1"
+
+    monkeypatch.setattr(
+        assistant_module,
+        "run_route",
+        lambda route, repo, top_k: f"PR {route.args['number']} of {repo.value}",
+    )
+    cache = AnswerCache(freshness=freshness, freshness_ttl_seconds=0)
+    assistant = GitHubAssistant(answer_cache=cache, escalation_model=None)
+    assistant.state.repo = Repo.jariko
+    assert assistant.chat("show PR 549 on kokos") == "PR 549 of kokos"
+    assert freshness_repos == [Repo.kokos]
+    assert assistant.last_turn.label == "kokos"
+    assert cache.get(cache.key("show PR 549 on kokos", Repo.kokos)) == "PR 549 of kokos"
@@ -0,0 +1,104 @@
+import threading
+import time
+from datetime import datetime
+
+from chat_with_repo.batch_review import review_open_pull_requests
+from chat_with_repo.model import Head, PullRequest, Repo, User
+from chat_with_repo.review_jobs import JobState, ReviewJobQueue
+
+
+def create_pull_request(number: int, sha: str) -> PullRequest:
+    head = Head(label=f"smeup:feature/{number}", ref=f"feature/{number}", sha=sha)
+    return PullRequest(
+        number=number,
+        html_url=f"https://github.com/smeup/jariko/pull/{number}",
+        diff_url=f"https://github.com/smeup/jariko/pull/{number}.diff",
+        title=f"Feature {number}",
+        user=User(login="dev", html_url="https://github.com/dev"),
+        created_at=datetime(2024, 7, 1),
+        head=head,
+        base=Head(label="smeup:develop", ref="develop", sha="base"),
+    )
+
+
+def test_batch_review_skips_reviewed_head_commits(tmp_path):
+    heads = {1: "aaa", 2: "bbb"}
+    reviewed = []
+
+    def list_pull_requests(owner, repo):
+        if repo == "kokos":
+            raise Exception("Error: 404 - Not Found")
+        return [create_pull_request(number, sha) for number, sha in heads.items()]
+
+    def review(number, question, owner, repo, model, callbacks):
+        reviewed.append(number)
+        return f"Review of {number}"
+
+    queue = ReviewJobQueue(path=str(tmp_path / "jobs.sqlite"), review=review)
+    report = review_open_pull_requests(
+        repos=[Repo.jariko, Repo.kokos],
+        queue=queue,
+        list_pull_requests=list_pull_requests,
+        timeout=5,
+    )
+    assert (report.pull_requests, report.reviewed, report.skipped) == (2, 2, 0)
+    # The repository that could not be listed
+    assert report.failed == 1
+
+    # Only the pull request with a new head commit is reviewed again
+    heads[2] = "ccc"
+    report = review_open_pull_requests(
+        repos=[Repo.jariko],
+        queue=queue,
+        list_pull_requests=list_pull_requests,
+        timeout=5,
+    )
+    assert (report.reviewed, report.skipped, report.failed) == (1, 1, 0)
+    assert sorted(reviewed) == [1, 2, 2]
+    assert queue.latest_review(2).head_sha == "ccc"
+    queue.shutdown()
+
+
+def test_batch_review_lists_the_open_pull_requests(fake_github, tmp_path):
+    def review(number, question, owner, repo, model, callbacks):
+        return f"Review of {number}"
+
+    queue = ReviewJobQueue(path=str(tmp_path / "jobs.sqlite"), review=review)
+    report = review_open_pull_requests(repos=[Repo.jariko], queue=queue, timeout=5)
+    queue.shutdown()
+    assert (report.pull_requests, report.reviewed, report.failed) == (5, 5, 0)
+
+
+def test_batch_review_cancels_the_reviews_after_the_timeout(tmp_path):
+    started = threading.Event()
+    stopped = []
+
+    def list_pull_requests(owner, repo):
+        return [create_pull_request(number, f"sha{number}") for number in [1, 2]]
+
+    def review(number, question, owner, repo, model, callbacks):
+        started.set()
+        try:
+            while True:
+                for callback in callbacks:
+                    callback.on_llm_new_token("token ")
+                time.sleep(0.01)
+        except Exception as e:
+            stopped.append(e)
+            raise
+
+    queue = ReviewJobQueue(
+        path=str(tmp_path / "jobs.sqlite"), max_concurrent_jobs=1, review=review
+    )
+    report = review_open_pull_requests(
+        repos=[Repo.jariko],
+        queue=queue,
+        list_pull_requests=list_pull_requests,
+        timeout=0.2,
+    )
+    queue.shutdown()
+    assert started.is_set()
+    assert (report.reviewed, report.failed) == (0, 2)
+    assert {job.state for job in queue.list_jobs()} == {JobState.CANCELLED}
+    # The running review has been stopped, the queued one never started
+    assert len(stopped) == 1
@@ -0,0 +1,84 @@
+import requests
+
+from chat_with_repo.cache_warmer import (
+    CacheWarmer,
+    warm_branches,
+    warm_open_pull_requests,
+)
+from chat_with_repo.github_client import get_response_cache
+from chat_with_repo.metadata_store import MISSING, PULL_REQUESTS, get_metadata_store
+from chat_with_repo.model import Repo
+from chat_with_repo.settings import settings
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b"[]", etag=None, links=None, url=""):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = {"ETag": etag} if etag else {}
+        self.links = links or {}
+
+
+def test_warm_runs_the_tasks_in_order():
+    calls = []
+
+    def task(name):
+        return lambda owner, repo, ttl_seconds: calls.append((name, repo))
+
+    def failing(owner, repo, ttl_seconds):
+        raise Exception("Error: 500 - Internal Server Error")
+
+    warmer = CacheWarmer(
+        repos=[Repo.jariko, Repo.webup_project],
+        interval_seconds=300,
+        tasks=[("first", task("first")), ("failing", failing), ("last", task("last"))],
+    )
+    report = warmer.warm()
+    assert calls == [
+        ("first", "jariko"),
+        ("first", "webup-project"),
+        ("last", "jariko"),
+        ("last", "webup-project"),
+    ]
+    assert len(report.warmed) == 4
+    assert len(report.failed) == 2
+    assert warmer.last_report is report
+
+
+def test_warm_stops_when_the_budget_runs_out(monkeypatch):
+    get_response_cache().clear()
+    monkeypatch.setattr(settings, "github_token", "token")
+    pages = {}
+
+    def fake_get(self, url, headers=None, params=None, timeout=None):
+        page = int(url.rsplit("page=", 1)[1]) if "page=" in url else 1
+        pages[page] = pages.get(page, 0) + 1
+        if headers.get("If-None-Match"):
+            return FakeResponse(304)
+        links = {"next": {"url": f"{url.split('?')[0]}?page={page + 1}"}}
+        return FakeResponse(200, etag=f'"{page}"', links=links if page < 5 else {})
+
+    monkeypatch.setattr(requests.Session, "get", fake_get)
+    warmer = CacheWarmer(
+        repos=[Repo.jariko],
+        interval_seconds=3600,
+        rate_limit_share=0.1,
+        tasks=[("branches", warm_branches)],
+    )
+    monkeypatch.setattr(warmer, "budget", lambda: 2)
+    first = warmer.warm()
+    assert first.exhausted and first.requests == 2
+    # The pages already warm are revalidated for free, the refresh goes on from the first cold page
+    second = warmer.warm()
+    assert second.exhausted and second.requests == 2
+    third = warmer.warm()
+    assert not third.exhausted and third.requests == 1
+    assert third.warmed == ["jariko: branches"]
+
+
+def test_warm_open_pull_requests_fills_the_metadata_store(fake_github):
+    warm_open_pull_requests("smeup", "jariko", ttl_seconds=60)
+    store = get_metadata_store()
+    assert store.get(PULL_REQUESTS, ("smeup", "jariko", 12)).number == 12
+    assert store.get(PULL_REQUESTS, ("smeup", "jariko", 7)) is MISSING
@@ -0,0 +1,113 @@
+import asyncio
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from chat_with_repo import chat_history
+from chat_with_repo.callbacks import TracingCallbackHandler
+from chat_with_repo.chat_history import ChatHistory
+from chat_with_repo.misc_tools import GetReferenceTool
+from chat_with_repo.tracing import TURN_SPAN, span
+from chat_with_repo.usage import span_usage, total_usage
+
+
+def summarizer(summary, messages, callbacks=None):
+    return " ".join([summary] + [msg.content for msg in messages]).strip()
+
+
+def test_chat_history_keeps_recent_messages():
+    history = ChatHistory(summarizer=summarizer)
+    history.append("show pr 549", "PR 549 is merged")
+    messages = history.to_messages()
+    assert isinstance(messages[0], HumanMessage)
+    assert isinstance(messages[1], AIMessage)
+    assert messages[1].content == "PR 549 is merged"
+    assert history.summary == ""
+
+
+def test_chat_history_summarizes_older_messages():
+    history = ChatHistory(max_messages=4, summarizer=summarizer)
+    for i in range(3):
+        history.append(f"question {i}", f"answer {i}")
+    assert history.summary == "question 0 answer 0"
+    messages = history.to_messages()
+    assert isinstance(messages[0], SystemMessage)
+    assert [msg.content for msg in messages[1:]] == [
+        "question 1",
+        "answer 1",
+        "question 2",
+        "answer 2",
+    ]
+
+
+def test_chat_history_respects_token_budget():
+    history = ChatHistory(
+        max_tokens=200,
+        max_summary_tokens=20,
+        max_message_tokens=10_000,
+        summarizer=lambda s, m, c: "summary",
+    )
+    for i in range(10):
+        history.append(f"question {i}", "word " * 50)
+    assert history.count_tokens() <= 200
+    assert history.questions()[-1] == "question 9"
+    assert history.summary == "summary"
+
+
+def test_chat_history_stores_large_outputs_by_reference():
+    history = ChatHistory(max_message_tokens=50, summarizer=summarizer)
+    review = "## Code review\n" + "a long line of the review\n" * 100
+    history.append("review pr 549", review)
+    answer = history.to_messages()[1].content
+    assert "output-1" in answer
+    assert len(answer) < 300
+    assert history.get_reference("output-1") == review
+    tool = GetReferenceTool(chat_history=history)
+    assert tool.run({"reference": "output-1"}) == review
+    assert "No output" in tool.run({"reference": "output-2"})
+
+
+def test_chat_history_stores_blank_large_outputs():
+    history = ChatHistory(max_message_tokens=5, summarizer=summarizer)
+    history.append("review pr 549", " \n" * 100)
+    assert "output-1" in history.to_messages()[1].content
+
+
+class SummaryChatModel(BaseChatModel):
+    @property
+    def _llm_type(self) -> str:
+        return "summary"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        message = AIMessage(
+            content="The summary",
+            usage_metadata={"input_tokens": 80, "output_tokens": 8, "total_tokens": 88},
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def test_chat_history_summary_is_traced_in_the_turn(monkeypatch):
+    monkeypatch.setattr(
+        chat_history,
+        "create_chat_model",
+        lambda stage, model, **kwargs: SummaryChatModel(
+            metadata={"ls_model_name": model, "stage": stage}
+        ),
+    )
+    history = ChatHistory(max_messages=2)
+    history.append("question 0", "answer 0")
+    with span(TURN_SPAN, "jariko") as turn:
+        history.append("question 1", "answer 1", callbacks=[TracingCallbackHandler()])
+    assert history.summary == "The summary"
+    assert total_usage(span_usage(turn)).input_tokens == 80
+
+    async def aappend():
+        with span(TURN_SPAN, "jariko") as turn:
+            await history.aappend(
+                "question 2", "answer 2", callbacks=[TracingCallbackHandler()]
+            )
+        return turn
+
+    assert total_usage(span_usage(asyncio.run(aappend()))).output_tokens == 8
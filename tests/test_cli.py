@@ -0,0 +1,75 @@
+import io
+import json
+
+from chat_with_repo.cli import answer_questions, read_questions
+from chat_with_repo.model import Repo, State
+from chat_with_repo.usage import Usage
+
+
+class FakeAssistant:
+    def __init__(self):
+        self.state = State()
+        self.last_turn_usage = {}
+
+    def chat(self, message, callbacks=None):
+        self.last_turn_usage = {
+            "gpt-4o-mini": Usage(llm_calls=1, input_tokens=100, output_tokens=10)
+        }
+        if "fail" in message:
+            raise Exception("Error: 500 - Internal Server Error")
+        return f"{self.state.repo.value}: {message}"
+
+
+def test_read_questions():
+    lines = [
+        "# comment",
+        "show PR 549",
+        "",
+        '{"id": "q2", "question": "last tag", "repo": "kokos"}',
+    ]
+    questions = list(read_questions(lines, repo=Repo.jariko))
+    assert [(q.id, q.question, q.repo) for q in questions] == [
+        ("2", "show PR 549", Repo.jariko),
+        ("q2", "last tag", Repo.kokos),
+    ]
+
+
+def test_answer_questions_writes_jsonl():
+    questions = read_questions(["show PR 549", "fail please", "show PR 550"])
+    output = io.StringIO()
+    answers = answer_questions(
+        questions, output=output, workers=2, create_assistant=FakeAssistant
+    )
+    lines = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert len(lines) == len(answers) == 3
+    by_id = {line["id"]: line for line in lines}
+    assert by_id["1"]["answer"] == "jariko: show PR 549"
+    assert by_id["2"]["answer"] is None
+    assert "500" in by_id["2"]["error"]
+    assert all(line["seconds"] >= 0 for line in lines)
+    assert by_id["1"]["llm_calls"] == by_id["2"]["llm_calls"] == 1
+    assert by_id["1"]["input_tokens"] == 100
+
+
+def test_answer_questions_reports_the_malformed_lines():
+    questions = read_questions(
+        [
+            "show PR 549",
+            '{"question": "last tag"',
+            '{"question": "last tag", "repo": "unknown"}',
+            '{"id": "q4"}',
+            '{"question": "last tag", "repo": "kokos"}',
+        ]
+    )
+    output = io.StringIO()
+    answer_questions(questions, output=output, create_assistant=FakeAssistant)
+    by_id = {
+        line["id"]: line for line in map(json.loads, output.getvalue().splitlines())
+    }
+    assert by_id["1"]["answer"] == "jariko: show PR 549"
+    assert by_id["5"]["answer"] == "kokos: last tag"
+    for number in ["2", "3", "4"]:
+        assert by_id[number]["answer"] is None and by_id[number]["error"]
+        assert by_id[number]["llm_calls"] == 0
+    assert "JSONDecodeError" in by_id["2"]["error"]
+    assert "unknown" in by_id["3"]["error"]
@@ -0,0 +1,98 @@
+import time
+from typing import Any, Iterator
+
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+import chat_with_repo.assistant as assistant_module
+from chat_with_repo.answer_cache import AnswerCache
+from chat_with_repo.assistant import STREAMED_ANSWER_SEPARATOR, GitHubAssistant
+from chat_with_repo.github_client import (
+    DEFAULT_TIMEOUT_SECONDS,
+    DeadlineExceededError,
+    deadline,
+    get_timeout,
+)
+
+
+class FakeChatModel(BaseChatModel):
+    responses: Iterator[AIMessage]
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        return ChatResult(generations=[ChatGeneration(message=next(self.responses))])
+
+
+def test_deadline_bounds_timeout():
+    assert get_timeout() == DEFAULT_TIMEOUT_SECONDS
+    with deadline(5):
+        assert get_timeout() <= 5
+        with deadline(100):
+            assert get_timeout() <= 5
+    with deadline(0.01):
+        time.sleep(0.02)
+        with pytest.raises(DeadlineExceededError):
+            get_timeout()
+
+
+def test_partial_answer_when_steps_run_out(monkeypatch):
+    def select_repo(i: int) -> AIMessage:
+        return AIMessage(
+            content="",
+            tool_calls=[
+                {
+                    "name": "select_github_repo",
+                    "args": {"repo": "jariko"},
+                    "id": f"c{i}",
+                }
+            ],
+        )
+
+    responses = iter([select_repo(i) for i in range(10)])
+    monkeypatch.setattr(
+        assistant_module,
+        "create_chat_model",
+        lambda stage, model, **kwargs: FakeChatModel(responses=responses),
+    )
+    answer_cache = AnswerCache(freshness=lambda repo: "v1")
+    assistant = GitHubAssistant(
+        fast_path=False,
+        escalation_model=None,
+        max_iterations=2,
+        answer_cache=answer_cache,
+    )
+    answer = assistant.chat("select jariko forever")
+    assert answer.startswith("I ran out of time or steps")
+    assert answer.count("**select_github_repo**") == 2
+    # The partial answer is not shared through the answer cache
+    assert (
+        answer_cache.get(
+            answer_cache.key("select jariko forever", assistant.state.repo)
+        )
+        is None
+    )
+    assert assistant.last_turn.attributes["partial"]
+    assert assistant.last_answer == answer
+
+
+def test_stream_replaces_the_draft_with_the_answer(monkeypatch):
+    async def achat(self, message, callbacks=None):
+        for token in ["Let me ", "check"]:
+            callbacks[0].on_llm_new_token(token)
+        self.last_answer = "I ran out of time before finding the answer"
+        return self.last_answer
+
+    monkeypatch.setattr(GitHubAssistant, "achat", achat)
+    assistant = GitHubAssistant(escalation_model=None)
+    streamed = "".join(assistant.stream("show PR 549"))
+    assert streamed == (
+        "Let me check"
+        + STREAMED_ANSWER_SEPARATOR
+        + "I ran out of time before finding the answer"
+    )
+    assert assistant.last_answer == "I ran out of time before finding the answer"
@@ -0,0 +1,91 @@
+import asyncio
+
+from chat_with_repo.branch_tools import find_branches_by_commit
+from chat_with_repo.commit_tools import compare_commits, is_commit_in_base
+from chat_with_repo.github_client import get, get_rate_limit
+from chat_with_repo.model import PullRequestFilter
+from chat_with_repo.pull_request_tools import (
+    aget_pull_requests,
+    get_diff,
+    get_files_changed_in_pull_request,
+    get_pull_request_by_number,
+    get_pull_requests,
+    get_pull_requests_by_commit,
+)
+from chat_with_repo.settings import settings
+from chat_with_repo.tag_tools import find_tags_by_commit
+
+
+def test_pull_requests_are_paginated(fake_github):
+    pull_requests = get_pull_requests(
+        PullRequestFilter(target_branch="develop"), owner="smeup", repo="kokos"
+    )
+    assert [pr.number for pr in pull_requests] == list(range(150, 0, -1))
+    assert any(
+        "/repos/smeup/kokos/pulls?" in uri and "page=2" in uri
+        for uri in fake_github.github.requests
+    )
+
+
+def test_pull_request_diff_and_files(fake_github):
+    pull_request = get_pull_request_by_number(12)
+    assert pull_request.title.startswith("Fix ") and pull_request.merged_at is None
+    assert get_pull_request_by_number(999) is None
+    files = get_files_changed_in_pull_request(12)
+    assert len(files) == 3
+    diff = get_diff(12)
+    assert all(f"diff --git a/{file.filename}" in diff for file in files)
+
+
+def test_files_and_pull_requests_of_commit_are_paginated(fake_github, monkeypatch):
+    repository = fake_github.github.repository("smeup", "kokos")
+    files = [
+        {
+            "filename": f"src/File{i}.kt",
+            "status": "added",
+            "additions": 1,
+            "deletions": 0,
+            "changes": 1,
+        }
+        for i in range(150)
+    ]
+    monkeypatch.setitem(repository.files, 1, files)
+    changed = get_files_changed_in_pull_request(1, repo="kokos")
+    assert [file.filename for file in changed] == [file["filename"] for file in files]
+    assert any(
+        "/pulls/1/files?" in uri and "page=2" in uri
+        for uri in fake_github.github.requests
+    )
+    head = repository.pull(150)["head"]["sha"]
+    assert 150 in [pr.number for pr in get_pull_requests_by_commit(head, repo="kokos")]
+    assert get_pull_requests_by_commit("0" * 40, repo="kokos") == []
+
+
+def test_commit_ancestry(fake_github):
+    repository = fake_github.github.repository("smeup", "jariko")
+    master = repository.branches["master"]
+    assert is_commit_in_base(master, "develop")
+    assert not is_commit_in_base(repository.branches["develop"], "master")
+    assert len(compare_commits("master", "develop")) == 20
+    assert compare_commits("master", "missing") is None
+    branches = find_branches_by_commit(master)
+    assert "develop" in branches and "master" in branches
+    assert find_tags_by_commit(master) == ["v1.3.0", "v1.2.0"]
+
+
+def test_etag_revalidation_and_rate_limit(fake_github):
+    url = f"{settings.github_api_url}/repos/smeup/jariko/branches"
+    headers = {"Authorization": f"token {settings.github_token}"}
+    first = get(url, headers=headers)
+    second = get(url, headers=headers)
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json()
+    assert fake_github.github.not_modified >= 1
+    assert get_rate_limit().remaining == fake_github.github.remaining
+
+
+def test_async_tools_share_the_fake_server(fake_github):
+    pull_requests = asyncio.run(
+        aget_pull_requests(PullRequestFilter(target_branch="develop"), repo="kokos")
+    )
+    assert len(pull_requests) == 150
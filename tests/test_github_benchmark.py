@@ -0,0 +1,26 @@
+from benchmarks.github_helpers import BenchmarkConfig, check_regressions, run_benchmark
+
+
+def test_github_helpers_benchmark():
+    report = run_benchmark(
+        BenchmarkConfig(pull_requests=250, branches=12, tags=6, commits=200, repeat=1)
+    )
+    assert set(report.results) == {
+        "get_pull_requests",
+        "get_pull_requests_by_path",
+        "find_branches_by_commit",
+        "find_tags_by_commit",
+        "is_commit_in_base",
+        "create_prompt_property",
+    }
+    pull_requests = report.results["get_pull_requests"]
+    assert pull_requests.cold.requests == 3
+    # The warm run revalidates the pages without transferring them again
+    assert pull_requests.warm.not_modified == 3 and pull_requests.warm.bytes == 0
+    assert check_regressions(report, report) == []
+
+    regressed = report.model_copy(deep=True)
+    regressed.results["is_commit_in_base"].cold.requests += 1
+    assert check_regressions(regressed, report) == [
+        "is_commit_in_base (cold): 2 requests, baseline 1"
+    ]
@@ -0,0 +1,20 @@
+from benchmarks.hot_functions import check_regressions, run_benchmark
+
+
+def test_hot_functions_benchmark():
+    report = run_benchmark(scale=0.005, repeat=1)
+    assert list(report.results) == [
+        "exclude_files_from_diff",
+        "__is_pull_request_match_filter",
+        "__extract_only_useful_information",
+        "generate_diff_hash",
+    ]
+    assert all(
+        result.operations_per_second > 0 and result.peak_bytes > 0
+        for result in report.results.values()
+    )
+    assert check_regressions(report, report) == []
+
+    regressed = report.model_copy(deep=True)
+    regressed.results["generate_diff_hash"].operations_per_second /= 2
+    assert len(check_regressions(regressed, report)) == 1
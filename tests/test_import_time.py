@@ -0,0 +1,10 @@
+import os
+
+from benchmarks.import_time import BUDGETS_MS, check_imports
+
+
+def test_import_time_within_budget():
+    # The budgets are doubled by default to absorb the noise of shared machines
+    budget_factor = float(os.getenv("IMPORT_TIME_BUDGET_FACTOR", "2"))
+    violations = check_imports(list(BUDGETS_MS), repeat=2, budget_factor=budget_factor)
+    assert violations == []
@@ -0,0 +1,36 @@
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from chat_with_repo.llm_cache import LLMCacheMissError, LLMCacheMode, SQLiteLLMCache
+
+
+def test_llm_cache_returns_recorded_response(tmp_path):
+    cache = SQLiteLLMCache(path=str(tmp_path / "cache.sqlite"))
+    llm = FakeListChatModel(responses=["first", "second"], cache=cache)
+    assert llm.invoke("hello").content == "first"
+    assert llm.invoke("hello").content == "first"
+    assert llm.invoke("bye").content == "second"
+    assert cache.hits == 1
+
+
+def test_llm_cache_replay(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    recorder = SQLiteLLMCache(path=path, mode=LLMCacheMode.RECORD)
+    FakeListChatModel(responses=["recorded"], cache=recorder).invoke("hello")
+    replay = SQLiteLLMCache(path=path, mode=LLMCacheMode.REPLAY)
+    llm = FakeListChatModel(responses=["recorded"], cache=replay)
+    assert llm.invoke("hello").content == "recorded"
+    with pytest.raises(LLMCacheMissError):
+        llm.invoke("bye")
+
+
+def test_llm_cache_evicts_least_recently_used(tmp_path):
+    cache = SQLiteLLMCache(path=str(tmp_path / "cache.sqlite"), max_size_bytes=3000)
+    llm = FakeListChatModel(responses=["x" * 500], cache=cache)
+    for i in range(10):
+        llm.invoke(f"question {i}")
+    assert cache.size() <= 3000
+    llm.invoke("question 9")
+    assert cache.hits == 1
+    llm.invoke("question 0")
+    assert cache.hits == 1
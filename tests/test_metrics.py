@@ -0,0 +1,97 @@
+import socket
+
+import pytest
+import requests
+
+from chat_with_repo.github_client import get_rate_limits, token_fingerprint
+from chat_with_repo.metrics import CONTENT_TYPE, Metrics, MetricsServer, get_metrics
+from chat_with_repo.pull_request_tools import get_pull_request_by_number
+from chat_with_repo.resources import Resources
+from chat_with_repo.settings import settings
+from chat_with_repo.tracing import LLM_SPAN, TOOL_SPAN, Span, latency_histograms, span
+
+
+def test_spans_feed_the_counters(fake_github):
+    metrics = get_metrics()
+    before = metrics.counter(
+        "chat_tool_invocations_total", tool="lookup", status="error"
+    )
+    requests_before = metrics.counter(
+        "chat_github_requests_total",
+        endpoint="/repos/{owner}/{repo}/pulls/{number}",
+        status=200,
+        cache="miss",
+    )
+    try:
+        with span(TOOL_SPAN, "lookup"):
+            get_pull_request_by_number(12)
+            raise ValueError("boom")
+    except ValueError:
+        pass
+    assert (
+        metrics.counter("chat_tool_invocations_total", tool="lookup", status="error")
+        == before + 1
+    )
+    assert (
+        metrics.counter(
+            "chat_github_requests_total",
+            endpoint="/repos/{owner}/{repo}/pulls/{number}",
+            status=200,
+            cache="miss",
+        )
+        == requests_before + 1
+    )
+    assert token_fingerprint("token fake-token") in get_rate_limits()
+
+
+def test_render_prometheus_text_format():
+    latency_histograms.reset()
+    metrics = Metrics()
+    llm = Span(LLM_SPAN, 'gpt-"4o"', stage="agent")
+    llm.set(input_tokens=120, output_tokens=30).finish()
+    metrics.observe_span(llm)
+    metrics.touch_session("a")
+    metrics.touch_session("b")
+    text = metrics.render(caches={"answer": (3, 1), "llm": (0, 0)})
+    lines = text.splitlines()
+    assert "# TYPE chat_llm_tokens_total counter" in lines
+    assert 'chat_llm_tokens_total{direction="input",model="gpt-\\"4o\\""} 120' in lines
+    assert 'chat_llm_calls_total{model="gpt-\\"4o\\"",stage="agent"} 1' in lines
+    assert 'chat_cache_hit_ratio{layer="answer"} 0.75' in lines
+    assert 'chat_cache_hit_ratio{layer="llm"} 0' in lines
+    assert "chat_active_sessions 2" in lines
+    assert (
+        'chat_span_duration_seconds_bucket{label="gpt-\\"4o\\"",span="llm",le="+Inf"} 1'
+        in lines
+    )
+    assert (
+        'chat_span_duration_seconds_count{label="gpt-\\"4o\\"",span="llm"} 1' in lines
+    )
+    assert Metrics(session_idle_seconds=-1).active_sessions() == 0
+
+
+def test_metrics_server_serves_the_metrics():
+    metrics = Metrics()
+    metrics.increment("chat_turns_total", repo="jariko")
+    server = MetricsServer(port=0, metrics=metrics, caches=lambda: {"metadata": (1, 1)})
+    server.start()
+    try:
+        response = requests.get(f"http://127.0.0.1:{server.port}/metrics", timeout=10)
+    finally:
+        server.stop()
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == CONTENT_TYPE
+    assert 'chat_turns_total{repo="jariko"} 1' in response.text
+    assert 'chat_cache_hits_total{layer="metadata"} 1' in response.text
+
+
+def test_metrics_server_reports_the_port_in_use(monkeypatch):
+    with socket.socket() as taken:
+        taken.bind(("127.0.0.1", 0))
+        taken.listen()
+        port = taken.getsockname()[1]
+        with pytest.raises(OSError):
+            MetricsServer(port=port, metrics=Metrics()).start()
+        monkeypatch.setitem(vars(settings), "metrics_port", port)
+        monkeypatch.setitem(vars(settings), "metrics_address", "127.0.0.1")
+        assert Resources().start_metrics_server() is None
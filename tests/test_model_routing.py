@@ -0,0 +1,98 @@
+from typing import Any, Iterator
+
+from langchain_core.agents import AgentActionMessageLog, AgentFinish
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.prompts.chat import ChatPromptTemplate, MessagesPlaceholder
+
+from chat_with_repo import pull_request_tools
+from chat_with_repo.callbacks import TracingCallbackHandler
+from chat_with_repo.misc_tools import SelectGitHubRepoTool
+from chat_with_repo.model import State
+from chat_with_repo.model_routing import (
+    CODE_REVIEW_STAGE,
+    StageStats,
+    create_routed_agent,
+    is_valid_tool_call,
+)
+from chat_with_repo.pricing import estimate_cost
+from chat_with_repo.tracing import TURN_SPAN, span
+
+PROMPT = ChatPromptTemplate.from_messages(
+    [("human", "{input}"), MessagesPlaceholder("agent_scratchpad")]
+)
+
+
+class FakeChatModel(BaseChatModel):
+    responses: Iterator[AIMessage]
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        return ChatResult(generations=[ChatGeneration(message=next(self.responses))])
+
+
+def tool_call(name: str, args: dict) -> AIMessage:
+    return AIMessage(
+        content="", tool_calls=[{"name": name, "args": args, "id": "call_1"}]
+    )
+
+
+def test_is_valid_tool_call():
+    tools = [SelectGitHubRepoTool(state=State())]
+    assert is_valid_tool_call(
+        tool_call("select_github_repo", {"repo": "jariko"}), tools
+    )
+    assert is_valid_tool_call(AIMessage(content="The answer"), tools)
+    assert not is_valid_tool_call(tool_call("unknown_tool", {}), tools)
+    assert not is_valid_tool_call(
+        tool_call("select_github_repo", {"repo": "foo"}), tools
+    )
+
+
+def test_routed_agent_escalates_invalid_tool_call():
+    tools = [SelectGitHubRepoTool(state=State())]
+    small = FakeChatModel(
+        responses=iter([tool_call("unknown_tool", {}), AIMessage(content="Done")]),
+        metadata={"stage": "agent"},
+    )
+    large = FakeChatModel(
+        responses=iter([tool_call("select_github_repo", {"repo": "kokos"})]),
+        metadata={"stage": "agent_escalation"},
+    )
+    stats = StageStats()
+    agent = create_routed_agent(small, tools, PROMPT, large)
+    config = {"callbacks": [TracingCallbackHandler()]}
+    with span(TURN_SPAN, "kokos") as turn:
+        actions = agent.invoke(
+            {"input": "select kokos", "intermediate_steps": []}, config
+        )
+        assert isinstance(actions[0], AgentActionMessageLog)
+        assert actions[0].tool_input == {"repo": "kokos"}
+        finish = agent.invoke({"input": "hello", "intermediate_steps": []}, config)
+        assert isinstance(finish, AgentFinish)
+    stats.record_spans(turn)
+    summary = stats.summary()
+    assert summary["agent"]["calls"] == 2
+    assert summary["agent_escalation"]["calls"] == 1
+
+
+def test_estimate_cost_versioned_model():
+    assert estimate_cost("gpt-4o-mini-2024-07-18", 1_000_000, 0) == 0.15
+    assert estimate_cost("unknown", 1000, 1000) == 0.0
+
+
+def test_review_model_is_deterministic(monkeypatch):
+    created = []
+
+    def create_chat_model(stage, model, **kwargs):
+        created.append((stage, kwargs))
+        return FakeChatModel(responses=iter([]))
+
+    monkeypatch.setattr(pull_request_tools, "create_chat_model", create_chat_model)
+    getattr(pull_request_tools, "__create_review_chain")(None)
+    # The review responses go through the LLM cache
+    assert created == [(CODE_REVIEW_STAGE, {"streaming": True, "temperature": 0})]
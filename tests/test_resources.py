@@ -0,0 +1,129 @@
+from types import SimpleNamespace
+
+import requests
+
+from chat_with_repo import commit_tools, github_client
+from chat_with_repo.github_client import (
+    CachedResponse,
+    ResponseCache,
+    get,
+    get_response_cache,
+)
+from chat_with_repo.metadata_store import (
+    ANCESTRY,
+    MISSING,
+    MetadataStore,
+    get_metadata_store,
+)
+from chat_with_repo.resources import get_resources
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b"", etag=None, links=None, url=""):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = {"ETag": etag} if etag else {}
+        self.links = links or {}
+
+
+def test_response_cache_evicts_by_size():
+    def cached(etag, size):
+        return CachedResponse(FakeResponse(200, b"x" * size, etag=etag))
+
+    cache = ResponseCache(max_size_bytes=100)
+    cache.put("a", cached('"a"', 10))
+    cache.put("b", cached('"b"', 10))
+    # Larger than a tenth of the cache, never stored
+    cache.put("big", cached('"big"', 11))
+    assert cache.lookup("big") is None
+    for i in range(9):
+        cache.put(str(i), cached(f'"{i}"', 10))
+    assert cache.size <= 100
+    assert cache.lookup("a") is None
+    assert cache.lookup("8").etag == '"8"'
+
+
+def test_metadata_store_expires_and_evicts():
+    store = MetadataStore(max_entries=2)
+    store.put("table", "expired", "value", ttl_seconds=-1)
+    assert store.get("table", "expired") is MISSING
+    store.put("table", "none", None, ttl_seconds=60)
+    assert store.get("table", "none") is None
+    store.put("table", "a", 1, ttl_seconds=60)
+    store.put("table", "b", 2, ttl_seconds=60)
+    assert store.get("table", "none") is MISSING
+    store.invalidate("table", "a")
+    assert store.get("table", "a") is MISSING
+    assert store.get("table", "b") == 2
+
+
+def test_get_revalidates_with_etag(monkeypatch):
+    get_response_cache().clear()
+    sent = []
+
+    def fake_get(self, url, headers=None, params=None, timeout=None):
+        sent.append(headers.get("If-None-Match"))
+        if headers.get("If-None-Match") == '"v1"':
+            return FakeResponse(304)
+        return FakeResponse(200, b"[]", etag='"v1"')
+
+    monkeypatch.setattr(requests.Session, "get", fake_get)
+    url = "https://api.github.com/repos/smeup/jariko/branches"
+    first = get(url, headers={"Accept": "application/json"})
+    second = get(url, headers={"Accept": "application/json"})
+    assert sent == [None, '"v1"']
+    assert second.content == first.content
+    assert second.json() == []
+    assert isinstance(second, CachedResponse)
+    assert get_response_cache().hits >= 1
+
+
+def test_get_returns_fresh_response_without_request(monkeypatch):
+    sent = []
+
+    def fake_get(self, url, headers=None, params=None, timeout=None):
+        sent.append(url)
+        return FakeResponse(200, b"[1]", etag='"v1"')
+
+    monkeypatch.setattr(requests.Session, "get", fake_get)
+    monkeypatch.setattr(get_response_cache(), "max_age_seconds", 60)
+    url = "https://api.github.com/repos/smeup/jariko/tags"
+    get(url)
+    assert get(url).json() == [1]
+    assert sent == [url]
+
+
+def test_is_commit_in_base_is_memoized(monkeypatch):
+    get_metadata_store().invalidate(ANCESTRY)
+    calls = []
+
+    def compare_commits(base, head, owner, repo):
+        calls.append((base, head))
+        return [] if base == "develop" else [SimpleNamespace(sha=head)]
+
+    monkeypatch.setattr(commit_tools, "compare_commits", compare_commits)
+    assert commit_tools.is_commit_in_base("abc", "develop")
+    assert commit_tools.is_commit_in_base("abc", "develop")
+    assert not commit_tools.is_commit_in_base("abc", "v1.0.0")
+    assert not commit_tools.is_commit_in_base("abc", "v1.0.0")
+    assert calls == [("develop", "abc"), ("v1.0.0", "abc")]
+
+
+def test_resources_are_shared():
+    assert get_resources() is get_resources()
+    assert get_resources().response_cache is github_client.get_response_cache()
+    stats = get_resources().stats()
+    assert "github_responses" in stats and "metadata" in stats
+
+
+def test_response_cache_expires_a_resource():
+    cache = ResponseCache(max_age_seconds=60)
+    base = "https://api.github.com/repos/smeup/jariko"
+    for url in [f"{base}/branches?page=2", f"{base}/tags", base]:
+        cache.put(url, CachedResponse(FakeResponse(200, b"[]", etag='"v"', url=url)))
+    assert cache.expire("/repos/smeup/jariko/branches") == 1
+    assert not cache.is_fresh(cache.lookup(f"{base}/branches?page=2"))
+    assert cache.is_fresh(cache.lookup(f"{base}/tags"))
+    assert cache.expire("/repos/smeup/jariko", subpaths=False) == 1
+    assert cache.is_fresh(cache.lookup(f"{base}/tags"))
@@ -0,0 +1,129 @@
+import sqlite3
+import subprocess
+import sys
+import threading
+
+from chat_with_repo.review_jobs import JobState, ReviewJobQueue
+from chat_with_repo.settings import settings
+
+
+def test_review_job_runs_in_background(tmp_path):
+    def review(number, question, owner, repo, model, callbacks):
+        for token in ["The ", "review ", f"of {number}"]:
+            for callback in callbacks:
+                callback.on_llm_new_token(token)
+        return f"The review of {number}"
+
+    queue = ReviewJobQueue(path=str(tmp_path / "jobs.sqlite"), review=review)
+    job = queue.submit(number=549, question="review 549")
+    assert job.state == JobState.QUEUED
+    assert "".join(queue.stream(job.id, poll_interval=0.01)) == "The review of 549"
+    assert queue.get(job.id).state == JobState.DONE
+    assert queue.latest_review(549).result == "The review of 549"
+    queue.shutdown()
+
+
+def test_review_job_deduplicates_in_flight_jobs(tmp_path):
+    release = threading.Event()
+    calls = []
+
+    def review(number, question, owner, repo, model, callbacks):
+        calls.append(number)
+        release.wait(5)
+        return "done"
+
+    queue = ReviewJobQueue(path=str(tmp_path / "jobs.sqlite"), review=review)
+    first = queue.submit(number=1, question="review 1")
+    second = queue.submit(number=1, question="make a code review of 1")
+    other = queue.submit(number=2, question="review 2")
+    assert first.id == second.id
+    assert other.id != first.id
+    release.set()
+    assert queue.wait(first.id, timeout=5).state == JobState.DONE
+    assert queue.wait(other.id, timeout=5).state == JobState.DONE
+    assert sorted(calls) == [1, 2]
+    # A finished review can be submitted again
+    assert queue.submit(number=1, question="review 1").id != first.id
+    queue.shutdown()
+
+
+def test_review_job_failure_and_reopen(tmp_path):
+    def review(number, question, owner, repo, model, callbacks):
+        raise Exception("Error: 404 - Not Found")
+
+    path = str(tmp_path / "jobs.sqlite")
+    queue = ReviewJobQueue(path=path, review=review)
+    job = queue.wait(queue.submit(number=3, question="review 3").id, timeout=5)
+    assert job.state == JobState.FAILED
+    assert "404" in job.error
+    queue.shutdown()
+    # The jobs are stored, a new queue on the same database finds them
+    reopened = ReviewJobQueue(path=path, review=review)
+    assert [j.id for j in reopened.list_jobs()] == [job.id]
+    reopened.shutdown()
+
+
+def test_review_job_queue_defaults_come_from_settings(tmp_path, monkeypatch):
+    monkeypatch.setitem(vars(settings), "review_jobs_path", str(tmp_path / "j.sqlite"))
+    monkeypatch.setitem(vars(settings), "review_max_concurrent_jobs", 3)
+    queue = ReviewJobQueue(review=lambda **kwargs: "done")
+    assert queue.path == str(tmp_path / "j.sqlite")
+    assert queue.max_concurrent_jobs == 3
+    assert queue._ReviewJobQueue__executor._max_workers == 3
+    queue.shutdown()
+
+
+def test_review_job_deduplicates_by_head_commit(tmp_path):
+    release = threading.Event()
+
+    def review(number, question, owner, repo, model, callbacks):
+        release.wait(5)
+        return "done"
+
+    queue = ReviewJobQueue(path=str(tmp_path / "jobs.sqlite"), review=review)
+    first = queue.submit(number=1, question="review 1", head_sha="a1")
+    assert queue.submit(number=1, question="review 1", head_sha="a1").id == first.id
+    pushed = queue.submit(number=1, question="review 1", head_sha="b2")
+    assert pushed.id != first.id
+    release.set()
+    assert queue.wait(pushed.id, timeout=5).state == JobState.DONE
+    queue.shutdown()
+
+
+def test_review_job_resumes_only_the_jobs_of_dead_processes(tmp_path):
+    release = threading.Event()
+    calls = []
+
+    def review(number, question, owner, repo, model, callbacks):
+        calls.append(number)
+        release.wait(5)
+        return "done"
+
+    path = str(tmp_path / "jobs.sqlite")
+    queue = ReviewJobQueue(path=path, review=review)
+    job = queue.submit(number=7, question="review 7")
+    # Another process on the same database leaves the job to its live owner
+    other = ReviewJobQueue(path=path, review=review)
+    release.set()
+    assert other.wait(job.id, timeout=5).state == JobState.DONE
+    other.shutdown()
+    queue.shutdown()
+    assert calls == [7]
+
+    # A job left running by a dead process is resumed by the next queue
+    dead = subprocess.run(
+        [sys.executable, "-c", "import os; print(os.getpid())"],
+        capture_output=True,
+        text=True,
+    )
+    worker = f"{job.worker.rpartition(':')[0]}:{dead.stdout.strip()}"
+    with sqlite3.connect(path) as connection:
+        connection.execute(
+            "UPDATE review_jobs SET state = ?, worker = ? WHERE id = ?",
+            (JobState.RUNNING.value, worker, job.id),
+        )
+    resumed = ReviewJobQueue(path=path, review=review)
+    assert resumed.wait(job.id, timeout=5).state == JobState.DONE
+    assert resumed.get(job.id).worker != worker
+    assert calls == [7, 7]
+    resumed.shutdown()
@@ -0,0 +1,73 @@
+from chat_with_repo.model import Repo
+from chat_with_repo.router import route_message
+
+
+def test_route_pull_request_by_number():
+    route = route_message("show PR 549")
+    assert route.tool == "get_pull_request_by_number"
+    assert route.args == {"number": 549}
+    assert route.repo is None
+
+    route = route_message("Hello, get me the pull request #7327 of webup-project")
+    assert route.tool == "get_pull_request_by_number"
+    assert route.args == {"number": 7327}
+    assert route.repo == Repo.webup_project
+
+
+def test_route_commit_by_sha():
+    route = route_message("get commit 5bc1da0")
+    assert route.tool == "get_commit_by_sha"
+    assert route.args == {"sha": "5bc1da0"}
+
+
+def test_route_tags_and_branches_by_commit():
+    route = route_message(
+        "which tags contain c37844f8d7c9246676184c8c883b9251d226f287 in kokos-sdk-java-rpgle"
+    )
+    assert route.tool == "find_tags_by_commit"
+    assert route.args == {"commit_sha": "c37844f8d7c9246676184c8c883b9251d226f287"}
+    assert route.repo == Repo.kokos_sdk_java_rpgle
+
+    route = route_message(
+        "Hello, tell me the branches that contain the commit 8d189c51b3ff056aa019c26e93f59e8a603e7735"
+    )
+    assert route.tool == "find_branches_by_commit"
+
+
+def test_route_pull_requests_by_commit():
+    route = route_message(
+        "Hello, tell me the pull request containing the commit 58fd35f96f1eb9f087d9613de1cb37b96b2d2e7f"
+    )
+    assert route.tool == "get_pull_requests_by_commit"
+
+
+def test_route_commits_by_pull_request():
+    route = route_message(
+        "Hello, tell me the commits associated with the pull request 554"
+    )
+    assert route.tool == "get_commits_by_pull_request"
+    assert route.args == {"number": 554}
+
+    route = route_message("list the commits of PR 554 in chat with repo")
+    assert route.tool == "get_commits_by_pull_request"
+    assert route.args == {"number": 554}
+    assert route.repo == Repo.chat_with_repo
+
+
+def test_route_ambiguous_falls_back_to_agent():
+    assert route_message("Hello, the pr 545 has been merged?") is None
+    assert route_message("make me the code review of the pull request 533") is None
+    assert (
+        route_message(
+            "Hello, tell me the title of pull request containing this commit 5bc1da09bab1d53b28fbcfdcf9f01fd766bb3b05"
+        )
+        is None
+    )
+    assert (
+        route_message(
+            "is the commit 67477d15d599cad9d7bca0df49cc383984d85125 in the branch master"
+        )
+        is None
+    )
+    assert route_message("show PR 549 and PR 550") is None
+    assert route_message("show PR 549 in jariko and kokos") is None
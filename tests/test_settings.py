@@ -0,0 +1,58 @@
+import subprocess
+import sys
+
+import pytest
+
+from chat_with_repo.settings import Settings
+
+
+def test_settings_are_validated_on_first_access():
+    settings = Settings(environ={"GITHUB_TOKEN": "token", "LLM_CACHE_MODE": "wrong"})
+    assert settings.github_token == "token"
+    assert settings.agent_model_name == "gpt-4o-mini"
+    with pytest.raises(Exception, match="OPENAI_API_KEY"):
+        settings.openai_api_key
+    with pytest.raises(Exception, match="LLM_CACHE_MODE"):
+        settings.llm_cache_mode
+
+
+def test_agent_model_defaults_to_model_name():
+    settings = Settings(environ={"MODEL_NAME": "gpt-4o"})
+    assert settings.agent_model_name == "gpt-4o"
+
+
+def test_tool_modules_import_without_streamlit_and_secrets():
+    code = (
+        "import sys\n"
+        "import chat_with_repo.commit_tools, chat_with_repo.tag_tools, chat_with_repo.branch_tools\n"
+        "import chat_with_repo.pull_request_tools\n"
+        "assert 'streamlit' not in sys.modules\n"
+    )
+    # No GITHUB_TOKEN nor Streamlit secrets: the settings are not needed to import the tools
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        env={"PATH": "", "HOME": "/nonexistent"},
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+
+
+def test_modules_do_not_resolve_settings_at_import():
+    code = (
+        "import sys\n"
+        "from chat_with_repo.settings import settings\n"
+        "import chat_with_repo.assistant, chat_with_repo.cache_warmer, chat_with_repo.batch_review\n"
+        "import chat_with_repo.usage, chat_with_repo.cli\n"
+        "resolved = [name for name in vars(settings) if not name.startswith('_')]\n"
+        "assert not resolved, resolved\n"
+        "assert 'dotenv' not in sys.modules\n"
+    )
+    # The defaults of the arguments are read when the objects are created, so they can be changed by then
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        env={"PATH": "", "HOME": "/nonexistent"},
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
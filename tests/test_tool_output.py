@@ -0,0 +1,60 @@
+from datetime import datetime
+
+from chat_with_repo.model import Head, PullRequest, User
+from chat_with_repo.tool_output import encode_names, encode_pull_requests, first_line
+
+
+def pull_request(number: int, merged: bool = True) -> PullRequest:
+    return PullRequest(
+        number=number,
+        html_url=f"https://github.com/smeup/jariko/pull/{number}",
+        diff_url=f"https://github.com/smeup/jariko/pull/{number}.diff",
+        title=f"Title {number}",
+        user=User(login="lanarimarco"),
+        created_at=datetime(2024, 5, 1, 10, 0),
+        merged_at=datetime(2024, 5, 2, 10, 0) if merged else None,
+        closed_at=datetime(2024, 5, 2, 10, 0) if merged else None,
+        head=Head(
+            label=f"smeup:feature/{number}", ref=f"feature/{number}", sha="a" * 40
+        ),
+        base=Head(label="smeup:develop", ref="develop", sha="b" * 40),
+    )
+
+
+def test_encode_pull_requests_hoists_repeated_fields():
+    output = encode_pull_requests(
+        [pull_request(1), pull_request(2, merged=False)],
+        fields=["number", "title", "author", "base", "state"],
+    )
+    lines = output.splitlines()
+    assert lines[0] == "all with author: lanarimarco, base: develop"
+    assert lines[1] == "number | title | state"
+    assert lines[2] == "1 | Title 1 | merged 2024-05-02 10:00"
+    assert lines[3] == "2 | Title 2 | open"
+
+
+def test_encode_pull_requests_marks_more_available():
+    output = encode_pull_requests(
+        [pull_request(number) for number in range(1, 11)],
+        fields=["number", "title"],
+        total=25,
+    )
+    assert (
+        output.splitlines()[-1] == "... 15 more pull requests available, shown 10 of 25"
+    )
+
+
+def test_encode_names_respects_token_cap():
+    names = [f"feature/branch-number-{i}" for i in range(1000)]
+    output = encode_names(names, "branches", max_tokens=100)
+    assert len(output) < 1000
+    assert "more branches available" in output.splitlines()[-1]
+
+
+def test_encode_names_empty():
+    assert encode_names([], "tags") == "No tags found."
+
+
+def test_first_line():
+    assert first_line("\n  Fix the parser\nDetails") == "Fix the parser"
+    assert first_line("   ") == first_line(None) == ""
@@ -0,0 +1,64 @@
+from chat_with_repo.branch_tools import FindBranchesByCommitTool
+from chat_with_repo.commit_tools import (
+    GetCommitByShaTool,
+    GetCommitsByPathTool,
+    GetCommitsByPullRequestTool,
+    IsCommitInBaseTool,
+)
+from chat_with_repo.misc_tools import SelectGitHubRepoTool
+from chat_with_repo.model import State
+from chat_with_repo.pull_request_tools import (
+    CodeReviewTool,
+    GetPullRequestByNumberTool,
+    GetPullRequestByPathTool,
+    GetPullRequestsByCommitTool,
+    GetPullRequestsTool,
+    IsCommitInBranchTool,
+)
+from chat_with_repo.tag_tools import FindTagsByCommitTool
+from chat_with_repo.tool_selector import ToolSelector
+
+
+def create_tools():
+    state = State()
+    return [
+        SelectGitHubRepoTool(state=state),
+        GetPullRequestByNumberTool(state=state),
+        GetPullRequestsTool(state=state),
+        GetPullRequestsByCommitTool(state=state),
+        GetPullRequestByPathTool(state=state),
+        CodeReviewTool(state=state),
+        GetCommitByShaTool(state=state),
+        IsCommitInBranchTool(state=state),
+        IsCommitInBaseTool(state=state),
+        GetCommitsByPathTool(state=state),
+        GetCommitsByPullRequestTool(state=state),
+        FindBranchesByCommitTool(state=state),
+        FindTagsByCommitTool(state=state),
+    ]
+
+
+def select(message: str):
+    return [tool.name for tool in ToolSelector(top_k=5).select(message, create_tools())]
+
+
+def test_select_github_repo_is_always_selected():
+    assert (
+        select("make me the code review of 21 in chat with repo")[0]
+        == "select_github_repo"
+    )
+    assert len(select("make me the code review of 21 in chat with repo")) == 6
+
+
+def test_select_tools():
+    assert "code_review" in select("make me the code review of 21 in chat with repo")
+    assert "find_tags_by_commit" in select(
+        "tell me the tags that contain the commit c37844f8d7c9246676184c8c883b9251d226f287"
+    )
+    tools = select("tell me if the pull request 487 has been merged in the v1.5.1")
+    assert "get_pull_request_by_number" in tools
+    assert "is_commit_in_base" in tools
+
+
+def test_select_all_tools_when_nothing_matches():
+    assert len(select("Ciao!")) == len(create_tools())
@@ -0,0 +1,104 @@
+import asyncio
+from uuid import uuid4
+
+from langchain_core.outputs import LLMResult
+
+from chat_with_repo.callbacks import TracingCallbackHandler
+from chat_with_repo.model import PullRequestFilter
+from chat_with_repo.pull_request_tools import aget_pull_requests, get_pull_requests
+from chat_with_repo.tracing import (
+    GITHUB_SPAN,
+    TOOL_SPAN,
+    TURN_SPAN,
+    LatencyHistogram,
+    current_span,
+    endpoint_template,
+    latency_histograms,
+    span,
+    timing_breakdown,
+    turn_summary,
+)
+
+
+def test_spans_are_nested_and_recorded():
+    latency_histograms.reset()
+    handler = TracingCallbackHandler()
+    run_id = uuid4()
+    with span(TURN_SPAN, "jariko") as turn:
+        with span(TOOL_SPAN, "get_pull_requests") as tool:
+            assert current_span() is tool
+        handler.on_chat_model_start(
+            {}, [[]], run_id=run_id, metadata={"ls_model_name": "gpt-4o-mini"}
+        )
+        handler.on_llm_end(LLMResult(generations=[[]]), run_id=run_id)
+        try:
+            with span(TOOL_SPAN, "find_branches_by_commit"):
+                raise ValueError("boom")
+        except ValueError:
+            pass
+    assert current_span() is None
+    assert [(depth, s.name, s.label) for depth, s in turn.walk()] == [
+        (0, "turn", "jariko"),
+        (1, "tool", "get_pull_requests"),
+        (1, "llm", "gpt-4o-mini"),
+        (1, "tool", "find_branches_by_commit"),
+    ]
+    assert turn.children[2].attributes["error"] == "ValueError"
+    assert turn_summary(turn)["tool_calls"] == 2
+    assert turn_summary(turn)["llm_calls"] == 1
+    assert len(timing_breakdown(turn)) == 4
+    assert latency_histograms.summary()["tool get_pull_requests"]["count"] == 1
+
+
+def test_histogram_quantiles():
+    histogram = LatencyHistogram()
+    for seconds in [0.002] * 90 + [0.7] * 9 + [100]:
+        histogram.observe(seconds)
+    assert histogram.quantile(0.5) == 0.005
+    assert histogram.quantile(0.95) == 1
+    assert histogram.quantile(1) == 100
+    assert histogram.summary()["count"] == 100
+
+
+def test_endpoint_template():
+    base = "https://api.github.com/repos/smeup/jariko"
+    assert endpoint_template(f"{base}/pulls/549/files?page=2") == (
+        "/repos/{owner}/{repo}/pulls/{number}/files"
+    )
+    assert endpoint_template(f"{base}/compare/develop...feature/x") == (
+        "/repos/{owner}/{repo}/compare/{basehead}"
+    )
+    assert endpoint_template(f"{base}/commits/abc1234/pulls") == (
+        "/repos/{owner}/{repo}/commits/{ref}/pulls"
+    )
+
+
+def test_github_requests_are_traced(fake_github):
+    with span(TURN_SPAN) as turn:
+        get_pull_requests(PullRequestFilter(target_branch="develop"), repo="kokos")
+        get_pull_requests(PullRequestFilter(target_branch="develop"), repo="kokos")
+    requests = [child for child in turn.children if child.name == GITHUB_SPAN]
+    assert [request.attributes["page"] for request in requests] == [1, 2, 1, 2]
+    assert {request.label for request in requests} == {"/repos/{owner}/{repo}/pulls"}
+    assert [request.attributes["cache"] for request in requests] == [
+        "miss",
+        "miss",
+        "revalidated",
+        "revalidated",
+    ]
+    summary = turn_summary(turn)
+    assert summary["github_requests"] == 4 and summary["github_cache_hits"] == 2
+    assert summary["github_bytes"] == sum(
+        request.attributes["bytes"] for request in requests[:2]
+    )
+
+
+def test_async_requests_are_children_of_the_tool(fake_github):
+    async def run():
+        with span(TOOL_SPAN, "get_pull_requests") as tool:
+            await aget_pull_requests(PullRequestFilter(), repo="kokos")
+        return tool
+
+    tool = asyncio.run(run())
+    assert len(tool.children) == 2
+    assert all(child.attributes["status"] == 200 for child in tool.children)
@@ -0,0 +1,178 @@
+from uuid import uuid4
+
+from typing import Any
+
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult, LLMResult
+
+from chat_with_repo.callbacks import TracingCallbackHandler
+from chat_with_repo.llm_cache import SQLiteLLMCache
+from chat_with_repo.model import State
+from chat_with_repo.pricing import estimate_cost
+from chat_with_repo.pull_request_tools import CodeReviewTool
+from chat_with_repo.review_jobs import ReviewJobQueue
+from chat_with_repo.settings import Settings, settings
+from chat_with_repo.tracing import TOOL_SPAN, TURN_SPAN, span
+from chat_with_repo.usage import (
+    Usage,
+    UsageLedger,
+    question_kind,
+    span_usage,
+    total_usage,
+)
+
+
+class UsageChatModel(BaseChatModel):
+    """Answers every prompt with the same message and its usage"""
+
+    @property
+    def _llm_type(self) -> str:
+        return "usage"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        message = AIMessage(
+            content="The answer",
+            usage_metadata={
+                "input_tokens": 1000,
+                "output_tokens": 100,
+                "total_tokens": 1100,
+            },
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def call_model(
+    handler: TracingCallbackHandler, model: str, input_tokens: int, output_tokens: int
+):
+    run_id = uuid4()
+    handler.on_chat_model_start(
+        {}, [[]], run_id=run_id, metadata={"ls_model_name": model, "stage": "agent"}
+    )
+    handler.on_llm_end(
+        LLMResult(
+            generations=[[]],
+            llm_output={
+                "token_usage": {
+                    "prompt_tokens": input_tokens,
+                    "completion_tokens": output_tokens,
+                }
+            },
+        ),
+        run_id=run_id,
+    )
+
+
+def test_model_prices_extend_the_price_table(monkeypatch):
+    assert Settings(environ={"MODEL_PRICES": '{"local": [1, 2]}'}).model_prices == {
+        "local": (1.0, 2.0)
+    }
+    with pytest.raises(Exception, match="MODEL_PRICES"):
+        Settings(environ={"MODEL_PRICES": '{"local": 1}'}).model_prices
+    monkeypatch.setitem(vars(settings), "model_prices", {"local": (1.0, 2.0)})
+    assert estimate_cost("local-2024", 1_000_000, 500_000) == 2.0
+    assert estimate_cost("gpt-4o-mini", 1_000_000, 0) == 0.15
+
+
+def test_turn_usage_by_model_and_kind():
+    handler = TracingCallbackHandler()
+    with span(TURN_SPAN, "jariko") as turn:
+        call_model(handler, "gpt-4o-mini", 1000, 100)
+        with span(TOOL_SPAN, "code_review"):
+            call_model(handler, "gpt-4o", 2000, 500)
+        with span(TOOL_SPAN, "get_pull_request_by_number"):
+            pass
+        call_model(handler, "gpt-4o-mini", 1200, 50)
+    usage = span_usage(turn)
+    assert usage["gpt-4o-mini"].llm_calls == 2
+    assert usage["gpt-4o-mini"].input_tokens == 2200
+    assert usage["gpt-4o"].cost == pytest.approx(estimate_cost("gpt-4o", 2000, 500))
+    assert total_usage(usage).output_tokens == 650
+    assert question_kind(turn) == "code_review+get_pull_request_by_number"
+    with span(TURN_SPAN, "jariko", answer_cache="hit") as cached:
+        pass
+    assert question_kind(cached) == "answer_cache" and span_usage(cached) == {}
+
+
+def test_usage_ledger_totals_persist(tmp_path):
+    path = str(tmp_path / "usage.sqlite")
+    ledger = UsageLedger(path)
+    ledger.record(
+        {"gpt-4o": Usage(llm_calls=1, input_tokens=10, output_tokens=5, cost=0.5)},
+        kind="code_review",
+        repo="jariko",
+        user="a@smeup.com",
+        session="s1",
+    )
+    ledger.record(
+        {
+            "gpt-4o-mini": Usage(
+                llm_calls=2, input_tokens=20, output_tokens=2, cost=0.1
+            ),
+            "gpt-4o": Usage(llm_calls=1, input_tokens=30, output_tokens=3, cost=1.0),
+        },
+        kind="get_pull_requests",
+        repo="kokos",
+        user="b@smeup.com",
+        session="s2",
+    )
+    ledger.record({}, kind="answer_cache", repo="jariko", user="a@smeup.com")
+    reopened = UsageLedger(path)
+    by_repo = reopened.totals("repo")
+    assert list(by_repo) == ["kokos", "jariko"]
+    assert by_repo["kokos"].turns == 1 and by_repo["kokos"].cost == pytest.approx(1.1)
+    assert by_repo["jariko"].turns == 2 and by_repo["jariko"].llm_calls == 1
+    assert reopened.totals("model", user="a@smeup.com")["gpt-4o"].input_tokens == 10
+    assert reopened.totals("user", session="s2") == {
+        "b@smeup.com": Usage(
+            turns=1, llm_calls=3, input_tokens=50, output_tokens=5, cost=1.1
+        )
+    }
+    assert reopened.totals("kind", since=2**40) == {}
+    with pytest.raises(ValueError):
+        reopened.totals("cost; DROP TABLE usage")
+
+
+def test_review_jobs_record_their_usage(tmp_path):
+    def review(number, question, owner, repo, model, callbacks):
+        call_model(callbacks[-1], model, 3000, 700)
+        return "done"
+
+    ledger = UsageLedger(str(tmp_path / "usage.sqlite"))
+    queue = ReviewJobQueue(
+        path=str(tmp_path / "jobs.sqlite"), review=review, usage_ledger=ledger
+    )
+    tool = CodeReviewTool(
+        state=State(messages=[HumanMessage(content="review 549")]),
+        model="gpt-4o",
+        job_queue=queue,
+        user="a@smeup.com",
+        session_id="s1",
+    )
+    assert "running in background" in tool.run({"number": 549})
+    job = queue.list_jobs()[0]
+    assert (job.user, job.session) == ("a@smeup.com", "s1")
+    queue.wait(job.id, timeout=5)
+    queue.shutdown()
+    usage = ledger.totals("kind")["code_review_job"]
+    assert (usage.llm_calls, usage.input_tokens, usage.output_tokens) == (1, 3000, 700)
+    # The usage of the review is accounted to the user and the session that submitted it
+    assert ledger.totals("user")["a@smeup.com"].input_tokens == 3000
+    assert ledger.totals("session")["s1"].output_tokens == 700
+
+
+def test_cached_model_calls_cost_nothing(tmp_path):
+    cache = SQLiteLLMCache(path=str(tmp_path / "cache.sqlite"))
+    llm = UsageChatModel(cache=cache, metadata={"ls_model_name": "gpt-4o"})
+    config = {"callbacks": [TracingCallbackHandler()]}
+    with span(TURN_SPAN, "jariko") as first:
+        llm.invoke("hello", config)
+    with span(TURN_SPAN, "jariko") as second:
+        assert llm.invoke("hello", config).content == "The answer"
+    assert cache.hits == 1
+    assert span_usage(first)["gpt-4o"].cost == pytest.approx(
+        estimate_cost("gpt-4o", 1000, 100)
+    )
+    cached = span_usage(second)["gpt-4o"]
+    assert (cached.llm_calls, cached.input_tokens, cached.cost) == (1, 0, 0.0)
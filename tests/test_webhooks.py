@@ -0,0 +1,124 @@
+import hashlib
+import hmac
+import json
+import os
+import socket
+import threading
+
+import pytest
+import requests
+
+from chat_with_repo.metadata_store import (
+    ANCESTRY,
+    MISSING,
+    PULL_REQUESTS,
+    get_metadata_store,
+)
+from chat_with_repo.resources import Resources
+from chat_with_repo.settings import settings
+from chat_with_repo.webhooks import (
+    WEBHOOK_PATH,
+    WebhookReceiver,
+    apply_event,
+    verify_signature,
+)
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "webhooks")
+SECRET = "It's a Secret to Everybody"
+
+
+def load_payload(name: str) -> bytes:
+    with open(os.path.join(FIXTURES, f"{name}.json"), "rb") as f:
+        return f.read()
+
+
+def sign(body: bytes) -> str:
+    return "sha256=" + hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+
+
+def test_verify_signature():
+    body = b"Hello, World!"
+    assert verify_signature(SECRET, body, sign(body))
+    assert not verify_signature(SECRET, body + b"!", sign(body))
+    assert not verify_signature(SECRET, body, None)
+
+
+def test_push_updates_the_ancestry():
+    store = get_metadata_store()
+    pushed = "2222222222222222222222222222222222222222"
+    store.put(ANCESTRY, ("smeup", "jariko", pushed, "develop"), False, 60)
+    store.put(ANCESTRY, ("smeup", "jariko", "old", "develop"), True, 60)
+    store.put(ANCESTRY, ("smeup", "jariko", "other", "master"), False, 60)
+    apply_event("push", json.loads(load_payload("push")))
+    assert store.get(ANCESTRY, ("smeup", "jariko", pushed, "develop")) is True
+    assert store.get(ANCESTRY, ("smeup", "jariko", "old", "develop")) is True
+    assert store.get(ANCESTRY, ("smeup", "jariko", "other", "master")) is False
+    apply_event("delete", json.loads(load_payload("delete")))
+    store.put(ANCESTRY, ("smeup", "jariko", pushed, "feature/ds"), True, 60)
+    apply_event("delete", json.loads(load_payload("delete")))
+    assert store.get(ANCESTRY, ("smeup", "jariko", pushed, "feature/ds")) is MISSING
+
+
+def test_receiver_applies_signed_pull_request():
+    receiver = WebhookReceiver(secret=SECRET, port=0, address="127.0.0.1")
+    receiver.start()
+    try:
+        url = f"http://127.0.0.1:{receiver.port}{WEBHOOK_PATH}"
+        body = load_payload("pull_request")
+        response = requests.post(
+            url,
+            data=body,
+            headers={"X-GitHub-Event": "pull_request", "X-Hub-Signature-256": "x"},
+        )
+        assert response.status_code == 401
+        response = requests.post(
+            url,
+            data=body,
+            headers={
+                "X-GitHub-Event": "pull_request",
+                "X-Hub-Signature-256": sign(body),
+            },
+        )
+        assert response.status_code == 200
+        assert response.json()["changes"]
+    finally:
+        receiver.stop()
+    pull_request = get_metadata_store().get(PULL_REQUESTS, ("smeup", "jariko", 549))
+    assert pull_request.merged_at is not None
+
+
+def test_resources_start_the_receiver_once(monkeypatch):
+    monkeypatch.setitem(vars(settings), "github_webhook_secret", SECRET)
+    monkeypatch.setitem(vars(settings), "github_webhook_port", 0)
+    resources = Resources()
+    started = []
+    # A deadlock would never return, the check runs in a thread with a timeout
+    thread = threading.Thread(
+        target=lambda: started.append(resources.start_webhook_receiver()),
+        daemon=True,
+    )
+    thread.start()
+    thread.join(10)
+    assert started and started[0] is not None
+    try:
+        assert resources.start_webhook_receiver() is started[0]
+        response = requests.post(
+            f"http://127.0.0.1:{started[0].port}{WEBHOOK_PATH}",
+            data=b"{}",
+            headers={"X-GitHub-Event": "ping", "X-Hub-Signature-256": sign(b"{}")},
+        )
+        assert response.status_code < 500
+    finally:
+        started[0].stop()
+
+
+def test_webhook_receiver_reports_the_port_in_use(monkeypatch):
+    with socket.socket() as taken:
+        taken.bind(("", 0))
+        taken.listen()
+        port = taken.getsockname()[1]
+        with pytest.raises(OSError):
+            WebhookReceiver(secret=SECRET, port=port).start()
+        monkeypatch.setitem(vars(settings), "github_webhook_secret", SECRET)
+        monkeypatch.setitem(vars(settings), "github_webhook_port", port)
+        assert Resources().start_webhook_receiver() is None